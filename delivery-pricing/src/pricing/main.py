@@ -5,44 +5,95 @@ PricingFunction
 
 import json
 import math
-from typing import List
+import time
+from typing import List, Optional
 import os
+import numpy as np
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
 from ecom.apigateway import iam_user_id, response # pylint: disable=import-error
+import packing
+import rates
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
+# Rate table bundled with the function, used when the S3 object cannot be read
+RATES_FILE = os.environ.get("RATES_FILE", os.path.join(os.path.dirname(__file__), "rates.json"))
+# Location of the rate table in S3. Without a bucket, the bundled file is used.
+RATES_BUCKET = os.environ.get("RATES_BUCKET", "")
+RATES_KEY = os.environ.get("RATES_KEY", "rates.json")
+# How often to check for a new rate table, in seconds
+RATES_TTL = float(os.environ.get("RATES_TTL", "60"))
+PACKING_ENGINE = os.environ.get("PACKING_ENGINE", "ffd")
+# Maximum time spent in the packing engine per cart, in seconds
+PACKING_BUDGET = float(os.environ.get("PACKING_BUDGET", "0.05"))
+# API Gateway stops waiting for the function after 29 seconds
+API_TIMEOUT = 29
+# Time kept aside to send the response of a batch request, in seconds
+BATCH_MARGIN = float(os.environ.get("BATCH_MARGIN", "1"))
+# Maximum number of carts priced per batch request. Carts cost about 40us
+# each through batch_handler() in tests/perf/bench_pricing.py, so a full
+# batch takes well under the API Gateway timeout. Carts that hit the packing budget are bounded by the
+# deadline of the request instead, see get_pricing_batch().
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "10000"))
 
 
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
+if RATES_BUCKET:
+    rate_table = rates.RateTableLoader( # pylint: disable=invalid-name
+        rates.S3Source(RATES_BUCKET, RATES_KEY),
+        ttl=RATES_TTL,
+        default=rates.FileSource(RATES_FILE).fetch()[1]
+    )
+else:
+    rate_table = rates.RateTableLoader(rates.FileSource(RATES_FILE), ttl=RATES_TTL) # pylint: disable=invalid-name
 
 
 # 50*50*50 cm cube
+BOX_DIMENSIONS = (500, 500, 500)
 BOX_VOLUME = 500*500*500
 # 12kg per box
 BOX_WEIGHT = 12000
 
 
-COUNTRY_SHIPPING_FEES = {
-    # Nordics countries
-    "DK":    0, "FI":    0, "NO":    0, "SE":    0,
+@tracer.capture_method
+def min_boxes(packages: List[dict]) -> int:
+    """
+    Minimum number of boxes based on the product packaging
+
+    This treats the shipment as a fluid and ignores the dimensions of each
+    package, which makes it a fast lower bound for count_boxes().
+    """
+
+    volume = sum([p["width"]*p["length"]*p["height"] for p in packages])
+    weight = sum([p["weight"] for p in packages])
+
+    return max(math.ceil(volume/BOX_VOLUME), math.ceil(weight/BOX_WEIGHT))
 
-    # Other EU countries
-    "AT": 1000, "BE": 1000, "BG": 1000, "CY": 1000,
-    "CZ": 1000, "DE": 1000, "EE": 1000, "ES": 1000,
-    "FR": 1000, "GR": 1000, "HR": 1000, "HU": 1000,
-    "IE": 1000, "IT": 1000, "LT": 1000, "LU": 1000,
-    "LV": 1000, "MT": 1000, "NL": 1000, "PO": 1000,
-    "PT": 1000, "RO": 1000, "SI": 1000, "SK": 1000,
 
-    # North America
-    "CA": 1500, "US": 1500,
+def pack_boxes(packages: List[dict], lower_bound: int) -> int:
+    """
+    Count number of boxes with the packing engine
 
-    # Rest of the world
-    "*": 2500
-}
+    If the packing engine is disabled or runs out of time, this returns the
+    lower bound from min_boxes().
+    """
+
+    if PACKING_ENGINE not in packing.ENGINES:
+        return lower_bound
+
+    try:
+        return max(lower_bound, packing.count_boxes(
+            packages, BOX_DIMENSIONS, BOX_WEIGHT,
+            engine=PACKING_ENGINE, budget=PACKING_BUDGET
+        ))
+    except packing.PackingTimeout:
+        logger.warning({
+            "message": "Packing engine ran out of time for {} packages".format(len(packages)),
+            "packageCount": len(packages)
+        })
+        return lower_bound
 
 
 @tracer.capture_method
@@ -51,19 +102,27 @@ def count_boxes(packages: List[dict]) -> int:
     Count number of boxes based on the product packaging
     """
 
-    volume = sum([p["width"]*p["length"]*p["height"] for p in packages])
-    weight = sum([p["weight"] for p in packages])
+    return pack_boxes(packages, min_boxes(packages))
 
-    return max(math.ceil(volume/BOX_VOLUME), math.ceil(weight/BOX_WEIGHT))
+
+def box_weight(packages: List[dict], boxes: int) -> int:
+    """
+    Average weight of a box, rounded up
+    """
+
+    if boxes == 0:
+        return 0
+
+    return -(-sum([p["weight"] for p in packages]) // boxes)
 
 
 @tracer.capture_method
-def get_shipping_cost(address: dict) -> int:
+def get_shipping_cost(address: dict, weight: int = 0) -> int:
     """
-    Get the shipping cost per box
+    Get the shipping cost per box, for boxes of 'weight' grams
     """
 
-    return COUNTRY_SHIPPING_FEES.get(address["country"], COUNTRY_SHIPPING_FEES["*"])
+    return rate_table.get().lookup(address["country"], weight)
 
 
 @tracer.capture_method
@@ -72,7 +131,114 @@ def get_pricing(products: List[dict], address: dict) -> int:
     Calculate the delivery cost for a specific address and list of products
     """
 
-    return count_boxes([p["package"] for p in products]) * get_shipping_cost(address)
+    packages = [p["package"] for p in products]
+    boxes = count_boxes(packages)
+
+    return boxes * get_shipping_cost(address, box_weight(packages, boxes))
+
+
+def _segment_sums(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Sum 'values' for each segment delimited by 'offsets'
+
+    This uses differences of cumulative sums rather than np.add.reduceat, as
+    the latter does not return 0 for empty segments.
+    """
+
+    cumsum = np.concatenate([[0], np.cumsum(values)])
+    return cumsum[offsets[1:]] - cumsum[offsets[:-1]]
+
+
+@tracer.capture_method
+def min_boxes_batch(carts: List[List[dict]]) -> List[int]:
+    """
+    Minimum number of boxes for multiple lists of packages
+
+    This returns the same values as calling min_boxes() for each list of
+    packages, but computes volumes and weights for all of them at once.
+    """
+
+    # Not worth the fixed cost of NumPy for a single cart
+    if len(carts) < 2:
+        return [min_boxes(packages) for packages in carts]
+
+    offsets = np.zeros(len(carts)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(packages) for packages in carts])
+
+    if offsets[-1] == 0:
+        return [min_boxes(packages) for packages in carts]
+
+    # Shape (4, n_packages): width, length, height and weight
+    dimensions = np.array([
+        (p["width"], p["length"], p["height"], p["weight"])
+        for packages in carts for p in packages
+    ]).T
+
+    # Only integers (as per the Package schema) are guaranteed to give the
+    # same results as min_boxes(). Anything else goes through the slow path.
+    if dimensions.dtype.kind not in "iu" or np.abs(dimensions).max() >= 2**21:
+        return [min_boxes(packages) for packages in carts]
+
+    dimensions = dimensions.astype(np.int64)
+    package_volumes = dimensions[0]*dimensions[1]*dimensions[2]
+
+    # Sums must not overflow, and float division is only exact below 2**53
+    if (np.abs(package_volumes).sum(dtype=np.float64) >= 2**53
+            or np.abs(dimensions[3]).sum(dtype=np.float64) >= 2**53):
+        return [min_boxes(packages) for packages in carts]
+
+    volumes = _segment_sums(package_volumes, offsets)
+    weights = _segment_sums(dimensions[3], offsets)
+
+    boxes = np.maximum(
+        np.ceil(volumes / BOX_VOLUME),
+        np.ceil(weights / BOX_WEIGHT)
+    )
+
+    return boxes.astype(np.int64).tolist()
+
+
+@tracer.capture_method
+def count_boxes_batch(carts: List[List[dict]], deadline: Optional[float] = None) -> List[int]:
+    """
+    Count number of boxes for multiple lists of packages
+
+    This returns the same values as calling count_boxes() for each list of
+    packages. With a deadline, in time.monotonic() seconds, this stops
+    before the first list of packages that could run past it and only
+    returns the counts of the previous ones.
+    """
+
+    boxes = []
+    for packages, lower_bound in zip(carts, min_boxes_batch(carts)):
+        if deadline is not None and time.monotonic() + PACKING_BUDGET > deadline:
+            break
+        boxes.append(pack_boxes(packages, lower_bound))
+
+    return boxes
+
+
+@tracer.capture_method
+def get_pricing_batch(carts: List[dict], deadline: Optional[float] = None) -> List[int]:
+    """
+    Calculate the delivery cost for multiple carts
+
+    Each cart is a dict with 'products' and 'address' keys, as for
+    get_pricing(). With a deadline, this only returns the pricings of the
+    carts that could be priced before it, in order.
+    """
+
+    carts_packages = [
+        [p["package"] for p in cart["products"]]
+        for cart in carts
+    ]
+    boxes = count_boxes_batch(carts_packages, deadline)
+
+    table = rate_table.get()
+    return [
+        count * table.lookup(cart["address"]["country"], box_weight(packages, count))
+        for count, packages, cart in zip(boxes, carts_packages, carts)
+    ]
 
 
 @logger.inject_lambda_context
@@ -113,3 +279,65 @@ def handler(event, _):
     return response({
         "pricing": pricing
     })
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+def batch_handler(event, context):
+    """
+    Lambda function handler for /backend/pricing/batch
+
+    Carts beyond MAX_BATCH_SIZE, or that cannot be priced before the API
+    Gateway timeout, are returned as 'unprocessed' for the caller to retry.
+    """
+
+    # Verify that this is a request with IAM credentials
+    if iam_user_id(event) is None:
+        logger.warning({"message": "User ARN not found in event"})
+        return response("Unauthorized", 403)
+
+    # Extract the request body
+    try:
+        body = json.loads(event["body"])
+    except Exception as exc: # pylint: disable=broad-except
+        logger.warning("Exception caught: %s", exc)
+        return response("Failed to parse JSON body", 400)
+
+    if not isinstance(body.get("carts", None), list):
+        logger.info({
+            "message": "Missing 'carts' in body",
+            "body": body
+        })
+        return response("Missing 'carts' in body", 400)
+
+    for index, cart in enumerate(body["carts"]):
+        for key in ["products", "address"]:
+            if key not in cart:
+                logger.info({
+                    "message": "Missing '{}' in cart {}".format(key, index),
+                    "body": body
+                })
+                return response("Missing '{}' in cart {}".format(key, index), 400)
+
+    # Calculate the delivery pricings
+    deadline = time.monotonic() + min(
+        context.get_remaining_time_in_millis() / 1000, API_TIMEOUT
+    ) - BATCH_MARGIN
+    pricings = get_pricing_batch(body["carts"][:MAX_BATCH_SIZE], deadline)
+    logger.debug({
+        "message": "Estimated delivery pricings for {} carts".format(len(pricings)),
+        "pricings": pricings
+    })
+
+    unprocessed = list(range(len(pricings), len(body["carts"])))
+    if unprocessed:
+        logger.info({
+            "message": "Could not price {} carts out of {}".format(len(unprocessed), len(body["carts"])),
+            "count": len(unprocessed)
+        })
+
+    # Send the response back
+    return response({
+        "pricings": pricings,
+        "unprocessed": unprocessed
+    })
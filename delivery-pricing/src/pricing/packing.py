@@ -0,0 +1,160 @@
+"""
+Packing engines for delivery pricing
+
+Packing engines count how many boxes are needed to ship a list of packages.
+They work on a normalized form of the packages, where each item is a
+(a, b, c, weight) tuple with a >= b >= c. As packages can be rotated freely,
+shipments with the same multiset of packages share the same key, and
+therefore the same cache entry.
+"""
+
+
+import functools
+import math
+import time
+from typing import Callable, Dict, List, Tuple
+
+
+__all__ = ["ENGINES", "PackingTimeout", "count_boxes", "normalize"]
+
+
+# (a, b, c, weight) with a >= b >= c
+Item = Tuple[int, int, int, int]
+# Box or free space dimensions, with a >= b >= c
+Space = Tuple[int, int, int]
+
+
+class PackingTimeout(Exception):
+    """
+    The packing engine ran out of time
+    """
+
+
+def normalize(packages: List[dict]) -> Tuple[Item, ...]:
+    """
+    Transform a list of packages into a hashable multiset of items
+    """
+
+    return tuple(sorted(
+        tuple(sorted((p["width"], p["length"], p["height"]), reverse=True)) + (p["weight"], )
+        for p in packages
+    ))
+
+
+def _fits(item: Item, space: Space) -> bool:
+    """
+    Check if an item fits in a space, in any orientation
+    """
+
+    return item[0] <= space[0] and item[1] <= space[1] and item[2] <= space[2]
+
+
+def _split(item: Item, space: Space) -> List[Space]:
+    """
+    Place an item in the corner of a space and return the remaining spaces
+
+    The item is placed with its largest side along the largest side of the
+    space, and the rest of the space is cut into three cuboids (guillotine
+    cut).
+    """
+
+    spaces = [
+        (space[0]-item[0], space[1], space[2]),
+        (item[0], space[1]-item[1], space[2]),
+        (item[0], item[1], space[2]-item[2])
+    ]
+
+    return [
+        tuple(sorted(s, reverse=True))
+        for s in spaces
+        if s[0] > 0 and s[1] > 0 and s[2] > 0
+    ]
+
+
+def first_fit_decreasing(items: Tuple[Item, ...], box: Space, max_weight: int, deadline: float) -> int:
+    """
+    First-fit decreasing 3D bin packing
+
+    Items are sorted by decreasing volume and placed in the first open box
+    where they fit, in the smallest free space that can hold them. Items that
+    cannot fit in an empty box are shipped on their own, using as many boxes
+    as their volume and weight require.
+
+    Raises PackingTimeout if it is still running after 'deadline', as
+    returned by time.perf_counter().
+    """
+
+    box = tuple(sorted(box, reverse=True))
+    box_volume = box[0]*box[1]*box[2]
+
+    # Each open box is a [remaining weight, free spaces] pair
+    boxes = []
+    oversized = 0
+
+    for item in sorted(items, key=lambda i: (i[0]*i[1]*i[2], i[3]), reverse=True):
+        if time.perf_counter() > deadline:
+            raise PackingTimeout()
+
+        if not _fits(item, box) or item[3] > max_weight:
+            oversized += max(
+                1,
+                math.ceil(item[0]*item[1]*item[2]/box_volume),
+                math.ceil(item[3]/max_weight)
+            )
+            continue
+
+        for open_box in boxes:
+            if open_box[0] < item[3]:
+                continue
+
+            spaces = [s for s in open_box[1] if _fits(item, s)]
+            if len(spaces) == 0:
+                continue
+
+            # Best fit: smallest free space that can hold the item
+            space = min(spaces, key=lambda s: s[0]*s[1]*s[2])
+            open_box[0] -= item[3]
+            open_box[1].remove(space)
+            open_box[1].extend(_split(item, space))
+            break
+        else:
+            boxes.append([max_weight-item[3], _split(item, box)])
+
+    return len(boxes) + oversized
+
+
+ENGINES: Dict[str, Callable[[Tuple[Item, ...], Space, int, float], int]] = {
+    "ffd": first_fit_decreasing
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def _count_boxes(engine: str, items: Tuple[Item, ...], box: Space, max_weight: int, budget: float) -> int:
+    """
+    Memoized call to a packing engine
+
+    Exceptions are not cached by lru_cache, so a shipment that ran out of
+    time is tried again on the next request.
+    """
+
+    return ENGINES[engine](items, box, max_weight, time.perf_counter()+budget)
+
+
+def count_boxes(
+        packages: List[dict],
+        box: Space,
+        max_weight: int,
+        engine: str = "ffd",
+        budget: float = 0.05
+    ) -> int:
+    """
+    Count the number of boxes needed to ship a list of packages
+
+    'budget' is the maximum time in seconds the engine can take. If it runs
+    out of time, this raises PackingTimeout.
+    """
+
+    if len(packages) == 0:
+        return 0
+
+    return _count_boxes(engine, normalize(packages), tuple(box), max_weight, budget)
@@ -0,0 +1,238 @@
+"""
+Shipping rate tables for delivery pricing
+
+Rate tables map countries to zones, and zones to a shipping cost per box for
+each weight band. They are stored as JSON documents with the following
+format:
+
+    {
+      "version": "2021-06-01",
+      "weightBands": [2000, 12000],
+      "defaultZone": "world",
+      "zones": {"nordics": ["DK", "FI", "NO", "SE"], "world": []},
+      "rates": {"nordics": [0, 500], "world": [2500, 3000]}
+    }
+
+'weightBands' are the upper bounds of each band in grams, and each zone has
+one rate per band. Boxes heavier than the last band use the last rate.
+
+Deployed functions read the rate table from S3, so it can change without a
+deployment. The file bundled with the function is only a default.
+"""
+
+
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Optional, Tuple
+import boto3
+from botocore.exceptions import ClientError
+from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
+
+
+__all__ = ["FileSource", "RateTable", "RateTableLoader", "S3Source"]
+
+
+logger = Logger(child=True) # pylint: disable=invalid-name
+
+
+def _country_index(country: str) -> int:
+    """
+    Returns the index of an ISO 3166-1 alpha-2 country code in a 26*26 table
+    """
+
+    if not isinstance(country, str) or len(country) != 2:
+        return -1
+
+    first = ord(country[0]) - 65
+    second = ord(country[1]) - 65
+    if not (0 <= first < 26 and 0 <= second < 26):
+        return -1
+
+    return first*26 + second
+
+
+class RateTable:
+    """
+    Compiled rate table
+
+    Zones and rates are compiled into flat lists, so that looking up a rate
+    is a couple of index operations and a bisection on the weight bands.
+    """
+
+    def __init__(self, data: dict):
+        self.version = data["version"]
+
+        zones = list(data["zones"].keys())
+        if data["defaultZone"] not in zones:
+            raise ValueError("Unknown default zone {}".format(data["defaultZone"]))
+
+        self._bands = list(data["weightBands"])
+        if len(self._bands) == 0 or self._bands != sorted(self._bands):
+            raise ValueError("Weight bands must be a non-empty sorted list")
+
+        # Rates for each zone index
+        self._rates = []
+        for zone in zones:
+            rates = data["rates"].get(zone)
+            if rates is None or len(rates) != len(self._bands):
+                raise ValueError("Zone {} needs one rate per weight band".format(zone))
+            self._rates.append(tuple(rates))
+        self._rates = tuple(self._rates)
+
+        # Zone index for each country
+        default_zone = zones.index(data["defaultZone"])
+        country_zones = [default_zone] * 26*26
+        for zone_index, zone in enumerate(zones):
+            for country in data["zones"][zone]:
+                index = _country_index(country)
+                if index < 0:
+                    raise ValueError("Invalid country code {}".format(country))
+                country_zones[index] = zone_index
+        self._country_zones = tuple(country_zones)
+        self._default_zone = default_zone
+
+    def lookup(self, country: str, weight: int = 0) -> int:
+        """
+        Returns the shipping cost per box for a country and box weight
+        """
+
+        index = _country_index(country)
+        zone = self._country_zones[index] if index >= 0 else self._default_zone
+        band = min(bisect.bisect_left(self._bands, weight), len(self._bands)-1)
+
+        return self._rates[zone][band]
+
+
+class FileSource:
+    """
+    Rate table stored in a local file
+
+    The modification time and size of the file act as its ETag, so the file
+    is only read again when it changes. Files in a Lambda deployment package
+    never change, so this is meant for local runs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self, etag: Optional[str] = None) -> Optional[Tuple[str, dict]]:
+        """
+        Returns the ETag and content of the rate table, or None if it did not
+        change since 'etag'
+        """
+
+        stat = os.stat(self.path)
+        new_etag = "{}-{}".format(stat.st_mtime_ns, stat.st_size)
+        if new_etag == etag:
+            return None
+
+        with open(self.path) as fp:
+            return new_etag, json.load(fp)
+
+
+class S3Source:
+    """
+    Rate table stored as an S3 object
+
+    The ETag of the object is sent as If-None-Match, so S3 only returns the
+    rate table when it changed.
+    """
+
+    def __init__(self, bucket: str, key: str, client=None):
+        self.bucket = bucket
+        self.key = key
+        self.client = client if client is not None else boto3.client("s3")
+
+    def fetch(self, etag: Optional[str] = None) -> Optional[Tuple[str, dict]]:
+        """
+        Returns the ETag and content of the rate table, or None if it did not
+        change since 'etag'
+        """
+
+        kwargs = {"Bucket": self.bucket, "Key": self.key}
+        if etag is not None:
+            kwargs["IfNoneMatch"] = etag
+        try:
+            res = self.client.get_object(**kwargs)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+                return None
+            raise
+
+        return res["ETag"], json.loads(res["Body"].read())
+
+
+class RateTableLoader:
+    """
+    Keeps a compiled rate table up to date
+
+    The rate table is loaded when creating the loader. After that, get()
+    never performs any I/O: once the table is older than 'ttl' seconds, it
+    starts a background refresh and keeps returning the current table until
+    the new one is compiled. If the refresh fails, the current table is kept.
+
+    If the source cannot be read when creating the loader and there is a
+    'default' rate table, that table is used until a refresh succeeds.
+    """
+
+    def __init__(self, source, ttl: float = 60, default: Optional[dict] = None):
+        self.source = source
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._thread = None
+        try:
+            self._etag, data = source.fetch()
+        except Exception as exc: # pylint: disable=broad-except
+            if default is None:
+                raise
+            logger.warning({
+                "message": "Failed to load rate table, using the default: {}".format(exc),
+                "version": default.get("version")
+            })
+            self._etag, data = None, default
+        self._table = RateTable(data)
+        self._checked = time.monotonic()
+
+    def get(self) -> RateTable:
+        """
+        Returns the current rate table
+        """
+
+        if time.monotonic() - self._checked > self.ttl:
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._checked = time.monotonic()
+                    self._thread = threading.Thread(target=self.refresh, daemon=True)
+                    self._thread.start()
+
+        return self._table
+
+    def refresh(self) -> None:
+        """
+        Fetch and compile the rate table if it changed
+        """
+
+        try:
+            res = self.source.fetch(self._etag)
+            if res is None:
+                return
+
+            etag, data = res
+            table = RateTable(data)
+        except Exception as exc: # pylint: disable=broad-except
+            logger.warning({
+                "message": "Failed to refresh rate table: {}".format(exc),
+                "version": self._table.version
+            })
+            return
+
+        logger.info({
+            "message": "Loaded rate table version {}".format(table.version),
+            "version": table.version
+        })
+        self._etag = etag
+        self._table = table
@@ -0,0 +1,84 @@
+"""
+Benchmark for the packing engine
+
+This measures the latency of `count_boxes()` with a cold cache on carts of 1
+to 200 packages, and how many more boxes it counts compared to the volume
+and weight lower bound.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python delivery-pricing/tests/perf/bench_packing.py
+"""
+
+
+import os
+import random
+import sys
+import time
+
+
+os.environ.setdefault("ENVIRONMENT", "perf")
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "pricing"))
+import main # pylint: disable=import-error,wrong-import-position
+
+
+CART_SIZES = [1, 10, 50, 100, 200]
+CARTS = 200
+
+
+def get_package() -> dict:
+    """
+    Generate a package, from small items to long ones
+    """
+
+    return {
+        "width": random.randrange(10, 500),
+        "length": random.randrange(10, 300),
+        "height": random.randrange(10, 200),
+        "weight": random.randrange(10, 3000)
+    }
+
+
+def main_():
+    """
+    Run the benchmark for each cart size
+    """
+
+    # 'extra' is the percentage of boxes above the lower bound, 'fallback' the
+    # number of carts for which the engine ran out of time.
+    print("{:>6} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+        "items", "p50", "p99", "max", "extra", "fallback"
+    ))
+    for size in CART_SIZES:
+        latencies = []
+        lower_bounds = 0
+        boxes = 0
+        fallbacks = 0
+        for _ in range(CARTS):
+            packages = [get_package() for _ in range(size)]
+            main.packing._count_boxes.cache_clear() # pylint: disable=protected-access
+
+            start = time.perf_counter()
+            count = main.count_boxes(packages)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            lower_bounds += main.min_boxes(packages)
+            boxes += count
+            # Results are not cached when the engine runs out of time
+            if main.packing._count_boxes.cache_info().currsize == 0: # pylint: disable=protected-access
+                fallbacks += 1
+
+        latencies.sort()
+        print("{:>6} {:>8.2f}ms {:>8.2f}ms {:>8.2f}ms {:>9.1f}% {:>9}".format(
+            size,
+            latencies[len(latencies)//2],
+            latencies[int(len(latencies)*0.99)],
+            latencies[-1],
+            (boxes/lower_bounds - 1) * 100,
+            fallbacks
+        ))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,114 @@
+"""
+Benchmark for batch delivery pricing
+
+This compares the per-cart cost of `get_pricing()` called in a loop with
+`get_pricing_batch()` and `batch_handler()` for batches of 1, 100 and 10,000
+carts, and checks that they all return the same pricings.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python delivery-pricing/tests/perf/bench_pricing.py
+"""
+
+
+import json
+import os
+import random
+import sys
+import timeit
+
+
+os.environ.setdefault("ENVIRONMENT", "perf")
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "pricing"))
+import main # pylint: disable=import-error,wrong-import-position
+
+
+BATCH_SIZES = [1, 100, 10000]
+COUNTRIES = ["SE", "FR", "US", "JP"]
+
+
+def get_cart() -> dict:
+    """
+    Generate a cart with 1 to 10 products
+    """
+
+    return {
+        "products": [{
+            "package": {
+                "width": random.randrange(10, 1000),
+                "length": random.randrange(10, 1000),
+                "height": random.randrange(10, 1000),
+                "weight": random.randrange(10, 1000)
+            }
+        } for _ in range(random.randrange(1, 11))],
+        "address": {"country": random.choice(COUNTRIES)}
+    }
+
+
+class Context:
+    """
+    Lambda context with the API Gateway timeout remaining
+    """
+
+    function_name = "bench_pricing"
+    memory_limit_in_mb = 1024
+    invoked_function_arn = "bench_pricing"
+    aws_request_id = "bench_pricing"
+
+    def get_remaining_time_in_millis(self):
+        """
+        Remaining time before the Lambda timeout
+        """
+
+        return 30000
+
+
+def handle(carts: list) -> list:
+    """
+    Price carts through the batch API handler
+    """
+
+    retval = main.batch_handler({
+        "requestContext": {"identity": {"userArn": "bench_pricing"}},
+        "body": json.dumps({"carts": carts})
+    }, Context())
+    body = json.loads(retval["body"])
+    assert body["unprocessed"] == []
+
+    return body["pricings"]
+
+
+def main_():
+    """
+    Run the benchmark for each batch size
+    """
+
+    print("{:>8} {:>14} {:>14} {:>8} {:>14}".format("carts", "get_pricing", "batch", "speedup", "handler"))
+    for size in BATCH_SIZES:
+        carts = [get_cart() for _ in range(size)]
+        iterations = max(1, 10000 // size)
+
+        expected = [main.get_pricing(c["products"], c["address"]) for c in carts]
+        assert main.get_pricing_batch(carts) == expected
+        assert handle(carts) == expected
+
+        before = timeit.timeit(
+            lambda: [main.get_pricing(c["products"], c["address"]) for c in carts], # pylint: disable=cell-var-from-loop
+            number=iterations
+        ) / iterations / size
+        after = timeit.timeit(
+            lambda: main.get_pricing_batch(carts), # pylint: disable=cell-var-from-loop
+            number=iterations
+        ) / iterations / size
+        handler = timeit.timeit(
+            lambda: handle(carts), # pylint: disable=cell-var-from-loop
+            number=iterations
+        ) / iterations / size
+        print("{:>8} {:>10.2f}us/c {:>10.2f}us/c {:>7.1f}x {:>10.2f}us/c".format(
+            size, before*1e6, after*1e6, before/after, handler*1e6
+        ))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,126 @@
+import random
+import time
+import pytest
+from fixtures import lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "pricing",
+    "module_name": "packing",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+
+
+BOX = (500, 500, 500)
+BOX_WEIGHT = 12000
+
+
+def get_package(max_size: int = 500, max_weight: int = 5000) -> dict:
+    return {
+        "width": random.randrange(10, max_size),
+        "length": random.randrange(10, max_size),
+        "height": random.randrange(10, max_size),
+        "weight": random.randrange(10, max_weight)
+    }
+
+
+def test_normalize(lambda_module):
+    """
+    Test normalize()
+    """
+
+    a = {"width": 100, "length": 300, "height": 200, "weight": 10}
+    b = {"width": 50, "length": 50, "height": 60, "weight": 20}
+
+    assert lambda_module.normalize([a, b]) == ((60, 50, 50, 20), (300, 200, 100, 10))
+    # Order and orientation do not matter
+    assert lambda_module.normalize([b, a]) == lambda_module.normalize([a, b])
+    assert lambda_module.normalize([dict(a, width=300, length=100)]) == lambda_module.normalize([a])
+
+
+def test_first_fit_decreasing(lambda_module):
+    """
+    Test first_fit_decreasing() with known packings
+    """
+
+    def count(packages):
+        return lambda_module.first_fit_decreasing(
+            lambda_module.normalize(packages), BOX, BOX_WEIGHT, time.perf_counter()+1
+        )
+
+    # Eight 25cm cubes fill a box exactly
+    assert count([{"width": 250, "length": 250, "height": 250, "weight": 100}] * 8) == 1
+    assert count([{"width": 250, "length": 250, "height": 250, "weight": 100}] * 9) == 2
+    # Two 40cm cubes cannot share a box
+    assert count([{"width": 400, "length": 400, "height": 400, "weight": 100}] * 2) == 2
+    # Long and flat packages can be rotated
+    assert count([{"width": 500, "length": 500, "height": 100, "weight": 100}] * 5) == 1
+    # Weight limit
+    assert count([{"width": 10, "length": 10, "height": 10, "weight": 7000}] * 2) == 2
+    # Oversized packages ship on their own
+    assert count([{"width": 1200, "length": 100, "height": 100, "weight": 100}]) == 1
+    assert count([{"width": 1000, "length": 500, "height": 500, "weight": 100}]) == 2
+
+
+def test_first_fit_decreasing_bounds(lambda_module):
+    """
+    Test that first_fit_decreasing() is between the lower bound and one box
+    per package
+    """
+
+    box_volume = BOX[0]*BOX[1]*BOX[2]
+
+    for _ in range(50):
+        packages = [get_package() for _ in range(random.randrange(1, 50))]
+        volume = sum(p["width"]*p["length"]*p["height"] for p in packages)
+        weight = sum(p["weight"] for p in packages)
+        lower_bound = max(-(-volume//box_volume), -(-weight//BOX_WEIGHT))
+
+        retval = lambda_module.first_fit_decreasing(
+            lambda_module.normalize(packages), BOX, BOX_WEIGHT, time.perf_counter()+1
+        )
+
+        assert lower_bound <= retval <= len(packages)
+
+
+def test_first_fit_decreasing_timeout(lambda_module):
+    """
+    Test first_fit_decreasing() with an expired deadline
+    """
+
+    with pytest.raises(lambda_module.PackingTimeout):
+        lambda_module.first_fit_decreasing(
+            lambda_module.normalize([get_package()]), BOX, BOX_WEIGHT, time.perf_counter()-1
+        )
+
+
+def test_count_boxes(lambda_module):
+    """
+    Test count_boxes()
+    """
+
+    packages = [get_package() for _ in range(20)]
+
+    retval = lambda_module.count_boxes(packages, BOX, BOX_WEIGHT)
+
+    assert retval == lambda_module.first_fit_decreasing(
+        lambda_module.normalize(packages), BOX, BOX_WEIGHT, time.perf_counter()+1
+    )
+    assert lambda_module.count_boxes([], BOX, BOX_WEIGHT) == 0
+
+
+def test_count_boxes_cache(lambda_module):
+    """
+    Test that count_boxes() is memoized on the multiset of packages
+    """
+
+    packages = [get_package() for _ in range(20)]
+    lambda_module.count_boxes(packages, BOX, BOX_WEIGHT)
+    hits = lambda_module._count_boxes.cache_info().hits
+
+    lambda_module.count_boxes(list(reversed(packages)), BOX, BOX_WEIGHT)
+
+    assert lambda_module._count_boxes.cache_info().hits == hits + 1
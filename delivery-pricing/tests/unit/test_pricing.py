@@ -1,5 +1,7 @@
 import json
 import math
+import time
+from types import SimpleNamespace
 from typing import List
 import pytest
 from fixtures import apigateway_event, context, lambda_module, get_order, get_product # pylint: disable=import-error
@@ -17,6 +19,18 @@ lambda_module = pytest.fixture(scope="module", params=[{
 context = pytest.fixture(context)
 
 
+class StaticSource:
+    """
+    Rate table source that never changes
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+
+    def fetch(self, etag=None):
+        return (None, self.data) if etag is None else None
+
+
 @pytest.fixture(scope="function", params=range(10))
 def order(get_order):
     """
@@ -25,9 +39,9 @@ def order(get_order):
     return get_order()
 
 
-def test_count_boxes(monkeypatch, lambda_module, order):
+def test_min_boxes(monkeypatch, lambda_module, order):
     """
-    Test count_boxes()
+    Test min_boxes()
     """
 
     monkeypatch.setattr(lambda_module, "BOX_VOLUME", 500*500*500)
@@ -40,24 +54,104 @@ def test_count_boxes(monkeypatch, lambda_module, order):
 
     expected = max(math.ceil(volume/lambda_module.BOX_VOLUME), math.ceil(weight/lambda_module.BOX_WEIGHT))
 
-    retval = lambda_module.count_boxes(packages)
+    retval = lambda_module.min_boxes(packages)
 
     assert expected == retval
 
 
+def test_count_boxes(lambda_module, order):
+    """
+    Test count_boxes()
+    """
+
+    packages = [p["package"] for p in order["products"]]
+
+    retval = lambda_module.count_boxes(packages)
+
+    assert retval >= lambda_module.min_boxes(packages)
+
+
+def test_count_boxes_long(lambda_module):
+    """
+    Test count_boxes() with long packages that fit by volume but not by shape
+    """
+
+    # Two 40x40x30cm packages fit in one box by volume and weight, but not
+    # side by side.
+    packages = [
+        {"width": 400, "length": 400, "height": 300, "weight": 1000}
+        for _ in range(2)
+    ]
+
+    assert lambda_module.min_boxes(packages) == 1
+    assert lambda_module.count_boxes(packages) == 2
+
+
+def test_count_boxes_timeout(monkeypatch, lambda_module):
+    """
+    Test count_boxes() when the packing engine runs out of time
+    """
+
+    packages = [
+        {"width": 400, "length": 400, "height": 300, "weight": 1000}
+        for _ in range(2)
+    ]
+
+    def count_boxes(*args, **kwargs):
+        raise lambda_module.packing.PackingTimeout()
+
+    monkeypatch.setattr(lambda_module.packing, "count_boxes", count_boxes)
+
+    # Falls back to the lower bound
+    assert lambda_module.count_boxes(packages) == 1
+
+
+def test_count_boxes_disabled(monkeypatch, lambda_module):
+    """
+    Test count_boxes() without packing engine
+    """
+
+    packages = [
+        {"width": 400, "length": 400, "height": 300, "weight": 1000}
+        for _ in range(2)
+    ]
+
+    monkeypatch.setattr(lambda_module, "PACKING_ENGINE", "none")
+
+    assert lambda_module.count_boxes(packages) == 1
+
+
 def test_get_shipping_cost(monkeypatch, lambda_module, order):
     """
     Test get_shipping_cost()
     """
 
-    monkeypatch.setattr(lambda_module, "COUNTRY_SHIPPING_FEES", {
-        order["address"]["country"]: 1000,
-        "*": 2500
-    })
+    monkeypatch.setattr(lambda_module, "rate_table", lambda_module.rates.RateTableLoader(
+        StaticSource({
+            "version": "test",
+            "weightBands": [5000, 12000],
+            "defaultZone": "world",
+            "zones": {"test": [order["address"]["country"]], "world": []},
+            "rates": {"test": [1000, 1200], "world": [2500, 3000]}
+        })
+    ))
 
-    retval = lambda_module.get_shipping_cost(order["address"])
+    assert lambda_module.get_shipping_cost(order["address"]) == 1000
+    assert lambda_module.get_shipping_cost(order["address"], 5000) == 1000
+    assert lambda_module.get_shipping_cost(order["address"], 5001) == 1200
+    assert lambda_module.get_shipping_cost(order["address"], 20000) == 1200
+    assert lambda_module.get_shipping_cost({"country": "??"}) == 2500
 
-    assert retval == 1000
+
+def test_get_shipping_cost_default(lambda_module):
+    """
+    Test get_shipping_cost() with the default rate table
+    """
+
+    assert lambda_module.get_shipping_cost({"country": "SE"}) == 0
+    assert lambda_module.get_shipping_cost({"country": "FR"}, 12000) == 1000
+    assert lambda_module.get_shipping_cost({"country": "US"}) == 1500
+    assert lambda_module.get_shipping_cost({"country": "JP"}) == 2500
 
 
 def test_get_pricing(monkeypatch, lambda_module, order):
@@ -69,8 +163,9 @@ def test_get_pricing(monkeypatch, lambda_module, order):
         assert packages == [p["package"] for p in order["products"]]
         return 10
 
-    def get_shipping_cost(address: dict) -> int:
+    def get_shipping_cost(address: dict, weight: int) -> int:
         assert address == order["address"]
+        assert weight == math.ceil(sum(p["package"]["weight"] for p in order["products"]) / 10)
         return 14
 
     monkeypatch.setattr(lambda_module, "count_boxes", count_boxes)
@@ -179,4 +274,268 @@ def test_handler_invalid_json(lambda_module, context, apigateway_event, order):
     assert retval["statusCode"] == 400
     assert "body" in retval
     body = json.loads(retval["body"])
-    assert "message" in body
\ No newline at end of file
+    assert "message" in body
+
+def test_count_boxes_batch(lambda_module, get_order):
+    """
+    Test count_boxes_batch() against count_boxes()
+    """
+
+    carts = [
+        [p["package"] for p in get_order()["products"]]
+        for _ in range(100)
+    ]
+    # Empty cart
+    carts.append([])
+
+    expected = [lambda_module.count_boxes(packages) for packages in carts]
+
+    retval = lambda_module.count_boxes_batch(carts)
+
+    assert retval == expected
+    assert all(isinstance(count, int) for count in retval)
+
+
+def test_count_boxes_batch_large(lambda_module):
+    """
+    Test count_boxes_batch() with values around the box size
+    """
+
+    box_side = round(lambda_module.BOX_VOLUME ** (1/3))
+
+    carts = [
+        [{"width": box_side, "length": box_side, "height": box_side, "weight": 0}],
+        [{"width": box_side, "length": box_side, "height": box_side+1, "weight": 0}],
+        [{"width": 1, "length": 1, "height": 1, "weight": lambda_module.BOX_WEIGHT}],
+        [{"width": 1, "length": 1, "height": 1, "weight": lambda_module.BOX_WEIGHT+1}],
+        # Too large to be computed with int64 values
+        [{"width": 2**30, "length": 2**30, "height": 2**30, "weight": 1}]
+    ]
+
+    expected = [lambda_module.count_boxes(packages) for packages in carts]
+
+    retval = lambda_module.count_boxes_batch(carts)
+
+    assert retval == expected
+    assert retval[:4] == [1, 2, 1, 2]
+
+
+def test_min_boxes_batch(lambda_module, get_order):
+    """
+    Test min_boxes_batch() against min_boxes()
+    """
+
+    carts = [
+        [p["package"] for p in get_order()["products"]]
+        for _ in range(100)
+    ]
+    carts.append([])
+
+    expected = [lambda_module.min_boxes(packages) for packages in carts]
+
+    retval = lambda_module.min_boxes_batch(carts)
+
+    assert retval == expected
+    assert all(isinstance(count, int) for count in retval)
+
+
+def test_count_boxes_batch_float(lambda_module, get_order):
+    """
+    Test count_boxes_batch() with non-integer dimensions
+    """
+
+    carts = [
+        [p["package"] for p in get_order()["products"]]
+        for _ in range(10)
+    ]
+    carts[3][0] = dict(carts[3][0], weight=carts[3][0]["weight"]+0.5)
+
+    expected = [lambda_module.count_boxes(packages) for packages in carts]
+
+    retval = lambda_module.count_boxes_batch(carts)
+
+    assert retval == expected
+
+
+def test_count_boxes_batch_empty(lambda_module):
+    """
+    Test count_boxes_batch() without packages
+    """
+
+    assert lambda_module.count_boxes_batch([]) == []
+    assert lambda_module.count_boxes_batch([[], []]) == [0, 0]
+
+
+def test_get_pricing_batch(lambda_module, get_order):
+    """
+    Test get_pricing_batch() against get_pricing()
+    """
+
+    carts = [get_order() for _ in range(100)]
+
+    expected = [
+        lambda_module.get_pricing(cart["products"], cart["address"])
+        for cart in carts
+    ]
+
+    retval = lambda_module.get_pricing_batch(carts)
+
+    assert retval == expected
+
+
+def test_batch_handler(monkeypatch, lambda_module, context, apigateway_event, get_order):
+    """
+    Test batch_handler()
+    """
+
+    carts = [
+        {"products": order["products"], "address": order["address"]}
+        for order in [get_order() for _ in range(5)]
+    ]
+
+    event = apigateway_event(
+        iam="USER_ARN",
+        body=json.dumps({"carts": carts})
+    )
+
+    def get_pricing_batch(carts_: List[dict], deadline: float) -> List[int]:
+        assert carts_ == carts
+        assert deadline > time.monotonic()
+        return [1000 for _ in carts_]
+
+    monkeypatch.setattr(lambda_module, "get_pricing_batch", get_pricing_batch)
+
+    retval = lambda_module.batch_handler(event, context)
+
+    assert "statusCode" in retval
+    assert retval["statusCode"] == 200
+    assert "body" in retval
+
+    body = json.loads(retval["body"])
+    assert "pricings" in body
+    assert body["pricings"] == [1000 for _ in carts]
+    assert body["unprocessed"] == []
+
+
+def test_batch_handler_no_iam(lambda_module, context, apigateway_event, order):
+    """
+    Test batch_handler() with no IAM credentials
+    """
+
+    event = apigateway_event(
+        body=json.dumps({"carts": [{"products": order["products"], "address": order["address"]}]})
+    )
+
+    retval = lambda_module.batch_handler(event, context)
+
+    assert "statusCode" in retval
+    assert retval["statusCode"] == 403
+    assert "body" in retval
+    body = json.loads(retval["body"])
+    assert "message" in body
+
+
+def test_batch_handler_no_carts(lambda_module, context, apigateway_event, order):
+    """
+    Test batch_handler() with no carts
+    """
+
+    event = apigateway_event(
+        iam="USER_ARN",
+        body=json.dumps({"products": order["products"], "address": order["address"]})
+    )
+
+    retval = lambda_module.batch_handler(event, context)
+
+    assert "statusCode" in retval
+    assert retval["statusCode"] == 400
+    assert "body" in retval
+    body = json.loads(retval["body"])
+    assert "message" in body
+
+
+def test_batch_handler_too_many_carts(monkeypatch, lambda_module, context, apigateway_event, order):
+    """
+    Test batch_handler() with more carts than MAX_BATCH_SIZE
+    """
+
+    monkeypatch.setattr(lambda_module, "MAX_BATCH_SIZE", 3)
+
+    def get_pricing_batch(carts_: List[dict], deadline: float) -> List[int]:
+        assert len(carts_) == 3
+        return [1000 for _ in carts_]
+
+    monkeypatch.setattr(lambda_module, "get_pricing_batch", get_pricing_batch)
+
+    event = apigateway_event(
+        iam="USER_ARN",
+        body=json.dumps({"carts": [
+            {"products": order["products"], "address": order["address"]}
+        ] * 5})
+    )
+
+    retval = lambda_module.batch_handler(event, context)
+
+    assert "statusCode" in retval
+    assert retval["statusCode"] == 200
+    assert "body" in retval
+    body = json.loads(retval["body"])
+    assert body["pricings"] == [1000, 1000, 1000]
+    assert body["unprocessed"] == [3, 4]
+
+
+def test_batch_handler_timeout(monkeypatch, lambda_module, context, apigateway_event, order):
+    """
+    Test batch_handler() with carts that cannot be priced before the deadline
+    """
+
+    # Each cart takes 10 seconds, which leaves time for three carts
+    clock = [0]
+
+    def pack_boxes(packages: List[dict], lower_bound: int) -> int:
+        clock[0] += 10
+        return lower_bound
+
+    monkeypatch.setattr(lambda_module, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    monkeypatch.setattr(lambda_module, "BATCH_MARGIN", 0)
+    monkeypatch.setattr(lambda_module, "PACKING_BUDGET", 1)
+    monkeypatch.setattr(lambda_module, "pack_boxes", pack_boxes)
+
+    event = apigateway_event(
+        iam="USER_ARN",
+        body=json.dumps({"carts": [
+            {"products": order["products"], "address": order["address"]}
+        ] * 5})
+    )
+
+    retval = lambda_module.batch_handler(event, context)
+
+    assert "statusCode" in retval
+    assert retval["statusCode"] == 200
+    assert "body" in retval
+    body = json.loads(retval["body"])
+    assert len(body["pricings"]) == 3
+    assert body["unprocessed"] == [3, 4]
+
+
+def test_batch_handler_no_address(lambda_module, context, apigateway_event, order):
+    """
+    Test batch_handler() with a cart without address
+    """
+
+    event = apigateway_event(
+        iam="USER_ARN",
+        body=json.dumps({"carts": [
+            {"products": order["products"], "address": order["address"]},
+            {"products": order["products"]}
+        ]})
+    )
+
+    retval = lambda_module.batch_handler(event, context)
+
+    assert "statusCode" in retval
+    assert retval["statusCode"] == 400
+    assert "body" in retval
+    body = json.loads(retval["body"])
+    assert "message" in body
+    assert "cart 1" in body["message"]
@@ -0,0 +1,217 @@
+import copy
+import io
+import json
+import os
+import time
+import boto3
+import pytest
+from botocore import stub
+from botocore.response import StreamingBody
+from fixtures import lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "pricing",
+    "module_name": "rates",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+
+
+RATES = {
+    "version": "1",
+    "weightBands": [2000, 12000],
+    "defaultZone": "world",
+    "zones": {
+        "nordics": ["DK", "FI", "NO", "SE"],
+        "world": []
+    },
+    "rates": {
+        "nordics": [0, 500],
+        "world": [2500, 3000]
+    }
+}
+
+
+@pytest.fixture
+def rates_file(tmp_path):
+    path = os.path.join(str(tmp_path), "rates.json")
+    with open(path, "w") as fp:
+        json.dump(RATES, fp)
+    return path
+
+
+def test_rate_table(lambda_module):
+    """
+    Test RateTable.lookup()
+    """
+
+    table = lambda_module.RateTable(RATES)
+
+    assert table.version == "1"
+    assert table.lookup("SE") == 0
+    assert table.lookup("SE", 2000) == 0
+    assert table.lookup("SE", 2001) == 500
+    assert table.lookup("SE", 50000) == 500
+    assert table.lookup("FR") == 2500
+    assert table.lookup("FR", 12000) == 3000
+    # Invalid country codes use the default zone
+    assert table.lookup("se") == 2500
+    assert table.lookup("SWE") == 2500
+    assert table.lookup(None) == 2500
+
+
+@pytest.mark.parametrize("change", [
+    {"defaultZone": "unknown"},
+    {"weightBands": []},
+    {"weightBands": [12000, 2000]},
+    {"rates": {"nordics": [0], "world": [2500, 3000]}},
+    {"rates": {"world": [2500, 3000]}},
+    {"zones": {"nordics": ["Sweden"], "world": []}}
+])
+def test_rate_table_invalid(lambda_module, change):
+    """
+    Test RateTable with invalid rate tables
+    """
+
+    data = copy.deepcopy(RATES)
+    data.update(change)
+
+    with pytest.raises(ValueError):
+        lambda_module.RateTable(data)
+
+
+def test_file_source(lambda_module, rates_file):
+    """
+    Test FileSource.fetch()
+    """
+
+    source = lambda_module.FileSource(rates_file)
+
+    etag, data = source.fetch()
+    assert data == RATES
+
+    # Unchanged file
+    assert source.fetch(etag) is None
+
+    # Changed file
+    with open(rates_file, "w") as fp:
+        json.dump(dict(RATES, version="2"), fp)
+    os.utime(rates_file, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+    new_etag, data = source.fetch(etag)
+    assert new_etag != etag
+    assert data["version"] == "2"
+
+
+def test_s3_source(lambda_module):
+    """
+    Test S3Source.fetch()
+    """
+
+    client = boto3.client("s3", region_name="eu-west-1")
+    stubber = stub.Stubber(client)
+    data = json.dumps(RATES).encode("utf-8")
+    stubber.add_response("get_object", {
+        "ETag": '"ETAG"',
+        "Body": StreamingBody(io.BytesIO(data), len(data))
+    }, {"Bucket": "BUCKET", "Key": "rates.json"})
+    # Unchanged object
+    stubber.add_client_error(
+        "get_object", service_error_code="304", http_status_code=304,
+        expected_params={"Bucket": "BUCKET", "Key": "rates.json", "IfNoneMatch": '"ETAG"'}
+    )
+    stubber.add_client_error("get_object", service_error_code="AccessDenied", http_status_code=403)
+    stubber.activate()
+
+    source = lambda_module.S3Source("BUCKET", "rates.json", client=client)
+    assert source.fetch() == ('"ETAG"', RATES)
+    assert source.fetch('"ETAG"') is None
+    with pytest.raises(lambda_module.ClientError):
+        source.fetch('"ETAG"')
+
+    stubber.assert_no_pending_responses()
+    stubber.deactivate()
+
+
+def test_loader_default(lambda_module, rates_file):
+    """
+    Test RateTableLoader with a source that cannot be read on startup
+    """
+
+    class FailingSource:
+        def __init__(self):
+            self.fail = True
+
+        def fetch(self, etag=None):
+            if self.fail:
+                raise IOError("Unavailable")
+            return "ETAG", dict(RATES, version="2")
+
+    source = FailingSource()
+    with pytest.raises(IOError):
+        lambda_module.RateTableLoader(source)
+
+    loader = lambda_module.RateTableLoader(source, default=RATES)
+    assert loader.get().version == "1"
+
+    source.fail = False
+    loader.refresh()
+    assert loader.get().version == "2"
+
+
+def test_loader_refresh(lambda_module, rates_file):
+    """
+    Test RateTableLoader.refresh()
+    """
+
+    loader = lambda_module.RateTableLoader(lambda_module.FileSource(rates_file))
+    assert loader.get().version == "1"
+
+    with open(rates_file, "w") as fp:
+        json.dump(dict(RATES, version="2"), fp)
+    os.utime(rates_file, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+    # Not refreshed until the TTL expires
+    assert loader.get().version == "1"
+
+    loader.refresh()
+    assert loader.get().version == "2"
+
+
+def test_loader_refresh_invalid(lambda_module, rates_file):
+    """
+    Test RateTableLoader.refresh() with an invalid rate table
+    """
+
+    loader = lambda_module.RateTableLoader(lambda_module.FileSource(rates_file))
+
+    with open(rates_file, "w") as fp:
+        json.dump(dict(RATES, version="2", defaultZone="unknown"), fp)
+    os.utime(rates_file, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+    loader.refresh()
+
+    # Keep the previous version
+    assert loader.get().version == "1"
+
+
+def test_loader_ttl(lambda_module, rates_file):
+    """
+    Test that RateTableLoader.get() refreshes the table in the background
+    """
+
+    loader = lambda_module.RateTableLoader(lambda_module.FileSource(rates_file), ttl=0)
+
+    with open(rates_file, "w") as fp:
+        json.dump(dict(RATES, version="2"), fp)
+    os.utime(rates_file, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+    # The current table is returned while the refresh happens
+    table = loader.get()
+    loader._thread.join() # pylint: disable=protected-access
+
+    assert table.version in ["1", "2"]
+    assert loader.get().version == "2"
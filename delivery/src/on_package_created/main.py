@@ -5,14 +5,12 @@ OnPackageCreatedFunction
 
 import os
 from typing import Optional
-from urllib.parse import urlparse
 import boto3
-import requests # pylint: disable=import-error
-from aws_requests_auth.boto_utils import BotoAWSRequestsAuth # pylint: disable=import-error
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
 from aws_lambda_powertools import Metrics
 from aws_lambda_powertools.metrics import MetricUnit
+from ecom.http import Client # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
@@ -25,6 +23,7 @@ table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name,no-member
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.delivery", service="delivery")
+http_client = Client() # pylint: disable=invalid-name
 
 
 @tracer.capture_method
@@ -38,16 +37,8 @@ def get_order(order_id: str) -> Optional[dict]:
         "orderId": order_id
     })
 
-    # Create IAM signature helper
-    request_url = ORDERS_API_URL + order_id
-    url = urlparse(request_url)
-    region = boto3.session.Session().region_name
-    auth = BotoAWSRequestsAuth(aws_host=url.netloc,
-                               aws_region=region,
-                               aws_service='execute-api')
-
     # Send request to order service
-    response = requests.get(request_url, auth=auth)
+    response = http_client.get(ORDERS_API_URL + order_id)
 
     if response.status_code != 200:
         logger.error({
@@ -7,14 +7,15 @@ import datetime
 import json
 import os
 import warnings
-from typing import List, Optional
+from typing import Optional
 import boto3
 from boto3.dynamodb.types import TypeDeserializer
 from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.logging.logger import Logger
 from aws_lambda_powertools import Metrics
 from aws_lambda_powertools.metrics import MetricUnit
-from ecom.helpers import Encoder
+from ecom.eventbridge import put_record_events # pylint: disable=import-error
+from ecom.helpers import Encoder # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
@@ -28,18 +29,6 @@ tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.delivery", service="delivery")
 
 
-@tracer.capture_method
-def send_events(events: List[dict]):
-    """
-    Send events to EventBridge
-    """
-
-    logger.info("Sending %d events to EventBridge", len(events))
-    # EventBridge only supports batches of up to 10 events
-    for i in range(0, len(events), 10):
-        eventbridge.put_events(Entries=events[i:i+10])
-
-
 def process_record(record: dict) -> Optional[dict]:
     """
     Process record from DynamoDB
@@ -147,11 +136,14 @@ def handler(event, _):
         "records": event.get("Records", [])
     })
 
-    events = [
-        process_record(record)
-        for record in event.get("Records", [])
-    ]
-    events = [event for event in events if event is not None]
+    # Keep track of the record for each event, to report failures
+    records = []
+    events = []
+    for record in event.get("Records", []):
+        record_event = process_record(record)
+        if record_event is not None:
+            records.append(record)
+            events.append(record_event)
 
     logger.info("Received %d event(s)", len(events))
     logger.debug({
@@ -159,5 +151,5 @@ def handler(event, _):
         "events": events
     })
 
-    if len(events) > 0:
-        send_events(events)
+    # Report failed records, so Lambda retries from the first failed one
+    return put_record_events(eventbridge, records, events, logger)
@@ -256,38 +256,6 @@ def test_process_record_completed_removed(lambda_module, order, ddb_record_compl
     assert response is None
 
 
-def test_send_events(lambda_module, order):
-    """
-    Test send_events()
-    """
-
-    # Prepare resources
-    event = {
-        "Time": datetime.datetime.now(),
-        "Source": "ecommerce.delivery",
-        "Resources": [order["orderId"]],
-        "DetailType": "DeliveryCompleted",
-        "Detail": json.dumps({
-            k: order[k] for k in ["orderId", "address"]
-        }),
-        "EventBusName": "EVENT_BUS_NAME"
-    }
-    expected_event = copy.deepcopy(event)
-    expected_event["Time"] = stub.ANY
-    expected_params = {"Entries": [expected_event]}
-
-    eventbridge = stub.Stubber(lambda_module.eventbridge)
-    eventbridge.add_response("put_events", {}, expected_params)
-    eventbridge.activate()
-
-    # Send events
-    lambda_module.send_events([event])
-
-    # Check that events were sent
-    eventbridge.assert_no_pending_responses()
-    eventbridge.deactivate()
-
-
 def test_handler(lambda_module, context, order,
         ddb_record_new, ddb_record_in_progress, ddb_record_failed, ddb_record_completed, ddb_record_in_progress_removed):
     """
@@ -0,0 +1,79 @@
+"""
+Backfill listings created before the search and availability indexes
+
+Listings used to store their city as 'City', without the search keys of
+ecom.listings or a calendar in the calendar table, so they never appear in
+searches. This migrates them in place, and can safely run more than once.
+
+Run it after deploying the listings stack, before relying on searches:
+
+    PYTHONPATH=shared/src/ecom python listings/scripts/backfill_listings.py [--dry-run]
+"""
+
+
+import argparse
+import boto3
+from boto3.dynamodb.conditions import Key
+from ecom.availability import put_calendar, to_bitsets # pylint: disable=import-error
+from ecom.dynamodb import query_all # pylint: disable=import-error
+from ecom.listings import legacy_update # pylint: disable=import-error
+
+
+def has_calendar(calendar_table, listing_id: str) -> bool:
+    """
+    Check if a listing has a calendar in the calendar table
+    """
+
+    res = calendar_table.query(
+        KeyConditionExpression=Key("listingId").eq(listing_id),
+        ProjectionExpression="listingId",
+        Limit=1
+    )
+    return len(res.get("Items", [])) > 0
+
+
+def main():
+    """
+    Run the backfill
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", 1)[0].strip())
+    parser.add_argument("--table", default="Listings")
+    parser.add_argument("--calendar-table", default="ListingsCalendar")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource("dynamodb")
+    table = dynamodb.Table(args.table) # pylint: disable=no-member
+    calendar_table = dynamodb.Table(args.calendar_table) # pylint: disable=no-member
+
+    scanned = updated = calendars = 0
+    for item in query_all(table.scan):
+        scanned += 1
+        params = legacy_update(item)
+        if params is not None:
+            updated += 1
+            if not args.dry_run:
+                try:
+                    table.update_item(**params)
+                except table.meta.client.exceptions.ConditionalCheckFailedException:
+                    # Deleted in the meantime
+                    continue
+
+        # Bookings only exist in the calendar table, so existing calendars
+        # are never overwritten.
+        if item.get("calendar") and not has_calendar(calendar_table, item["listingId"]):
+            calendars += 1
+            if not args.dry_run:
+                put_calendar(
+                    calendar_table, item["listingId"],
+                    item.get("city", item.get("City")), to_bitsets(item["calendar"])
+                )
+
+    print("{} listings scanned, {} updated, {} calendars created{}".format(
+        scanned, updated, calendars, " (dry run)" if args.dry_run else ""
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+BookListingFunction
+"""
+
+
+import datetime
+import json
+import os
+from typing import List
+import boto3
+from aws_lambda_powertools.logging import Logger
+from aws_lambda_powertools.tracing import Tracer
+from ecom.apigateway import response # pylint: disable=import-error
+from ecom.auth import InvalidToken, Verifier, cognito_issuer # pylint: disable=import-error
+from ecom.availability import NotAvailable, book # pylint: disable=import-error
+from ecom.cache import TTLCache, VersionedCache, create_store # pylint: disable=import-error
+
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+CALENDAR_TABLE_NAME = os.environ["CALENDAR_TABLE_NAME"]
+USER_POOL_ID = os.environ["USER_POOL_ID"]
+# Maximum number of days for a booking
+MAX_STAY = 366
+# Must match the cache settings of GetListingFunction
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "30"))
+CACHE_STORE = os.environ.get("CACHE_STORE", "")
+
+
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+calendar_table = dynamodb.Table(CALENDAR_TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
+verifier = Verifier(cognito_issuer(USER_POOL_ID)) # pylint: disable=invalid-name
+listing_cache = VersionedCache( # pylint: disable=invalid-name
+    TTLCache(ttl=CACHE_TTL),
+    create_store(CACHE_STORE),
+    prefix="listing:"
+)
+
+
+@tracer.capture_method
+def calendar_update(listing_id: str, check_in: datetime.date, check_out: datetime.date, versions: dict) -> List[dict]:
+    """
+    Returns the operations marking the booked days as unavailable in the
+    calendar of the listing
+
+    The positions of the days in the calendar come from the current listing,
+    so the update has a condition on its version. The new version is saved
+    in 'versions'.
+    """
+
+    versions.pop(listing_id, None)
+    item = table.get_item(
+        Key={"listingId": listing_id},
+        ProjectionExpression="#calendar, #version",
+        ExpressionAttributeNames={"#calendar": "calendar", "#version": "version"},
+        ConsistentRead=True
+    ).get("Item")
+    if item is None:
+        return []
+
+    positions = [
+        i for i, entry in enumerate(item.get("calendar", []))
+        if check_in <= datetime.date.fromisoformat(entry["date"]) < check_out and entry.get("available")
+    ]
+    if len(positions) == 0:
+        return []
+
+    # Listings created before versioning start at version 0
+    version = item.get("version", 0)
+    versions[listing_id] = int(version) + 1
+    return [{"Update": {
+        "TableName": TABLE_NAME,
+        "Key": {"listingId": listing_id},
+        "UpdateExpression": "SET {} ADD #version :one".format(
+            ", ".join("#calendar[{}].#available = :false".format(i) for i in positions)
+        ),
+        "ConditionExpression": "attribute_not_exists(#version) OR #version = :version",
+        "ExpressionAttributeNames": {"#calendar": "calendar", "#available": "available", "#version": "version"},
+        "ExpressionAttributeValues": {":false": False, ":one": 1, ":version": version}
+    }}]
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+def handler(event, _):
+    """
+    Lambda function handler for /listings/book/{listingId}
+    """
+
+    token = (event.get("headers") or {}).get("Authorization")
+    listing_id = event["pathParameters"]["listingId"]
+
+    try:
+        verifier.verify(token)
+    except InvalidToken as exc:
+        logger.warning(exc)
+        return response("Unauthorized", 401)
+
+    try:
+        body = json.loads(event["body"])
+        check_in = datetime.date.fromisoformat(body["checkIn"])
+        check_out = datetime.date.fromisoformat(body["checkOut"])
+    except (TypeError, KeyError, ValueError) as exc:
+        logger.warning({"message": "Invalid booking request: {}".format(exc)})
+        return response("Body must contain 'checkIn' and 'checkOut' dates in the YYYY-MM-DD format", 400)
+
+    if not 0 < (check_out - check_in).days <= MAX_STAY:
+        return response("'checkOut' must be 1 to {} days after 'checkIn'".format(MAX_STAY), 400)
+
+    versions = {}
+    try:
+        book(
+            calendar_table, listing_id, check_in, check_out,
+            extra=lambda: calendar_update(listing_id, check_in, check_out, versions)
+        )
+        if listing_id in versions:
+            listing_cache.invalidate(listing_id, versions[listing_id])
+    except NotAvailable as exc:
+        return response(str(exc), 409)
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error({"message": "Failed to book listing {}: {}".format(listing_id, exc), "listingId": listing_id})
+        return response({"message": "Internal server error", "code": 500, "details": str(exc)}, 500)
+
+    logger.info({
+        "message": "Booked listing {} from {} to {}".format(listing_id, check_in, check_out),
+        "listingId": listing_id
+    })
+    return response({"message": "Listing booked", "listingId": listing_id})
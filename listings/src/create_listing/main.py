@@ -1,70 +1,78 @@
+"""
+CreateListingFunction
+"""
+
+
 import json
 import os
 import uuid
 import boto3
 from aws_lambda_powertools.logging import Logger
 from aws_lambda_powertools.tracing import Tracer
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy import Response
+from ecom.apigateway import response # pylint: disable=import-error
+from ecom.auth import InvalidToken, Verifier, cognito_issuer, groups # pylint: disable=import-error
+from ecom.availability import put_calendar, to_bitsets # pylint: disable=import-error
+from ecom.listings import search_keys # pylint: disable=import-error
+
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+CALENDAR_TABLE_NAME = os.environ["CALENDAR_TABLE_NAME"]
+USER_POOL_ID = os.environ["USER_POOL_ID"]
+
 
-logger = Logger()
-tracer = Tracer()
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+calendar_table = dynamodb.Table(CALENDAR_TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
+verifier = Verifier(cognito_issuer(USER_POOL_ID)) # pylint: disable=invalid-name
 
-dynamodb = boto3.resource('dynamodb')
-cognito = boto3.client('cognito-idp')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
-def handler(event, context):
-    token = event['headers'].get('Authorization')
+def handler(event, _):
+    """
+    Lambda function handler for /listings/create
+    """
+
+    token = event["headers"].get("Authorization")
 
     # Validate JWT token and get user information
     try:
-        user_info = cognito.get_user(AccessToken=token)
-        user_sub = next(attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'sub')
-        groups = cognito.list_groups_for_user(UserPoolId=user_info['UserPoolId'], Username=user_info['Username'])
-        
-        is_host = any(group['GroupName'] == 'host' for group in groups['Groups'])
-        
-        if not is_host:
-            return Response(
-                status_code=403,
-                body=json.dumps({"message": "User is not authorized to create listings"})
-            )
-        
-        body = json.loads(event['body'])
+        claims = verifier.verify(token)
+        user_sub = claims["sub"]
+
+        if "host" not in groups(claims):
+            return response("User is not authorized to create listings", 403)
+
+        body = json.loads(event["body"])
         listing_id = str(uuid.uuid4())
 
         item = {
-            'listingId': listing_id,
-            'Type': body['listingType'],
-            'name': body['name'],
-            'address': body['address'],
-            'City': body['city'],
-            'photoAddressList': body['photoAddressList'],
-            'category': body['category'],
-            'price': body['price'],
-            'calendar': body['calendar'],
-            'hostId': user_sub
+            "listingId": listing_id,
+            "Type": body["listingType"],
+            "name": body["name"],
+            "address": body["address"],
+            "city": body["city"],
+            "photoAddressList": body["photoAddressList"],
+            "category": body["category"],
+            "price": body["price"],
+            "calendar": body["calendar"],
+            "hostId": user_sub,
+            "version": 1
         }
+        item.update(search_keys(body["city"], body["category"]))
 
+        # The availability index is written first, so that the listing never
+        # shows up in searches without its calendar.
+        put_calendar(calendar_table, listing_id, body["city"], to_bitsets(body["calendar"]))
         table.put_item(Item=item)
 
-        return Response(
-            status_code=201,
-            body=json.dumps({"message": "Listing created successfully", "listingId": listing_id})
-        )
-
-    except cognito.exceptions.NotAuthorizedException as e:
-        logger.error(e)
-        return Response(
-            status_code=401,
-            body=json.dumps({"message": "Unauthorized"})
-        )
-    except Exception as e:
-        logger.error(e)
-        return Response(
-            status_code=500,
-            body=json.dumps({"message": "Internal server error", "error": str(e)})
-        )
+        return response({"message": "Listing created successfully", "listingId": listing_id}, 201)
+
+    except InvalidToken as exc:
+        logger.error(exc)
+        return response("Unauthorized", 401)
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error(exc)
+        return response({"message": "Internal server error", "error": str(exc)}, 500)
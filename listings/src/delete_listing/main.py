@@ -1,61 +1,76 @@
-import json
+"""
+DeleteListingFunction
+"""
+
+
 import os
 import boto3
-from boto3.dynamodb.conditions import Key
 from aws_lambda_powertools.logging import Logger
 from aws_lambda_powertools.tracing import Tracer
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy import Response
+from ecom.apigateway import response # pylint: disable=import-error
+from ecom.auth import InvalidToken, Verifier, cognito_issuer # pylint: disable=import-error
+from ecom.availability import delete_calendar # pylint: disable=import-error
+from ecom.cache import TTLCache, VersionedCache, create_store # pylint: disable=import-error
+
 
-logger = Logger()
-tracer = Tracer()
+TABLE_NAME = os.environ["TABLE_NAME"]
+CALENDAR_TABLE_NAME = os.environ["CALENDAR_TABLE_NAME"]
+USER_POOL_ID = os.environ["USER_POOL_ID"]
+# Must match the cache settings of GetListingFunction
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "30"))
+CACHE_STORE = os.environ.get("CACHE_STORE", "")
+
+
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+calendar_table = dynamodb.Table(CALENDAR_TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
+verifier = Verifier(cognito_issuer(USER_POOL_ID)) # pylint: disable=invalid-name
+listing_cache = VersionedCache( # pylint: disable=invalid-name
+    TTLCache(ttl=CACHE_TTL),
+    create_store(CACHE_STORE),
+    prefix="listing:"
+)
 
-dynamodb = boto3.resource('dynamodb')
-cognito = boto3.client('cognito-idp')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
-def handler(event, context):
-    token = event['headers'].get('Authorization')
-    listing_id = event['pathParameters']['listingId']
+def handler(event, _):
+    """
+    Lambda function handler for /listings/delete/{listingId}
+    """
+
+    token = event["headers"].get("Authorization")
+    listing_id = event["pathParameters"]["listingId"]
 
     # Validate JWT token and get user information
     try:
-        user_info = cognito.get_user(AccessToken=token)
-        user_sub = next(attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'sub')
-        
-        response = table.get_item(Key={'listingId': listing_id})
-        item = response.get('Item')
+        claims = verifier.verify(token)
+        user_sub = claims["sub"]
+
+        item = table.get_item(Key={"listingId": listing_id}).get("Item")
 
         if not item:
-            return Response(
-                status_code=400,
-                body=json.dumps({"message": "Invalid listing ID", "code": 400, "details": "Listing ID provided is not valid."})
-            )
-
-        if item['hostId'] != user_sub:
-            return Response(
-                status_code=403,
-                body=json.dumps({"message": "User is not authorized to delete this listing"})
-            )
-
-        table.delete_item(Key={'listingId': listing_id})
-
-        return Response(
-            status_code=200,
-            body=json.dumps({"message": "Listing successfully deleted"})
-        )
-
-    except cognito.exceptions.NotAuthorizedException as e:
-        logger.error(e)
-        return Response(
-            status_code=401,
-            body=json.dumps({"message": "Unauthorized"})
-        )
-    except Exception as e:
-        logger.error(e)
-        return Response(
-            status_code=500,
-            body=json.dumps({"message": "Internal server error", "error": str(e)})
-        )
+            return response({
+                "message": "Invalid listing ID",
+                "code": 400,
+                "details": "Listing ID provided is not valid."
+            }, 400)
+
+        if item["hostId"] != user_sub:
+            return response("User is not authorized to delete this listing", 403)
+
+        table.delete_item(Key={"listingId": listing_id})
+        delete_calendar(calendar_table, listing_id)
+        # Deleting counts as a new version of the listing
+        listing_cache.invalidate(listing_id, int(item.get("version", 0)) + 1)
+
+        return response("Listing successfully deleted")
+
+    except InvalidToken as exc:
+        logger.error(exc)
+        return response("Unauthorized", 401)
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error(exc)
+        return response({"message": "Internal server error", "error": str(exc)}, 500)
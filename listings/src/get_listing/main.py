@@ -1,40 +1,104 @@
+"""
+GetListingFunction
+"""
+
+
+import hashlib
 import json
 import os
+from typing import Optional
 import boto3
 from aws_lambda_powertools.logging import Logger
 from aws_lambda_powertools.tracing import Tracer
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy import Response
+from ecom.apigateway import header, response # pylint: disable=import-error
+from ecom.cache import TTLCache, VersionedCache, create_store # pylint: disable=import-error
+from ecom.helpers import Encoder # pylint: disable=import-error
+
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+# Maximum number of listings kept in the local cache
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "1000"))
+# Maximum time a listing can stay in the cache, in seconds
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "30"))
+# Shared cache tier, see ecom.cache.STORES
+CACHE_STORE = os.environ.get("CACHE_STORE", "")
+
+
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
+listing_cache = VersionedCache( # pylint: disable=invalid-name
+    TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL),
+    create_store(CACHE_STORE),
+    prefix="listing:"
+)
+
+
+@tracer.capture_method
+def load_listing(listing_id: str) -> Optional[dict]:
+    """
+    Retrieve a listing from DynamoDB as a cache entry
+
+    Cache entries contain the serialized listing and its ETag, so that
+    cache hits do not need to serialize the listing again.
+    """
+
+    item = table.get_item(Key={"listingId": listing_id}).get("Item")
+    if item is None:
+        return None
 
-logger = Logger()
-tracer = Tracer()
+    body = json.dumps(item, cls=Encoder)
+    return {
+        # Listings created before versioning start at version 0
+        "version": int(item.get("version", 0)),
+        "etag": '"{}"'.format(hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()),
+        "body": body
+    }
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """
+    Check if an ETag matches an If-None-Match header
+
+    This uses the weak comparison, as required for If-None-Match.
+    """
+
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
-def handler(event, context):
-    listing_id = event['pathParameters']['listingId']
+def handler(event, _):
+    """
+    Lambda function handler for /listings/get/{listingId}
+    """
+
+    listing_id = event["pathParameters"]["listingId"]
 
     try:
-        response = table.get_item(Key={'listingId': listing_id})
-        item = response.get('Item')
-
-        if not item:
-            return Response(
-                status_code=400,
-                body=json.dumps({"message": "Invalid listing ID", "code": 400, "details": "Listing ID provided is not valid."})
-            )
-
-        return Response(
-            status_code=200,
-            body=json.dumps(item)
-        )
-
-    except Exception as e:
-        logger.error(e)
-        return Response(
-            status_code=500,
-            body=json.dumps({"message": "Internal server error", "code": 500, "details": "An unexpected error occurred while processing the request."})
-        )
+        entry = listing_cache.get(listing_id, lambda: load_listing(listing_id))
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error({"message": "Failed to retrieve listing {}: {}".format(listing_id, exc), "listingId": listing_id})
+        return response({
+            "message": "Internal server error",
+            "code": 500,
+            "details": "An unexpected error occurred while processing the request."
+        }, 500)
+
+    if entry is None:
+        return response({
+            "message": "Invalid listing ID",
+            "code": 400,
+            "details": "Listing ID provided is not valid."
+        }, 400)
+
+    headers = {"ETag": entry["etag"]}
+    if etag_matches(entry["etag"], header(event, "If-None-Match")):
+        return response(None, 304, headers=headers)
+
+    return response(None, 200, headers=headers, body=entry["body"])
@@ -1,61 +1,112 @@
-import json
+"""
+ListListingsFunction
+"""
+
+
 import os
+from typing import Optional, Tuple
 import boto3
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Attr, Key
 from aws_lambda_powertools.logging import Logger
 from aws_lambda_powertools.tracing import Tracer
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy import Response
+from ecom.apigateway import response # pylint: disable=import-error
+from ecom.pagination import InvalidCursor, decode_cursor, encode_cursor, fill_page # pylint: disable=import-error
 
-logger = Logger()
-tracer = Tracer()
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
+TABLE_NAME = os.environ["TABLE_NAME"]
+# Maximum number of items per page
+MAX_LIMIT = 100
+# Maximum number of DynamoDB requests to fill a page
+MAX_READS = int(os.environ.get("LIST_MAX_READS", "10"))
+# Number of items read per request when filtering by category
+FILTER_READ_SIZE = 100
+# Secret to sign cursors, if any
+CURSOR_SECRET = os.environ.get("CURSOR_SECRET")
+
+HOST_INDEX = "hostId-index"
+CATEGORY_INDEX = "category-price-index"
+# Search indexes that exist on the table, see SearchListingsFunction
+SEARCH_INDEXES = os.environ.get("SEARCH_INDEXES", "").split(",")
 
-@logger.inject_lambda_context
-@tracer.capture_lambda_handler
-def handler(event, context):
-    query_params = event.get('queryStringParameters') or {}
-    limit = int(query_params.get('limit', 10))
-    last_evaluated_key = query_params.get('lastEvaluatedKey')
-    host_id = query_params.get('hostId')
-    category = query_params.get('category')
-    sort_order = query_params.get('sortOrder', 'asc')
 
-    scan_kwargs = {
-        'Limit': limit
-    }
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
 
-    if last_evaluated_key:
-        scan_kwargs['ExclusiveStartKey'] = json.loads(last_evaluated_key)
+
+def build_request(host_id: Optional[str], category: Optional[str], sort_order: str) -> Tuple[str, dict, list]:
+    """
+    Returns the operation, parameters and key attributes to list listings
+
+    Listings of a host are read from the hostId index, sorted by listingId.
+    Without a host, listings of a category are read from the category index,
+    sorted by price, once it is listed in SEARCH_INDEXES. Other listings need
+    a table scan, which is unsorted.
+    """
 
     if host_id:
-        scan_kwargs['IndexName'] = 'hostId-index'
-        scan_kwargs['KeyConditionExpression'] = Key('hostId').eq(host_id)
+        params = {
+            "IndexName": HOST_INDEX,
+            "KeyConditionExpression": Key("hostId").eq(host_id),
+            "ScanIndexForward": sort_order != "desc"
+        }
+        if category:
+            params["FilterExpression"] = Attr("category").eq(category)
+        return "query", params, ["listingId", "hostId"]
+
+    if category and CATEGORY_INDEX in SEARCH_INDEXES:
+        return "query", {
+            "IndexName": CATEGORY_INDEX,
+            "KeyConditionExpression": Key("category").eq(category),
+            "ScanIndexForward": sort_order != "desc"
+        }, ["listingId", "category", "price"]
 
     if category:
-        scan_kwargs['FilterExpression'] = Attr('category').eq(category)
+        return "scan", {"FilterExpression": Attr("category").eq(category)}, ["listingId"]
+
+    return "scan", {}, ["listingId"]
 
-    if sort_order == 'desc':
-        scan_kwargs['ScanIndexForward'] = False
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+def handler(event, _):
+    """
+    Lambda function handler for /listings/list
+    """
+
+    query_params = event.get("queryStringParameters") or {}
+    host_id = query_params.get("hostId")
+    category = query_params.get("category")
+    sort_order = query_params.get("sortOrder", "asc")
 
     try:
-        response = table.scan(**scan_kwargs)
-        items = response.get('Items', [])
-        last_evaluated_key = response.get('LastEvaluatedKey')
-
-        return Response(
-            status_code=200,
-            body=json.dumps({
-                'items': items,
-                'lastEvaluatedKey': last_evaluated_key
-            })
-        )
+        limit = int(query_params.get("limit", 10))
+    except ValueError:
+        return response("'limit' must be an integer", 400)
+    if not 0 < limit <= MAX_LIMIT:
+        return response("'limit' must be between 1 and {}".format(MAX_LIMIT), 400)
+    if sort_order not in ["asc", "desc"]:
+        return response("'sortOrder' must be 'asc' or 'desc'", 400)
+
+    operation, params, key_attributes = build_request(host_id, category, sort_order)
+    # The cursor is only valid for the same index and partition
+    scope = "{}:{}".format(params.get("IndexName", "table"), host_id or category or "")
 
-    except Exception as e:
-        logger.error(e)
-        return Response(
-            status_code=500,
-            body=json.dumps({"message": "Internal server error", "code": 500, "details": str(e)})
+    try:
+        items, last_key = fill_page(
+            getattr(table, operation), params, limit, key_attributes,
+            start_key=decode_cursor(query_params.get("lastEvaluatedKey"), scope, key_attributes, CURSOR_SECRET),
+            read_size=FILTER_READ_SIZE if "FilterExpression" in params else None,
+            max_reads=MAX_READS
         )
+    except InvalidCursor as exc:
+        return response(str(exc), 400)
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error({"message": "Failed to list listings: {}".format(exc)})
+        return response({"message": "Internal server error", "code": 500, "details": str(exc)}, 500)
+
+    return response({
+        "items": items,
+        "lastEvaluatedKey": encode_cursor(last_key, scope, CURSOR_SECRET)
+    })
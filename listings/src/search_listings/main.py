@@ -1,68 +1,132 @@
-import json
+"""
+SearchListingsFunction
+"""
+
+
+import datetime
 import os
+from typing import Optional
 import boto3
-from boto3.dynamodb.conditions import Attr
 from aws_lambda_powertools.logging import Logger
 from aws_lambda_powertools.tracing import Tracer
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy import Response
+from ecom.apigateway import response # pylint: disable=import-error
+from ecom.availability import find_available # pylint: disable=import-error
+from planner import INDEXES, InvalidCursor, plan_search, search # pylint: disable=import-error
+
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+CALENDAR_TABLE_NAME = os.environ["CALENDAR_TABLE_NAME"]
+# Maximum number of items per page
+MAX_LIMIT = 100
+# Maximum number of DynamoDB requests to fill a page
+MAX_READS = int(os.environ.get("SEARCH_MAX_READS", "10"))
+# Maximum number of days for availability searches
+MAX_STAY = 366
+# Secret to sign cursors, if any
+CURSOR_SECRET = os.environ.get("CURSOR_SECRET")
+# Search indexes that exist on the table. DynamoDB creates one GSI per table
+# update, so indexes are added over several deployments.
+SEARCH_INDEXES = [
+    index for index in INDEXES
+    if index["name"] in os.environ.get("SEARCH_INDEXES", "").split(",")
+]
+
+
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+calendar_table = dynamodb.Table(CALENDAR_TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
+
+
+def parse_int(value: Optional[str]) -> Optional[int]:
+    """
+    Parse an optional integer query parameter
+
+    Raises ValueError if the value is not an integer.
+    """
+
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime.date]:
+    """
+    Parse an optional ISO 8601 date query parameter
 
-logger = Logger()
-tracer = Tracer()
+    Raises ValueError if the value is not a date.
+    """
+
+    if value is None or value == "":
+        return None
+    return datetime.date.fromisoformat(value)
 
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
-def handler(event, context):
-    query_params = event.get('queryStringParameters') or {}
-    limit = int(query_params.get('limit', 10))
-    last_evaluated_key = query_params.get('lastEvaluatedKey')
-    city = query_params.get('city')
-    category = query_params.get('category')
-    min_price = query_params.get('minPrice')
-    max_price = query_params.get('maxPrice')
-
-    scan_kwargs = {
-        'Limit': limit
-    }
-
-    if last_evaluated_key:
-        scan_kwargs['ExclusiveStartKey'] = json.loads(last_evaluated_key)
-
-    filter_expression = []
-
-    if city:
-        filter_expression.append(Attr('city').eq(city))
-    if category:
-        filter_expression.append(Attr('category').eq(category))
-    if min_price:
-        filter_expression.append(Attr('price').gte(int(min_price)))
-    if max_price:
-        filter_expression.append(Attr('price').lte(int(max_price)))
-
-    if filter_expression:
-        scan_kwargs['FilterExpression'] = filter_expression.pop()
-        for expr in filter_expression:
-            scan_kwargs['FilterExpression'] &= expr
+def handler(event, _):
+    """
+    Lambda function handler for /listings/search
+    """
+
+    query_params = event.get("queryStringParameters") or {}
 
     try:
-        response = table.scan(**scan_kwargs)
-        items = response.get('Items', [])
-        last_evaluated_key = response.get('LastEvaluatedKey')
-
-        return Response(
-            status_code=200,
-            body=json.dumps({
-                'items': items,
-                'lastEvaluatedKey': last_evaluated_key
-            })
-        )
+        limit = parse_int(query_params.get("limit"))
+        min_price = parse_int(query_params.get("minPrice"))
+        max_price = parse_int(query_params.get("maxPrice"))
+    except ValueError:
+        return response("'limit', 'minPrice' and 'maxPrice' must be integers", 400)
+
+    if limit is None:
+        limit = 10
+    elif not 0 < limit <= MAX_LIMIT:
+        return response("'limit' must be between 1 and {}".format(MAX_LIMIT), 400)
+
+    try:
+        check_in = parse_date(query_params.get("checkIn"))
+        check_out = parse_date(query_params.get("checkOut"))
+    except ValueError:
+        return response("'checkIn' and 'checkOut' must be dates in the YYYY-MM-DD format", 400)
 
-    except Exception as e:
-        logger.error(e)
-        return Response(
-            status_code=500,
-            body=json.dumps({"message": "Internal server error", "code": 500, "details": str(e)})
+    if (check_in is None) != (check_out is None):
+        return response("'checkIn' and 'checkOut' must be used together", 400)
+    if check_in is not None:
+        if not 0 < (check_out - check_in).days <= MAX_STAY:
+            return response("'checkOut' must be 1 to {} days after 'checkIn'".format(MAX_STAY), 400)
+        # Availability is indexed by city
+        if not query_params.get("city"):
+            return response("'city' is required to search by dates", 400)
+
+    plan = plan_search(
+        city=query_params.get("city"),
+        category=query_params.get("category"),
+        min_price=min_price,
+        max_price=max_price,
+        indexes=SEARCH_INDEXES
+    )
+    logger.debug({"message": "Searching listings with {}".format(plan.name), "index": plan.name})
+
+    try:
+        listing_ids = None
+        if check_in is not None:
+            listing_ids = find_available(calendar_table.query, query_params["city"], check_in, check_out)
+
+        items, cursor = search(
+            table.query, table.scan, plan, limit,
+            cursor=query_params.get("lastEvaluatedKey"),
+            max_reads=MAX_READS,
+            secret=CURSOR_SECRET,
+            listing_ids=listing_ids
         )
+    except InvalidCursor as exc:
+        return response(str(exc), 400)
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error({"message": "Failed to search listings: {}".format(exc)})
+        return response({"message": "Internal server error", "code": 500, "details": str(exc)}, 500)
+
+    return response({
+        "items": items,
+        "lastEvaluatedKey": cursor
+    })
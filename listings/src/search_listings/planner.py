@@ -0,0 +1,218 @@
+"""
+Query planner for listing searches
+
+Searches are served by global secondary indexes that use the equality
+filters as their partition key and the price as their sort key, see
+ecom.listings:
+
+    city-category-price-index: searchCityCategory ("<city>#<category>"), price
+    city-price-index:          searchCity, price
+    category-price-index:      category, price
+
+The planner picks the deployed index that covers the most equality filters,
+turns the price range into a key condition, and keeps the remaining filters
+as a FilterExpression. Searches that no deployed index covers fall back to a
+Scan.
+
+Pages are filled up to the requested number of results by reading as many
+times as needed, within a bound on the number of reads per page. Cursors are
+opaque tokens that embed the index they belong to.
+"""
+
+
+from typing import Callable, List, Optional, Set, Tuple
+from boto3.dynamodb.conditions import Attr, ConditionBase, Key
+from ecom import pagination # pylint: disable=import-error
+from ecom.listings import INDEXES, SEPARATOR, SORT_KEY # pylint: disable=import-error
+from ecom.pagination import InvalidCursor # pylint: disable=import-error
+
+
+__all__ = [
+    "INDEXES", "InvalidCursor", "Plan", "decode_cursor", "encode_cursor",
+    "plan_search", "search"
+]
+
+
+# Table key
+TABLE_KEY = ["listingId"]
+# Number of items read per Scan request, as most scanned items are filtered
+# out
+SCAN_PAGE_SIZE = 500
+
+
+class Plan:
+    """
+    Execution plan for a search
+    """
+
+    def __init__(self, index: Optional[dict], params: dict):
+        self.index = index
+        self.params = params
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the index, or 'scan' for table scans
+        """
+
+        return self.index["name"] if self.index is not None else "scan"
+
+    @property
+    def key_attributes(self) -> List[str]:
+        """
+        Attributes of the LastEvaluatedKey for this plan
+        """
+
+        if self.index is None:
+            return TABLE_KEY
+        return TABLE_KEY + [self.index["key"], SORT_KEY]
+
+    @property
+    def filtered(self) -> bool:
+        """
+        Whether some results are filtered out after being read
+        """
+
+        return "FilterExpression" in self.params
+
+
+def _and(conditions: List[ConditionBase]) -> Optional[ConditionBase]:
+    """
+    Combine conditions with AND
+    """
+
+    if len(conditions) == 0:
+        return None
+
+    condition = conditions[0]
+    for other in conditions[1:]:
+        condition &= other
+    return condition
+
+
+def _price_condition(condition_type, min_price: Optional[int], max_price: Optional[int]):
+    """
+    Returns the condition on the price range, or None
+    """
+
+    if min_price is not None and max_price is not None:
+        return condition_type(SORT_KEY).between(min_price, max_price)
+    if min_price is not None:
+        return condition_type(SORT_KEY).gte(min_price)
+    if max_price is not None:
+        return condition_type(SORT_KEY).lte(max_price)
+    return None
+
+
+def plan_search(
+        city: Optional[str] = None,
+        category: Optional[str] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        indexes: Optional[List[dict]] = None
+    ) -> Plan:
+    """
+    Pick the most selective index for a search and build its parameters
+
+    'indexes' are the search indexes that exist on the table, all of INDEXES
+    by default.
+    """
+
+    filters = {"city": city, "category": category}
+    filters = {k: v for k, v in filters.items() if v}
+
+    # Most selective index that only needs the provided filters
+    index = next((
+        index for index in (INDEXES if indexes is None else indexes)
+        if all(field in filters for field in index["fields"])
+    ), None)
+
+    if index is None:
+        condition = _and(
+            [Attr(k).eq(v) for k, v in filters.items()] +
+            [c for c in [_price_condition(Attr, min_price, max_price)] if c is not None]
+        )
+        return Plan(None, {"FilterExpression": condition} if condition is not None else {})
+
+    key_condition = Key(index["key"]).eq(SEPARATOR.join(filters[f] for f in index["fields"]))
+    price_condition = _price_condition(Key, min_price, max_price)
+    if price_condition is not None:
+        key_condition &= price_condition
+
+    params = {"IndexName": index["name"], "KeyConditionExpression": key_condition}
+    residual = _and([Attr(k).eq(v) for k, v in filters.items() if k not in index["fields"]])
+    if residual is not None:
+        params["FilterExpression"] = residual
+
+    return Plan(index, params)
+
+
+def encode_cursor(plan: Plan, key: Optional[dict], secret: Optional[str] = None) -> Optional[str]:
+    """
+    Returns an opaque cursor for the LastEvaluatedKey of a plan
+    """
+
+    return pagination.encode_cursor(key, plan.name, secret)
+
+
+def decode_cursor(plan: Plan, cursor: Optional[str], secret: Optional[str] = None) -> Optional[dict]:
+    """
+    Returns the ExclusiveStartKey from a cursor
+
+    Raises InvalidCursor if the cursor is invalid or was created for another
+    index.
+    """
+
+    return pagination.decode_cursor(cursor, plan.name, plan.key_attributes, secret)
+
+
+def _only(operation: Callable[..., dict], listing_ids: Set[str]) -> Callable[..., dict]:
+    """
+    Wrap a Query or Scan operation to only return some listings
+    """
+
+    def _operation(**kwargs) -> dict:
+        res = operation(**kwargs)
+        res["Items"] = [item for item in res.get("Items", []) if item["listingId"] in listing_ids]
+        return res
+
+    return _operation
+
+
+def search(
+        query: Callable[..., dict],
+        scan: Callable[..., dict],
+        plan: Plan,
+        limit: int,
+        cursor: Optional[str] = None,
+        max_reads: int = 10,
+        secret: Optional[str] = None,
+        listing_ids: Optional[Set[str]] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+    """
+    Run a search and return up to 'limit' items and the cursor for the next
+    page
+
+    'query' and 'scan' are the Query and Scan operations of the table. The
+    page is filled by reading until it has 'limit' items or 'max_reads'
+    requests were made, so pages can only be short on the last page or when
+    most items are filtered out.
+
+    If 'listing_ids' is set, only these listings are returned, such as the
+    listings available for some dates.
+    """
+
+    operation = query if plan.index is not None else scan
+    if listing_ids is not None:
+        if not listing_ids:
+            return [], None
+        operation = _only(operation, listing_ids)
+
+    items, start_key = pagination.fill_page(
+        operation, plan.params, limit, plan.key_attributes,
+        start_key=decode_cursor(plan, cursor, secret),
+        read_size=SCAN_PAGE_SIZE if plan.filtered or listing_ids is not None else None,
+        max_reads=max_reads
+    )
+
+    return items, encode_cursor(plan, start_key, secret)
@@ -1,75 +1,167 @@
+"""
+UpdateListingFunction
+"""
+
+
 import json
 import os
+from typing import List, Optional
 import boto3
-from boto3.dynamodb.conditions import Key
 from aws_lambda_powertools.logging import Logger
 from aws_lambda_powertools.tracing import Tracer
-from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
-from aws_lambda_powertools.utilities.data_classes.api_gateway_proxy import Response
+from ecom.apigateway import response # pylint: disable=import-error
+from ecom.auth import InvalidToken, Verifier, cognito_issuer # pylint: disable=import-error
+from ecom.availability import Conflict, replace_calendar, set_city # pylint: disable=import-error
+from ecom.cache import TTLCache, VersionedCache, create_store # pylint: disable=import-error
+from ecom.dynamodb import NUMBER, InvalidUpdate, UpdatePlanner # pylint: disable=import-error
+from ecom.listings import SEARCH_KEYS, search_keys # pylint: disable=import-error
+
+
+TABLE_NAME = os.environ["TABLE_NAME"]
+CALENDAR_TABLE_NAME = os.environ["CALENDAR_TABLE_NAME"]
+USER_POOL_ID = os.environ["USER_POOL_ID"]
+# Must match the cache settings of GetListingFunction
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "30"))
+CACHE_STORE = os.environ.get("CACHE_STORE", "")
+
+
+dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name
+calendar_table = dynamodb.Table(CALENDAR_TABLE_NAME) # pylint: disable=invalid-name
+logger = Logger() # pylint: disable=invalid-name
+tracer = Tracer() # pylint: disable=invalid-name
+verifier = Verifier(cognito_issuer(USER_POOL_ID)) # pylint: disable=invalid-name
+listing_cache = VersionedCache( # pylint: disable=invalid-name
+    TTLCache(ttl=CACHE_TTL),
+    create_store(CACHE_STORE),
+    prefix="listing:"
+)
+# Fields that hosts can update, the search keys are derived from them
+update_planner = UpdatePlanner({ # pylint: disable=invalid-name
+    "Type": str,
+    "name": str,
+    "address": str,
+    "city": str,
+    "photoAddressList": list,
+    "category": str,
+    "price": NUMBER,
+    "calendar": list,
+    "hostInformation": str,
+    **{key: str for key in SEARCH_KEYS}
+})
+
+
+@tracer.capture_method
+def update_with_calendar(listing_id: str, city: Optional[str], body: dict, remove_keys: List[str]) -> int:
+    """
+    Update a listing and replace its calendar in a single transaction
+
+    Bookings only exist in the calendar table, so the booked days are marked
+    as unavailable in both copies of the calendar. Returns the new version of
+    the listing.
+    """
+
+    version = None
 
-logger = Logger()
-tracer = Tracer()
+    def listing_update(calendar: List[dict]) -> List[dict]:
+        nonlocal version
+        # The transaction cannot return the new version, so it is written
+        # with a condition on the current one.
+        current = table.get_item(
+            Key={"listingId": listing_id},
+            ProjectionExpression="#version",
+            ExpressionAttributeNames={"#version": "version"},
+            ConsistentRead=True
+        ).get("Item")
+        if current is None:
+            raise ValueError("Listing {} was deleted".format(listing_id))
+        # Listings created before versioning start at version 0
+        current_version = current.get("version", 0)
+        version = int(current_version) + 1
+
+        params = update_planner.plan(dict(body, calendar=calendar), remove=remove_keys, add={"version": 1})
+        params["ConditionExpression"] = "attribute_not_exists(#version) OR #version = :version"
+        params["ExpressionAttributeNames"]["#version"] = "version"
+        params["ExpressionAttributeValues"][":version"] = current_version
+        return [{"Update": {"TableName": TABLE_NAME, "Key": {"listingId": listing_id}, **params}}]
+
+    replace_calendar(calendar_table, listing_id, city, body["calendar"], extra=listing_update)
+    return version
 
-dynamodb = boto3.resource('dynamodb')
-cognito = boto3.client('cognito-idp')
-table = dynamodb.Table(os.environ['TABLE_NAME'])
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
-def handler(event, context):
-    token = event['headers'].get('Authorization')
-    listing_id = event['pathParameters']['listingId']
+def handler(event, _):
+    """
+    Lambda function handler for /listings/update/{listingId}
+    """
+
+    token = event["headers"].get("Authorization")
+    listing_id = event["pathParameters"]["listingId"]
 
     # Validate JWT token and get user information
     try:
-        user_info = cognito.get_user(AccessToken=token)
-        user_sub = next(attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'sub')
-        
-        response = table.get_item(Key={'listingId': listing_id})
-        item = response.get('Item')
+        claims = verifier.verify(token)
+        user_sub = claims["sub"]
+
+        item = table.get_item(Key={"listingId": listing_id}).get("Item")
 
         if not item:
-            return Response(
-                status_code=400,
-                body=json.dumps({"message": "Invalid listing ID", "code": 400, "details": "Listing ID provided is not valid."})
-            )
+            return response({
+                "message": "Invalid listing ID",
+                "code": 400,
+                "details": "Listing ID provided is not valid."
+            }, 400)
 
-        if item['hostId'] != user_sub:
-            return Response(
-                status_code=403,
-                body=json.dumps({"message": "User is not authorized to update this listing"})
+        if item["hostId"] != user_sub:
+            return response("User is not authorized to update this listing", 403)
+
+        body = json.loads(event["body"])
+        # The ID and version are managed by this function
+        body.pop("listingId", None)
+        body.pop("version", None)
+        # Stored as 'Type' by CreateListingFunction
+        if "listingType" in body:
+            body["Type"] = body.pop("listingType")
+        if any(key in body for key in SEARCH_KEYS):
+            return response("Search keys cannot be updated", 400)
+
+        remove_keys = []
+        if "city" in body or "category" in body:
+            keys = search_keys(body.get("city", item.get("city")), body.get("category", item.get("category")))
+            body.update(keys)
+            # Index keys cannot be null, so stale keys are removed
+            remove_keys = [key for key in SEARCH_KEYS if key not in keys and key in item]
+
+        try:
+            # Every update invalidates cached copies of the listing
+            params = update_planner.plan(body, remove=remove_keys, add={"version": 1})
+        except InvalidUpdate as exc:
+            return response(str(exc), 400)
+
+        # Keep the availability index in sync
+        city = body.get("city", item.get("city"))
+        if "calendar" in body:
+            version = update_with_calendar(listing_id, city, body, remove_keys)
+        else:
+            res = table.update_item(
+                Key={"listingId": listing_id},
+                ReturnValues="UPDATED_NEW",
+                **params
             )
+            version = int(res["Attributes"]["version"])
+            if "city" in body and body["city"] != item.get("city"):
+                set_city(calendar_table, listing_id, city)
+        listing_cache.invalidate(listing_id, version)
+
+        return response("Listing updated successfully")
 
-        body = json.loads(event['body'])
-        update_expression = "SET "
-        expression_attribute_values = {}
-
-        for key, value in body.items():
-            update_expression += f"{key} = :{key}, "
-            expression_attribute_values[f":{key}"] = value
-
-        update_expression = update_expression.rstrip(", ")
-
-        table.update_item(
-            Key={'listingId': listing_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeValues=expression_attribute_values
-        )
-
-        return Response(
-            status_code=200,
-            body=json.dumps({"message": "Listing updated successfully"})
-        )
-
-    except cognito.exceptions.NotAuthorizedException as e:
-        logger.error(e)
-        return Response(
-            status_code=401,
-            body=json.dumps({"message": "Unauthorized"})
-        )
-    except Exception as e:
-        logger.error(e)
-        return Response(
-            status_code=500,
-            body=json.dumps({"message": "Internal server error", "error": str(e)})
-        )
+    except Conflict as exc:
+        logger.warning(exc)
+        return response(str(exc), 409)
+    except InvalidToken as exc:
+        logger.error(exc)
+        return response("Unauthorized", 401)
+    except Exception as exc: # pylint: disable=broad-except
+        logger.error(exc)
+        return response({"message": "Internal server error", "error": str(exc)}, 500)
@@ -0,0 +1,198 @@
+"""
+Benchmark for date-range listing searches
+
+This compares the previous way of finding the listings available between two
+dates in a city, which scans the listings table and deserializes the
+'calendar' attribute of every listing, with the monthly bitsets of
+ecom.availability, on a synthetic dataset of 100,000 listings with a year of
+availability each.
+
+Deserializing 36 million calendar entries takes a while, so the previous
+search is measured on a sample of listings and scaled to the full table. The
+number of requests is estimated from DynamoDB's 1 MB page size.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python listings/tests/perf/bench_availability.py
+"""
+
+
+import datetime
+import random
+import statistics
+import time
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from ecom import availability # pylint: disable=import-error
+
+
+LISTINGS = 100000
+CITIES = ["city-{}".format(i) for i in range(200)]
+FIRST_DAY = datetime.date(2021, 1, 1)
+DAYS = 365
+# Probability that a day is available
+AVAILABILITY = 0.7
+SEARCHES = 20
+# Number of listings deserialized to measure the previous search
+LEGACY_SAMPLE = 2000
+# DynamoDB pages
+PAGE_SIZE = 1024 * 1024
+# Cost model for the estimated latency
+REQUEST_LATENCY_MS = 5
+
+
+def generate_calendar() -> list:
+    """
+    Generate a year of availability, as stored in the 'calendar' attribute
+    """
+
+    return [{
+        "date": (FIRST_DAY + datetime.timedelta(days=i)).isoformat(),
+        "available": random.random() < AVAILABILITY
+    } for i in range(DAYS)]
+
+
+def legacy_is_available(item: dict, city: str, start: datetime.date, end: datetime.date) -> bool:
+    """
+    Previous search: deserialize a listing and check its calendar
+    """
+
+    deserializer = TypeDeserializer()
+    listing = {k: deserializer.deserialize(v) for k, v in item.items()}
+    if listing["city"] != city:
+        return False
+    days = {entry["date"]: entry["available"] for entry in listing["calendar"]}
+    day = start
+    while day < end:
+        if not days.get(day.isoformat(), False):
+            return False
+        day += datetime.timedelta(days=1)
+    return True
+
+
+def generate_bitsets() -> dict:
+    """
+    Generate a year of availability directly as monthly bitsets
+
+    This is used for listings outside of the sample, as building their
+    calendars first would take most of the benchmark's time.
+    """
+
+    bitsets = {}
+    for month, mask in availability.month_masks(FIRST_DAY, FIRST_DAY + datetime.timedelta(days=DAYS)):
+        free = 0
+        for day in range(mask.bit_length()):
+            if random.random() < AVAILABILITY:
+                free |= 1 << day
+        bitsets[month] = free
+    return bitsets
+
+
+class StubCalendarTable:
+    """
+    In-memory stand-in for the city index of the calendar table
+    """
+
+    def __init__(self):
+        self.partitions = {}
+        self.requests = 0
+        self.items_read = 0
+
+    def put(self, listing_id: str, city: str, bitsets: dict) -> None:
+        """
+        Store the calendar of a listing
+        """
+
+        for month, free in bitsets.items():
+            self.partitions.setdefault("{}#{}".format(city, month), []).append(
+                {"listingId": listing_id, "free": free}
+            )
+
+    def reset(self):
+        """
+        Reset the request counters
+        """
+
+        self.requests = 0
+        self.items_read = 0
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None, **_): # pylint: disable=invalid-name
+        """
+        Query operation on the city index
+
+        Items only contain the listing ID and a number, so a partition fits in
+        a single page for the city sizes of this benchmark.
+        """
+
+        items = self.partitions.get(KeyConditionExpression.get_expression()["values"][1], [])
+        self.requests += 1
+        self.items_read += len(items)
+        return {"Items": items}
+
+
+def main():
+    """
+    Run the benchmark
+    """
+
+    random.seed(42)
+    print("Generating {} listings with {} days of availability...".format(LISTINGS, DAYS))
+    serializer = TypeSerializer()
+    calendar_table = StubCalendarTable()
+    sample = []
+    item_sizes = []
+    for i in range(LISTINGS):
+        listing_id = "L{:06d}".format(i)
+        city = random.choice(CITIES)
+        if i >= LEGACY_SAMPLE:
+            calendar_table.put(listing_id, city, generate_bitsets())
+            continue
+
+        calendar = generate_calendar()
+        calendar_table.put(listing_id, city, availability.to_bitsets(calendar))
+        item = {"listingId": listing_id, "city": city, "calendar": calendar}
+        sample.append({k: serializer.serialize(v) for k, v in item.items()})
+        # Approximate DynamoDB item size: attribute names and values
+        item_sizes.append(len(repr(item)))
+
+    legacy_requests = LISTINGS * statistics.mean(item_sizes) / PAGE_SIZE
+
+    legacy_times = []
+    bitset_times = []
+    bitset_requests = []
+    bitset_items = []
+    for _ in range(SEARCHES):
+        city = random.choice(CITIES)
+        start = FIRST_DAY + datetime.timedelta(days=random.randrange(DAYS - 14))
+        end = start + datetime.timedelta(days=random.randrange(1, 14))
+
+        begin = time.perf_counter()
+        for item in sample:
+            legacy_is_available(item, city, start, end)
+        legacy_times.append((time.perf_counter() - begin) * LISTINGS / LEGACY_SAMPLE)
+
+        calendar_table.reset()
+        begin = time.perf_counter()
+        availability.find_available(calendar_table.query, city, start, end)
+        bitset_times.append(time.perf_counter() - begin)
+        bitset_requests.append(calendar_table.requests)
+        bitset_items.append(calendar_table.items_read)
+
+    print("{:<10} {:>9} {:>11} {:>10} {:>12}".format(
+        "method", "requests", "items read", "cpu time", "est. latency"
+    ))
+    print("{:<10} {:>9.0f} {:>11} {:>8.0f}ms {:>10.0f}ms".format(
+        "legacy", legacy_requests, LISTINGS,
+        statistics.mean(legacy_times) * 1000,
+        statistics.mean(legacy_times) * 1000 + legacy_requests * REQUEST_LATENCY_MS
+    ))
+    print("{:<10} {:>9.1f} {:>11.0f} {:>8.2f}ms {:>10.0f}ms".format(
+        "bitsets",
+        statistics.mean(bitset_requests),
+        statistics.mean(bitset_items),
+        statistics.mean(bitset_times) * 1000,
+        statistics.mean(bitset_times) * 1000 + statistics.mean(bitset_requests) * REQUEST_LATENCY_MS
+    ))
+
+
+if __name__ == "__main__":
+    main()
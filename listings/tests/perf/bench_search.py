@@ -0,0 +1,290 @@
+"""
+Benchmark for listing searches
+
+This compares the previous Scan-based search with the query planner on a
+synthetic dataset of 1,000,000 listings, served by an in-memory DynamoDB
+stand-in that implements the search indexes. For each kind of search, it
+reports the number of results on the first page, the number of requests and
+items read to return it, and an estimated latency based on those numbers.
+
+The previous search is measured twice: as it was, with a single sparse page,
+and when clients keep requesting pages until they get 'limit' results.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python listings/tests/perf/bench_search.py
+"""
+
+
+import bisect
+import os
+import random
+import statistics
+import sys
+from boto3.dynamodb.conditions import Attr
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "search_listings"))
+import planner # pylint: disable=import-error,wrong-import-position
+
+
+LISTINGS = 1000000
+CITIES = ["city-{}".format(i) for i in range(500)]
+CATEGORIES = ["category-{}".format(i) for i in range(20)]
+LIMIT = 10
+SEARCHES = 20
+# Cost model for the estimated latency
+REQUEST_LATENCY_MS = 5
+ITEM_LATENCY_MS = 0.01
+# Maximum number of requests for the previous search to fill a page
+MAX_LEGACY_REQUESTS = 1000
+
+
+# Listings are stored as (listingId, city, category, price) tuples to keep
+# the dataset in memory.
+GETTERS = {
+    "listingId": lambda l: l[0],
+    "city": lambda l: l[1],
+    "category": lambda l: l[2],
+    "price": lambda l: l[3],
+    "searchCity": lambda l: l[1],
+    "searchCityCategory": lambda l: l[1] + planner.SEPARATOR + l[2]
+}
+
+
+def compile_condition(condition):
+    """
+    Compile a boto3 condition into a predicate on listing tuples
+    """
+
+    if condition is None:
+        return lambda l: True
+
+    expression = condition.get_expression()
+    operator, values = expression["operator"], expression["values"]
+
+    if operator == "AND":
+        left, right = compile_condition(values[0]), compile_condition(values[1])
+        return lambda l: left(l) and right(l)
+
+    getter = GETTERS[values[0].name]
+    if operator == "=":
+        return lambda l: getter(l) == values[1]
+    if operator == ">=":
+        return lambda l: getter(l) >= values[1]
+    if operator == "<=":
+        return lambda l: getter(l) <= values[1]
+    if operator == "BETWEEN":
+        return lambda l: values[1] <= getter(l) <= values[2]
+    raise NotImplementedError(operator)
+
+
+def key_condition_bounds(condition):
+    """
+    Returns the partition key value and price bounds of a key condition
+    """
+
+    expression = condition.get_expression()
+    if expression["operator"] != "AND":
+        return expression["values"][1], None, None
+
+    partition, price = expression["values"]
+    price = price.get_expression()
+    operator, values = price["operator"], price["values"]
+    if operator == "BETWEEN":
+        return partition.get_expression()["values"][1], values[1], values[2]
+    if operator == ">=":
+        return partition.get_expression()["values"][1], values[1], None
+    return partition.get_expression()["values"][1], None, values[1]
+
+
+def to_item(listing) -> dict:
+    """
+    Transform a listing tuple into a DynamoDB item
+    """
+
+    return {k: getter(listing) for k, getter in GETTERS.items()}
+
+
+class StubTable:
+    """
+    In-memory stand-in for the listings table and its search indexes
+    """
+
+    def __init__(self, listings):
+        self.listings = listings
+        self.requests = 0
+        self.items_read = 0
+
+        self.indexes = {}
+        for index in planner.INDEXES:
+            partitions = {}
+            for listing in listings:
+                partitions.setdefault(GETTERS[index["key"]](listing), []).append(listing)
+            for partition in partitions.values():
+                partition.sort(key=lambda l: (l[3], l[0]))
+            self.indexes[index["name"]] = {
+                k: (v, [(l[3], l[0]) for l in v]) for k, v in partitions.items()
+            }
+
+    def reset(self):
+        """
+        Reset the request counters
+        """
+
+        self.requests = 0
+        self.items_read = 0
+
+    def scan(self, Limit, FilterExpression=None, ExclusiveStartKey=None): # pylint: disable=invalid-name
+        """
+        Scan operation, in listingId order
+        """
+
+        start = 0 if ExclusiveStartKey is None else int(ExclusiveStartKey["listingId"][1:]) + 1
+        page = self.listings[start:start+Limit]
+        self.requests += 1
+        self.items_read += len(page)
+
+        predicate = compile_condition(FilterExpression)
+        res = {"Items": [to_item(l) for l in page if predicate(l)]}
+        if start + Limit < len(self.listings):
+            res["LastEvaluatedKey"] = {"listingId": page[-1][0]}
+        return res
+
+    def query(self, IndexName, KeyConditionExpression, Limit, FilterExpression=None, ExclusiveStartKey=None): # pylint: disable=invalid-name
+        """
+        Query operation on a search index
+        """
+
+        partition_key, low, high = key_condition_bounds(KeyConditionExpression)
+        partition, keys = self.indexes[IndexName].get(partition_key, ([], []))
+
+        if ExclusiveStartKey is not None:
+            start = bisect.bisect_right(keys, (ExclusiveStartKey["price"], ExclusiveStartKey["listingId"]))
+        else:
+            start = 0 if low is None else bisect.bisect_left(keys, (low, ""))
+        end = len(keys) if high is None else bisect.bisect_right(keys, (high, "￿"))
+
+        page = partition[start:min(end, start+Limit)]
+        self.requests += 1
+        self.items_read += len(page)
+
+        predicate = compile_condition(FilterExpression)
+        res = {"Items": [to_item(l) for l in page if predicate(l)]}
+        if start + Limit < end:
+            item = to_item(page[-1])
+            res["LastEvaluatedKey"] = {k: item[k] for k in planner.Plan(
+                next(i for i in planner.INDEXES if i["name"] == IndexName), {}
+            ).key_attributes}
+        return res
+
+
+def legacy_search(table, filters: dict, fill: bool) -> int:
+    """
+    Previous search: one Scan with 'Limit' applied before the filters
+
+    Returns the number of results on the first page, or on the first pages
+    until there are 'limit' results if 'fill' is True.
+    """
+
+    conditions = []
+    if filters.get("city"):
+        conditions.append(Attr("city").eq(filters["city"]))
+    if filters.get("category"):
+        conditions.append(Attr("category").eq(filters["category"]))
+    if filters.get("min_price") is not None:
+        conditions.append(Attr("price").gte(filters["min_price"]))
+    if filters.get("max_price") is not None:
+        conditions.append(Attr("price").lte(filters["max_price"]))
+
+    params = {"Limit": LIMIT}
+    if conditions:
+        params["FilterExpression"] = conditions.pop()
+        for condition in conditions:
+            params["FilterExpression"] &= condition
+
+    results = 0
+    for _ in range(MAX_LEGACY_REQUESTS):
+        res = table.scan(**params)
+        results += len(res["Items"])
+        if not fill or results >= LIMIT or "LastEvaluatedKey" not in res:
+            break
+        params["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+    return results
+
+
+def planner_search(table, filters: dict) -> int:
+    """
+    Search with the query planner
+    """
+
+    plan = planner.plan_search(**filters)
+    items, _ = planner.search(table.query, table.scan, plan, LIMIT)
+    return len(items)
+
+
+def get_filters(kind: str) -> dict:
+    """
+    Generate search filters
+    """
+
+    min_price = random.randrange(20, 500)
+    filters = {
+        "city+category+price": {
+            "city": random.choice(CITIES), "category": random.choice(CATEGORIES),
+            "min_price": min_price, "max_price": min_price+300
+        },
+        "city": {"city": random.choice(CITIES)},
+        "category+maxPrice": {"category": random.choice(CATEGORIES), "max_price": min_price},
+        "price": {"min_price": min_price, "max_price": min_price+50}
+    }
+    return filters[kind]
+
+
+def main():
+    """
+    Run the benchmark for each kind of search
+    """
+
+    random.seed(42)
+    print("Generating {} listings...".format(LISTINGS))
+    listings = [
+        ("L{:07d}".format(i), random.choice(CITIES), random.choice(CATEGORIES), random.randrange(20, 1000))
+        for i in range(LISTINGS)
+    ]
+    table = StubTable(listings)
+
+    print("{:<20} {:<14} {:>8} {:>9} {:>11} {:>12}".format(
+        "search", "method", "results", "requests", "items read", "est. latency"
+    ))
+    for kind in ["city+category+price", "city", "category+maxPrice", "price"]:
+        searches = [get_filters(kind) for _ in range(SEARCHES)]
+        methods = [
+            ("legacy", lambda f: legacy_search(table, f, False)),
+            ("legacy filled", lambda f: legacy_search(table, f, True)),
+            ("planner", lambda f: planner_search(table, f))
+        ]
+        for name, method in methods:
+            results = []
+            requests = []
+            items_read = []
+            for filters in searches:
+                table.reset()
+                results.append(method(filters))
+                requests.append(table.requests)
+                items_read.append(table.items_read)
+
+            print("{:<20} {:<14} {:>8.1f} {:>9.1f} {:>11.0f} {:>10.0f}ms".format(
+                kind, name,
+                statistics.mean(results),
+                statistics.mean(requests),
+                statistics.mean(items_read),
+                statistics.mean(
+                    r*REQUEST_LATENCY_MS + i*ITEM_LATENCY_MS
+                    for r, i in zip(requests, items_read)
+                )
+            ))
+
+
+if __name__ == "__main__":
+    main()
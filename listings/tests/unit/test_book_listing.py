@@ -0,0 +1,136 @@
+import json
+import uuid
+import pytest
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "book_listing",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "CALENDAR_TABLE_NAME": "CALENDAR_TABLE_NAME",
+        "USER_POOL_ID": "eu-west-1_TEST",
+        "CACHE_STORE": "memory",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+LISTING_ID = str(uuid.uuid4())
+
+
+def get_event(apigateway_event, body: dict) -> dict:
+    event = apigateway_event(
+        method="POST",
+        resource="/listings/book/{listingId}",
+        path="/listings/book/{}".format(LISTING_ID),
+        body=json.dumps(body),
+        path_params={"listingId": LISTING_ID}
+    )
+    event["headers"] = {"Authorization": "TOKEN"}
+    return event
+
+
+def add_month(table, free: int) -> None:
+    table.add_response("batch_get_item", {"Responses": {"CALENDAR_TABLE_NAME": [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": str(free)}}
+    ]}})
+
+
+@pytest.fixture
+def verifier(lambda_module, monkeypatch):
+    monkeypatch.setattr(lambda_module.verifier, "verify", lambda token: {"sub": "USER_ID"})
+
+
+# Listings created before versioning have no version
+@pytest.mark.parametrize("version", [3, None])
+def test_handler(lambda_module, apigateway_event, context, verifier, version):
+    """
+    Bookings also update the calendar of the listing
+    """
+
+    item = {"calendar": {"L": [
+        {"M": {"date": {"S": "2021-06-0{}".format(day)}, "available": {"BOOL": True}}}
+        for day in range(1, 4)
+    ]}}
+    if version is not None:
+        item["version"] = {"N": str(version)}
+
+    table = stub.Stubber(lambda_module.calendar_table.meta.client)
+    add_month(table, 0b111)
+    table.add_response("get_item", {"Item": item}, {
+        "TableName": "TABLE_NAME",
+        "Key": {"listingId": LISTING_ID},
+        "ProjectionExpression": "#calendar, #version",
+        "ExpressionAttributeNames": {"#calendar": "calendar", "#version": "version"},
+        "ConsistentRead": True
+    })
+    table.add_response("transact_write_items", {}, {"TransactItems": [{
+        "Update": {
+            "TableName": "CALENDAR_TABLE_NAME",
+            "Key": {"listingId": LISTING_ID, "month": "2021-06"},
+            "UpdateExpression": "SET #free = :new, #booked = :booked",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free", "#booked": "booked"},
+            "ExpressionAttributeValues": {":old": 0b111, ":new": 0b100, ":booked": 0b011}
+        }
+    }, {
+        "Update": {
+            "TableName": "TABLE_NAME",
+            "Key": {"listingId": LISTING_ID},
+            "UpdateExpression": "SET #calendar[0].#available = :false, #calendar[1].#available = :false ADD #version :one",
+            "ConditionExpression": "attribute_not_exists(#version) OR #version = :version",
+            "ExpressionAttributeNames": {"#calendar": "calendar", "#available": "available", "#version": "version"},
+            "ExpressionAttributeValues": {":false": False, ":one": 1, ":version": version or 0}
+        }
+    }]})
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, {"checkIn": "2021-06-01", "checkOut": "2021-06-03"}), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert lambda_module.listing_cache.shared.get("listing:{}#version".format(LISTING_ID)) == (version or 0) + 1
+
+
+def test_handler_not_available(lambda_module, apigateway_event, context, verifier):
+    """
+    Test handler() with dates already booked
+    """
+
+    table = stub.Stubber(lambda_module.calendar_table.meta.client)
+    add_month(table, 0b100)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, {"checkIn": "2021-06-01", "checkOut": "2021-06-03"}), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 409
+
+
+def test_handler_invalid_dates(lambda_module, apigateway_event, context, verifier):
+    """
+    Test handler() with invalid dates
+    """
+
+    response = lambda_module.handler(get_event(apigateway_event, {"checkIn": "2021-06-03", "checkOut": "2021-06-01"}), context)
+
+    assert response["statusCode"] == 400
+
+
+def test_handler_unauthorized(lambda_module, apigateway_event, context):
+    """
+    Test handler() with an invalid token
+    """
+
+    response = lambda_module.handler(get_event(apigateway_event, {"checkIn": "2021-06-01", "checkOut": "2021-06-03"}), context)
+
+    assert response["statusCode"] == 401
@@ -0,0 +1,147 @@
+import json
+import uuid
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "get_listing",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "CACHE_STORE": "memory",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+@pytest.fixture
+def listing():
+    return {
+        "listingId": str(uuid.uuid4()),
+        "name": "Listing name",
+        "city": "Paris",
+        "category": "apartment",
+        "price": 120,
+        "hostId": str(uuid.uuid4()),
+        "version": 1
+    }
+
+
+def add_get_item(table, listing_id: str, item) -> None:
+    response = {}
+    if item is not None:
+        response["Item"] = {k: TypeSerializer().serialize(v) for k, v in item.items()}
+    table.add_response("get_item", response, {
+        "TableName": "TABLE_NAME",
+        "Key": {"listingId": listing_id}
+    })
+
+
+def get_event(apigateway_event, listing_id: str, etag=None) -> dict:
+    event = apigateway_event(
+        resource="/listings/get/{listingId}",
+        path="/listings/get/{}".format(listing_id),
+        path_params={"listingId": listing_id}
+    )
+    if etag is not None:
+        event["headers"] = {"if-none-match": etag}
+    return event
+
+
+def test_handler(lambda_module, apigateway_event, context, listing):
+    """
+    Listings are only read once from DynamoDB
+    """
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    add_get_item(table, listing["listingId"], listing)
+    table.activate()
+
+    for _ in range(3):
+        response = lambda_module.handler(get_event(apigateway_event, listing["listingId"]), context)
+        assert response["statusCode"] == 200
+        assert json.loads(response["body"]) == listing
+        assert response["headers"]["ETag"].startswith('"')
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+def test_handler_not_modified(lambda_module, apigateway_event, context, listing):
+    """
+    Test handler() with a matching If-None-Match header
+    """
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    add_get_item(table, listing["listingId"], listing)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, listing["listingId"]), context)
+    etag = response["headers"]["ETag"]
+
+    response = lambda_module.handler(get_event(apigateway_event, listing["listingId"], etag), context)
+    assert response["statusCode"] == 304
+    assert response["body"] == ""
+    assert response["headers"]["ETag"] == etag
+
+    response = lambda_module.handler(get_event(apigateway_event, listing["listingId"], '"other", W/' + etag), context)
+    assert response["statusCode"] == 304
+
+    response = lambda_module.handler(get_event(apigateway_event, listing["listingId"], '"other"'), context)
+    assert response["statusCode"] == 200
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+def test_handler_invalidated(lambda_module, apigateway_event, context, listing):
+    """
+    Newer versions are read after an invalidation
+    """
+
+    new_listing = dict(listing, price=150, version=2)
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    add_get_item(table, listing["listingId"], listing)
+    add_get_item(table, listing["listingId"], new_listing)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, listing["listingId"]), context)
+    etag = response["headers"]["ETag"]
+
+    # Version marker written by UpdateListingFunction
+    lambda_module.listing_cache.shared.put("listing:{}#version".format(listing["listingId"]), 2, 30)
+    # Read once the local copy of the marker expires
+    lambda_module.listing_cache.markers.clear()
+
+    response = lambda_module.handler(get_event(apigateway_event, listing["listingId"], etag), context)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == new_listing
+    assert response["headers"]["ETag"] != etag
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+def test_handler_missing(lambda_module, apigateway_event, context):
+    """
+    Test handler() with a listing that does not exist
+    """
+
+    listing_id = str(uuid.uuid4())
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    add_get_item(table, listing_id, None)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, listing_id), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 400
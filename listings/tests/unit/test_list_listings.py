@@ -0,0 +1,226 @@
+import json
+import os
+import uuid
+import pytest
+import yaml
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "list_listings",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "SEARCH_INDEXES": "city-price-index",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+HOST_ID = str(uuid.uuid4())
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "template.yaml")
+
+
+def get_listing(category: str = "apartment") -> dict:
+    return {
+        "listingId": str(uuid.uuid4()),
+        "name": "Listing name",
+        "category": category,
+        "hostId": HOST_ID
+    }
+
+
+def serialize(item: dict) -> dict:
+    return {k: {"S": v} for k, v in item.items()}
+
+
+def load_template() -> dict:
+    """
+    Load the CloudFormation template, ignoring intrinsic function tags
+    """
+
+    class Loader(yaml.SafeLoader): # pylint: disable=too-many-ancestors
+        pass
+    Loader.add_multi_constructor("!", lambda loader, suffix, node: None)
+
+    with open(TEMPLATE_PATH) as fp:
+        return yaml.load(fp, Loader=Loader) # nosec
+
+
+def test_handler_host(lambda_module, apigateway_event, context):
+    """
+    Listings of a host are read with a Query on the hostId index
+    """
+
+    listings = [get_listing() for _ in range(3)]
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("query", {
+        "Items": [serialize(l) for l in listings],
+        "LastEvaluatedKey": {"listingId": {"S": listings[-1]["listingId"]}, "hostId": {"S": HOST_ID}}
+    }, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "hostId-index",
+        "KeyConditionExpression": stub.ANY,
+        "ScanIndexForward": False,
+        "Limit": 3
+    })
+    table.activate()
+
+    event = apigateway_event(query_params={"hostId": HOST_ID, "limit": "3", "sortOrder": "desc"})
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["items"] == listings
+    assert lambda_module.decode_cursor(
+        body["lastEvaluatedKey"], "hostId-index:{}".format(HOST_ID), ["listingId", "hostId"]
+    ) == {"listingId": listings[-1]["listingId"], "hostId": HOST_ID}
+
+
+def test_handler_host_category(lambda_module, apigateway_event, context):
+    """
+    Category filters read more pages until the page is full
+    """
+
+    listings = [get_listing() for _ in range(3)]
+    cursor = lambda_module.encode_cursor(
+        {"listingId": "START", "hostId": HOST_ID},
+        "hostId-index:{}".format(HOST_ID)
+    )
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("query", {
+        "Items": [serialize(listings[0])],
+        "LastEvaluatedKey": {"listingId": {"S": "NEXT"}, "hostId": {"S": HOST_ID}}
+    }, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "hostId-index",
+        "KeyConditionExpression": stub.ANY,
+        "FilterExpression": stub.ANY,
+        "ScanIndexForward": True,
+        "ExclusiveStartKey": {"listingId": "START", "hostId": HOST_ID},
+        "Limit": lambda_module.FILTER_READ_SIZE
+    })
+    table.add_response("query", {
+        "Items": [serialize(l) for l in listings[1:]]
+    }, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "hostId-index",
+        "KeyConditionExpression": stub.ANY,
+        "FilterExpression": stub.ANY,
+        "ScanIndexForward": True,
+        "ExclusiveStartKey": {"listingId": "NEXT", "hostId": HOST_ID},
+        "Limit": lambda_module.FILTER_READ_SIZE
+    })
+    table.activate()
+
+    event = apigateway_event(query_params={
+        "hostId": HOST_ID, "category": "apartment", "limit": "5", "lastEvaluatedKey": cursor
+    })
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"items": listings, "lastEvaluatedKey": None}
+
+
+def test_build_request_indexes(lambda_module, monkeypatch):
+    """
+    Requests only use indexes defined in the template
+    """
+
+    template = load_template()
+    indexes = [
+        index["IndexName"]
+        for index in template["Resources"]["ListingsTable"]["Properties"]["GlobalSecondaryIndexes"]
+    ]
+    search_indexes = template["Globals"]["Function"]["Environment"]["Variables"]["SEARCH_INDEXES"].split(",")
+    assert set(search_indexes) <= set(indexes)
+
+    monkeypatch.setattr(lambda_module, "SEARCH_INDEXES", search_indexes)
+    for host_id in [None, HOST_ID]:
+        for category in [None, "apartment"]:
+            operation, params, _ = lambda_module.build_request(host_id, category, "asc")
+            if operation == "query":
+                assert params["IndexName"] in indexes
+
+
+def test_handler_category(lambda_module, apigateway_event, context):
+    """
+    Listings of a category are scanned until the category index exists
+    """
+
+    listings = [get_listing() for _ in range(2)]
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("scan", {"Items": [serialize(l) for l in listings]}, {
+        "TableName": "TABLE_NAME",
+        "FilterExpression": stub.ANY,
+        "Limit": lambda_module.FILTER_READ_SIZE
+    })
+    table.activate()
+
+    response = lambda_module.handler(apigateway_event(query_params={"category": "apartment"}), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"items": listings, "lastEvaluatedKey": None}
+
+
+def test_handler_category_index(lambda_module, apigateway_event, context, monkeypatch):
+    """
+    Listings of a category are read from the category index once it exists
+    """
+
+    monkeypatch.setattr(lambda_module, "SEARCH_INDEXES", ["city-price-index", "category-price-index"])
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("query", {"Items": []}, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "category-price-index",
+        "KeyConditionExpression": stub.ANY,
+        "ScanIndexForward": True,
+        "Limit": 10
+    })
+    table.activate()
+
+    response = lambda_module.handler(apigateway_event(query_params={"category": "apartment"}), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+
+
+def test_handler_invalid_cursor(lambda_module, apigateway_event, context):
+    """
+    Cursors from another host are rejected
+    """
+
+    cursor = lambda_module.encode_cursor({"listingId": "ID", "hostId": "OTHER"}, "hostId-index:OTHER")
+
+    event = apigateway_event(query_params={"hostId": HOST_ID, "lastEvaluatedKey": cursor})
+    response = lambda_module.handler(event, context)
+
+    assert response["statusCode"] == 400
+
+
+def test_handler_invalid_params(lambda_module, apigateway_event, context):
+    """
+    Test handler() with invalid query parameters
+    """
+
+    for query_params in [{"limit": "abc"}, {"limit": "0"}, {"limit": "1000"}, {"sortOrder": "random"}]:
+        response = lambda_module.handler(apigateway_event(query_params=query_params), context)
+        assert response["statusCode"] == 400
@@ -0,0 +1,216 @@
+from decimal import Decimal
+import uuid
+import pytest
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+from fixtures import lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "search_listings",
+    "module_name": "planner",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+
+
+def get_listing(city: str = "Paris", category: str = "apartment", price: int = 100) -> dict:
+    return {
+        "listingId": str(uuid.uuid4()),
+        "city": city,
+        "category": category,
+        "price": Decimal(price),
+        "searchCity": city,
+        "searchCityCategory": "{}#{}".format(city, category)
+    }
+
+
+class FakeOperation:
+    """
+    Query or Scan operation that returns predefined pages
+    """
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.pages.pop(0)
+
+
+def build(condition) -> str:
+    return ConditionExpressionBuilder().build_expression(condition, is_key_condition=True).condition_expression
+
+
+def test_plan_search_city_category(lambda_module):
+    """
+    City and category use the composite index
+    """
+
+    plan = lambda_module.plan_search(city="Paris", category="apartment", min_price=50, max_price=200)
+
+    assert plan.name == "city-category-price-index"
+    assert plan.params["IndexName"] == "city-category-price-index"
+    assert "FilterExpression" not in plan.params
+    assert not plan.filtered
+    assert build(plan.params["KeyConditionExpression"]) == "(#n0 = :v0 AND #n1 BETWEEN :v1 AND :v2)"
+    assert plan.key_attributes == ["listingId", "searchCityCategory", "price"]
+
+
+def test_plan_search_city(lambda_module):
+    """
+    City only uses the city index
+    """
+
+    plan = lambda_module.plan_search(city="Paris", min_price=50)
+
+    assert plan.name == "city-price-index"
+    assert build(plan.params["KeyConditionExpression"]) == "(#n0 = :v0 AND #n1 >= :v1)"
+    assert not plan.filtered
+
+
+def test_plan_search_category(lambda_module):
+    """
+    Category only uses the category index
+    """
+
+    plan = lambda_module.plan_search(category="apartment")
+
+    assert plan.name == "category-price-index"
+    assert build(plan.params["KeyConditionExpression"]) == "#n0 = :v0"
+
+
+def test_plan_search_deployed_indexes(lambda_module):
+    """
+    Only the indexes that exist on the table are used
+    """
+
+    indexes = [index for index in lambda_module.INDEXES if index["name"] == "city-price-index"]
+
+    plan = lambda_module.plan_search(city="Paris", category="apartment", indexes=indexes)
+    assert plan.name == "city-price-index"
+    assert plan.filtered
+
+    plan = lambda_module.plan_search(category="apartment", indexes=indexes)
+    assert plan.name == "scan"
+    assert plan.filtered
+
+
+def test_plan_search_scan(lambda_module):
+    """
+    Searches without equality filters fall back to a Scan
+    """
+
+    plan = lambda_module.plan_search(max_price=200)
+    assert plan.name == "scan"
+    assert plan.filtered
+    assert plan.key_attributes == ["listingId"]
+
+    plan = lambda_module.plan_search()
+    assert plan.name == "scan"
+    assert plan.params == {}
+
+
+def test_cursor(lambda_module):
+    """
+    Test encode_cursor() and decode_cursor()
+    """
+
+    plan = lambda_module.plan_search(city="Paris")
+    key = {"listingId": "ID", "searchCity": "Paris", "price": Decimal("12.5")}
+
+    cursor = lambda_module.encode_cursor(plan, key)
+    assert isinstance(cursor, str)
+    assert lambda_module.decode_cursor(plan, cursor) == key
+    assert lambda_module.encode_cursor(plan, None) is None
+    assert lambda_module.decode_cursor(plan, None) is None
+
+    # Cursor for another index
+    with pytest.raises(lambda_module.InvalidCursor):
+        lambda_module.decode_cursor(lambda_module.plan_search(category="apartment"), cursor)
+
+    # Malformed cursors
+    for cursor in ["not a cursor", "e30=", "bnVsbA=="]:
+        with pytest.raises(lambda_module.InvalidCursor):
+            lambda_module.decode_cursor(plan, cursor)
+
+
+def test_search_fill_page(lambda_module):
+    """
+    Sparse pages are filled by reading again
+    """
+
+    plan = lambda_module.plan_search(max_price=200)
+    items = [get_listing() for _ in range(5)]
+    scan = FakeOperation([
+        {"Items": items[:1], "LastEvaluatedKey": {"listingId": items[0]["listingId"]}},
+        {"Items": [], "LastEvaluatedKey": {"listingId": "OTHER"}},
+        {"Items": items[1:], "LastEvaluatedKey": {"listingId": items[4]["listingId"]}}
+    ])
+
+    retval, cursor = lambda_module.search(None, scan, plan, 3)
+
+    assert retval == items[:3]
+    assert len(scan.calls) == 3
+    assert scan.calls[0]["Limit"] == lambda_module.SCAN_PAGE_SIZE
+    assert "ExclusiveStartKey" not in scan.calls[0]
+    assert scan.calls[2]["ExclusiveStartKey"] == {"listingId": "OTHER"}
+    # Resumes after the last returned item, not the last read item
+    assert lambda_module.decode_cursor(plan, cursor) == {"listingId": items[2]["listingId"]}
+
+
+def test_search_query(lambda_module):
+    """
+    Index queries only read the number of items needed
+    """
+
+    plan = lambda_module.plan_search(city="Paris")
+    items = [get_listing() for _ in range(4)]
+    query = FakeOperation([
+        {"Items": items[:2], "LastEvaluatedKey": {"listingId": items[1]["listingId"]}},
+        {"Items": items[2:], "LastEvaluatedKey": {"listingId": items[3]["listingId"]}}
+    ])
+
+    retval, cursor = lambda_module.search(query, None, plan, 4)
+
+    assert retval == items
+    assert [call["Limit"] for call in query.calls] == [4, 2]
+    assert lambda_module.decode_cursor(plan, cursor) == {
+        "listingId": items[3]["listingId"],
+        "searchCity": "Paris",
+        "price": 100
+    }
+
+
+def test_search_last_page(lambda_module):
+    """
+    No cursor is returned on the last page
+    """
+
+    plan = lambda_module.plan_search(category="apartment")
+    items = [get_listing() for _ in range(2)]
+
+    retval, cursor = lambda_module.search(FakeOperation([{"Items": items}]), None, plan, 2)
+    assert retval == items
+    assert cursor is None
+
+    retval, cursor = lambda_module.search(FakeOperation([{"Items": items}]), None, plan, 10)
+    assert retval == items
+    assert cursor is None
+
+
+def test_search_max_reads(lambda_module):
+    """
+    Partial pages are returned after 'max_reads' requests
+    """
+
+    plan = lambda_module.plan_search(max_price=200)
+    scan = FakeOperation([{"Items": [], "LastEvaluatedKey": {"listingId": str(i)}} for i in range(5)])
+
+    retval, cursor = lambda_module.search(None, scan, plan, 10, max_reads=3)
+
+    assert retval == []
+    assert len(scan.calls) == 3
+    assert lambda_module.decode_cursor(plan, cursor) == {"listingId": "2"}
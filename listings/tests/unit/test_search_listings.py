@@ -0,0 +1,186 @@
+import importlib
+import json
+import uuid
+import pytest
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "search_listings",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "CALENDAR_TABLE_NAME": "CALENDAR_TABLE_NAME",
+        "SEARCH_INDEXES": "city-category-price-index,city-price-index,category-price-index",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+@pytest.fixture
+def listing():
+    return {
+        "listingId": str(uuid.uuid4()),
+        "name": "Listing name",
+        "city": "Paris",
+        "category": "apartment",
+        "price": 120,
+        "hostId": str(uuid.uuid4()),
+        "searchCity": "Paris",
+        "searchCityCategory": "Paris#apartment"
+    }
+
+
+def test_handler(lambda_module, apigateway_event, context, listing):
+    """
+    Test handler() with a city and category search
+    """
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("query", {
+        "Items": [{
+            k: {"N": str(v)} if isinstance(v, int) else {"S": v}
+            for k, v in listing.items()
+        }]
+    }, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "city-category-price-index",
+        "KeyConditionExpression": stub.ANY,
+        "Limit": 5
+    })
+    table.activate()
+
+    event = apigateway_event(
+        resource="/listings/search",
+        path="/listings/search",
+        query_params={"city": "Paris", "category": "apartment", "maxPrice": "200", "limit": "5"}
+    )
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["items"] == [listing]
+    assert body["lastEvaluatedKey"] is None
+
+
+def test_handler_cursor(lambda_module, apigateway_event, context, listing):
+    """
+    Test handler() with a cursor from a previous page
+    """
+
+    plan = lambda_module.plan_search(city="Paris")
+    cursor = importlib.import_module("planner").encode_cursor(plan, {
+        "listingId": listing["listingId"],
+        "searchCity": "Paris",
+        "price": 120
+    })
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("query", {"Items": []}, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "city-price-index",
+        "KeyConditionExpression": stub.ANY,
+        "ExclusiveStartKey": {
+            "listingId": listing["listingId"],
+            "searchCity": "Paris",
+            "price": 120
+        },
+        "Limit": 10
+    })
+    table.activate()
+
+    event = apigateway_event(query_params={"city": "Paris", "lastEvaluatedKey": cursor})
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"items": [], "lastEvaluatedKey": None}
+
+
+def test_handler_invalid_cursor(lambda_module, apigateway_event, context):
+    """
+    Test handler() with a cursor from another search
+    """
+
+    cursor = importlib.import_module("planner").encode_cursor(
+        lambda_module.plan_search(city="Paris"),
+        {"listingId": "ID", "searchCity": "Paris", "price": 120}
+    )
+
+    event = apigateway_event(query_params={"category": "apartment", "lastEvaluatedKey": cursor})
+    response = lambda_module.handler(event, context)
+
+    assert response["statusCode"] == 400
+
+
+def test_handler_invalid_params(lambda_module, apigateway_event, context):
+    """
+    Test handler() with invalid query parameters
+    """
+
+    for query_params in [{"limit": "abc"}, {"minPrice": "1.5"}, {"limit": "0"}, {"limit": "1000"}]:
+        response = lambda_module.handler(apigateway_event(query_params=query_params), context)
+        assert response["statusCode"] == 400
+
+
+def test_handler_dates(lambda_module, apigateway_event, context, listing):
+    """
+    Test handler() with check-in and check-out dates
+    """
+
+    other = dict(listing, listingId=str(uuid.uuid4()))
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("query", {
+        "Items": [{"listingId": {"S": listing["listingId"]}, "free": {"N": str(0b111)}}]
+    }, {
+        "TableName": "CALENDAR_TABLE_NAME",
+        "IndexName": "city-month-index",
+        "KeyConditionExpression": stub.ANY,
+        "ProjectionExpression": "listingId, #free",
+        "ExpressionAttributeNames": {"#free": "free"}
+    })
+    table.add_response("query", {
+        "Items": [{
+            k: {"N": str(v)} if isinstance(v, int) else {"S": v}
+            for k, v in item.items()
+        } for item in [other, listing]]
+    }, {
+        "TableName": "TABLE_NAME",
+        "IndexName": "city-price-index",
+        "KeyConditionExpression": stub.ANY,
+        "Limit": importlib.import_module("planner").SCAN_PAGE_SIZE
+    })
+    table.activate()
+
+    event = apigateway_event(query_params={"city": "Paris", "checkIn": "2021-06-01", "checkOut": "2021-06-03"})
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"items": [listing], "lastEvaluatedKey": None}
+
+
+def test_handler_invalid_dates(lambda_module, apigateway_event, context):
+    """
+    Test handler() with invalid check-in and check-out dates
+    """
+
+    for query_params in [
+            {"city": "Paris", "checkIn": "2021-06-01"},
+            {"city": "Paris", "checkIn": "2021-06-01", "checkOut": "tomorrow"},
+            {"city": "Paris", "checkIn": "2021-06-03", "checkOut": "2021-06-01"},
+            {"checkIn": "2021-06-01", "checkOut": "2021-06-03"}
+        ]:
+        response = lambda_module.handler(apigateway_event(query_params=query_params), context)
+        assert response["statusCode"] == 400
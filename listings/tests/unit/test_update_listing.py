@@ -0,0 +1,198 @@
+import json
+import uuid
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "update_listing",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "CALENDAR_TABLE_NAME": "CALENDAR_TABLE_NAME",
+        "USER_POOL_ID": "eu-west-1_TEST",
+        "CACHE_STORE": "memory",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+@pytest.fixture
+def listing():
+    return {
+        "listingId": str(uuid.uuid4()),
+        "name": "Listing name",
+        "city": "Paris",
+        "category": "apartment",
+        "price": 120,
+        "hostId": str(uuid.uuid4()),
+        "searchCity": "Paris",
+        "searchCityCategory": "Paris#apartment",
+        "version": 1
+    }
+
+
+def test_handler(lambda_module, apigateway_event, context, listing, monkeypatch):
+    """
+    Updates bump the version and invalidate cached listings
+    """
+
+    monkeypatch.setattr(lambda_module.verifier, "verify", lambda token: {"sub": listing["hostId"]})
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("get_item", {
+        "Item": {k: TypeSerializer().serialize(v) for k, v in listing.items()}
+    }, {"TableName": "TABLE_NAME", "Key": {"listingId": listing["listingId"]}})
+    table.add_response("update_item", {
+        "Attributes": {"version": {"N": "2"}}
+    }, {
+        "TableName": "TABLE_NAME",
+        "Key": {"listingId": listing["listingId"]},
+        "UpdateExpression": "SET #n0 = :v0, #n1 = :v1, #n2 = :v2 ADD #n3 :v3",
+        "ExpressionAttributeNames": {
+            "#n0": "city",
+            "#n1": "searchCityCategory",
+            "#n2": "searchCity",
+            "#n3": "version"
+        },
+        "ExpressionAttributeValues": {
+            ":v0": "Lyon",
+            ":v1": "Lyon#apartment",
+            ":v2": "Lyon",
+            ":v3": 1
+        },
+        "ReturnValues": "UPDATED_NEW"
+    })
+    # The calendar moves to the new city
+    table.add_response("query", {
+        "Items": [{"month": {"S": "2021-06"}}]
+    }, {
+        "TableName": "CALENDAR_TABLE_NAME",
+        "KeyConditionExpression": stub.ANY,
+        "ProjectionExpression": "#month",
+        "ExpressionAttributeNames": {"#month": "month"}
+    })
+    table.add_response("update_item", {}, {
+        "TableName": "CALENDAR_TABLE_NAME",
+        "Key": {"listingId": listing["listingId"], "month": "2021-06"},
+        "UpdateExpression": "SET cityMonth = :cityMonth",
+        "ExpressionAttributeValues": {":cityMonth": "Lyon#2021-06"}
+    })
+    table.activate()
+
+    event = apigateway_event(
+        method="PUT",
+        body=json.dumps({"city": "Lyon", "version": 10}),
+        path_params={"listingId": listing["listingId"]}
+    )
+    event["headers"] = {"Authorization": "TOKEN"}
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert lambda_module.listing_cache.shared.get("listing:{}#version".format(listing["listingId"])) == 2
+
+
+def test_handler_invalid_fields(lambda_module, apigateway_event, context, listing, monkeypatch):
+    """
+    Test handler() with fields that cannot be updated
+    """
+
+    monkeypatch.setattr(lambda_module.verifier, "verify", lambda token: {"sub": listing["hostId"]})
+
+    for body in [{"hostId": "OTHER"}, {"price": "free"}, {"searchCity": "Lyon"}]:
+        table = stub.Stubber(lambda_module.table.meta.client)
+        table.add_response("get_item", {
+            "Item": {k: TypeSerializer().serialize(v) for k, v in listing.items()}
+        }, {"TableName": "TABLE_NAME", "Key": {"listingId": listing["listingId"]}})
+        table.activate()
+
+        event = apigateway_event(
+            method="PUT",
+            body=json.dumps(body),
+            path_params={"listingId": listing["listingId"]}
+        )
+        event["headers"] = {"Authorization": "TOKEN"}
+        response = lambda_module.handler(event, context)
+
+        table.assert_no_pending_responses()
+        table.deactivate()
+
+        assert response["statusCode"] == 400
+
+
+# Listings created before versioning have no version
+@pytest.mark.parametrize("version", [1, None])
+def test_handler_calendar(lambda_module, apigateway_event, context, listing, monkeypatch, version):
+    """
+    Calendars are replaced with the listing in a single transaction, keeping
+    booked days unavailable
+    """
+
+    monkeypatch.setattr(lambda_module.verifier, "verify", lambda token: {"sub": listing["hostId"]})
+
+    calendar = [{"date": "2021-06-0{}".format(day), "available": True} for day in range(1, 4)]
+    merged = [dict(entry, available=entry["date"] != "2021-06-03") for entry in calendar]
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("get_item", {
+        "Item": {k: TypeSerializer().serialize(v) for k, v in listing.items()}
+    }, {"TableName": "TABLE_NAME", "Key": {"listingId": listing["listingId"]}})
+    # Day 3 is booked
+    table.add_response("query", {"Items": [{
+        "listingId": {"S": listing["listingId"]},
+        "month": {"S": "2021-06"},
+        "free": {"N": "3"},
+        "booked": {"N": "4"}
+    }]}, {
+        "TableName": "CALENDAR_TABLE_NAME",
+        "KeyConditionExpression": stub.ANY,
+        "ConsistentRead": True
+    })
+    table.add_response("get_item", {"Item": {} if version is None else {"version": {"N": str(version)}}}, {
+        "TableName": "TABLE_NAME",
+        "Key": {"listingId": listing["listingId"]},
+        "ProjectionExpression": "#version",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ConsistentRead": True
+    })
+    table.add_response("transact_write_items", {}, {"TransactItems": [{
+        "Update": {
+            "TableName": "CALENDAR_TABLE_NAME",
+            "Key": {"listingId": listing["listingId"], "month": "2021-06"},
+            "UpdateExpression": "SET #free = :free, cityMonth = :cityMonth",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free"},
+            "ExpressionAttributeValues": {":free": 3, ":cityMonth": "Paris#2021-06", ":old": 3}
+        }
+    }, {
+        "Update": {
+            "TableName": "TABLE_NAME",
+            "Key": {"listingId": listing["listingId"]},
+            "UpdateExpression": "SET #n0 = :v0 ADD #n1 :v1",
+            "ConditionExpression": "attribute_not_exists(#version) OR #version = :version",
+            "ExpressionAttributeNames": {"#n0": "calendar", "#n1": "version", "#version": "version"},
+            "ExpressionAttributeValues": {":v0": merged, ":v1": 1, ":version": version or 0}
+        }
+    }]})
+    table.activate()
+
+    event = apigateway_event(
+        method="PUT",
+        body=json.dumps({"calendar": calendar}),
+        path_params={"listingId": listing["listingId"]}
+    )
+    event["headers"] = {"Authorization": "TOKEN"}
+    response = lambda_module.handler(event, context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert lambda_module.listing_cache.shared.get("listing:{}#version".format(listing["listingId"])) == (version or 0) + 1
@@ -4,21 +4,18 @@ CreateOrderFunction
 
 
 import asyncio
-import concurrent
+from concurrent.futures import ThreadPoolExecutor
 import datetime
-import json
 import os
-from typing import List, Tuple
-from urllib.parse import urlparse
+from typing import Callable, List, Optional, Tuple
 import uuid
 import boto3
-import jsonschema
-import requests
-from aws_requests_auth.boto_utils import BotoAWSRequestsAuth
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
 from aws_lambda_powertools import Metrics # pylint: disable=import-error
 from aws_lambda_powertools.metrics import MetricUnit # pylint: disable=import-error
+from ecom.http import Client # pylint: disable=import-error
+from ecom.schema import load_validator # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
@@ -27,6 +24,12 @@ TABLE_NAME = os.environ["TABLE_NAME"]
 DELIVERY_API_URL = os.environ["DELIVERY_API_URL"]
 PAYMENT_API_URL = os.environ["PAYMENT_API_URL"]
 PRODUCTS_API_URL = os.environ["PRODUCTS_API_URL"]
+# Maximum time in seconds for a single validation check
+CHECK_TIMEOUT = 5
+# Maximum time in seconds to connect to another service
+CONNECT_TIMEOUT = 3.05
+# Time in seconds kept after validation to store the order and respond
+RESPONSE_MARGIN = 1
 
 
 dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
@@ -34,31 +37,37 @@ table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name,no-member
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.orders") # pylint: disable=invalid-name
+# Without retries, as a retry would outlive the deadline of the check
+http_client = Client(timeout=(CONNECT_TIMEOUT, CHECK_TIMEOUT), retries=0) # pylint: disable=invalid-name
+# Shared across invocations so threads and the event loop are created once per
+# container. A thread cannot be interrupted, so a check that misses its
+# deadline keeps its worker until the HTTP timeout expires. Checks pass their
+# deadline down as the HTTP timeout so that workers are released at about the
+# same time.
+executor = ThreadPoolExecutor(max_workers=3) # pylint: disable=invalid-name
+loop = asyncio.new_event_loop() # pylint: disable=invalid-name
+validator = load_validator(SCHEMA_FILE) # pylint: disable=invalid-name
+
+
+def http_timeout(timeout: float) -> Tuple[float, float]:
+    """
+    Returns the connect and read timeouts for a check with a deadline
+    """
 
-
-with open(SCHEMA_FILE) as fp:
-    schema = json.load(fp) # pylint: disable=invalid-name
+    return (min(CONNECT_TIMEOUT, timeout), timeout)
 
 
 @tracer.capture_method
-def validate_delivery(order: dict) -> Tuple[bool, str]:
+def validate_delivery(order: dict, timeout: float = CHECK_TIMEOUT) -> Tuple[bool, str]:
     """
     Validate the delivery price
     """
 
-    # Gather the domain name and AWS region
-    url = urlparse(DELIVERY_API_URL)
-    region = boto3.session.Session().region_name
-    # Create the signature helper
-    iam_auth = BotoAWSRequestsAuth(aws_host=url.netloc,
-                                   aws_region=region,
-                                   aws_service='execute-api')
-
     # Send a POST request
-    response = requests.post(
+    response = http_client.post(
         DELIVERY_API_URL+"/backend/pricing",
         json={"products": order["products"], "address": order["address"]},
-        auth=iam_auth
+        timeout=http_timeout(timeout)
     )
 
     logger.debug({
@@ -87,24 +96,16 @@ def validate_delivery(order: dict) -> Tuple[bool, str]:
 
 
 @tracer.capture_method
-def validate_payment(order: dict) -> Tuple[bool, str]:
+def validate_payment(order: dict, timeout: float = CHECK_TIMEOUT) -> Tuple[bool, str]:
     """
     Validate the payment token
     """
 
-    # Gather the domain name and AWS region
-    url = urlparse(PAYMENT_API_URL)
-    region = boto3.session.Session().region_name
-    # Create the signature helper
-    iam_auth = BotoAWSRequestsAuth(aws_host=url.netloc,
-                                   aws_region=region,
-                                   aws_service='execute-api')
-
     # Send a POST request
-    response = requests.post(
+    response = http_client.post(
         PAYMENT_API_URL+"/backend/validate",
         json={"paymentToken": order["paymentToken"], "total": order["total"]},
-        auth=iam_auth
+        timeout=http_timeout(timeout)
     )
 
     logger.debug({
@@ -133,23 +134,16 @@ def validate_payment(order: dict) -> Tuple[bool, str]:
 
 
 @tracer.capture_method
-def validate_products(order: dict) -> Tuple[bool, str]:
+def validate_products(order: dict, timeout: float = CHECK_TIMEOUT) -> Tuple[bool, str]:
     """
     Validate the products in the order
     """
 
-    # Gather the domain name and AWS region
-    url = urlparse(PRODUCTS_API_URL)
-    region = boto3.session.Session().region_name
-    # Create the signature helper
-    iam_auth = BotoAWSRequestsAuth(aws_host=url.netloc,
-                                   aws_region=region,
-                                   aws_service='execute-api')
     # Send a POST request
-    response = requests.post(
+    response = http_client.post(
         PRODUCTS_API_URL+"/backend/validate",
         json={"products": order["products"]},
-        auth=iam_auth
+        timeout=http_timeout(timeout)
     )
 
     logger.debug({
@@ -161,23 +155,62 @@ def validate_products(order: dict) -> Tuple[bool, str]:
     return (len(body.get("products", [])) == 0, body.get("message", ""))
 
 
+async def run_check(
+        check: Callable[[dict, float], Tuple[bool, str]],
+        order: dict,
+        timeout: float
+    ) -> Tuple[bool, str]:
+    """
+    Run a blocking validation check with a deadline
+    """
+
+    future = asyncio.get_running_loop().run_in_executor(executor, check, order, timeout)
+    return await asyncio.wait_for(future, timeout)
+
+
 @tracer.capture_method
-async def validate(order: dict) -> List[str]:
+async def validate(order: dict, timeout: Optional[float] = None) -> List[str]:
     """
     Returns a list of error messages
+
+    All checks run at the same time, each with its own deadline. If a check
+    fails hard (an exception or a timeout, not an invalid order), the other
+    checks are cancelled as the order cannot be accepted anyway.
     """
 
-    error_msgs = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        futures = [
-            executor.submit(validate_delivery, order),
-            executor.submit(validate_payment, order),
-            executor.submit(validate_products, order)
+    # The overall budget is enforced through the deadline of each check
+    check_timeout = CHECK_TIMEOUT if timeout is None else min(CHECK_TIMEOUT, timeout)
+    # Resolve the functions at call time, so they can be swapped out
+    tasks = {
+        asyncio.ensure_future(run_check(check, order, check_timeout)): name
+        for name, check in [
+            ("delivery", validate_delivery),
+            ("payment", validate_payment),
+            ("products", validate_products)
         ]
-        for future in concurrent.futures.as_completed(futures):
-            valid, error_msg = future.result()
-            if not valid:
-                error_msgs.append(error_msg)
+    }
+
+    done, pending = await asyncio.wait(tasks.keys(), return_when=asyncio.FIRST_EXCEPTION)
+
+    error_msgs = []
+    for task in done:
+        exc = task.exception()
+        if exc is not None:
+            logger.warning({
+                "message": "Failure to validate the order against the {} service".format(tasks[task]),
+                "service": tasks[task],
+                "exception": repr(exc)
+            })
+            error_msgs.append("Failure to contact the {} service".format(tasks[task]))
+            continue
+
+        valid, error_msg = task.result()
+        if not valid:
+            error_msgs.append(error_msg)
+
+    for task in pending:
+        task.cancel()
+        error_msgs.append("Validation against the {} service was cancelled".format(tasks[task]))
 
     if error_msgs:
         logger.info({
@@ -238,7 +271,7 @@ def store_order(order: dict) -> None:
 @metrics.log_metrics(raise_on_empty_metrics=False)
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
-def handler(event, _):
+def handler(event, context):
     """
     Lambda function handler
     """
@@ -257,13 +290,12 @@ def handler(event, _):
     order["userId"] = event["userId"]
 
     # Validate the schema of the order
-    try:
-        jsonschema.validate(order, schema)
-    except jsonschema.ValidationError as exc:
+    schema_errors = validator.errors(order)
+    if schema_errors:
         return {
             "success": False,
             "message": "JSON Schema validation error",
-            "errors": [str(exc)]
+            "errors": schema_errors
         }
 
     # Cleanup products
@@ -272,8 +304,20 @@ def handler(event, _):
     # Inject fields in the order
     order = inject_order_fields(order)
 
-    # Validate the order against other services
-    error_msgs = asyncio.run(validate(order))
+    # Validate the order against other services within the time left for
+    # this invocation
+    budget = context.get_remaining_time_in_millis()/1000 - RESPONSE_MARGIN
+    if budget <= 0:
+        logger.warning({
+            "message": "Not enough time left to validate the order",
+            "budget": budget
+        })
+        return {
+            "success": False,
+            "message": "Validation errors",
+            "errors": ["Not enough time left to validate the order"]
+        }
+    error_msgs = loop.run_until_complete(validate(order, budget))
     if len(error_msgs) > 0:
         return {
             "success": False,
@@ -4,30 +4,141 @@ OnPackageCreated Function
 
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import boto3
+from botocore.config import Config
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
 from aws_lambda_powertools import Metrics # pylint: disable=import-error
 from aws_lambda_powertools.metrics import MetricUnit # pylint: disable=import-error
+from ecom.cache import TTLCache # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 TABLE_NAME = os.environ["TABLE_NAME"]
+# Maximum number of concurrent writes for events covering several orders
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "16"))
+# Time orders updated by an event are remembered, so that retries of the
+# event on the same container skip them, in seconds
+APPLIED_TTL = float(os.environ.get("APPLIED_TTL", "900"))
+# Results of an order update
+UPDATED = "UPDATED"
+IGNORED = "IGNORED"
+FAILED = "FAILED"
+# Order status state machine: each status maps to the statuses an order can
+# move to from it
+STATE_MACHINE = {
+    "NEW": ["PACKAGED", "PACKAGING_FAILED"],
+    "PACKAGED": ["FULFILLED", "DELIVERY_FAILED"],
+    "PACKAGING_FAILED": [],
+    "FULFILLED": [],
+    "DELIVERY_FAILED": []
+}
 
 
-dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
+dynamodb = boto3.resource( # pylint: disable=invalid-name
+    "dynamodb",
+    # One connection per worker
+    config=Config(max_pool_connections=MAX_WORKERS)
+)
 table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name,no-member
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.orders") # pylint: disable=invalid-name
+applied = TTLCache(maxsize=10000, ttl=APPLIED_TTL) # pylint: disable=invalid-name
+
+
+class OutOfOrderEvent(Exception):
+    """
+    The order is not yet in a status that can move to the status of the event
+    """
+
+
+class FailedOrders(Exception):
+    """
+    Some orders of an event could not be updated
+    """
+
+    def __init__(self, order_ids: List[str]):
+        super().__init__("Failed to update orders: {}".format(", ".join(order_ids)))
+        self.order_ids = order_ids
+
+
+def compile_conditions(state_machine: Dict[str, List[str]]) -> Dict[str, Tuple[str, dict]]:
+    """
+    Compile a state machine into a condition expression for each status
+
+    The condition only holds if the current status of the order can move to
+    that status. It also fails for orders that do not exist.
+    """
+
+    sources: Dict[str, List[str]] = {status: [] for status in state_machine}
+    for source, targets in state_machine.items():
+        for target in targets:
+            sources[target].append(source)
+
+    conditions = {}
+    for target, from_statuses in sources.items():
+        if not from_statuses:
+            continue
+        values = {":from{}".format(i): status for i, status in enumerate(from_statuses)}
+        conditions[target] = ("#s IN ({})".format(", ".join(values.keys())), values)
+    return conditions
+
+
+def reachable(state_machine: Dict[str, List[str]], source: str, target: str) -> bool:
+    """
+    Returns True if an order can move from one status to another in one or
+    more transitions
+    """
+
+    queue = list(state_machine.get(source, []))
+    seen = set()
+    while queue:
+        status = queue.pop()
+        if status == target:
+            return True
+        if status not in seen:
+            seen.add(status)
+            queue.extend(state_machine.get(status, []))
+    return False
+
+
+CONDITIONS = compile_conditions(STATE_MACHINE)
+
+
+def get_status(order_id: str) -> Optional[str]:
+    """
+    Retrieve the current status of an order, or None if it does not exist
+
+    Only the status is read, as this function can only access the status and
+    products of orders.
+    """
+
+    item = table.meta.client.get_item(
+        TableName=TABLE_NAME,
+        Key={"orderId": order_id},
+        ProjectionExpression="#s",
+        ExpressionAttributeNames={"#s": "status"},
+        ConsistentRead=True
+    ).get("Item")
+    return item.get("status") if item is not None else None
 
 
 @tracer.capture_method
-def update_order(order_id: str, status: str, products: Optional[List[dict]] = None) -> None:
+def update_order(order_id: str, status: str, products: Optional[List[dict]] = None) -> bool:
     """
-    Update packages in the order
+    Update the status and packages in the order
+
+    This sends a single conditional write, which only succeeds if the order
+    can move to that status. Only when it fails is the current status read,
+    to tell duplicate or stale events from events that arrived too early.
+
+    Returns False if the event was already applied or is stale, and raises
+    OutOfOrderEvent if the event arrived before the ones leading to the
+    status, so that it is retried.
     """
 
     logger.info({
@@ -36,37 +147,83 @@ def update_order(order_id: str, status: str, products: Optional[List[dict]] = No
         "status": status
     })
 
+    condition, condition_values = CONDITIONS[status]
     update_expression = "set #s = :s"
     attribute_names = {
         "#s": "status"
     }
     attribute_values = {
-        ":s": status
+        ":s": status,
+        **condition_values
     }
 
     if products is not None:
-        product_ids = [p["productId"] for p in products]
-
-        item = table.get_item(
-            Key={"orderId": order_id},
-            AttributesToGet=["products"]
-        )["Item"]
-        new_products = []
-        for product in item["products"]:
-            if product["productId"] in product_ids:
-                new_products.append(product)
-
         update_expression += ", #p = :p"
         attribute_names["#p"] = "products"
         attribute_values[":p"] = products
 
+    # The client is used rather than the table resource, as the latter is not
+    # thread-safe.
+    try:
+        table.meta.client.update_item(
+            TableName=TABLE_NAME,
+            Key={"orderId": order_id},
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=attribute_names,
+            ExpressionAttributeValues=attribute_values
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException as exc:
+        current = get_status(order_id)
+        if current is not None and current != status and reachable(STATE_MACHINE, current, status):
+            raise OutOfOrderEvent("Order {} is {}, cannot move to {} yet".format(order_id, current, status)) from exc
+
+        logger.warning({
+            "message": "Ignoring status {} for order {} with status {}".format(status, order_id, current),
+            "orderId": order_id,
+            "status": status,
+            "currentStatus": current
+        })
+        return False
+
+    return True
+
+
+def try_update_order(order_id: str, status: str, products: Optional[List[dict]] = None) -> str:
+    """
+    Update an order, and return UPDATED, IGNORED or FAILED
+    """
+
+    try:
+        return UPDATED if update_order(order_id, status, products) else IGNORED
+    except Exception as exc: # pylint: disable=broad-except
+        logger.warning({
+            "message": "Failed to update order {}: {}".format(order_id, exc),
+            "orderId": order_id,
+            "status": status
+        })
+        return FAILED
 
-    table.update_item(
-        Key={"orderId": order_id},
-        UpdateExpression=update_expression,
-        ExpressionAttributeNames=attribute_names,
-        ExpressionAttributeValues=attribute_values
-    )
+
+@tracer.capture_method
+def update_orders(updates: List[Tuple[str, str, Optional[List[dict]]]]) -> Dict[str, str]:
+    """
+    Update orders concurrently
+
+    Each update is a tuple of order ID, status and products. As orders are
+    independent, they are sent as separate conditional writes rather than
+    transactions, so that one failing order does not fail the others.
+
+    Returns the result of the update for each order ID: UPDATED, IGNORED or
+    FAILED.
+    """
+
+    if len(updates) == 0:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(updates))) as executor:
+        results = executor.map(lambda update: try_update_order(*update), updates)
+        return {update[0]: result for update, result in zip(updates, results)}
 
 
 @metrics.log_metrics
@@ -75,11 +232,21 @@ def update_order(order_id: str, status: str, products: Optional[List[dict]] = No
 def handler(event, _):
     """
     Lambda handler
+
+    Returns the result of the update for each order. If some orders fail,
+    this raises FailedOrders so that the event is retried. Orders already
+    updated by the event are skipped on the same container, and rejected by
+    their condition otherwise.
     """
 
     order_ids = event["resources"]
+    event_id = event.get("id")
 
     metrics_data = defaultdict(int)
+    # Metric for each order, only counted once the order is updated, so that
+    # retries of the event do not count orders again
+    metric_names = {}
+    updates = []
 
     for order_id in order_ids:
         logger.info({
@@ -89,13 +256,19 @@ def handler(event, _):
             "orderId": order_id
         })
         tracer.put_annotation("orderId", order_id)
+        if event_id is not None and applied.get((event_id, order_id)) is not None:
+            logger.info({
+                "message": "Order {} already updated by event {}".format(order_id, event_id),
+                "orderId": order_id
+            })
+            continue
         if event["source"] == "ecommerce.warehouse":
             if event["detail-type"] == "PackageCreated":
-                metrics_data["orderPackaged"] += 1
-                update_order(order_id, "PACKAGED", event["detail"]["products"])
+                metric_names[order_id] = "orderPackaged"
+                updates.append((order_id, "PACKAGED", event["detail"]["products"]))
             elif event["detail-type"] == "PackagingFailed":
-                metrics_data["orderFailed"] += 1
-                update_order(order_id, "PACKAGING_FAILED")
+                metric_names[order_id] = "orderFailed"
+                updates.append((order_id, "PACKAGING_FAILED", None))
             else:
                 logger.warning({
                     "message": "Unknown event type {} for order {}".format(event["detail-type"], order_id),
@@ -105,11 +278,11 @@ def handler(event, _):
                 })
         elif event["source"] == "ecommerce.delivery":
             if event["detail-type"] == "DeliveryCompleted":
-                metrics_data["orderFulfilled"] += 1
-                update_order(order_id, "FULFILLED")
+                metric_names[order_id] = "orderFulfilled"
+                updates.append((order_id, "FULFILLED", None))
             elif event["detail-type"] == "DeliveryFailed":
-                metrics_data["orderFailed"] += 1
-                update_order(order_id, "DELIVERY_FAILED")
+                metric_names[order_id] = "orderFailed"
+                updates.append((order_id, "DELIVERY_FAILED", None))
             else:
                 logger.warning({
                     "message": "Unknown event type {} for order {}".format(event["detail-type"], order_id),
@@ -125,7 +298,23 @@ def handler(event, _):
                 "orderId": order_id
             })
 
+    results = update_orders(updates)
+
+    failed = [order_id for order_id, result in results.items() if result == FAILED]
+    for order_id, result in results.items():
+        if result == UPDATED:
+            metrics_data[metric_names[order_id]] += 1
+    if event_id is not None:
+        for order_id, result in results.items():
+            if result != FAILED:
+                applied.put((event_id, order_id), result)
+
     # Add custom metrics
     metrics.add_dimension(name="environment", value=ENVIRONMENT)
     for key, value in metrics_data.items():
-        metrics.add_metric(name=key, unit=MetricUnit.Count, value=value)
\ No newline at end of file
+        metrics.add_metric(name=key, unit=MetricUnit.Count, value=value)
+
+    if failed:
+        raise FailedOrders(failed)
+
+    return results
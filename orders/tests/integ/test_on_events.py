@@ -155,7 +155,8 @@ def test_on_delivery_completed(order, listener, table_name, event_bus_name):
     eventbridge = boto3.client("events")
     table = boto3.resource("dynamodb").Table(table_name) # pylint: disable=no-member
 
-    # Store order in DynamoDB table
+    # Store order in DynamoDB table, ready for delivery
+    order["status"] = "PACKAGED"
     table.put_item(Item=order)
 
     # Create the event
@@ -192,7 +193,8 @@ def test_on_delivery_failed(order, listener, table_name, event_bus_name):
     eventbridge = boto3.client("events")
     table = boto3.resource("dynamodb").Table(table_name) # pylint: disable=no-member
 
-    # Store order in DynamoDB table
+    # Store order in DynamoDB table, ready for delivery
+    order["status"] = "PACKAGED"
     table.put_item(Item=order)
 
     # Create the event
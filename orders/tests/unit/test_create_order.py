@@ -1,6 +1,7 @@
 import asyncio
 import copy
 import json
+import time
 from typing import Tuple
 from botocore import stub
 import pytest
@@ -81,6 +82,22 @@ def test_validate_delivery(lambda_module, order):
     assert valid == True
 
 
+def test_validate_delivery_timeout(lambda_module, order):
+    """
+    Test validate_delivery() with a deadline shorter than the connect timeout
+    """
+
+    url = "mock://DELIVERY_API_URL/backend/pricing"
+
+    with requests_mock.Mocker() as m:
+        m.post(url, text=json.dumps({"pricing": order["deliveryPrice"]}))
+
+        valid, _ = lambda_module.validate_delivery(order, 1.5)
+
+    assert valid == True
+    assert m.request_history[0].timeout == (1.5, 1.5)
+
+
 def test_validate_delivery_incorrect(lambda_module, order):
     """
     Test validate_delivery() with incorrect price
@@ -238,7 +255,7 @@ def test_validate(monkeypatch, lambda_module, order):
     Test validate()
     """
 
-    def validate_true(order: dict) -> Tuple[bool, str]:
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
         return (True, "")
 
     monkeypatch.setattr(lambda_module, "validate_delivery", validate_true)
@@ -254,7 +271,7 @@ def test_validate_fail(monkeypatch, lambda_module, order):
     Test validate() with failures
     """
 
-    def validate_true(order: dict) -> Tuple[bool, str]:
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
         return (False, "Something is wrong")
 
     monkeypatch.setattr(lambda_module, "validate_delivery", validate_true)
@@ -265,6 +282,54 @@ def test_validate_fail(monkeypatch, lambda_module, order):
     assert len(error_msgs) == 3
 
 
+def test_validate_exception(monkeypatch, lambda_module, order):
+    """
+    Test validate() with a check failing hard
+    """
+
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
+        return (True, "")
+
+    def validate_slow(order: dict, timeout: float) -> Tuple[bool, str]:
+        time.sleep(0.5)
+        return (True, "")
+
+    def validate_exception(order: dict, timeout: float) -> Tuple[bool, str]:
+        raise requests.exceptions.ConnectionError("Connection refused")
+
+    monkeypatch.setattr(lambda_module, "validate_delivery", validate_exception)
+    monkeypatch.setattr(lambda_module, "validate_payment", validate_slow)
+    monkeypatch.setattr(lambda_module, "validate_products", validate_true)
+
+    start = time.monotonic()
+    error_msgs = asyncio.run(lambda_module.validate(order))
+    assert time.monotonic() - start < 0.5
+    assert "Failure to contact the delivery service" in error_msgs
+    assert "Validation against the payment service was cancelled" in error_msgs
+
+
+def test_validate_timeout(monkeypatch, lambda_module, order):
+    """
+    Test validate() with a check exceeding the time budget
+    """
+
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
+        return (True, "")
+
+    def validate_slow(order: dict, timeout: float) -> Tuple[bool, str]:
+        time.sleep(0.5)
+        return (True, "")
+
+    monkeypatch.setattr(lambda_module, "validate_delivery", validate_true)
+    monkeypatch.setattr(lambda_module, "validate_payment", validate_true)
+    monkeypatch.setattr(lambda_module, "validate_products", validate_slow)
+
+    start = time.monotonic()
+    error_msgs = asyncio.run(lambda_module.validate(order, 0.1))
+    assert time.monotonic() - start < 0.5
+    assert error_msgs == ["Failure to contact the products service"]
+
+
 def test_store_order(lambda_module, order):
     """
     Test store_order()
@@ -287,7 +352,7 @@ def test_handler(monkeypatch, lambda_module, context, order):
     Test handler()
     """
 
-    def validate_true(order: dict) -> Tuple[bool, str]:
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
         return (True, "")
 
     def store_order(order: dict) -> None:
@@ -314,12 +379,38 @@ def test_handler(monkeypatch, lambda_module, context, order):
     compare_dict(order, response["order"])
 
 
+def test_handler_no_time_left(monkeypatch, lambda_module, context, order):
+    """
+    Test handler() without enough time left to validate the order
+    """
+
+    def validate_fail(order: dict, timeout: float) -> Tuple[bool, str]:
+        raise AssertionError("validation should not run")
+
+    monkeypatch.setattr(lambda_module, "validate_delivery", validate_fail)
+    monkeypatch.setattr(lambda_module, "validate_payment", validate_fail)
+    monkeypatch.setattr(lambda_module, "validate_products", validate_fail)
+    monkeypatch.setattr(context, "get_remaining_time_in_millis", lambda: 500)
+
+    user_id = order["userId"]
+    order = copy.deepcopy(order)
+    del order["userId"]
+
+    response = lambda_module.handler({
+        "order": order,
+        "userId": user_id
+    }, context)
+
+    assert response["success"] == False
+    assert response["errors"] == ["Not enough time left to validate the order"]
+
+
 def test_handler_wrong_event(monkeypatch, lambda_module, context, order):
     """
     Test handler() with an incorrect event
     """
 
-    def validate_true(order: dict) -> Tuple[bool, str]:
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
         return (True, "")
 
     def store_order(order: dict) -> None:
@@ -344,7 +435,7 @@ def test_handler_wrong_order(monkeypatch, lambda_module, context, order):
     Test handler() with an incorrect order
     """
 
-    def validate_true(order: dict) -> Tuple[bool, str]:
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
         return (True, "")
 
     def store_order(order: dict) -> None:
@@ -375,7 +466,7 @@ def test_handler_validation_failure(monkeypatch, lambda_module, context, order):
     Test handler() with failing validation
     """
 
-    def validate_true(order: dict) -> Tuple[bool, str]:
+    def validate_true(order: dict, timeout: float) -> Tuple[bool, str]:
         return (False, "Something went wrong")
 
     def store_order(order: dict) -> None:
@@ -1,5 +1,4 @@
 import json
-from boto3.dynamodb.types import TypeSerializer
 from botocore import stub
 import pytest
 from fixtures import context, lambda_module, get_order, get_product # pylint: disable=import-error
@@ -21,30 +20,64 @@ def order(get_order):
     return get_order()
 
 
+def test_compile_conditions(lambda_module):
+    """
+    Test compile_conditions()
+    """
+
+    conditions = lambda_module.compile_conditions(lambda_module.STATE_MACHINE)
+
+    assert conditions == {
+        "PACKAGED": ("#s IN (:from0)", {":from0": "NEW"}),
+        "PACKAGING_FAILED": ("#s IN (:from0)", {":from0": "NEW"}),
+        "FULFILLED": ("#s IN (:from0)", {":from0": "PACKAGED"}),
+        "DELIVERY_FAILED": ("#s IN (:from0)", {":from0": "PACKAGED"})
+    }
+
+    conditions = lambda_module.compile_conditions({"A": ["C"], "B": ["C"], "C": []})
+    assert conditions == {"C": ("#s IN (:from0, :from1)", {":from0": "A", ":from1": "B"})}
+
+
+def test_reachable(lambda_module):
+    """
+    Test reachable()
+    """
+
+    state_machine = lambda_module.STATE_MACHINE
+
+    assert lambda_module.reachable(state_machine, "NEW", "PACKAGED")
+    assert lambda_module.reachable(state_machine, "NEW", "FULFILLED")
+    assert not lambda_module.reachable(state_machine, "PACKAGED", "PACKAGED")
+    assert not lambda_module.reachable(state_machine, "FULFILLED", "PACKAGED")
+    assert not lambda_module.reachable(state_machine, "PACKAGING_FAILED", "FULFILLED")
+
+
 def test_update_order(lambda_module):
     """
     test update_order()
     """
 
     order_id = "ORDER_ID"
-    status = "STATUS"
+    status = "FULFILLED"
 
     table = stub.Stubber(lambda_module.table.meta.client)
     expected_params = {
         "TableName": "TABLE_NAME",
         "Key": {"orderId": order_id},
-        "UpdateExpression": stub.ANY,
+        "UpdateExpression": "set #s = :s",
+        "ConditionExpression": "#s IN (:from0)",
         "ExpressionAttributeNames": {
             "#s": "status"
         },
         "ExpressionAttributeValues": {
-            ":s": status
+            ":s": status,
+            ":from0": "PACKAGED"
         }
     }
     table.add_response("update_item", {}, expected_params)
     table.activate()
 
-    lambda_module.update_order(order_id, status)
+    assert lambda_module.update_order(order_id, status) == True
 
     table.assert_no_pending_responses()
     table.deactivate()
@@ -56,46 +89,79 @@ def test_update_order_products(lambda_module, order):
     """
 
     order_id = "ORDER_ID"
-    status = "STATUS"
+    status = "PACKAGED"
 
+    # A single write, without reading the order first
     table = stub.Stubber(lambda_module.table.meta.client)
-    # get_item stub
-    expected_params = {
-        "TableName": "TABLE_NAME",
-        "Key": {"orderId": order_id},
-        "AttributesToGet": ["products"]
-    }
-    response = {
-        "Item": {
-            k: TypeSerializer().serialize(v)
-            for k, v in order.items()
-        }
-    }
-    print(response)
-    table.add_response("get_item", response, expected_params)
-    # update_item stub
     expected_params = {
         "TableName": "TABLE_NAME",
         "Key": {"orderId": order_id},
-        "UpdateExpression": stub.ANY,
+        "UpdateExpression": "set #s = :s, #p = :p",
+        "ConditionExpression": "#s IN (:from0)",
         "ExpressionAttributeNames": {
             "#s": "status",
             "#p": "products"
         },
         "ExpressionAttributeValues": {
             ":p": order["products"],
-            ":s": status
+            ":s": status,
+            ":from0": "NEW"
         }
     }
     table.add_response("update_item", {}, expected_params)
     table.activate()
 
-    lambda_module.update_order(order_id, status, order["products"])
+    assert lambda_module.update_order(order_id, status, order["products"]) == True
 
     table.assert_no_pending_responses()
     table.deactivate()
 
 
+def test_update_order_rejected(lambda_module):
+    """
+    Duplicate and stale events are ignored, and events that arrive too early
+    are retried
+    """
+
+    test_cases = [
+        # Duplicate
+        ("FULFILLED", {"status": {"S": "FULFILLED"}}, False),
+        # Stale
+        ("PACKAGED", {"status": {"S": "FULFILLED"}}, False),
+        ("DELIVERY_FAILED", {"status": {"S": "PACKAGING_FAILED"}}, False),
+        # Unknown order
+        ("PACKAGED", None, False),
+        # Too early
+        ("FULFILLED", {"status": {"S": "NEW"}}, True)
+    ]
+
+    for status, item, raises in test_cases:
+        table = stub.Stubber(lambda_module.table.meta.client)
+        table.add_client_error(
+            "update_item",
+            service_error_code="ConditionalCheckFailedException",
+            http_status_code=400
+        )
+        # Only the status is read
+        table.add_response("get_item", {"Item": item} if item is not None else {}, {
+            "TableName": "TABLE_NAME",
+            "Key": {"orderId": "ORDER_ID"},
+            "ProjectionExpression": "#s",
+            "ExpressionAttributeNames": {"#s": "status"},
+            "ConsistentRead": True
+        })
+        table.activate()
+
+        if raises:
+            with pytest.raises(lambda_module.OutOfOrderEvent):
+                lambda_module.update_order("ORDER_ID", status)
+        else:
+            assert lambda_module.update_order("ORDER_ID", status) == False
+
+        table.assert_no_pending_responses()
+        table.deactivate()
+
+
 def test_handler(monkeypatch, lambda_module, context, order):
     """
     Test handler()
@@ -140,13 +206,18 @@ def test_handler(monkeypatch, lambda_module, context, order):
     }]
 
     for test_case in test_cases:
-        def update_order(order_id: str, status: str, products=None) -> None:
-            assert test_case["called"]
+        def update_orders(updates: list) -> dict:
+            if not test_case["called"]:
+                assert updates == []
+                return {}
+            assert len(updates) == 1
+            order_id, status, products = updates[0]
             assert order_id == "ORDER_ID"
             assert status == test_case["status"]
             if test_case.get("products", False):
                 assert products is not None
-        monkeypatch.setattr(lambda_module, "update_order", update_order)
+            return {order_id: lambda_module.UPDATED}
+        monkeypatch.setattr(lambda_module, "update_orders", update_orders)
 
         event = {
             "resources": ["ORDER_ID"],
@@ -154,4 +225,78 @@ def test_handler(monkeypatch, lambda_module, context, order):
             "detail-type": test_case["detail-type"],
             "detail": order
         }
-        lambda_module.handler(event, context)
\ No newline at end of file
+        lambda_module.handler(event, context)
+
+
+def test_update_orders(monkeypatch, lambda_module):
+    """
+    Test update_orders()
+    """
+
+    order_ids = ["ORDER_{}".format(i) for i in range(50)]
+    calls = []
+
+    def update_order(order_id: str, status: str, products=None) -> bool:
+        calls.append((order_id, status, products))
+        if order_id == "ORDER_1":
+            raise lambda_module.OutOfOrderEvent()
+        if order_id == "ORDER_2":
+            raise Exception("ProvisionedThroughputExceededException")
+        return order_id != "ORDER_3"
+
+    monkeypatch.setattr(lambda_module, "update_order", update_order)
+
+    retval = lambda_module.update_orders([(order_id, "FULFILLED", None) for order_id in order_ids])
+
+    assert sorted(calls) == sorted((order_id, "FULFILLED", None) for order_id in order_ids)
+    assert retval["ORDER_0"] == lambda_module.UPDATED
+    assert retval["ORDER_1"] == lambda_module.FAILED
+    assert retval["ORDER_2"] == lambda_module.FAILED
+    assert retval["ORDER_3"] == lambda_module.IGNORED
+    assert list(retval.keys()) == order_ids
+
+    assert lambda_module.update_orders([]) == {}
+
+
+def test_handler_retry(monkeypatch, lambda_module, context, order):
+    """
+    Retries of an event only update the orders that failed
+    """
+
+    event = {
+        "id": "EVENT_ID",
+        "resources": ["ORDER_1", "ORDER_2", "ORDER_3"],
+        "source": "ecommerce.delivery",
+        "detail-type": "DeliveryCompleted",
+        "detail": order
+    }
+    calls = []
+    failing = {"ORDER_2"}
+
+    def update_order(order_id: str, status: str, products=None) -> bool:
+        calls.append(order_id)
+        if order_id in failing:
+            raise lambda_module.OutOfOrderEvent()
+        return True
+
+    def add_metric(name, unit, value):
+        metrics[name] = metrics.get(name, 0) + value
+    metrics = {}
+
+    monkeypatch.setattr(lambda_module, "update_order", update_order)
+    monkeypatch.setattr(lambda_module, "applied", lambda_module.TTLCache())
+    monkeypatch.setattr(lambda_module.metrics, "add_metric", add_metric)
+
+    with pytest.raises(lambda_module.FailedOrders) as excinfo:
+        lambda_module.handler(event, context)
+    assert excinfo.value.order_ids == ["ORDER_2"]
+    assert sorted(calls) == ["ORDER_1", "ORDER_2", "ORDER_3"]
+
+    calls.clear()
+    failing.clear()
+    retval = lambda_module.handler(event, context)
+    assert calls == ["ORDER_2"]
+    assert retval == {"ORDER_2": lambda_module.UPDATED}
+
+    # Each order is counted once
+    assert metrics == {"orderFulfilled": 3}
\ No newline at end of file
@@ -154,25 +154,33 @@ def modify_data(order):
     return {"record": record, "event": event}
 
 
-def test_send_events(lambda_module, insert_data):
+def test_handler_failed_events(lambda_module, context, insert_data):
     """
-    Test send_events()
+    Test the Lambda function handler when events cannot be sent
     """
 
-    eventbridge = stub.Stubber(lambda_module.eventbridge)
-
-    events = [insert_data["event"]]
-    response = {}
-    expected_params = {"Entries": events}
+    event = {"Records": [insert_data["record"]]}
 
-    eventbridge.add_response("put_events", response, expected_params)
+    eventbridge = stub.Stubber(lambda_module.eventbridge)
+    insert_data["event"]["Time"] = stub.ANY
+    expected_params = {"Entries": [insert_data["event"]]}
+    # Entries rejected by EventBridge are retried
+    for _ in range(3):
+        eventbridge.add_response("put_events", {
+            "FailedEntryCount": 1,
+            "Entries": [{"ErrorCode": "InternalFailure", "ErrorMessage": "Failure"}]
+        }, expected_params)
     eventbridge.activate()
 
-    lambda_module.send_events(events)
+    response = lambda_module.handler(event, context)
 
     eventbridge.assert_no_pending_responses()
     eventbridge.deactivate()
 
+    assert response == {"batchItemFailures": [
+        {"itemIdentifier": insert_data["record"]["dynamodb"]["SequenceNumber"]}
+    ]}
+
 
 def test_handler(lambda_module, context, insert_data):
     """
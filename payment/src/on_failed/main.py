@@ -5,11 +5,11 @@ OnFailed Function
 
 import os
 import boto3
-import requests
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
 from aws_lambda_powertools import Metrics # pylint: disable=import-error
 from aws_lambda_powertools.metrics import MetricUnit # pylint: disable=import-error
+from ecom.http import Client # pylint: disable=import-error
 
 API_URL = os.environ["API_URL"]
 ENVIRONMENT = os.environ["ENVIRONMENT"]
@@ -21,6 +21,8 @@ table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name,no-member
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.payment") # pylint: disable=invalid-name
+# The 3rd party payment API does not use IAM authentication
+http_client = Client(sign=False) # pylint: disable=invalid-name
 
 
 @tracer.capture_method
@@ -53,7 +55,7 @@ def cancel_payment(payment_token: str) -> None:
     Cancel the payment request
     """
 
-    response = requests.post(API_URL+"/cancelPayment", json={
+    response = http_client.post(API_URL+"/cancelPayment", json={
         "paymentToken": payment_token
     })
 
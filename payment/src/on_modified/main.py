@@ -5,11 +5,11 @@ OnModified Function
 
 import os
 import boto3
-import requests
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
 from aws_lambda_powertools import Metrics # pylint: disable=import-error
 from aws_lambda_powertools.metrics import MetricUnit # pylint: disable=import-error
+from ecom.http import Client # pylint: disable=import-error
 
 
 API_URL = os.environ["API_URL"]
@@ -22,6 +22,8 @@ table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name,no-member
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.payment") # pylint: disable=invalid-name
+# The 3rd party payment API does not use IAM authentication
+http_client = Client(sign=False) # pylint: disable=invalid-name
 
 
 @tracer.capture_method
@@ -43,7 +45,7 @@ def update_payment_amount(payment_token: str, amount: int) -> None:
     Update the payment amount
     """
 
-    response = requests.post(API_URL+"/updateAmount", json={
+    response = http_client.post(API_URL+"/updateAmount", json={
         "paymentToken": payment_token,
         "amount": amount
     })
@@ -4,10 +4,10 @@ ValidateFunction
 
 import json
 import os
-import requests
 from aws_lambda_powertools.tracing import Tracer #pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger #pylint: disable=import-error
 from ecom.apigateway import iam_user_id, response # pylint: disable=import-error
+from ecom.http import Client # pylint: disable=import-error
 
 
 API_URL = os.environ["API_URL"]
@@ -16,6 +16,8 @@ ENVIRONMENT = os.environ["ENVIRONMENT"]
 
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
+# The 3rd party payment API does not use IAM authentication
+http_client = Client(sign=False) # pylint: disable=invalid-name
 
 
 @tracer.capture_method
@@ -25,7 +27,7 @@ def validate_payment_token(payment_token: str, total: int) -> bool:
     """
 
     # Send the request to the 3p service
-    res = requests.post(API_URL+"/check", json={
+    res = http_client.post(API_URL+"/check", json={
         "paymentToken": payment_token,
         "amount": total
     })
@@ -7,6 +7,7 @@ import os
 import boto3
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
+from ecom import listeners # pylint: disable=import-error
 from ecom.apigateway import response # pylint: disable=import-error
 
 
@@ -22,15 +23,31 @@ logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 
 
+@tracer.capture_method
+def bump_version(service_name: str):
+    """
+    Increment the version counter of the listeners of a service
+
+    OnEventsFunction caches the listeners of each service until their version
+    changes.
+    """
+
+    listeners.bump_version(table, service_name)
+
+
 @tracer.capture_method
 def delete_id(connection_id: str):
     """
     Delete the connectionId in DynamoDB
     """
 
-    table.delete_item(Key={
-        "id": connection_id
-    })
+    old_item = table.delete_item(
+        Key={"id": connection_id},
+        ReturnValues="ALL_OLD"
+    ).get("Attributes", {})
+
+    if "service" in old_item:
+        bump_version(old_item["service"])
 
 
 @logger.inject_lambda_context
@@ -3,59 +3,234 @@ OnEvents Lambda function
 """
 
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import os
-from typing import List
+from typing import Dict, Iterable, List
 import boto3
 from boto3.dynamodb.conditions import Key
+from botocore.config import Config
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
+from ecom import listeners # pylint: disable=import-error
+from ecom.cache import TTLCache # pylint: disable=import-error
+from ecom.dynamodb import query_all # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 API_URL = os.environ["LISTENER_API_URL"]
 TABLE_NAME = os.environ["LISTENER_TABLE_NAME"]
+# Maximum number of concurrent PostToConnection requests
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "32"))
+# Maximum time the listeners of a service are cached, in seconds
+SUBSCRIPTION_TTL = float(os.environ.get("SUBSCRIPTION_TTL", "60"))
+# Time between two reads of the version counter of a service, in seconds.
+# New listeners may miss events for up to this long.
+VERSION_TTL = float(os.environ.get("VERSION_TTL", "1"))
+# Maximum size of a frame of coalesced events, in bytes. API Gateway accepts
+# WebSocket messages of up to 128 KB.
+MAX_FRAME_SIZE = int(os.environ.get("MAX_FRAME_SIZE", str(128 * 1024)))
 
 
-apigwmgmt = boto3.client("apigatewaymanagementapi", endpoint_url=API_URL) # pylint: disable=invalid-name
+apigwmgmt = boto3.client( # pylint: disable=invalid-name
+    "apigatewaymanagementapi",
+    endpoint_url=API_URL,
+    # One connection per worker
+    config=Config(max_pool_connections=MAX_WORKERS)
+)
 dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
 table = dynamodb.Table(TABLE_NAME) # pylint: disable=invalid-name,no-member
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
+subscriptions = TTLCache(ttl=SUBSCRIPTION_TTL) # pylint: disable=invalid-name
+versions = TTLCache(ttl=VERSION_TTL) # pylint: disable=invalid-name
 
 
 @tracer.capture_method
 def get_connection_ids(service_name: str) -> List[str]:
     """
-    Retrieve connection IDs for a service name
+    Retrieve all connection IDs for a service name
     """
 
-    res = table.query(
+    return [c["id"] for c in query_all(
+        table.query,
         IndexName="listener-service",
         KeyConditionExpression=Key("service").eq(service_name),
-        # Only check for 100 connections
-        Limit=100
-    )
+        ProjectionExpression="#id",
+        ExpressionAttributeNames={"#id": "id"}
+    )]
 
-    return [c["id"] for c in res.get("Items", [])]
+
+@tracer.capture_method
+def get_version(service_name: str) -> int:
+    """
+    Retrieve the version counter of the listeners of a service
+
+    RegisterFunction and OnDisconnectFunction increment it when the listeners
+    change.
+    """
+
+    version = versions.get(service_name)
+    if version is None:
+        version = listeners.read_version(table, service_name)
+        versions.put(service_name, version)
+    return version
+
+
+def get_listeners(service_name: str) -> List[str]:
+    """
+    Retrieve connection IDs for a service name, through the subscription
+    cache
+    """
+
+    # The version is read first, so that changes during the query bump the
+    # version again.
+    version = get_version(service_name)
+    entry = subscriptions.get(service_name)
+    if entry is not None and entry["version"] == version:
+        return entry["connectionIds"]
+
+    connection_ids = get_connection_ids(service_name)
+    subscriptions.put(service_name, {"version": version, "connectionIds": connection_ids})
+    return connection_ids
+
+
+@tracer.capture_method
+def bump_version(service_name: str):
+    """
+    Increment the version counter of the listeners of a service
+    """
+
+    listeners.bump_version(table, service_name)
+    subscriptions.invalidate(service_name)
+    versions.invalidate(service_name)
+
+
+def post(connection_id: str, data: bytes) -> bool:
+    """
+    Send data to a connection
+
+    Returns False if the connection is gone.
+    """
+
+    try:
+        apigwmgmt.post_to_connection(ConnectionId=connection_id, Data=data)
+    except apigwmgmt.exceptions.GoneException:
+        return False
+    except Exception as exc: # pylint: disable=broad-except
+        # Retrying the event would send it again to all other connections, so
+        # errors are only logged.
+        logger.warning({
+            "message": "Failed to send event to {}: {}".format(connection_id, exc),
+            "connectionId": connection_id
+        })
+    return True
+
+
+def post_frames(connection_id: str, frames: List[bytes]) -> bool:
+    """
+    Send frames to a connection, in order
+
+    Returns False if the connection is gone.
+    """
+
+    for frame in frames:
+        if not post(connection_id, frame):
+            return False
+    return True
 
 
 @tracer.capture_method
-def send_event(event: dict, connection_ids: List[str]):
+def send_frames(frames: List[bytes], connection_ids: List[str]) -> List[str]:
+    """
+    Send frames to a list of connection IDs
+
+    Connections receive their frames concurrently, and each connection
+    receives them in order. Returns the IDs of the connections that are gone.
+    """
+
+    if len(connection_ids) == 0 or len(frames) == 0:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(connection_ids))) as executor:
+        connected = executor.map(lambda connection_id: post_frames(connection_id, frames), connection_ids)
+        return [
+            connection_id
+            for connection_id, is_connected in zip(connection_ids, connected)
+            if not is_connected
+        ]
+
+
+def send_event(event: dict, connection_ids: List[str]) -> List[str]:
     """
     Send an event to a list of connection IDs
+
+    The event is serialized once, then sent to connections concurrently.
+    Returns the IDs of the connections that are gone.
     """
 
-    for connection_id in connection_ids:
-        try:
-            apigwmgmt.post_to_connection(
-                ConnectionId=connection_id,
-                Data=json.dumps(event).encode("utf-8")
-            )
-        # The client is disconnected, we can safely ignore and move to the
-        # next connection ID.
-        except apigwmgmt.exceptions.GoneException:
-            continue
+    return send_frames([json.dumps(event).encode("utf-8")], connection_ids)
+
+
+def build_frames(events: List[dict]) -> List[bytes]:
+    """
+    Serialize events into frames, each holding a JSON array of events
+
+    Frames hold as many consecutive events as fit in MAX_FRAME_SIZE. An event
+    that does not fit on its own is sent in a frame of its own.
+    """
+
+    frames = []
+    parts: List[bytes] = []
+    # Size of the frame: the opening bracket, then each event followed by a
+    # comma or the closing bracket.
+    size = 1
+    for event in events:
+        data = json.dumps(event).encode("utf-8")
+        if parts and size + len(data) + 1 > MAX_FRAME_SIZE:
+            frames.append(b"[" + b",".join(parts) + b"]")
+            parts, size = [], 1
+        parts.append(data)
+        size += len(data) + 1
+    if parts:
+        frames.append(b"[" + b",".join(parts) + b"]")
+    return frames
+
+
+def group_by_source(events: List[dict]) -> Dict[str, List[dict]]:
+    """
+    Group events by service name, keeping their order
+    """
+
+    groups: Dict[str, List[dict]] = {}
+    for event in events:
+        groups.setdefault(event["source"], []).append(event)
+    return groups
+
+
+@tracer.capture_method
+def delete_connection_ids(connection_ids: Iterable[str]):
+    """
+    Delete connections that are gone, with BatchWriteItem
+    """
+
+    with table.batch_writer() as batch:
+        for connection_id in connection_ids:
+            batch.delete_item(Key={"id": connection_id})
+
+
+def clean_up(service_name: str, gone_ids: List[str]):
+    """
+    Delete connections that are gone for a service name
+    """
+
+    if gone_ids:
+        logger.info({
+            "message": "Deleting {} stale connections".format(len(gone_ids)),
+            "serviceName": service_name
+        })
+        delete_connection_ids(gone_ids)
+        bump_version(service_name)
 
 
 @logger.inject_lambda_context
@@ -63,18 +238,80 @@ def send_event(event: dict, connection_ids: List[str]):
 def handler(event, _):
     """
     Lambda handler
+
+    The function receives events from EventBridge one at a time, or in
+    coalescing mode, batches of events buffered in an SQS queue. In the
+    latter case, each listener receives the events of its service as JSON
+    arrays of up to MAX_FRAME_SIZE bytes, and the messages of the services
+    that failed are returned as a partial batch response.
     """
 
-    # Get the service name
-    service_name = event["source"]
-    logger.debug({
-        "message": "Receive event from {}".format(service_name),
-        "serviceName": service_name,
-        "event": event
-    })
+    if "Records" not in event:
+        # Get the service name
+        service_name = event["source"]
+        logger.debug({
+            "message": "Receive event from {}".format(service_name),
+            "serviceName": service_name,
+            "event": event
+        })
 
-    # Get connection IDs
-    connection_ids = get_connection_ids(service_name)
+        # Get connection IDs
+        connection_ids = get_listeners(service_name)
+
+        # Send event to connected users
+        gone_ids = send_event(event, connection_ids)
+
+        # Clean up disconnected clients
+        clean_up(service_name, gone_ids)
+        return
+
+    # Messages are only reported as failed, and delivered again by SQS, when
+    # none of their events were sent, so listeners do not get duplicates.
+    failures = []
+    events = []
+    message_ids: Dict[str, List[str]] = {}
+    for record in event["Records"]:
+        try:
+            service_event = json.loads(record["body"])
+            message_ids.setdefault(service_event["source"], []).append(record["messageId"])
+            events.append(service_event)
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.error({
+                "message": "Invalid message {}: {}".format(record["messageId"], exc),
+                "messageId": record["messageId"]
+            })
+            failures.append(record["messageId"])
+
+    for service_name, service_events in group_by_source(events).items():
+        logger.debug({
+            "message": "Receive {} events from {}".format(len(service_events), service_name),
+            "serviceName": service_name,
+            "events": service_events
+        })
+
+        try:
+            connection_ids = get_listeners(service_name)
+        except Exception as exc: # pylint: disable=broad-except
+            logger.error({
+                "message": "Failed to get the listeners of {}: {}".format(service_name, exc),
+                "serviceName": service_name
+            })
+            failures.extend(message_ids[service_name])
+            continue
+
+        gone_ids = send_frames(build_frames(service_events), connection_ids)
+        try:
+            clean_up(service_name, gone_ids)
+        except Exception as exc: # pylint: disable=broad-except
+            # The connections are still gone, and the next events find them
+            logger.warning({
+                "message": "Failed to delete stale connections of {}: {}".format(service_name, exc),
+                "serviceName": service_name
+            })
 
-    # Send event to connected users
-    send_event(event, connection_ids)
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id}
+            for message_id in failures
+        ]
+    }
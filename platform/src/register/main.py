@@ -9,6 +9,7 @@ import os
 import boto3
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
+from ecom import listeners # pylint: disable=import-error
 from ecom.apigateway import response # pylint: disable=import-error
 
 
@@ -22,6 +23,18 @@ logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 
 
+@tracer.capture_method
+def bump_version(service_name: str):
+    """
+    Increment the version counter of the listeners of a service
+
+    OnEventsFunction caches the listeners of each service until their version
+    changes.
+    """
+
+    listeners.bump_version(table, service_name)
+
+
 @tracer.capture_method
 def register_service(connection_id: str, service_name: str):
     """
@@ -30,11 +43,19 @@ def register_service(connection_id: str, service_name: str):
 
     ttl = datetime.datetime.now() + datetime.timedelta(days=1)
 
-    table.put_item(Item={
-        "id": connection_id,
-        "service": service_name,
-        "ttl": int(ttl.timestamp())
-    })
+    old_item = table.put_item(
+        Item={
+            "id": connection_id,
+            "service": service_name,
+            "ttl": int(ttl.timestamp())
+        },
+        ReturnValues="ALL_OLD"
+    ).get("Attributes", {})
+
+    bump_version(service_name)
+    # The connection was listening to another service
+    if old_item.get("service") not in (None, service_name):
+        bump_version(old_item["service"])
 
 
 @logger.inject_lambda_context
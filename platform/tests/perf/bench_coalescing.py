@@ -0,0 +1,93 @@
+"""
+Benchmark for the coalescing mode of OnEvents
+
+This compares sending a burst of events to the listeners of a service one
+event at a time, as EventBridge invokes the function for each event, with the
+coalescing mode, where the function receives the burst as a batch of SQS
+messages and sends each listener frames holding arrays of events.
+
+The API Gateway Management API is the stub server of bench_on_events.py,
+which answers after POST_LATENCY_MS.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python platform/tests/perf/bench_coalescing.py
+"""
+
+
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_on_events import StubTable, serve # pylint: disable=import-error,wrong-import-position
+
+
+LISTENERS = 500
+# Number of events in the burst
+BURST = 20
+SERVICE_NAME = "ecommerce.orders"
+EVENTS = [{
+    "source": SERVICE_NAME,
+    "detail-type": "OrderCreated",
+    "detail": {"orderId": str(uuid.uuid4()), "products": [{"productId": str(i), "quantity": 1} for i in range(10)]}
+} for _ in range(BURST)]
+
+
+def main():
+    """
+    Run the benchmark
+    """
+
+    random.seed(42)
+    connection_ids = [str(uuid.uuid4()) for _ in range(LISTENERS)]
+
+    received = multiprocessing.Value("i", 0)
+    port = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=serve, args=(set(), received, port), daemon=True)
+    server.start()
+    while port.value == 0:
+        time.sleep(0.01)
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "AWS_ACCESS_KEY_ID")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "AWS_SECRET_ACCESS_KEY")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    os.environ["ENVIRONMENT"] = "bench"
+    os.environ["LISTENER_TABLE_NAME"] = "LISTENER_TABLE_NAME"
+    os.environ["LISTENER_API_URL"] = "http://127.0.0.1:{}/prod/".format(port.value)
+    os.environ["POWERTOOLS_TRACE_DISABLED"] = "true"
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "on_events"))
+    import main as on_events # pylint: disable=import-error,import-outside-toplevel
+
+    on_events.table = StubTable(connection_ids)
+
+    # One event at a time
+    start = time.perf_counter()
+    for event in EVENTS:
+        on_events.send_event(event, connection_ids)
+    single_time = time.perf_counter() - start
+    single_posts = received.value
+
+    # Coalescing mode
+    received.value = 0
+    start = time.perf_counter()
+    frames = on_events.build_frames(EVENTS)
+    on_events.send_frames(frames, connection_ids)
+    coalesced_time = time.perf_counter() - start
+    coalesced_posts = received.value
+
+    server.terminate()
+
+    print("{:<30} {:>10} {:>9}".format("method", "posts", "time"))
+    print("{:<30} {:>10} {:>8.2f}s".format("one event at a time", single_posts, single_time))
+    print("{:<30} {:>10} {:>8.2f}s".format(
+        "coalesced ({} frames)".format(len(frames)), coalesced_posts, coalesced_time
+    ))
+
+
+if __name__ == "__main__":
+    main()
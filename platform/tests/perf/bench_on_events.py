@@ -0,0 +1,215 @@
+"""
+Benchmark for the OnEvents broadcast
+
+This compares the previous broadcast, which reads the first 100 listeners and
+sends the event to one connection at a time, with the concurrent broadcast of
+OnEventsFunction, for a service with 10,000 listeners.
+
+The API Gateway Management API is a local stub server, in a separate process
+so it does not compete with the broadcast for the GIL. It answers after
+POST_LATENCY_MS, and returns GoneException for a share of the connections.
+The listener table is an in-memory stand-in that returns pages of 1 MB worth
+of connections.
+
+The previous broadcast only reaches the first 100 listeners. The time it
+would take to reach all of them is estimated from its time per connection.
+The concurrent broadcast is bound by the CPU time botocore spends to sign and
+send each request once POST_LATENCY_MS is covered by the workers.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python platform/tests/perf/bench_on_events.py
+"""
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+
+
+LISTENERS = 10000
+SERVICE_NAME = "ecommerce.orders"
+# Share of connections that are gone
+GONE_RATE = 0.02
+# Latency of PostToConnection from Lambda
+POST_LATENCY_MS = 20
+# Number of items per Query page for connection IDs
+PAGE_SIZE = 5000
+EVENT = {
+    "source": SERVICE_NAME,
+    "detail-type": "OrderCreated",
+    "detail": {"orderId": str(uuid.uuid4()), "products": [{"productId": str(i), "quantity": 1} for i in range(10)]}
+}
+
+
+class ManagementApiHandler(BaseHTTPRequestHandler):
+    """
+    Stub for PostToConnection
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    gone_ids = set()
+    received = None
+
+    def do_POST(self): # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(POST_LATENCY_MS / 1000)
+        connection_id = self.path.rsplit("/", 1)[-1]
+        if connection_id in self.gone_ids:
+            body = json.dumps({"message": "Gone"}).encode("utf-8")
+            self.send_response(410)
+            self.send_header("x-amzn-ErrorType", "GoneException")
+        else:
+            with self.received.get_lock():
+                self.received.value += 1
+            body = b""
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+
+class StubTable:
+    """
+    In-memory stand-in for the listener table
+    """
+
+    def __init__(self, connection_ids):
+        self.connection_ids = connection_ids
+        self.deleted = []
+        self.queries = 0
+
+    def query(self, Limit=None, ExclusiveStartKey=None, **_): # pylint: disable=invalid-name
+        """
+        Query the listener-service index
+        """
+
+        self.queries += 1
+        start = 0 if ExclusiveStartKey is None else self.connection_ids.index(ExclusiveStartKey["id"]) + 1
+        end = start + min(Limit or PAGE_SIZE, PAGE_SIZE)
+        res = {"Items": [{"id": connection_id} for connection_id in self.connection_ids[start:end]]}
+        if end < len(self.connection_ids):
+            res["LastEvaluatedKey"] = {"id": self.connection_ids[end-1], "service": SERVICE_NAME}
+        return res
+
+    def batch_writer(self):
+        """
+        Batch writer that records deleted keys
+        """
+
+        table = self
+
+        class BatchWriter:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def delete_item(self, Key): # pylint: disable=invalid-name
+                table.deleted.append(Key["id"])
+
+        return BatchWriter()
+
+
+def serve(gone_ids: set, received, port) -> None:
+    """
+    Run the stub server, and write its port once it is ready
+    """
+
+    ManagementApiHandler.gone_ids = gone_ids
+    ManagementApiHandler.received = received
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ManagementApiHandler)
+    server.daemon_threads = True
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+
+def legacy_broadcast(main, event: dict) -> int:
+    """
+    Previous broadcast: first 100 connections, one post at a time
+
+    Returns the number of connections the event was sent to.
+    """
+
+    res = main.table.query(
+        IndexName="listener-service",
+        KeyConditionExpression=None,
+        Limit=100
+    )
+    connection_ids = [c["id"] for c in res.get("Items", [])]
+    for connection_id in connection_ids:
+        try:
+            main.apigwmgmt.post_to_connection(
+                ConnectionId=connection_id,
+                Data=json.dumps(event).encode("utf-8")
+            )
+        except main.apigwmgmt.exceptions.GoneException:
+            continue
+    return len(connection_ids)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+
+    random.seed(42)
+    connection_ids = [str(uuid.uuid4()) for _ in range(LISTENERS)]
+    gone_ids = set(random.sample(connection_ids, int(LISTENERS * GONE_RATE)))
+
+    received = multiprocessing.Value("i", 0)
+    port = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=serve, args=(gone_ids, received, port), daemon=True)
+    server.start()
+    while port.value == 0:
+        time.sleep(0.01)
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "AWS_ACCESS_KEY_ID")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "AWS_SECRET_ACCESS_KEY")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+    os.environ["ENVIRONMENT"] = "bench"
+    os.environ["LISTENER_TABLE_NAME"] = "LISTENER_TABLE_NAME"
+    os.environ["LISTENER_API_URL"] = "http://127.0.0.1:{}/prod/".format(port.value)
+    os.environ["POWERTOOLS_TRACE_DISABLED"] = "true"
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "on_events"))
+    import main as on_events # pylint: disable=import-error,import-outside-toplevel
+
+    # Legacy broadcast
+    on_events.table = StubTable(connection_ids)
+    start = time.perf_counter()
+    legacy_count = legacy_broadcast(on_events, EVENT)
+    legacy_time = time.perf_counter() - start
+
+    # Concurrent broadcast
+    received.value = 0
+    table = StubTable(connection_ids)
+    on_events.table = table
+    start = time.perf_counter()
+    on_events.delete_connection_ids(on_events.send_event(EVENT, on_events.get_connection_ids(SERVICE_NAME)))
+    broadcast_time = time.perf_counter() - start
+
+    server.terminate()
+
+    print("{:<30} {:>10} {:>10} {:>9}".format("method", "delivered", "deleted", "time"))
+    print("{:<30} {:>10} {:>10} {:>8.2f}s".format("legacy", legacy_count, 0, legacy_time))
+    print("{:<30} {:>10} {:>10} {:>8.2f}s".format(
+        "legacy, all pages (estimated)", LISTENERS - len(gone_ids), 0, legacy_time / legacy_count * LISTENERS
+    ))
+    print("{:<30} {:>10} {:>10} {:>8.2f}s".format(
+        "concurrent ({} workers)".format(on_events.MAX_WORKERS),
+        received.value, len(table.deleted), broadcast_time
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import uuid
 from botocore import stub
 import pytest
 from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
-from helpers import mock_table # pylint: disable=import-error,no-name-in-module
 
 
 lambda_module = pytest.fixture(scope="module", params=[{
@@ -24,10 +23,41 @@ def test_delete_id(lambda_module):
     """
 
     connection_id = str(uuid.uuid4())
-    table = mock_table(
-        lambda_module.table, "delete_item", ["id"],
-        items={"id": connection_id}
-    )
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("delete_item", {"Attributes": {
+        "id": {"S": connection_id},
+        "service": {"S": "ecommerce.test"}
+    }}, {
+        "TableName": "TABLE_NAME",
+        "Key": {"id": connection_id},
+        "ReturnValues": "ALL_OLD"
+    })
+    table.add_response("update_item", {}, {
+        "TableName": "TABLE_NAME",
+        "Key": {"id": "version#ecommerce.test"},
+        "UpdateExpression": "ADD #version :one",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ExpressionAttributeValues": {":one": 1}
+    })
+    table.activate()
+
+    lambda_module.delete_id(connection_id)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+def test_delete_id_unregistered(lambda_module):
+    """
+    Test delete_id() with a connection that did not register
+    """
+
+    connection_id = str(uuid.uuid4())
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("delete_item", {"Attributes": {"id": {"S": connection_id}}})
+    table.activate()
 
     lambda_module.delete_id(connection_id)
 
@@ -1,7 +1,7 @@
 import json
+import threading
 from typing import List
 import uuid
-from boto3.dynamodb.types import TypeSerializer
 from botocore import stub
 import pytest
 from fixtures import context, lambda_module # pylint: disable=import-error
@@ -26,56 +26,184 @@ def test_get_connection_ids(lambda_module):
     """
 
     service_name = "ecommerce.test"
-    connection_ids = [str(uuid.uuid4()) for _ in range(100)]
+    connection_ids = [str(uuid.uuid4()) for _ in range(150)]
 
     table = stub.Stubber(lambda_module.table.meta.client)
-    response = {
-        "Items": [{
-            "service": {"S": service_name},
-            "id": {"S": connection_id}
-        } for connection_id in connection_ids]
-    }
     expected_params = {
         "TableName": "TABLE_NAME",
         "IndexName": "listener-service",
         "KeyConditionExpression": stub.ANY,
-        "Limit": stub.ANY
+        "ProjectionExpression": "#id",
+        "ExpressionAttributeNames": {"#id": "id"}
     }
-    table.add_response("query", response, expected_params)
+    # Connections are read until the last page
+    table.add_response("query", {
+        "Items": [{"id": {"S": connection_id}} for connection_id in connection_ids[:100]],
+        "LastEvaluatedKey": {"id": {"S": connection_ids[99]}, "service": {"S": service_name}}
+    }, expected_params)
+    table.add_response("query", {
+        "Items": [{"id": {"S": connection_id}} for connection_id in connection_ids[100:]]
+    }, dict(expected_params, ExclusiveStartKey={"id": connection_ids[99], "service": service_name}))
     table.activate()
 
     retval = lambda_module.get_connection_ids(service_name)
 
-    for connection_id in connection_ids:
-        assert connection_id in retval
+    assert retval == connection_ids
 
     table.assert_no_pending_responses()
     table.deactivate()
 
 
-def test_send_event(lambda_module):
+def test_get_listeners(monkeypatch, lambda_module):
+    """
+    Listeners are cached until their version changes
+    """
+
+    service_name = "ecommerce.cached"
+    clock = {"now": 0}
+    monkeypatch.setattr(lambda_module, "subscriptions", lambda_module.TTLCache(ttl=60, clock=lambda: clock["now"]))
+    monkeypatch.setattr(lambda_module, "versions", lambda_module.TTLCache(ttl=1, clock=lambda: clock["now"]))
+    queries = []
+
+    def get_connection_ids(service_name_got: str) -> List[str]:
+        queries.append(service_name_got)
+        return ["id-{}".format(len(queries))]
+
+    monkeypatch.setattr(lambda_module, "get_connection_ids", get_connection_ids)
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    for version in ["1", "1", "2"]:
+        table.add_response("get_item", {"Item": {"version": {"N": version}}}, {
+            "TableName": "TABLE_NAME",
+            "Key": {"id": "version#" + service_name},
+            "ProjectionExpression": "#version",
+            "ExpressionAttributeNames": {"#version": "version"}
+        })
+    table.activate()
+
+    # The version is only read once per VERSION_TTL
+    assert lambda_module.get_listeners(service_name) == ["id-1"]
+    assert lambda_module.get_listeners(service_name) == ["id-1"]
+    # Same version
+    clock["now"] = 1
+    assert lambda_module.get_listeners(service_name) == ["id-1"]
+    # New version
+    clock["now"] = 2
+    assert lambda_module.get_listeners(service_name) == ["id-2"]
+    assert queries == [service_name, service_name]
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+class FakeManagementApi:
+    """
+    Thread-safe stand-in for the API Gateway Management API client
+    """
+
+    def __init__(self, exceptions, gone_ids=()):
+        self.exceptions = exceptions
+        self.gone_ids = set(gone_ids)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes): # pylint: disable=invalid-name
+        with self._lock:
+            self.calls.append((ConnectionId, Data))
+        if ConnectionId in self.gone_ids:
+            raise self.exceptions.GoneException({"Error": {"Code": "GoneException"}}, "PostToConnection")
+        if ConnectionId == "error":
+            raise self.exceptions.LimitExceededException({"Error": {"Code": "LimitExceededException"}}, "PostToConnection")
+
+
+def test_send_event(monkeypatch, lambda_module):
     """
     Test send_event()
     """
 
     event = {"message": "sample_payload"}
     event_bytes = json.dumps(event).encode("utf-8")
-    connection_ids = [str(uuid.uuid4()) for _ in range(100)]
+    connection_ids = [str(uuid.uuid4()) for _ in range(100)] + ["error"]
+    gone_ids = connection_ids[10:20]
+
+    apigw_mock = FakeManagementApi(lambda_module.apigwmgmt.exceptions, gone_ids)
+    monkeypatch.setattr(lambda_module, "apigwmgmt", apigw_mock)
+
+    retval = lambda_module.send_event(event, connection_ids)
+
+    assert retval == gone_ids
+    assert sorted(apigw_mock.calls) == sorted((connection_id, event_bytes) for connection_id in connection_ids)
+
+
+def test_send_event_empty(lambda_module):
+    """
+    Test send_event() without connections
+    """
+
+    assert lambda_module.send_event({"message": "sample_payload"}, []) == []
+
+
+def test_send_frames(monkeypatch, lambda_module):
+    """
+    Connections receive frames in order, until they are gone
+    """
+
+    frames = [b"[1]", b"[2]", b"[3]"]
+    connection_ids = [str(uuid.uuid4()) for _ in range(20)]
+    gone_ids = connection_ids[:2]
+
+    apigw_mock = FakeManagementApi(lambda_module.apigwmgmt.exceptions, gone_ids)
+    monkeypatch.setattr(lambda_module, "apigwmgmt", apigw_mock)
+
+    retval = lambda_module.send_frames(frames, connection_ids)
 
-    apigw_mock = stub.Stubber(lambda_module.apigwmgmt)
-    response = {}
+    assert retval == gone_ids
     for connection_id in connection_ids:
-        expected_params = {
-            "ConnectionId": connection_id,
-            "Data": event_bytes
-        }
-        apigw_mock.add_response("post_to_connection", response, expected_params)
-    apigw_mock.activate()
+        received = [data for connection_id_got, data in apigw_mock.calls if connection_id_got == connection_id]
+        assert received == (frames[:1] if connection_id in gone_ids else frames)
 
-    lambda_module.send_event(event, connection_ids)
 
-    apigw_mock.assert_no_pending_responses()
-    apigw_mock.deactivate()
+def test_build_frames(monkeypatch, lambda_module):
+    """
+    Test build_frames()
+    """
+
+    events = [{"id": str(i)} for i in range(10)]
+    size = len(json.dumps(events[0]))
+    # Room for three events per frame
+    monkeypatch.setattr(lambda_module, "MAX_FRAME_SIZE", 3 * (size + 1) + 1)
+
+    retval = lambda_module.build_frames(events)
+
+    assert [json.loads(frame) for frame in retval] == [events[0:3], events[3:6], events[6:9], events[9:10]]
+    assert all(len(frame) <= lambda_module.MAX_FRAME_SIZE for frame in retval)
+
+    # Events larger than a frame are sent on their own
+    large = {"id": "x" * 100}
+    retval = lambda_module.build_frames([events[0], large, events[1]])
+    assert [json.loads(frame) for frame in retval] == [[events[0]], [large], [events[1]]]
+
+    assert lambda_module.build_frames([]) == []
+
+
+def test_delete_connection_ids(lambda_module):
+    """
+    Test delete_connection_ids()
+    """
+
+    connection_ids = [str(uuid.uuid4()) for _ in range(30)]
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    for chunk in [connection_ids[:25], connection_ids[25:]]:
+        table.add_response("batch_write_item", {"UnprocessedItems": {}}, {"RequestItems": {"TABLE_NAME": [
+            {"DeleteRequest": {"Key": {"id": connection_id}}} for connection_id in chunk
+        ]}})
+    table.activate()
+
+    lambda_module.delete_connection_ids(connection_ids)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
 
 
 def test_handler(monkeypatch, lambda_module, context):
@@ -91,24 +219,113 @@ def test_handler(monkeypatch, lambda_module, context):
     connection_ids = [str(uuid.uuid4()) for _ in range(100)]
 
     called = {
-        "get_connection_ids": False,
-        "send_event": False
+        "get_listeners": False,
+        "send_event": False,
+        "delete_connection_ids": False,
+        "bump_version": False
     }
 
-    def get_connection_ids(service_name_got: str) -> List[str]:
-        assert service_name == service_name
-        called["get_connection_ids"] = True
+    def get_listeners(service_name_got: str) -> List[str]:
+        assert service_name == service_name_got
+        called["get_listeners"] = True
         return connection_ids
 
-    def send_event(event_got: dict, connection_ids_got: list):
+    def send_event(event_got: dict, connection_ids_got: list) -> List[str]:
         assert event == event_got
         assert connection_ids == connection_ids_got
         called["send_event"] = True
+        return connection_ids[:5]
 
-    monkeypatch.setattr(lambda_module, "get_connection_ids", get_connection_ids)
+    def delete_connection_ids(connection_ids_got: list):
+        assert connection_ids[:5] == connection_ids_got
+        called["delete_connection_ids"] = True
+
+    def bump_version(service_name_got: str):
+        assert service_name == service_name_got
+        called["bump_version"] = True
+
+    monkeypatch.setattr(lambda_module, "get_listeners", get_listeners)
+    monkeypatch.setattr(lambda_module, "bump_version", bump_version)
     monkeypatch.setattr(lambda_module, "send_event", send_event)
+    monkeypatch.setattr(lambda_module, "delete_connection_ids", delete_connection_ids)
 
     lambda_module.handler(event, context)
 
     for k in called.keys():
-        assert called[k] == True
\ No newline at end of file
+        assert called[k] == True
+
+
+def test_handler_coalescing(monkeypatch, lambda_module, context):
+    """
+    Test handler() with a batch of events from SQS
+    """
+
+    events = [
+        {"source": "ecommerce.orders", "detail": {"orderId": "1"}},
+        {"source": "ecommerce.delivery", "detail": {"orderId": "1"}},
+        {"source": "ecommerce.orders", "detail": {"orderId": "2"}}
+    ]
+    event = {"Records": [
+        {"messageId": str(uuid.uuid4()), "eventSource": "aws:sqs", "body": json.dumps(e)}
+        for e in events
+    ]}
+    listeners = {
+        "ecommerce.orders": ["orders-1", "orders-2", "gone"],
+        "ecommerce.delivery": ["delivery-1"]
+    }
+
+    apigw_mock = FakeManagementApi(lambda_module.apigwmgmt.exceptions, ["gone"])
+    monkeypatch.setattr(lambda_module, "apigwmgmt", apigw_mock)
+    monkeypatch.setattr(lambda_module, "get_listeners", lambda service_name: listeners[service_name])
+    deleted = []
+    bumped = []
+    monkeypatch.setattr(lambda_module, "delete_connection_ids", deleted.extend)
+    monkeypatch.setattr(lambda_module, "bump_version", bumped.append)
+
+    assert lambda_module.handler(event, context) == {"batchItemFailures": []}
+
+    # One frame per connection, holding the events of its service in order
+    assert sorted((connection_id, json.loads(data)) for connection_id, data in apigw_mock.calls) == sorted([
+        ("delivery-1", [events[1]]),
+        ("gone", [events[0], events[2]]),
+        ("orders-1", [events[0], events[2]]),
+        ("orders-2", [events[0], events[2]])
+    ], key=lambda call: call[0])
+    assert deleted == ["gone"]
+    assert bumped == ["ecommerce.orders"]
+
+
+def test_handler_coalescing_failures(monkeypatch, lambda_module, context):
+    """
+    Test handler() with a batch of events from SQS, where some services
+    fail
+    """
+
+    events = [
+        {"source": "ecommerce.orders", "detail": {"orderId": "1"}},
+        {"source": "ecommerce.delivery", "detail": {"orderId": "1"}},
+        {"source": "ecommerce.delivery", "detail": {"orderId": "2"}}
+    ]
+    records = [
+        {"messageId": str(uuid.uuid4()), "eventSource": "aws:sqs", "body": json.dumps(e)}
+        for e in events
+    ] + [{"messageId": str(uuid.uuid4()), "eventSource": "aws:sqs", "body": "not json"}]
+
+    def get_listeners(service_name):
+        if service_name == "ecommerce.delivery":
+            raise Exception("Throttled")
+        return ["orders-1"]
+
+    apigw_mock = FakeManagementApi(lambda_module.apigwmgmt.exceptions, [])
+    monkeypatch.setattr(lambda_module, "apigwmgmt", apigw_mock)
+    monkeypatch.setattr(lambda_module, "get_listeners", get_listeners)
+
+    response = lambda_module.handler({"Records": records}, context)
+
+    # Only the messages that were not sent are delivered again
+    assert sorted(f["itemIdentifier"] for f in response["batchItemFailures"]) == sorted(
+        record["messageId"] for record in records[1:]
+    )
+    assert [(connection_id, json.loads(data)) for connection_id, data in apigw_mock.calls] == [
+        ("orders-1", [events[0]])
+    ]
\ No newline at end of file
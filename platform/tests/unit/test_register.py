@@ -3,7 +3,6 @@ import uuid
 from botocore import stub
 import pytest
 from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
-from helpers import mock_table # pylint: disable=import-error,no-name-in-module
 
 
 lambda_module = pytest.fixture(scope="module", params=[{
@@ -25,14 +24,25 @@ def test_register_service(lambda_module):
 
     connection_id = str(uuid.uuid4())
     service_name = "test"
-    table = mock_table(
-        lambda_module.table, "put_item", ["id"],
-        items={
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("put_item", {}, {
+        "TableName": "TABLE_NAME",
+        "Item": {
             "id": connection_id,
             "service": service_name,
             "ttl": stub.ANY
-        }
-    )
+        },
+        "ReturnValues": "ALL_OLD"
+    })
+    table.add_response("update_item", {}, {
+        "TableName": "TABLE_NAME",
+        "Key": {"id": "version#" + service_name},
+        "UpdateExpression": "ADD #version :one",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ExpressionAttributeValues": {":one": 1}
+    })
+    table.activate()
 
     lambda_module.register_service(connection_id, service_name)
 
@@ -40,6 +50,35 @@ def test_register_service(lambda_module):
     table.deactivate()
 
 
+def test_register_service_change(lambda_module):
+    """
+    Test register_service() with a connection that listened to another
+    service
+    """
+
+    connection_id = str(uuid.uuid4())
+
+    table = stub.Stubber(lambda_module.table.meta.client)
+    table.add_response("put_item", {"Attributes": {
+        "id": {"S": connection_id},
+        "service": {"S": "old"}
+    }})
+    for service_name in ["new", "old"]:
+        table.add_response("update_item", {}, {
+            "TableName": "TABLE_NAME",
+            "Key": {"id": "version#" + service_name},
+            "UpdateExpression": stub.ANY,
+            "ExpressionAttributeNames": stub.ANY,
+            "ExpressionAttributeValues": stub.ANY
+        })
+    table.activate()
+
+    lambda_module.register_service(connection_id, "new")
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
 def test_handler(monkeypatch, lambda_module, context, apigateway_event):
     """
     Test handler()
@@ -4,12 +4,11 @@ TableUpdateFunction
 
 
 import os
-from typing import List
 import boto3
 from boto3.dynamodb.types import TypeDeserializer
 from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.logging.logger import Logger
-from ecom.eventbridge import ddb_to_event # pylint: disable=import-error
+from ecom.eventbridge import ddb_to_event, put_record_events # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
@@ -22,18 +21,6 @@ logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 
 
-@tracer.capture_method
-def send_events(events: List[dict]):
-    """
-    Send events to EventBridge
-    """
-
-    logger.info("Sending %d events to EventBridge", len(events))
-    # EventBridge only supports batches of up to 10 events
-    for i in range(0, len(events), 10):
-        eventbridge.put_events(Entries=events[i:i+10])
-
-
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
 def handler(event, _):
@@ -51,9 +38,10 @@ def handler(event, _):
         "records": event.get("Records", [])
     })
 
+    records = event.get("Records", [])
     events = [
         ddb_to_event(record, EVENT_BUS_NAME, "ecommerce.products", "Product", "productId")
-        for record in event.get("Records", [])
+        for record in records
     ]
 
     logger.info("Received %d event(s)", len(events))
@@ -62,4 +50,5 @@ def handler(event, _):
         "events": events
     })
 
-    send_events(events)
+    # Report failed records, so Lambda retries from the first failed one
+    return put_record_events(eventbridge, records, events, logger)
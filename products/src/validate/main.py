@@ -3,41 +3,107 @@ ValidateFunction
 """
 
 
+from decimal import Decimal
+import hashlib
 import json
 import os
-from typing import List, Optional, Union, Set
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, Set
+import warnings
 import boto3
 from boto3.dynamodb.types import TypeDeserializer
 from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.logging.logger import Logger
+from aws_lambda_powertools import Metrics
+from aws_lambda_powertools.metrics import MetricUnit
 from ecom.apigateway import iam_user_id, response # pylint: disable=import-error
+from ecom.cache import TTLCache # pylint: disable=import-error
+from ecom.dynamodb import batch_get # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 TABLE_NAME = os.environ["TABLE_NAME"]
+# Maximum number of products kept in the cache
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", "1000"))
+# Maximum time a product can stay in the cache, in seconds. This is also the
+# maximum time a stale product can be accepted after a change: product events
+# would only reach the container that processes them, so entries are not
+# invalidated otherwise.
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "15"))
+# Number of concurrent BatchGetItem requests
+BATCH_GET_WORKERS = 4
+# Product fields compared with the user-provided products
+PRODUCT_FIELDS = ["productId", "name", "package", "price"]
 
 
 dynamodb = boto3.client("dynamodb") # pylint: disable=invalid-name
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
+metrics = Metrics(namespace="ecommerce.products", service="products") # pylint: disable=invalid-name
 type_deserializer = TypeDeserializer() # pylint: disable=invalid-name
+product_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL) # pylint: disable=invalid-name
+
+
+def canonical(value: Any) -> Any:
+    """
+    Returns a canonical form of a value for comparisons
+
+    Numbers are turned into normalized Decimal values, so that numbers from
+    DynamoDB and JSON match regardless of their type, and dictionary keys are
+    sorted.
+    """
+
+    if isinstance(value, dict):
+        return {k: canonical(value[k]) for k in sorted(value.keys())}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value)).normalize()
+    if isinstance(value, (int, Decimal)):
+        return Decimal(value).normalize()
+    return value
+
+
+def product_fingerprint(product: dict, fields: Iterable[str]) -> str:
+    """
+    Returns a hash of the canonical form of the given fields of a product
+    """
+
+    data = canonical({field: product[field] for field in fields if field in product})
+
+    return hashlib.blake2b(repr(data).encode("utf-8"), digest_size=16).hexdigest()
 
 
 @tracer.capture_method
-def compare_product(user_product: dict, ddb_product: Optional[dict]) -> Optional[Set[Union[dict, str]]]:
+def compare_product(
+        user_product: dict,
+        ddb_product: Optional[dict],
+        fingerprint: Optional[str] = None
+    ) -> Optional[Set[Union[dict, str]]]:
     """
     Compare the user-provided product with the data provided by DynamoDB
+
+    'fingerprint' is the fingerprint of the DynamoDB product, if it was
+    already computed. Valid products only need one hash comparison: fields
+    are compared one by one only to build the error message.
     """
 
     if ddb_product is None:
         return user_product, "Product '{}' not found".format(user_product["productId"])
 
+    if fingerprint is None:
+        fingerprint = product_fingerprint(ddb_product, ddb_product.keys())
+    if product_fingerprint(user_product, ddb_product.keys()) == fingerprint:
+        return None
+
     # Validate schema
     for key in ddb_product.keys():
         if key not in user_product:
             return ddb_product, "Missing '{}' in product '{}'".format(key, user_product["productId"])
 
-        if user_product[key] != ddb_product[key]:
+        if canonical(user_product[key]) != canonical(ddb_product[key]):
             return ddb_product, "Invalid value for '{}': want '{}', got '{}' in product '{}'".format(
                 key, ddb_product[key], user_product[key], user_product["productId"]
             )
@@ -46,6 +112,62 @@ def compare_product(user_product: dict, ddb_product: Optional[dict]) -> Optional
     return None
 
 
+@tracer.capture_method
+def fetch_products(product_ids: List[str]) -> Dict[str, Tuple[dict, str]]:
+    """
+    Retrieve products and their fingerprint from DynamoDB
+    """
+
+    ddb_products = {}
+
+    for product in batch_get(
+            dynamodb, TABLE_NAME,
+            [{"productId": {"S": product_id}} for product_id in product_ids],
+            max_workers=BATCH_GET_WORKERS,
+            ProjectionExpression=", ".join("#{}".format(field) for field in PRODUCT_FIELDS),
+            ExpressionAttributeNames={"#{}".format(field): field for field in PRODUCT_FIELDS}
+        ):
+        product = {k: type_deserializer.deserialize(v) for k, v in product.items()}
+        ddb_products[product["productId"]] = (product, product_fingerprint(product, product.keys()))
+
+    return ddb_products
+
+
+@tracer.capture_method
+def get_products(product_ids: List[str]) -> Dict[str, Tuple[dict, str]]:
+    """
+    Retrieve products and their fingerprint from the cache, or from DynamoDB
+    on cache misses
+    """
+
+    products = product_cache.get_many(product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in products]
+
+    metrics.add_metric(name="productCacheHits", unit=MetricUnit.Count, value=len(products))
+    metrics.add_metric(name="productCacheMisses", unit=MetricUnit.Count, value=len(missing))
+    if len(product_ids) > 0:
+        metrics.add_metric(
+            name="productCacheHitRate", unit=MetricUnit.Percent,
+            value=100*len(products)/len(product_ids)
+        )
+
+    if len(missing) > 0:
+        start = time.perf_counter()
+        ddb_products = fetch_products(missing)
+        metrics.add_metric(
+            name="productFetchLatency", unit=MetricUnit.Milliseconds,
+            value=(time.perf_counter()-start)*1000
+        )
+
+        # Products that do not exist are not cached, as they could be
+        # created at any time.
+        for product_id, product in ddb_products.items():
+            product_cache.put(product_id, product)
+        products.update(ddb_products)
+
+    return products
+
+
 @tracer.capture_method
 def validate_products(products: List[dict]) -> Set[Union[List[dict], str]]:
     """
@@ -57,52 +179,20 @@ def validate_products(products: List[dict]) -> Set[Union[List[dict], str]]:
     validated_products = []
     reasons = []
 
-    # batch_get_item only supports up to 100 items, so split the list of products in batches
-    # of 100 max.
-    for i in range(0, len(products), 100):
-        q_products = {}
-        for product in products[i:i+100]:
-            q_products[product["productId"]] = product
-
-        response = dynamodb.batch_get_item(RequestItems={
-            TABLE_NAME: {
-                "Keys": [
-                    {"productId": {"S": product_id}}
-                    # Only fetch by batch of 100 items
-                    for product_id in q_products.keys()
-                ],
-                "ProjectionExpression": "#productId, #name, #package, #price",
-                "ExpressionAttributeNames": {
-                    "#productId": "productId",
-                    "#name": "name",
-                    "#package": "package",
-                    "#price": "price"
-                }
-            }
-        })
-
-        ddb_products = {
-            p["productId"]["S"]: {k: type_deserializer.deserialize(v) for k, v in p.items()}
-            for p in response.get("Responses", {}).get(TABLE_NAME, [])
-        }
-
-        # Even if we ask less than 100 items, there is a 16MB response limit, so the call might
-        # return less items than expected.
-        while response.get("UnprocessedKeys", {}).get(TABLE_NAME, None) is not None:
-            response = dynamodb.batch_get_item(RequestItems=response["UnprocessedKeys"])
-
-            for product in response.get("Responses", {}).get(TABLE_NAME, []):
-                ddb_products[product["productId"]["S"]] = {k: type_deserializer.deserialize(v) for k, v in product.items()}
-
-        for product_id, product in q_products.items():
-            retval = compare_product(product, ddb_products.get(product_id, None))
-            if retval is not None:
-                validated_products.append(retval[0])
-                reasons.append(retval[1])
+    q_products = {product["productId"]: product for product in products}
+    ddb_products = get_products(list(q_products.keys()))
+
+    for product_id, product in q_products.items():
+        ddb_product, fingerprint = ddb_products.get(product_id, (None, None))
+        retval = compare_product(product, ddb_product, fingerprint)
+        if retval is not None:
+            validated_products.append(retval[0])
+            reasons.append(retval[1])
 
     return validated_products, ". ".join(reasons)
 
 
+@metrics.log_metrics
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
 def handler(event, _):
@@ -110,6 +200,11 @@ def handler(event, _):
     Lambda function handler for /backend/validate
     """
 
+    # this handler may complete without publishing any metrics
+    warnings.filterwarnings("ignore", "No metrics to publish*")
+
+    metrics.add_dimension(name="environment", value=ENVIRONMENT)
+
     user_id = iam_user_id(event)
     if user_id is None:
         logger.warning({"message": "User ARN not found in event"})
@@ -69,6 +69,57 @@ def test_compare_product_wrong_price(lambda_module, product):
     assert retval[1].find(product["productId"]) != -1
 
 
+def test_compare_product_decimal(lambda_module, product):
+    """
+    Compare a product with the Decimal values returned by DynamoDB
+    """
+
+    ddb_product = copy.deepcopy(product)
+    ddb_product["price"] = decimal.Decimal(str(product["price"]))
+    ddb_product["package"]["weight"] = decimal.Decimal("{}.0".format(product["package"]["weight"]))
+    fingerprint = lambda_module.product_fingerprint(ddb_product, ddb_product.keys())
+
+    assert lambda_module.compare_product(product, ddb_product, fingerprint) is None
+
+    user_product = copy.deepcopy(product)
+    user_product["price"] += 0.5
+    retval = lambda_module.compare_product(user_product, ddb_product, fingerprint)
+    assert retval is not None
+    assert retval[1].find("'price'") != -1
+
+
+def test_compare_product_extra_field(lambda_module, product):
+    """
+    Fields that are not in the DynamoDB item are ignored
+    """
+
+    user_product = copy.deepcopy(product)
+    user_product["quantity"] = 2
+
+    assert lambda_module.compare_product(user_product, product) is None
+
+
+def test_product_fingerprint(lambda_module, product):
+    """
+    Test product_fingerprint()
+    """
+
+    fields = product.keys()
+    fingerprint = lambda_module.product_fingerprint(product, fields)
+
+    # Key order and number types do not matter
+    reordered = {k: product[k] for k in reversed(list(product.keys()))}
+    reordered["price"] = decimal.Decimal(product["price"])
+    assert lambda_module.product_fingerprint(reordered, fields) == fingerprint
+    assert lambda_module.product_fingerprint(dict(product, price=float(product["price"])), fields) == fingerprint
+
+    # Missing or different values do not match
+    missing = {k: v for k, v in product.items() if k != "package"}
+    assert lambda_module.product_fingerprint(missing, fields) != fingerprint
+    assert lambda_module.product_fingerprint(dict(product, price=product["price"]+1), fields) != fingerprint
+    assert lambda_module.product_fingerprint(dict(product, price=str(product["price"])), fields) != fingerprint
+
+
 def test_compare_product_missing(lambda_module, product):
     retval = lambda_module.compare_product(product, None)
 
@@ -113,11 +164,15 @@ def test_validate_products(lambda_module, product):
     dynamodb.deactivate()
 
 
-def test_validate_products_multiple(lambda_module, product):
+def test_validate_products_multiple(monkeypatch, lambda_module, product):
     """
     Test validate_products() with multiple DynamoDB calls
     """
 
+    # Stubbed responses are returned in order, so requests must not run
+    # concurrently.
+    monkeypatch.setattr(lambda_module, "BATCH_GET_WORKERS", 1)
+
     products = []
     for i in range(0, 105):
         product_temp = copy.deepcopy(product)
@@ -269,6 +324,119 @@ def test_validate_products_incorrect(lambda_module, product):
     dynamodb.deactivate()
 
 
+def test_get_products_cache(lambda_module, product):
+    """
+    Test that get_products() only fetches cache misses from DynamoDB
+    """
+
+    cached_product = copy.deepcopy(product)
+    cached_product["productId"] = str(uuid.uuid4())
+
+    # Stub boto3
+    dynamodb = stub.Stubber(lambda_module.dynamodb)
+    response = {
+        "Responses": {
+            lambda_module.TABLE_NAME: [{k: TypeSerializer().serialize(v) for k, v in cached_product.items()}]
+        }
+    }
+    expected_params = {
+        "RequestItems": {
+            lambda_module.TABLE_NAME: {
+                "Keys": [{"productId": {"S": cached_product["productId"]}}],
+                "ProjectionExpression": stub.ANY,
+                "ExpressionAttributeNames": stub.ANY
+            }
+        }
+    }
+    dynamodb.add_response("batch_get_item", response, expected_params)
+    response = {
+        "Responses": {
+            lambda_module.TABLE_NAME: [{k: TypeSerializer().serialize(v) for k, v in product.items()}]
+        }
+    }
+    expected_params = {
+        "RequestItems": {
+            lambda_module.TABLE_NAME: {
+                # Only the product that is not in the cache
+                "Keys": [{"productId": {"S": product["productId"]}}],
+                "ProjectionExpression": stub.ANY,
+                "ExpressionAttributeNames": stub.ANY
+            }
+        }
+    }
+    dynamodb.add_response("batch_get_item", response, expected_params)
+    dynamodb.activate()
+
+    lambda_module.get_products([cached_product["productId"]])
+    retval = lambda_module.get_products([cached_product["productId"], product["productId"]])
+
+    dynamodb.assert_no_pending_responses()
+    dynamodb.deactivate()
+
+    assert {k: v[0] for k, v in retval.items()} == {
+        cached_product["productId"]: cached_product,
+        product["productId"]: product
+    }
+    assert retval[product["productId"]][1] == lambda_module.product_fingerprint(product, product.keys())
+
+
+def test_validate_products_stale_price(monkeypatch, lambda_module, product):
+    """
+    Test that a stale price is not accepted after the cache TTL expires
+    """
+
+    now = [0]
+    monkeypatch.setattr(lambda_module, "product_cache", lambda_module.TTLCache(
+        ttl=lambda_module.CACHE_TTL, clock=lambda: now[0]
+    ))
+
+    new_product = copy.deepcopy(product)
+    new_product["price"] += 100
+
+    def add_response(ddb_product):
+        dynamodb.add_response("batch_get_item", {
+            "Responses": {
+                lambda_module.TABLE_NAME: [{k: TypeSerializer().serialize(v) for k, v in ddb_product.items()}]
+            }
+        }, {
+            "RequestItems": {
+                lambda_module.TABLE_NAME: {
+                    "Keys": [{"productId": {"S": product["productId"]}}],
+                    "ProjectionExpression": stub.ANY,
+                    "ExpressionAttributeNames": stub.ANY
+                }
+            }
+        })
+
+    # The price changes in DynamoDB after the first request
+    dynamodb = stub.Stubber(lambda_module.dynamodb)
+    add_response(product)
+    add_response(new_product)
+    dynamodb.activate()
+
+    # Product is cached
+    retval = lambda_module.validate_products([product])
+    assert len(retval[0]) == 0
+
+    # Still cached right before the TTL expires
+    now[0] = lambda_module.CACHE_TTL - 0.001
+    retval = lambda_module.validate_products([product])
+    assert len(retval[0]) == 0
+
+    # The old price is rejected as soon as the TTL expires
+    now[0] = lambda_module.CACHE_TTL
+    retval = lambda_module.validate_products([product])
+    assert len(retval[0]) == 1
+    assert retval[0][0]["price"] == new_product["price"]
+
+    # The new price is accepted
+    retval = lambda_module.validate_products([new_product])
+    assert len(retval[0]) == 0
+
+    dynamodb.assert_no_pending_responses()
+    dynamodb.deactivate()
+
+
 def test_handler_bad_body(monkeypatch, lambda_module, apigateway_event, context, product):
     """
     Test the function handler with a bad body
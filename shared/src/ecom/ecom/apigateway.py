@@ -9,7 +9,7 @@ from .helpers import Encoder
 
 
 __all__ = [
-    "cognito_user_id", "iam_user_id", "response"
+    "cognito_user_id", "header", "iam_user_id", "response"
 ]
 
 
@@ -35,26 +35,48 @@ def iam_user_id(event: dict) -> Optional[str]:
         return None
 
 
+def header(event: dict, name: str) -> Optional[str]:
+    """
+    Returns the value of a request header or None
+
+    Header names are case-insensitive.
+    """
+
+    headers = event.get("headers") or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
 def response(
-        msg: Union[dict, str],
+        msg: Union[dict, str, None],
         status_code: int = 200,
         allow_origin: str = "*",
         allow_headers: str = "Content-Type,X-Amz-Date,Authorization,X-Api-Key,x-requested-with",
-        allow_methods: str = "GET,POST,PUT,DELETE,OPTIONS"
+        allow_methods: str = "GET,POST,PUT,DELETE,OPTIONS",
+        headers: Optional[Dict[str, str]] = None,
+        body: Optional[str] = None
     ) -> Dict[str, Union[int, str]]:
     """
     Returns a response for API Gateway
+
+    'body' is an already serialized body that replaces 'msg'. If both are
+    None, the response has an empty body.
     """
 
     if isinstance(msg, str):
         msg = {"message": msg}
+    if body is None:
+        body = json.dumps(msg, cls=Encoder) if msg is not None else ""
 
     return {
         "statusCode": status_code,
-        "headers": {
+        "headers": dict({
             "Access-Control-Allow-Headers": allow_headers,
             "Access-Control-Allow-Origin": allow_origin,
             "Access-Control-Allow-Methods": allow_methods
-        },
-        "body": json.dumps(msg, cls=Encoder)
+        }, **(headers or {})),
+        "body": body
     }
@@ -0,0 +1,269 @@
+"""
+Verification of Cognito JSON Web Tokens
+
+Cognito signs tokens with RS256 keys published as a JSON Web Key Set (JWKS)
+at '{issuer}/.well-known/jwks.json'. Verifying tokens locally against a
+cached JWKS avoids a call to Cognito on every request, at the cost of
+accepting tokens revoked before their expiry, as API Gateway's Cognito
+authorizer does.
+
+RSA signatures are verified with Python integers, as public key operations
+with the usual exponent of 65537 only take a few modular multiplications, so
+this does not depend on a cryptography library.
+"""
+
+
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import requests
+from .cache import TTLCache
+
+
+__all__ = ["InvalidToken", "KeySet", "Verifier", "cognito_issuer", "groups"]
+
+
+# Time before the JWKS is read again, in seconds
+JWKS_TTL = 3600
+# Minimum time between two reads of the JWKS when tokens use unknown keys,
+# so that forged key IDs cannot trigger a request each
+JWKS_MIN_REFRESH = 60
+# Timeout for reading the JWKS, in seconds
+JWKS_TIMEOUT = 3
+# Tolerated clock skew with Cognito, in seconds
+LEEWAY = 30
+# Maximum number of verified tokens kept in cache
+TOKEN_CACHE_SIZE = 1024
+# DER encoding of the DigestInfo prefix for SHA-256, see RFC 8017 section 9.2
+SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+RSAKey = Tuple[int, int]
+
+
+class InvalidToken(Exception):
+    """
+    The token is malformed, expired, or its signature or claims are invalid
+    """
+
+
+def cognito_issuer(user_pool_id: str) -> str:
+    """
+    Returns the issuer of tokens for a Cognito user pool
+
+    User pool IDs start with their region, such as 'eu-west-1_AbCdEf123'.
+    """
+
+    region = user_pool_id.split("_", 1)[0]
+    return "https://cognito-idp.{}.amazonaws.com/{}".format(region, user_pool_id)
+
+
+def groups(claims: dict) -> List[str]:
+    """
+    Returns the Cognito groups of the user of a token
+    """
+
+    return claims.get("cognito:groups", [])
+
+
+def _b64decode(value: str) -> bytes:
+    """
+    Decode base64url without padding
+    """
+
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _to_int(value: str) -> int:
+    return int.from_bytes(_b64decode(value), "big")
+
+
+def fetch_jwks(url: str) -> dict:
+    """
+    Read a JWKS
+    """
+
+    res = requests.get(url, timeout=JWKS_TIMEOUT)
+    res.raise_for_status()
+    return res.json()
+
+
+def verify_rs256(key: RSAKey, message: bytes, signature: bytes) -> bool:
+    """
+    Verify a RSASSA-PKCS1-v1_5 signature with SHA-256
+
+    This encodes the expected message representative and compares it with the
+    result of the public key operation, rather than parsing the latter.
+    """
+
+    modulus, exponent = key
+    size = (modulus.bit_length() + 7) // 8
+    if len(signature) != size:
+        return False
+
+    value = int.from_bytes(signature, "big")
+    if value >= modulus:
+        return False
+
+    digest_info = SHA256_DIGEST_INFO + hashlib.sha256(message).digest()
+    if size < len(digest_info) + 11:
+        return False
+    expected = b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+
+    return hmac.compare_digest(pow(value, exponent, modulus).to_bytes(size, "big"), expected)
+
+
+class KeySet:
+    """
+    JWKS cached in memory
+
+    The JWKS is read again after 'ttl' seconds, or when a token uses an
+    unknown key ID, which happens when Cognito rotates its keys. If the JWKS
+    cannot be read but was read before, the previous keys are kept.
+
+    This is thread-safe.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            ttl: float = JWKS_TTL,
+            min_refresh: float = JWKS_MIN_REFRESH,
+            fetch: Callable[[str], dict] = fetch_jwks,
+            clock: Callable[[], float] = time.monotonic
+        ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh = min_refresh
+        self.fetch = fetch
+        self.clock = clock
+
+        self._keys: Optional[Dict[str, RSAKey]] = None
+        self._fetched = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, now: float) -> None:
+        self._fetched = now
+        try:
+            jwks = self.fetch(self.url)
+        except Exception: # pylint: disable=broad-except
+            if self._keys is None:
+                raise
+            return
+
+        self._keys = {
+            key["kid"]: (_to_int(key["n"]), _to_int(key["e"]))
+            for key in jwks.get("keys", [])
+            if key.get("kty") == "RSA" and key.get("alg", "RS256") == "RS256"
+        }
+
+    def get(self, kid: str) -> Optional[RSAKey]:
+        """
+        Returns the public key for a key ID, or None if it is unknown
+        """
+
+        with self._lock:
+            now = self.clock()
+            if (
+                    self._keys is None
+                    or now >= self._fetched + self.ttl
+                    or (kid not in self._keys and now >= self._fetched + self.min_refresh)
+                ):
+                self._refresh(now)
+            return self._keys.get(kid)
+
+
+class Verifier:
+    """
+    Verify Cognito tokens and return their claims
+
+    Verified tokens are cached until they expire, keyed by the hash of the
+    token, so repeated requests with the same token skip the signature
+    verification.
+
+    'token_use' is "access" or "id", and 'client_id' is the app client the
+    tokens must be issued for, if set.
+    """
+
+    def __init__(
+            self,
+            issuer: str,
+            client_id: Optional[str] = None,
+            token_use: Optional[str] = "access",
+            keys: Optional[KeySet] = None,
+            cache: Optional[TTLCache] = None,
+            leeway: float = LEEWAY,
+            clock: Callable[[], float] = time.time
+        ):
+        self.issuer = issuer
+        self.client_id = client_id
+        self.token_use = token_use
+        self.keys = keys if keys is not None else KeySet(issuer + "/.well-known/jwks.json")
+        self.cache = cache if cache is not None else TTLCache(maxsize=TOKEN_CACHE_SIZE)
+        self.leeway = leeway
+        self.clock = clock
+
+    def verify(self, token: Optional[str]) -> dict:
+        """
+        Returns the claims of a token
+
+        Raises InvalidToken if the token is not valid.
+        """
+
+        if not token:
+            raise InvalidToken("Missing token")
+        if token.startswith("Bearer "):
+            token = token[7:]
+
+        now = self.clock()
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        claims = self.cache.get(cache_key)
+        if claims is not None and now < claims["exp"] + self.leeway:
+            return claims
+
+        claims = self._verify(token, now)
+        self.cache.put(cache_key, claims, ttl=claims["exp"] + self.leeway - now)
+        return claims
+
+    def _verify(self, token: str, now: float) -> dict:
+        # The signing input is the ASCII encoding of the first two segments
+        if not token.isascii():
+            raise InvalidToken("Malformed token")
+        try:
+            header_b64, claims_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            claims = json.loads(_b64decode(claims_b64))
+            signature = _b64decode(signature_b64)
+        except ValueError as exc:
+            raise InvalidToken("Malformed token") from exc
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise InvalidToken("Malformed token")
+
+        if header.get("alg") != "RS256":
+            raise InvalidToken("Unsupported algorithm: {}".format(header.get("alg")))
+        key = self.keys.get(header.get("kid"))
+        if key is None:
+            raise InvalidToken("Unknown key: {}".format(header.get("kid")))
+        if not verify_rs256(key, "{}.{}".format(header_b64, claims_b64).encode("ascii"), signature):
+            raise InvalidToken("Invalid signature")
+
+        if not isinstance(claims.get("exp"), (int, float)) or now >= claims["exp"] + self.leeway:
+            raise InvalidToken("Token expired")
+        if isinstance(claims.get("iat"), (int, float)) and claims["iat"] > now + self.leeway:
+            raise InvalidToken("Token issued in the future")
+        if claims.get("iss") != self.issuer:
+            raise InvalidToken("Invalid issuer: {}".format(claims.get("iss")))
+        if self.token_use is not None and claims.get("token_use") != self.token_use:
+            raise InvalidToken("Invalid token use: {}".format(claims.get("token_use")))
+        if self.client_id is not None:
+            # Access tokens contain the app client ID in 'client_id' and ID
+            # tokens in 'aud'.
+            client_id = claims.get("client_id", claims.get("aud"))
+            if client_id != self.client_id:
+                raise InvalidToken("Invalid client ID: {}".format(client_id))
+
+        return claims
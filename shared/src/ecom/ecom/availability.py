@@ -0,0 +1,370 @@
+"""
+Availability calendars stored as monthly bitsets
+
+Calendars are stored in a dedicated DynamoDB table with one item per
+resource and month:
+
+    {"listingId": "...", "month": "2021-06", "free": 1073741823, "booked": 6, "cityMonth": "Paris#2021-06"}
+
+Bit 'd-1' of 'free' is set when day 'd' of the month is available, and bit
+'d-1' of 'booked' when it was booked. The 'cityMonth' attribute is the
+partition key of a global secondary index, so that all calendars of a city
+for a month can be read with a single Query.
+
+Bookings update the 'free' and 'booked' words of each month with a condition
+on the previous value of 'free', in a single transaction when the booking
+spans multiple months. Every write to a month changes 'free', so the same
+condition protects hosts replacing the calendar of a listing.
+"""
+
+
+import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from boto3.dynamodb.conditions import Key
+from .dynamodb import batch_get, query_all
+
+
+__all__ = [
+    "Conflict", "NotAvailable", "book", "delete_calendar", "find_available",
+    "is_free", "month_masks", "put_calendar", "replace_calendar", "set_city",
+    "to_bitsets"
+]
+
+
+# Global secondary index on 'cityMonth'
+CITY_INDEX = "city-month-index"
+# Maximum number of operations in a transaction
+MAX_TRANSACT_ITEMS = 100
+
+
+class NotAvailable(Exception):
+    """
+    Some of the requested days are not available
+    """
+
+
+class Conflict(Exception):
+    """
+    Concurrent writes to a calendar kept conflicting
+    """
+
+
+def _month_key(day: datetime.date) -> str:
+    return "{:04d}-{:02d}".format(day.year, day.month)
+
+
+def _city_month(city: str, month: str) -> str:
+    return "{}#{}".format(city, month)
+
+
+def month_masks(start: datetime.date, end: datetime.date) -> List[Tuple[str, int]]:
+    """
+    Returns the month keys and day masks for the days in [start, end)
+    """
+
+    masks = []
+    day = start
+    while day < end:
+        # First day of the next month
+        next_month = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        last = min(end, next_month)
+        count = (last - day).days
+        masks.append((_month_key(day), ((1 << count) - 1) << (day.day - 1)))
+        day = last
+    return masks
+
+
+def to_bitsets(calendar: Iterable[dict]) -> Dict[str, int]:
+    """
+    Transform a list of {"date": "YYYY-MM-DD", "available": bool} entries
+    into monthly bitsets of available days
+    """
+
+    bitsets = {}
+    for entry in calendar:
+        day = datetime.date.fromisoformat(entry["date"])
+        month = _month_key(day)
+        bitsets.setdefault(month, 0)
+        if entry.get("available", False):
+            bitsets[month] |= 1 << (day.day - 1)
+    return bitsets
+
+
+def is_free(bitsets: Dict[str, int], masks: List[Tuple[str, int]]) -> bool:
+    """
+    Check if all days of the masks are available in the bitsets
+    """
+
+    return all(bitsets.get(month, 0) & mask == mask for month, mask in masks)
+
+
+def put_calendar(table, listing_id: str, city: Optional[str], bitsets: Dict[str, int]) -> None:
+    """
+    Write the calendar of a listing
+
+    'table' is the calendar table, as a boto3 Table resource.
+    """
+
+    with table.batch_writer() as batch:
+        for month, free in bitsets.items():
+            item = {"listingId": listing_id, "month": month, "free": free}
+            if city:
+                item["cityMonth"] = _city_month(city, month)
+            batch.put_item(Item=item)
+
+
+def _months(table, listing_id: str) -> List[str]:
+    """
+    Returns the months in the calendar of a listing
+    """
+
+    return [
+        item["month"] for item in query_all(
+            table.query,
+            KeyConditionExpression=Key("listingId").eq(listing_id),
+            ProjectionExpression="#month",
+            ExpressionAttributeNames={"#month": "month"}
+        )
+    ]
+
+
+def _is_conflict(exc) -> bool:
+    """
+    Check if a transaction was cancelled because of a failed condition
+    """
+
+    reasons = exc.response.get("CancellationReasons", [])
+    return any(reason.get("Code") == "ConditionalCheckFailed" for reason in reasons)
+
+
+def replace_calendar(
+        table,
+        listing_id: str,
+        city: Optional[str],
+        calendar: List[dict],
+        extra: Optional[Callable[[List[dict]], List[dict]]] = None,
+        max_attempts: int = 5
+    ) -> List[dict]:
+    """
+    Replace the calendar of a listing, keeping the booked days unavailable
+
+    Months missing from 'calendar' are deleted, unless they contain bookings.
+    Each month is written with a condition on its previous value, in a single
+    transaction, so a concurrent booking makes this read the calendar again
+    and retry.
+
+    'extra' receives the calendar with the booked days marked as unavailable
+    and returns more operations for the same transaction, such as an update
+    of the listing. It is called for each attempt.
+
+    Returns the calendar with the booked days marked as unavailable.
+    """
+
+    client = table.meta.client
+    for _ in range(max_attempts):
+        current = {
+            item["month"]: item for item in query_all(
+                table.query,
+                KeyConditionExpression=Key("listingId").eq(listing_id),
+                ConsistentRead=True
+            )
+        }
+        booked = {month: int(item.get("booked", 0)) for month, item in current.items()}
+
+        merged = []
+        for entry in calendar:
+            day = datetime.date.fromisoformat(entry["date"])
+            is_booked = booked.get(_month_key(day), 0) >> (day.day - 1) & 1
+            merged.append(dict(entry, available=bool(entry.get("available", False)) and not is_booked))
+
+        bitsets = to_bitsets(merged)
+        operations = []
+        for month, free in bitsets.items():
+            values: Dict[str, Any] = {":free": free}
+            if city:
+                expression = "SET #free = :free, cityMonth = :cityMonth"
+                values[":cityMonth"] = _city_month(city, month)
+            else:
+                expression = "SET #free = :free REMOVE cityMonth"
+            if month in current:
+                condition = "#free = :old"
+                values[":old"] = int(current[month]["free"])
+            else:
+                condition = "attribute_not_exists(listingId)"
+            operations.append({"Update": {
+                "TableName": table.name,
+                "Key": {"listingId": listing_id, "month": month},
+                "UpdateExpression": expression,
+                "ConditionExpression": condition,
+                "ExpressionAttributeNames": {"#free": "free"},
+                "ExpressionAttributeValues": values
+            }})
+        for month in sorted(current.keys() - bitsets.keys()):
+            key = {"listingId": listing_id, "month": month}
+            values = {":old": int(current[month]["free"])}
+            if booked[month]:
+                # Keep the bookings, without available days
+                operations.append({"Update": {
+                    "TableName": table.name,
+                    "Key": key,
+                    "UpdateExpression": "SET #free = :free",
+                    "ConditionExpression": "#free = :old",
+                    "ExpressionAttributeNames": {"#free": "free"},
+                    "ExpressionAttributeValues": dict(values, **{":free": 0})
+                }})
+            else:
+                operations.append({"Delete": {
+                    "TableName": table.name,
+                    "Key": key,
+                    "ConditionExpression": "#free = :old",
+                    "ExpressionAttributeNames": {"#free": "free"},
+                    "ExpressionAttributeValues": values
+                }})
+
+        if extra is not None:
+            operations.extend(extra(merged))
+        if len(operations) > MAX_TRANSACT_ITEMS:
+            raise ValueError("Calendars cannot span more than {} months".format(MAX_TRANSACT_ITEMS))
+        if len(operations) == 0:
+            return merged
+
+        try:
+            client.transact_write_items(TransactItems=operations)
+            return merged
+        except client.exceptions.TransactionCanceledException as exc:
+            if not _is_conflict(exc):
+                raise
+
+    raise Conflict("Too many concurrent updates of the calendar of listing {}".format(listing_id))
+
+
+def delete_calendar(table, listing_id: str) -> None:
+    """
+    Delete the calendar of a listing
+    """
+
+    with table.batch_writer() as batch:
+        for month in _months(table, listing_id):
+            batch.delete_item(Key={"listingId": listing_id, "month": month})
+
+
+def set_city(table, listing_id: str, city: Optional[str]) -> None:
+    """
+    Move the calendar of a listing to another city
+    """
+
+    for month in _months(table, listing_id):
+        if city:
+            table.update_item(
+                Key={"listingId": listing_id, "month": month},
+                UpdateExpression="SET cityMonth = :cityMonth",
+                ExpressionAttributeValues={":cityMonth": _city_month(city, month)}
+            )
+        else:
+            table.update_item(
+                Key={"listingId": listing_id, "month": month},
+                UpdateExpression="REMOVE cityMonth"
+            )
+
+
+def find_available(
+        query: Callable[..., dict],
+        city: str,
+        start: datetime.date,
+        end: datetime.date
+    ) -> Set[str]:
+    """
+    Returns the IDs of the listings in a city available for all days in
+    [start, end)
+
+    'query' is the Query operation of the calendar table. This reads one
+    partition of the city index per month, so the cost depends on the number
+    of listings in the city rather than the size of the table.
+    """
+
+    available = None
+    for month, mask in month_masks(start, end):
+        month_available = set()
+        for item in query_all(
+                query,
+                IndexName=CITY_INDEX,
+                KeyConditionExpression=Key("cityMonth").eq(_city_month(city, month)),
+                ProjectionExpression="listingId, #free",
+                ExpressionAttributeNames={"#free": "free"}
+            ):
+            if int(item["free"]) & mask == mask and (available is None or item["listingId"] in available):
+                month_available.add(item["listingId"])
+
+        available = month_available
+        if len(available) == 0:
+            break
+
+    return available or set()
+
+
+def book(
+        table,
+        listing_id: str,
+        start: datetime.date,
+        end: datetime.date,
+        extra: Optional[Callable[[], List[dict]]] = None,
+        max_attempts: int = 5
+    ) -> None:
+    """
+    Book the days in [start, end) for a listing
+
+    Each month is updated with a condition on its previous value, so
+    concurrent bookings of the same month cannot both succeed: the one that
+    loses reads the calendar again and retries.
+
+    'extra' returns more operations for the same transaction, such as an
+    update of the listing. It is called for each attempt, so they can be
+    conditional on fresh reads.
+
+    Raises NotAvailable if some of the days are not available.
+    """
+
+    masks = month_masks(start, end)
+    if len(masks) == 0:
+        return
+    if len(masks) > MAX_TRANSACT_ITEMS:
+        raise ValueError("Bookings cannot span more than {} months".format(MAX_TRANSACT_ITEMS))
+
+    client = table.meta.client
+    for _ in range(max_attempts):
+        # Unprocessed keys are retried, as missing months would be taken as
+        # unavailable
+        items = {item["month"]: item for item in batch_get(
+            client, table.name,
+            [{"listingId": listing_id, "month": month} for month, _ in masks],
+            ConsistentRead=True
+        )}
+        bitsets = {month: int(item["free"]) for month, item in items.items()}
+        if not is_free(bitsets, masks):
+            raise NotAvailable("Listing {} is not available between {} and {}".format(listing_id, start, end))
+
+        operations = [{
+            "Update": {
+                "TableName": table.name,
+                "Key": {"listingId": listing_id, "month": month},
+                "UpdateExpression": "SET #free = :new, #booked = :booked",
+                "ConditionExpression": "#free = :old",
+                "ExpressionAttributeNames": {"#free": "free", "#booked": "booked"},
+                "ExpressionAttributeValues": {
+                    ":old": bitsets[month],
+                    ":new": bitsets[month] & ~mask,
+                    ":booked": int(items[month].get("booked", 0)) | mask
+                }
+            }
+        } for month, mask in masks]
+        if extra is not None:
+            operations.extend(extra())
+
+        try:
+            client.transact_write_items(TransactItems=operations)
+            return
+        except client.exceptions.TransactionCanceledException as exc:
+            if not _is_conflict(exc):
+                raise
+
+    raise NotAvailable("Too many concurrent bookings for listing {}".format(listing_id))
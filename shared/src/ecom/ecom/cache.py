@@ -0,0 +1,343 @@
+"""
+Caches for Lambda functions
+
+Lambda containers are reused across invocations, so module-level caches
+survive between requests on warm containers. Since there is no way to reach
+every container when the source data changes, entries must always have a
+TTL that bounds how long stale data can be served, unless a shared tier
+such as DynamoDBStore carries invalidations between containers.
+"""
+
+
+import abc
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+import boto3
+from .dynamodb import batch_get
+
+
+__all__ = ["DynamoDBStore", "MemoryStore", "Store", "TTLCache", "VersionedCache", "create_store"]
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with a time-to-live per entry
+
+    Entries expire 'ttl' seconds after they are written, whether they are
+    read in the meantime or not. When the cache is full, the least recently
+    used entry is evicted.
+
+    This is thread-safe.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the value for 'key', or 'default' if it is missing or expired
+        """
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires, value = entry
+            if self.clock() >= expires:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """
+        Returns the values for the keys that are in the cache
+        """
+
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Write a value in the cache
+        """
+
+        with self._lock:
+            self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Remove a key from the cache
+        """
+
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove all keys from the cache
+        """
+
+        with self._lock:
+            self._data.clear()
+
+    def hit_rate(self) -> float:
+        """
+        Ratio of hits over all lookups since the cache was created
+        """
+
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class Store(abc.ABC):
+    """
+    Interface for cache tiers shared between containers
+
+    Implementations must be safe to use from multiple threads. Values are
+    JSON-serializable objects.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Any:
+        """
+        Returns the value for 'key', or None if it is missing or expired
+        """
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Returns the values for the keys that are in the store
+
+        Stores that can read several keys in one request override this.
+        """
+
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    @abc.abstractmethod
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Write a value that expires after 'ttl' seconds
+        """
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Remove a key
+        """
+
+
+class MemoryStore(Store):
+    """
+    In-memory stand-in for a shared cache tier
+
+    This is only shared within a container, and is meant for tests and local
+    development.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self.clock() >= entry[0]:
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (self.clock() + ttl, value)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DynamoDBStore(Store):
+    """
+    Shared cache tier in a DynamoDB table
+
+    The table has a 'key' string partition key and uses 'ttl' as its Time to
+    Live attribute. As DynamoDB deletes expired items in the background,
+    expiry is also checked on reads. The table name defaults to the
+    CACHE_TABLE_NAME environment variable.
+    """
+
+    def __init__(self, table_name: Optional[str] = None, table=None, clock: Callable[[], float] = time.time):
+        if table is None:
+            table = boto3.resource("dynamodb").Table(table_name or os.environ["CACHE_TABLE_NAME"])
+        self.table = table
+        self.clock = clock
+
+    def get(self, key: str) -> Any:
+        item = self.table.get_item(Key={"key": key}).get("Item")
+        if item is None or self.clock() >= int(item["ttl"]):
+            return None
+        return json.loads(item["value"])
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        now = self.clock()
+        return {
+            item["key"]: json.loads(item["value"])
+            for item in batch_get(self.table.meta.client, self.table.name, [{"key": key} for key in keys])
+            if now < int(item["ttl"])
+        }
+
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        self.table.put_item(Item={
+            "key": key,
+            "value": json.dumps(value),
+            # Rounded up, so that entries never expire early
+            "ttl": int(self.clock() + ttl) + 1
+        })
+
+    def delete(self, key: str) -> None:
+        self.table.delete_item(Key={"key": key})
+
+
+# Default value for markers that are not in the local tier, as missing
+# markers are cached as None
+_UNKNOWN = object()
+
+
+# Shared cache tiers by name
+STORES: Dict[str, Callable[[], Store]] = {
+    "dynamodb": DynamoDBStore,
+    "memory": MemoryStore
+}
+
+
+def create_store(name: Optional[str]) -> Optional[Store]:
+    """
+    Returns the shared cache tier with the given name, or None if the name is
+    empty
+
+    Raises ValueError if there is no such cache tier.
+    """
+
+    if not name:
+        return None
+    if name not in STORES:
+        raise ValueError("Unknown cache store '{}'".format(name))
+    return STORES[name]()
+
+
+class VersionedCache:
+    """
+    Read-through cache with a local tier, an optional shared tier, and
+    version-based invalidation
+
+    Entries are dicts with a 'version' number that increases on every write
+    to the source data. Writers call invalidate() with the new version, which
+    stores a version marker in the shared tier: entries older than the marker
+    are ignored by all containers, even if they are still in their local
+    tier. Without a shared tier, invalidations only reach the local tier of
+    the current container, and other containers rely on the TTL.
+
+    Markers are kept in the local tier for 'check_interval' seconds, so local
+    hits do not read the shared tier on every call, and invalidations reach
+    other containers within that interval. Local misses read the marker and
+    the shared entry in a single request.
+    """
+
+    def __init__(self, local: TTLCache, shared: Optional[Store] = None, prefix: str = "", check_interval: float = 1):
+        self.local = local
+        self.shared = shared
+        self.prefix = prefix
+        self.markers = TTLCache(maxsize=local.maxsize, ttl=check_interval, clock=local.clock)
+
+    def _entry_key(self, key: str) -> str:
+        return "{}{}".format(self.prefix, key)
+
+    def _marker_key(self, key: str) -> str:
+        return "{}{}#version".format(self.prefix, key)
+
+    def get(self, key: str, loader: Callable[[], Optional[dict]]) -> Optional[dict]:
+        """
+        Returns the entry for 'key', calling 'loader' on cache misses
+
+        'loader' returns the entry from the source, or None if it does not
+        exist. Missing entries are not cached.
+        """
+
+        marker = self.markers.get(key, _UNKNOWN)
+
+        def fresh(entry: Optional[dict]) -> bool:
+            return entry is not None and (marker is None or entry["version"] >= marker)
+
+        entry = self.local.get(key)
+        if entry is not None and (self.shared is None or (marker is not _UNKNOWN and fresh(entry))):
+            return entry
+
+        if self.shared is not None:
+            values = self.shared.get_many([self._marker_key(key), self._entry_key(key)])
+            marker = values.get(self._marker_key(key))
+            self.markers.put(key, marker)
+            if fresh(entry):
+                return entry
+
+            entry = values.get(self._entry_key(key))
+            if fresh(entry):
+                self.local.put(key, entry)
+                return entry
+
+        entry = loader()
+        if entry is None:
+            self.local.invalidate(key)
+            return None
+
+        self.local.put(key, entry)
+        if self.shared is not None and fresh(entry):
+            self.shared.put(self._entry_key(key), entry, self.local.ttl)
+        return entry
+
+    def invalidate(self, key: str, version: int) -> None:
+        """
+        Invalidate entries older than 'version'
+        """
+
+        self.local.invalidate(key)
+        if self.shared is not None:
+            self.markers.put(key, version)
+            # Markers must outlive the entries they invalidate, including
+            # stale entries written by readers that loaded them just before
+            # the invalidation.
+            self.shared.put(self._marker_key(key), version, 2 * self.local.ttl)
+            self.shared.delete(self._entry_key(key))
@@ -0,0 +1,409 @@
+"""
+DynamoDB helpers for Lambda functions
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+import json
+import math
+import random
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+__all__ = [
+    "BatchGetError", "InvalidUpdate", "UpdatePlanner", "batch_get", "ddb_to_plain",
+    "diff_images", "image_to_plain", "image_to_json", "query_all"
+]
+
+
+# Maximum number of keys in a BatchGetItem request
+MAX_BATCH_GET_KEYS = 100
+
+
+def _number(value: str) -> Union[int, float]:
+    """
+    Convert a DynamoDB number into an int or a float
+
+    This follows the same rules as `ecom.helpers.Encoder` for Decimal values.
+    """
+
+    try:
+        return int(value)
+    except ValueError:
+        number = Decimal(value)
+        if number % 1:
+            return float(number)
+        return int(number)
+
+
+def ddb_to_plain(value: Dict[str, Any]) -> Any:
+    """
+    Convert a DynamoDB attribute value into plain JSON types
+
+    Compared to boto3's TypeDeserializer, this does not create Decimal, set or
+    Binary objects. Numbers become int or float, sets become lists and binary
+    values are kept as their base64 representation, so the result can be
+    passed directly to `json.dumps()`.
+    """
+
+    for type_, data in value.items():
+        if type_ == "S":
+            return data
+        if type_ == "N":
+            return _number(data)
+        if type_ == "M":
+            return {k: ddb_to_plain(v) for k, v in data.items()}
+        if type_ == "L":
+            return [ddb_to_plain(v) for v in data]
+        if type_ == "NS":
+            return [_number(v) for v in data]
+        if type_ == "NULL":
+            return None
+        # BOOL, B, SS and BS are already JSON-compatible
+        return data
+
+    raise ValueError("Empty DynamoDB attribute value")
+
+
+def image_to_plain(image: Dict[str, dict]) -> dict:
+    """
+    Convert a DynamoDB item or stream image into a dict of plain JSON types
+    """
+
+    return {k: ddb_to_plain(v) for k, v in image.items()}
+
+
+def image_to_json(image: Dict[str, dict]) -> str:
+    """
+    Convert a DynamoDB item or stream image into a JSON string
+    """
+
+    return json.dumps(image_to_plain(image))
+
+
+def _pointer(path: str, key: Union[int, str]) -> str:
+    """
+    Append a key to a JSON pointer (RFC 6901)
+    """
+
+    return "{}/{}".format(path, str(key).replace("~", "~0").replace("/", "~1"))
+
+
+def _diff(old: Dict[str, Any], new: Dict[str, Any], path: str, changes: List[str]) -> None:
+    """
+    Append the JSON pointers of differences between two DynamoDB attribute
+    values to 'changes'
+    """
+
+    # Most attributes are unchanged: dict comparison is done in C and does not
+    # need to deserialize anything.
+    if old == new:
+        return
+
+    (old_type, old_data), = old.items()
+    (new_type, new_data), = new.items()
+
+    if old_type != new_type:
+        changes.append(path)
+    elif old_type == "M":
+        for key in old_data.keys():
+            if key not in new_data:
+                changes.append(_pointer(path, key))
+        for key, value in new_data.items():
+            if key not in old_data:
+                changes.append(_pointer(path, key))
+            else:
+                _diff(old_data[key], value, _pointer(path, key), changes)
+    elif old_type == "L":
+        for i in range(max(len(old_data), len(new_data))):
+            if i >= len(old_data) or i >= len(new_data):
+                changes.append(_pointer(path, i))
+            else:
+                _diff(old_data[i], new_data[i], _pointer(path, i), changes)
+    # Different representations of the same number, e.g. '1.0' and '1'
+    elif old_type == "N":
+        if _number(old_data) != _number(new_data):
+            changes.append(path)
+    # Sets are unordered
+    elif old_type == "NS":
+        if {_number(v) for v in old_data} != {_number(v) for v in new_data}:
+            changes.append(path)
+    elif old_type in ["SS", "BS"]:
+        if set(old_data) != set(new_data):
+            changes.append(path)
+    else:
+        changes.append(path)
+
+
+def diff_images(old: Dict[str, dict], new: Dict[str, dict]) -> Dict[str, List[str]]:
+    """
+    Compare two DynamoDB images without deserializing them
+
+    This returns a dict with the top-level attributes that changed as keys,
+    and the JSON pointers to the nested values that changed as values. For
+    example, changing the weight of a product returns
+    {"package": ["/package/weight"]}.
+    """
+
+    changes = {}
+
+    # Attributes removed from the image
+    for key in old.keys():
+        if key not in new:
+            changes[key] = [_pointer("", key)]
+
+    for key, value in new.items():
+        # Attributes added to the image
+        if key not in old:
+            changes[key] = [_pointer("", key)]
+            continue
+
+        paths = []
+        _diff(old[key], value, _pointer("", key), paths)
+        if paths:
+            changes[key] = paths
+
+    return changes
+
+
+class BatchGetError(Exception):
+    """
+    Some keys could not be retrieved by BatchGetItem
+    """
+
+    def __init__(self, message: str, keys: List[dict]):
+        super().__init__(message)
+        self.keys = keys
+
+
+def _key_id(key: dict) -> Hashable:
+    """
+    Returns a hashable representation of a key
+    """
+
+    return tuple(sorted(
+        (name, tuple(sorted(value.items())) if isinstance(value, dict) else value)
+        for name, value in key.items()
+    ))
+
+
+def _batch_get_chunk(
+        client,
+        table_name: str,
+        keys: List[dict],
+        params: dict,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float
+    ) -> List[dict]:
+    """
+    Retrieve up to 100 keys, retrying unprocessed keys with backoff
+    """
+
+    items = []
+    for attempt in range(max_attempts):
+        # Full jitter exponential backoff between attempts
+        if attempt > 0:
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2**(attempt-1))))
+
+        res = client.batch_get_item(RequestItems={
+            table_name: dict(params, Keys=keys)
+        })
+        items.extend(res.get("Responses", {}).get(table_name, []))
+
+        keys = res.get("UnprocessedKeys", {}).get(table_name, {}).get("Keys", [])
+        if len(keys) == 0:
+            return items
+
+    raise BatchGetError(
+        "{} keys still unprocessed after {} attempts".format(len(keys), max_attempts),
+        keys
+    )
+
+
+def batch_get(
+        client,
+        table_name: str,
+        keys: Iterable[dict],
+        max_workers: int = 4,
+        max_attempts: int = 8,
+        base_delay: float = 0.05,
+        max_delay: float = 1.0,
+        **params
+    ) -> Iterator[dict]:
+    """
+    Retrieve items from a DynamoDB table with BatchGetItem
+
+    Duplicate keys are removed, then keys are split in requests of up to 100
+    keys that run concurrently. Unprocessed keys are retried with jittered
+    exponential backoff. Items are yielded as soon as their request
+    completes, in no particular order.
+
+    'params' are added to the request for the table, such as
+    'ProjectionExpression' or 'ConsistentRead'. Keys and items use the format
+    of 'client': DynamoDB JSON for boto3 clients, or Python types for the
+    client of a boto3 resource.
+
+    Raises BatchGetError if keys are still unprocessed after 'max_attempts'.
+    """
+
+    unique_keys = list({_key_id(key): key for key in keys}.values())
+    chunks = [
+        unique_keys[i:i+MAX_BATCH_GET_KEYS]
+        for i in range(0, len(unique_keys), MAX_BATCH_GET_KEYS)
+    ]
+
+    def get_chunk(chunk: List[dict]) -> List[dict]:
+        return _batch_get_chunk(client, table_name, chunk, params, max_attempts, base_delay, max_delay)
+
+    if len(chunks) == 1:
+        yield from get_chunk(chunks[0])
+    elif len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            for future in as_completed([executor.submit(get_chunk, chunk) for chunk in chunks]):
+                yield from future.result()
+
+
+def query_all(query: Callable[..., dict], **kwargs) -> Iterator[dict]:
+    """
+    Yield all items from a paginated Query or Scan operation
+
+    'query' is the operation, such as 'table.query' or 'client.scan', and
+    'kwargs' are its parameters.
+    """
+
+    while True:
+        res = query(**kwargs)
+        yield from res.get("Items", [])
+
+        if res.get("LastEvaluatedKey", None) is None:
+            return
+        kwargs["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+
+
+# Types for number fields in UpdatePlanner
+NUMBER = (int, float, Decimal)
+
+
+class InvalidUpdate(ValueError):
+    """
+    An update contains fields that cannot be updated or have the wrong type
+    """
+
+
+class UpdatePlanner:
+    """
+    Build the parameters of UpdateItem requests from partial documents
+
+    'fields' maps the attribute paths that can be updated, with dots between
+    the keys of nested maps, to their allowed types. Updates are nested
+    dicts: {"a": {"b": 1}} sets 'a.b' if it is a field, or the whole 'a' map
+    if 'a' is a field.
+
+    Attribute names always go through ExpressionAttributeNames, so fields can
+    use reserved words such as 'name', and floats are converted to Decimal
+    for boto3, including inside lists and maps.
+    """
+
+    def __init__(self, fields: Dict[str, Union[type, Tuple[type, ...]]]):
+        self.fields = fields
+        # Paths of the maps that contain fields
+        self._parents = {
+            ".".join(path.split(".")[:i])
+            for path in fields
+            for i in range(1, path.count(".") + 1)
+        }
+
+    def _check(self, path: str, value: Any) -> Any:
+        types = self.fields[path]
+        if not isinstance(types, tuple):
+            types = (types,)
+        # bool is a subclass of int, but not a valid number
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise InvalidUpdate("Invalid type for '{}': {}".format(path, type(value).__name__))
+        return self._convert(path, value)
+
+    def _convert(self, path: str, value: Any) -> Any:
+        if isinstance(value, float):
+            # JSON parsers accept NaN and Infinity, but DynamoDB does not
+            if not math.isfinite(value):
+                raise InvalidUpdate("Invalid number for '{}': {}".format(path, value))
+            return Decimal(str(value))
+        if isinstance(value, dict):
+            return {key: self._convert(path, item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._convert(path, item) for item in value]
+        return value
+
+    def _flatten(self, update: dict, prefix: str, sets: List[Tuple[str, Any]]) -> None:
+        for key, value in update.items():
+            path = prefix + key
+            if "." in key:
+                raise InvalidUpdate("Invalid field name: '{}'".format(path))
+            if path in self.fields:
+                sets.append((path, self._check(path, value)))
+            elif path in self._parents and isinstance(value, dict):
+                self._flatten(value, path + ".", sets)
+            else:
+                raise InvalidUpdate("Field '{}' cannot be updated".format(path))
+
+    def plan(
+            self,
+            update: dict,
+            remove: Iterable[str] = (),
+            add: Optional[Dict[str, Any]] = None
+        ) -> dict:
+        """
+        Returns the UpdateExpression, ExpressionAttributeNames and
+        ExpressionAttributeValues parameters for an update
+
+        'remove' are paths to remove and 'add' maps paths to numbers to add.
+        These are set by the caller, so they are not validated against the
+        fields.
+
+        Raises InvalidUpdate if the update contains invalid fields or does not
+        change anything.
+        """
+
+        if not isinstance(update, dict):
+            raise InvalidUpdate("Invalid update: {}".format(type(update).__name__))
+        sets = []
+        self._flatten(update, "", sets)
+        remove = list(remove)
+        add = add or {}
+        if not sets and not remove and not add:
+            raise InvalidUpdate("No fields to update")
+
+        names = {}
+        values = {}
+
+        def name(path: str) -> str:
+            placeholders = []
+            for key in path.split("."):
+                if key not in names:
+                    names[key] = "#n{}".format(len(names))
+                placeholders.append(names[key])
+            return ".".join(placeholders)
+
+        def value(val: Any) -> str:
+            placeholder = ":v{}".format(len(values))
+            values[placeholder] = val
+            return placeholder
+
+        clauses = []
+        if sets:
+            clauses.append("SET " + ", ".join("{} = {}".format(name(p), value(v)) for p, v in sets))
+        if remove:
+            clauses.append("REMOVE " + ", ".join(name(p) for p in remove))
+        if add:
+            clauses.append("ADD " + ", ".join("{} {}".format(name(p), value(v)) for p, v in add.items()))
+
+        params = {
+            "UpdateExpression": " ".join(clauses),
+            "ExpressionAttributeNames": {placeholder: key for key, placeholder in names.items()}
+        }
+        if values:
+            params["ExpressionAttributeValues"] = values
+        return params
@@ -3,29 +3,49 @@ EventBridge helpers for Lambda functions
 """
 
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
+import logging
 import os
+import random
+import time
+from typing import Dict, List
 from boto3.dynamodb.types import TypeDeserializer
-from .helpers import Encoder
+from .dynamodb import diff_images, image_to_json, image_to_plain
 
 
-__all__ = ["ddb_to_event"]
+__all__ = ["ddb_to_event", "entry_size", "pack_entries", "put_events", "put_record_events"]
 deserialize = TypeDeserializer().deserialize
 
 
+# PutEvents limits
+MAX_ENTRIES = 10
+MAX_REQUEST_SIZE = 256*1024
+
+
 def ddb_to_event(
         ddb_record: dict,
         event_bus_name: str,
         source: str,
         object_type: str,
-        resource_key: str
+        resource_key: str,
+        compact: bool = False
     ) -> dict:
     """
     Transforms a DynamoDB Streams record into an EventBridge event
 
     For this function to works, you need to have a StreamViewType of
     NEW_AND_OLD_IMAGES.
+
+    Images are converted straight from DynamoDB JSON to plain JSON types,
+    without going through Decimal values and the Encoder class.
+
+    For MODIFY records, the detail contains the top-level attributes that
+    changed in 'changed', and the JSON pointers to the nested values that
+    changed in 'changedPaths'. With 'compact', 'old' only contains the
+    previous values of changed attributes, to keep large items under the
+    EventBridge size limit.
     """
 
     event = {
@@ -45,51 +65,202 @@ def ddb_to_event(
     # Created event
     if ddb_record["eventName"].upper() == "INSERT":
         event["DetailType"] = "{}Created".format(object_type)
-        event["Detail"] = json.dumps({
-            k: deserialize(v)
-            for k, v
-            in ddb_record["dynamodb"]["NewImage"].items()
-        }, cls=Encoder)
+        event["Detail"] = image_to_json(ddb_record["dynamodb"]["NewImage"])
 
     # Deleted event
     elif ddb_record["eventName"].upper() == "REMOVE":
         event["DetailType"] = "{}Deleted".format(object_type)
-        event["Detail"] = json.dumps({
-            k: deserialize(v)
-            for k, v
-            in ddb_record["dynamodb"]["OldImage"].items()
-        }, cls=Encoder)
+        event["Detail"] = image_to_json(ddb_record["dynamodb"]["OldImage"])
 
     elif ddb_record["eventName"].upper() == "MODIFY":
-        new = {
-            k: deserialize(v)
-            for k, v
-            in ddb_record["dynamodb"]["NewImage"].items()
-        }
-        old = {
-            k: deserialize(v)
-            for k, v
-            in ddb_record["dynamodb"]["OldImage"].items()
-        }
+        new_image = ddb_record["dynamodb"]["NewImage"]
+        old_image = ddb_record["dynamodb"]["OldImage"]
 
-        # Old keys not in NewImage
-        changed = [k for k in old.keys() if k not in new.keys()]
-        for k in new.keys():
-            # New keys not in OldImage
-            if k not in old.keys():
-                changed.append(k)
-            # New keys that are not equal to old values
-            elif new[k] != old[k]:
-                changed.append(k)
+        # Compare the raw images, so only changed values need to be looked at
+        changes = diff_images(old_image, new_image)
+
+        if compact:
+            old_image = {k: old_image[k] for k in changes.keys() if k in old_image}
 
         event["DetailType"] = "{}Modified".format(object_type)
         event["Detail"] = json.dumps({
-            "new": new,
-            "old": old,
-            "changed": changed
-        }, cls=Encoder)
+            "new": image_to_plain(new_image),
+            "old": image_to_plain(old_image),
+            "changed": list(changes.keys()),
+            "changedPaths": [path for paths in changes.values() for path in paths]
+        })
 
     else:
         raise ValueError("Wrong eventName value for DynamoDB event: {}".format(ddb_record["eventName"]))
 
-    return event
\ No newline at end of file
+    return event
+
+
+def entry_size(entry: dict) -> int:
+    """
+    Returns the size of a PutEvents entry, as calculated by EventBridge
+    """
+
+    size = 14 if entry.get("Time") is not None else 0
+    for key in ["Source", "DetailType", "Detail"]:
+        if entry.get(key) is not None:
+            size += len(entry[key].encode("utf-8"))
+    for resource in entry.get("Resources", []):
+        size += len(resource.encode("utf-8"))
+
+    return size
+
+
+def pack_entries(entries: List[dict]) -> List[List[int]]:
+    """
+    Group entries into PutEvents requests
+
+    This returns lists of indices in 'entries', each list holding at most 10
+    entries and 256KB. Entries that are too large on their own are left out.
+    """
+
+    batches = []
+    batch = []
+    batch_size = 0
+
+    for index, entry in enumerate(entries):
+        size = entry_size(entry)
+        if size > MAX_REQUEST_SIZE:
+            continue
+
+        if len(batch) == MAX_ENTRIES or batch_size + size > MAX_REQUEST_SIZE:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+
+        batch.append(index)
+        batch_size += size
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def _put_batch(
+        client,
+        entries: List[dict],
+        indices: List[int],
+        max_attempts: int,
+        base_delay: float
+    ) -> Dict[int, dict]:
+    """
+    Send one PutEvents request, retrying failed entries only
+
+    Returns the last error for entries that could not be sent, by index.
+    """
+
+    failures = {}
+    for attempt in range(max_attempts):
+        # Full jitter exponential backoff between attempts
+        if attempt > 0:
+            time.sleep(random.uniform(0, base_delay * 2**attempt))
+
+        try:
+            res = client.put_events(Entries=[entries[i] for i in indices])
+        except Exception as exc: # pylint: disable=broad-except
+            failures = {
+                i: {"ErrorCode": type(exc).__name__, "ErrorMessage": str(exc)}
+                for i in indices
+            }
+            continue
+
+        if res.get("FailedEntryCount", 0) == 0:
+            return {}
+
+        # Results are in the same order as the request entries
+        failures = {
+            i: result
+            for i, result in zip(indices, res["Entries"])
+            if "ErrorCode" in result
+        }
+        indices = list(failures.keys())
+
+    return failures
+
+
+def put_events(
+        client,
+        entries: List[dict],
+        max_workers: int = 4,
+        max_attempts: int = 3,
+        base_delay: float = 0.05
+    ) -> List[dict]:
+    """
+    Send events to EventBridge
+
+    Entries are packed by count and size into PutEvents requests, which are
+    sent concurrently. Entries rejected by EventBridge are retried with
+    jittered backoff.
+
+    Entries are therefore not delivered in order: an entry can reach
+    EventBridge before one that precedes it in 'entries', even when both
+    concern the same resource. EventBridge does not guarantee ordering
+    either, so consumers must not rely on it.
+
+    This returns the entries that could not be sent, as dicts with the
+    'index' of the entry, 'ErrorCode' and 'ErrorMessage'.
+    """
+
+    batches = pack_entries(entries)
+    packed = {i for batch in batches for i in batch}
+    failures = {
+        i: {"ErrorCode": "EntryTooLarge", "ErrorMessage": "Entry exceeds {} bytes".format(MAX_REQUEST_SIZE)}
+        for i in range(len(entries))
+        if i not in packed
+    }
+
+    if len(batches) == 1:
+        failures.update(_put_batch(client, entries, batches[0], max_attempts, base_delay))
+    elif len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            for result in executor.map(
+                    lambda batch: _put_batch(client, entries, batch, max_attempts, base_delay),
+                    batches
+                ):
+                failures.update(result)
+
+    return [
+        {"index": i, "ErrorCode": failures[i].get("ErrorCode"), "ErrorMessage": failures[i].get("ErrorMessage")}
+        for i in sorted(failures.keys())
+    ]
+
+
+def put_record_events(client, records: List[dict], events: List[dict], logger=None) -> dict:
+    """
+    Send events created from DynamoDB Streams records to EventBridge
+
+    'events[i]' is the event for 'records[i]'. This returns the partial batch
+    response of the Lambda function, with the sequence numbers of the records
+    whose events could not be sent, so Lambda retries the batch from the
+    first of them. Events sent before that failure are sent again.
+
+    As with put_events(), events are not delivered in the order of the
+    records, including within a retried batch.
+    """
+
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    logger.info("Sending %d events to EventBridge", len(events))
+    failures = put_events(client, events)
+
+    for failure in failures:
+        logger.warning({
+            "message": "Failed to send event to EventBridge",
+            "event": events[failure["index"]],
+            "errorCode": failure["ErrorCode"],
+            "errorMessage": failure["ErrorMessage"]
+        })
+
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": records[failure["index"]]["dynamodb"]["SequenceNumber"]}
+            for failure in failures
+        ]
+    }
@@ -0,0 +1,113 @@
+"""
+HTTP helpers for Lambda functions
+"""
+
+
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+import boto3
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from aws_requests_auth.boto_utils import BotoAWSRequestsAuth
+
+
+__all__ = ["Client"]
+
+
+# Connect and read timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+# Only retry on errors from the load balancer in front of the API
+RETRY_STATUS_CODES = [502, 503, 504]
+
+
+class Client:
+    """
+    Pooled HTTP client for service-to-service calls
+
+    This keeps a requests Session with one connection pool per host, and
+    caches the AWS region and the SigV4 signer for each host. Create it once at
+    the module level of a Lambda function so warm containers reuse sockets,
+    TLS sessions and credentials across invocations.
+
+    Connection errors are retried for all methods, but 5xx responses are only
+    retried for idempotent methods, as a POST might have been processed.
+    """
+
+    def __init__(
+            self,
+            sign: bool = True,
+            service: str = "execute-api",
+            region: Optional[str] = None,
+            timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+            retries: int = 2,
+            backoff_factor: float = 0.1,
+            pool_maxsize: int = 10
+        ):
+        self.sign = sign
+        self.service = service
+        self.region = region
+        if sign and region is None:
+            self.region = boto3.session.Session().region_name
+        self.timeout = timeout
+        self._auths: Dict[str, BotoAWSRequestsAuth] = {}
+
+        adapter = HTTPAdapter(
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUS_CODES,
+                raise_on_status=False
+            )
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def auth(self, url: str) -> Optional[BotoAWSRequestsAuth]:
+        """
+        Returns the cached signature helper for the host of a URL
+        """
+
+        if not self.sign:
+            return None
+
+        host = urlparse(url).netloc
+        if host not in self._auths:
+            self._auths[host] = BotoAWSRequestsAuth(
+                aws_host=host,
+                aws_region=self.region,
+                aws_service=self.service
+            )
+        return self._auths[host]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the connection pool
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("auth", self.auth(url))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a GET request
+        """
+
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        Send a POST request
+        """
+
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        """
+        Close all pooled connections
+        """
+
+        self.session.close()
@@ -0,0 +1,53 @@
+"""
+Version counters of the listeners of the platform WebSocket API
+
+RegisterFunction and OnDisconnectFunction increment the counter of a service
+when its listeners change, and OnEventsFunction caches the listeners of each
+service until its counter changes. Counters are items of the listener table,
+with 'VERSION_PREFIX' followed by the service name as their ID, so all these
+functions must use this module to read and write them.
+"""
+
+
+__all__ = ["VERSION_PREFIX", "bump_version", "read_version", "version_key"]
+
+
+# Prefix for the IDs of the version counter items
+VERSION_PREFIX = "version#"
+
+
+def version_key(service_name: str) -> dict:
+    """
+    Returns the key of the version counter of a service
+    """
+
+    return {"id": VERSION_PREFIX + service_name}
+
+
+def bump_version(table, service_name: str) -> None:
+    """
+    Increment the version counter of the listeners of a service
+
+    'table' is the listener table, as a boto3 Table resource.
+    """
+
+    table.update_item(
+        Key=version_key(service_name),
+        UpdateExpression="ADD #version :one",
+        ExpressionAttributeNames={"#version": "version"},
+        ExpressionAttributeValues={":one": 1}
+    )
+
+
+def read_version(table, service_name: str) -> int:
+    """
+    Returns the version counter of the listeners of a service, or 0 if its
+    listeners never changed
+    """
+
+    item = table.get_item(
+        Key=version_key(service_name),
+        ProjectionExpression="#version",
+        ExpressionAttributeNames={"#version": "version"}
+    ).get("Item")
+    return int(item["version"]) if item is not None else 0
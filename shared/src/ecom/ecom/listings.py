@@ -0,0 +1,84 @@
+"""
+Search indexes of listings
+
+Searches are served by global secondary indexes of the listings table that
+use the equality filters as their partition key and the price as their sort
+key. When an index covers several filters, its partition key is a composite
+attribute joining their values with SEPARATOR, such as "<city>#<category>".
+
+CreateListingFunction and UpdateListingFunction write these attributes with
+search_keys(), and the search planner queries them, so both are derived from
+INDEXES.
+"""
+
+
+from typing import Dict, Optional
+
+
+__all__ = ["INDEXES", "SEARCH_KEYS", "SEPARATOR", "SORT_KEY", "legacy_update", "search_keys"]
+
+
+# Search indexes, from the most to the least selective. 'fields' are the
+# equality filters covered by the partition key of the index.
+INDEXES = [
+    {"name": "city-category-price-index", "key": "searchCityCategory", "fields": ("city", "category")},
+    {"name": "city-price-index", "key": "searchCity", "fields": ("city", )},
+    {"name": "category-price-index", "key": "category", "fields": ("category", )}
+]
+# Sort key of all search indexes
+SORT_KEY = "price"
+# Separator for composite partition keys
+SEPARATOR = "#"
+# Attributes that only exist as partition keys of search indexes
+SEARCH_KEYS = [index["key"] for index in INDEXES if index["key"] not in index["fields"]]
+
+
+def search_keys(city: Optional[str], category: Optional[str]) -> Dict[str, str]:
+    """
+    Returns the attributes used as partition keys by the search indexes
+
+    Listings without a city or category are not part of the indexes on them,
+    as GSIs are sparse.
+    """
+
+    values = {"city": city, "category": category}
+    keys = {}
+    for index in INDEXES:
+        if index["key"] in SEARCH_KEYS and all(values[field] for field in index["fields"]):
+            keys[index["key"]] = SEPARATOR.join(values[field] for field in index["fields"])
+    return keys
+
+
+def legacy_update(item: dict) -> Optional[dict]:
+    """
+    Returns the parameters of UpdateItem to migrate a listing created before
+    the search indexes, or None if it is up to date
+
+    Listings used to store their city as 'City', without search keys.
+    """
+
+    city = item.get("city", item.get("City"))
+    keys = search_keys(city, item.get("category"))
+    if "City" not in item and all(item.get(key) == value for key, value in keys.items()):
+        return None
+
+    names = {}
+    values = {}
+    assignments = []
+    for i, (name, value) in enumerate(dict(keys, city=city).items()):
+        names["#a{}".format(i)] = name
+        values[":a{}".format(i)] = value
+        assignments.append("#a{i} = :a{i}".format(i=i))
+    expression = "SET " + ", ".join(assignments)
+    if "City" in item:
+        names["#legacy"] = "City"
+        expression += " REMOVE #legacy"
+
+    return {
+        "Key": {"listingId": item["listingId"]},
+        "UpdateExpression": expression,
+        # Do not recreate listings deleted in the meantime
+        "ConditionExpression": "attribute_exists(listingId)",
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values
+    }
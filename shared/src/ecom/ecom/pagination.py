@@ -0,0 +1,133 @@
+"""
+Pagination helpers for DynamoDB Query and Scan operations
+
+APIs return opaque cursors instead of the raw LastEvaluatedKey. A cursor is
+bound to a scope, such as the index it was created for, and can be signed
+with a secret so that clients cannot forge their own keys.
+"""
+
+
+import base64
+import binascii
+from decimal import Decimal
+import hashlib
+import hmac
+import json
+from typing import Callable, List, Optional, Tuple
+from .helpers import Encoder
+
+
+__all__ = ["InvalidCursor", "decode_cursor", "encode_cursor", "fill_page"]
+
+
+# Length of the signature in bytes
+SIGNATURE_SIZE = 16
+
+
+class InvalidCursor(Exception):
+    """
+    The cursor is malformed, forged, or belongs to another scope
+    """
+
+
+def _sign(data: bytes, secret: Optional[str]) -> bytes:
+    """
+    Returns the signature of a cursor, or an empty signature without secret
+    """
+
+    if not secret:
+        return b""
+    return hmac.new(secret.encode("utf-8"), data, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def encode_cursor(key: Optional[dict], scope: str, secret: Optional[str] = None) -> Optional[str]:
+    """
+    Returns an opaque cursor for a LastEvaluatedKey
+    """
+
+    if key is None:
+        return None
+
+    data = json.dumps({"s": scope, "k": key}, separators=(",", ":"), cls=Encoder).encode("utf-8")
+    return base64.urlsafe_b64encode(_sign(data, secret) + data).decode("ascii")
+
+
+def decode_cursor(
+        cursor: Optional[str],
+        scope: str,
+        key_attributes: List[str],
+        secret: Optional[str] = None
+    ) -> Optional[dict]:
+    """
+    Returns the ExclusiveStartKey from a cursor
+
+    Raises InvalidCursor if the cursor is malformed, if its signature does
+    not match, or if it was created for another scope or key schema.
+    """
+
+    if not cursor:
+        return None
+
+    signature_size = SIGNATURE_SIZE if secret else 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        signature, data = raw[:signature_size], raw[signature_size:]
+        if not hmac.compare_digest(signature, _sign(data, secret)):
+            raise InvalidCursor("Invalid cursor signature")
+        data = json.loads(data, parse_float=Decimal)
+        cursor_scope, key = data["s"], data["k"]
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+
+    if cursor_scope != scope or not isinstance(key, dict) or sorted(key.keys()) != sorted(key_attributes):
+        raise InvalidCursor("Cursor does not match the request")
+
+    return key
+
+
+def fill_page(
+        operation: Callable[..., dict],
+        params: dict,
+        limit: int,
+        key_attributes: List[str],
+        start_key: Optional[dict] = None,
+        read_size: Optional[int] = None,
+        max_reads: int = 10
+    ) -> Tuple[List[dict], Optional[dict]]:
+    """
+    Read up to 'limit' items from a Query or Scan operation
+
+    As DynamoDB applies 'Limit' before the FilterExpression, filtered pages
+    can be sparse. This reads until there are 'limit' items or 'max_reads'
+    requests were made, and returns the items and the LastEvaluatedKey to
+    resume from, or None on the last page.
+
+    'read_size' is the Limit of each request, and defaults to the number of
+    items still needed. 'key_attributes' are the attributes of the
+    LastEvaluatedKey, which is rebuilt from the last returned item when a
+    request returns more items than needed.
+    """
+
+    items = []
+
+    for _ in range(max_reads):
+        needed = limit - len(items)
+        request = dict(params, Limit=max(needed, read_size or 0))
+        if start_key is not None:
+            request["ExclusiveStartKey"] = start_key
+
+        res = operation(**request)
+        page = res.get("Items", [])
+
+        if len(page) >= needed:
+            items.extend(page[:needed])
+            if len(page) == needed and res.get("LastEvaluatedKey") is None:
+                return items, None
+            return items, {k: page[needed-1][k] for k in key_attributes}
+
+        items.extend(page)
+        start_key = res.get("LastEvaluatedKey")
+        if start_key is None:
+            break
+
+    return items, start_key
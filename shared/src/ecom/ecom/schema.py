@@ -0,0 +1,75 @@
+"""
+JSON Schema helpers for Lambda functions
+"""
+
+
+import functools
+import json
+from typing import List
+import fastjsonschema
+import jsonschema
+
+
+__all__ = ["Validator", "load_validator"]
+
+
+class Validator:
+    """
+    Precompiled JSON Schema validator
+
+    The schema is checked once and compiled into a specialized Python function
+    with fastjsonschema. As most payloads are valid, only that function runs on
+    the happy path. When it rejects a payload, jsonschema goes through it again
+    to collect every error with a readable message.
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        self._validator = validator_class(schema)
+
+        # jsonschema does not check formats or inject default values by
+        # default, so turn these off to get the same results.
+        self._compiled = fastjsonschema.compile(schema, use_default=False, use_formats=False)
+
+    def errors(self, instance) -> List[str]:
+        """
+        Returns the list of validation errors, or an empty list if the instance
+        is valid
+        """
+
+        try:
+            self._compiled(instance)
+            return []
+        except fastjsonschema.JsonSchemaException:
+            pass
+
+        return [
+            "{}: {}".format(
+                "/" + "/".join(str(p) for p in error.absolute_path),
+                error.message
+            )
+            for error in self._validator.iter_errors(instance)
+        ]
+
+    def is_valid(self, instance) -> bool:
+        """
+        Returns True if the instance is valid
+        """
+
+        return len(self.errors(instance)) == 0
+
+
+@functools.lru_cache(maxsize=None)
+def load_validator(path: str) -> Validator:
+    """
+    Load and compile a JSON Schema file
+
+    Validators are cached per path, so the file is only read and compiled
+    once per container.
+    """
+
+    with open(path) as fp:
+        return Validator(json.load(fp))
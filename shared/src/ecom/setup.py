@@ -6,12 +6,14 @@ from setuptools import find_packages, setup
 
 setup(
     author="Amazon Web Services",
-    install_requires=["boto3"],
+    install_requires=[
+        "aws-requests-auth", "boto3", "fastjsonschema>=2.15", "jsonschema", "requests"
+    ],
     license="MIT-0",
     name="ecom",
     packages=find_packages(),
     setup_requires=["pytest-runner"],
     test_suite="tests",
     tests_require=["pytest"],
-    version="0.1.2"
+    version="0.1.13"
 )
\ No newline at end of file
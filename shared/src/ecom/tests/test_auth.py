@@ -0,0 +1,303 @@
+import base64
+import hashlib
+import json
+import random
+import pytest
+from ecom import auth # pylint: disable=import-error
+
+
+ISSUER = "https://cognito-idp.eu-west-1.amazonaws.com/eu-west-1_TEST"
+NOW = 1600000000
+
+# RFC 7515, appendix A.2: JWS using RSASSA-PKCS1-v1_5 SHA-256
+RFC7515_A2 = {
+    "n": (
+        "ofgWCuLjybRlzo0tZWJjNiuSfb4p4fAkd_wWJcyQoTbji9k0l8W26mPddx"
+        "HmfHQp-Vaw-4qPCJrcS2mJPMEzP1Pt0Bm4d4QlL-yRT-SFd2lZS-pCgNMs"
+        "D1W_YpRPEwOWvG6b32690r2jZ47soMZo9wGzjb_7OMg0LOL-bSf63kpaSH"
+        "SXndS5z5rexMdbBYUsLA9e-KXBdQOS-UTo7WTBEMa2R2CapHg665xsmtdV"
+        "MTBQY4uDZlxvb3qCo5ZwKh9kG4LT6_I5IhlJH7aGhyxXFvUK-DWNmoudF8"
+        "NAco9_h9iaGNj8q2ethFkMLs91kzk2PAcDTW9gb54h4FRWyuXpoQ"
+    ),
+    "e": "AQAB",
+    "protected": "eyJhbGciOiJSUzI1NiJ9",
+    "payload": (
+        "eyJpc3MiOiJqb2UiLA0KICJleHAiOjEzMDA4MTkzODAsDQogImh0dHA6Ly9leGFt"
+        "cGxlLmNvbS9pc19yb290Ijp0cnVlfQ"
+    ),
+    "signature": (
+        "cC4hiUPoj9Eetdgtv3hF80EGrhuB__dzERat0XF9g2VtQgr9PJbu3XOiZj5RZmh7"
+        "AAuHIm4Bh-0Qc_lF5YKt_O8W2Fp5jujGbds9uJdbF9CUAr7t1dnZcAcQjbKBYNX4"
+        "BAynRFdiuB--f_nZLgrnbyTyWzO75vRK5h6xBArLIARNPvkSjtQBMHlb1L07Qe7K"
+        "0GarZRmB_eSN9383LcOLn6_dO--xi12jzDwusC-eOkHWEsqtFZESc6BfI7noOPqv"
+        "hJ1phCnvWh6IeYI2w9QOYEUipUTI8np6LbgGY9Fs98rqVt5AXLIhWkWywlVmtVrB"
+        "p0igcN_IoypGlUPQGe77Rw"
+    )
+}
+
+
+def is_prime(value: int, rounds: int = 20) -> bool:
+    """
+    Miller-Rabin primality test
+    """
+
+    if value < 4:
+        return value in (2, 3)
+    d, s = value - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for _ in range(rounds):
+        x = pow(random.randrange(2, value - 1), d, value)
+        if x in (1, value - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, value)
+            if x == value - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def generate_key(bits: int = 1024) -> dict:
+    """
+    Generate an RSA key pair
+    """
+
+    exponent = 65537
+    while True:
+        primes = []
+        while len(primes) < 2:
+            candidate = random.getrandbits(bits // 2) | (1 << (bits // 2 - 1)) | 1
+            if is_prime(candidate) and (candidate - 1) % exponent != 0:
+                primes.append(candidate)
+        modulus = primes[0] * primes[1]
+        if modulus.bit_length() == bits:
+            break
+    private = pow(exponent, -1, (primes[0] - 1) * (primes[1] - 1))
+    return {"n": modulus, "e": exponent, "d": private}
+
+
+def b64encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode("ascii")
+
+
+def to_jwk(kid: str, key: dict) -> dict:
+    def encode(value: int) -> str:
+        return b64encode(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+    return {"kid": kid, "kty": "RSA", "alg": "RS256", "use": "sig", "n": encode(key["n"]), "e": encode(key["e"])}
+
+
+def sign(kid: str, key: dict, claims: dict, alg: str = "RS256") -> str:
+    """
+    Create a signed JWT
+    """
+
+    header = b64encode(json.dumps({"kid": kid, "alg": alg}).encode("utf-8"))
+    payload = b64encode(json.dumps(claims).encode("utf-8"))
+    size = (key["n"].bit_length() + 7) // 8
+    digest_info = auth.SHA256_DIGEST_INFO + hashlib.sha256("{}.{}".format(header, payload).encode("ascii")).digest()
+    encoded = b"\x00\x01" + b"\xff" * (size - len(digest_info) - 3) + b"\x00" + digest_info
+    signature = pow(int.from_bytes(encoded, "big"), key["d"], key["n"]).to_bytes(size, "big")
+    return "{}.{}.{}".format(header, payload, b64encode(signature))
+
+
+def get_claims(**kwargs) -> dict:
+    claims = {
+        "sub": "USER_ID",
+        "username": "USER_ID",
+        "cognito:groups": ["host"],
+        "iss": ISSUER,
+        "token_use": "access",
+        "client_id": "CLIENT_ID",
+        "iat": NOW - 60,
+        "exp": NOW + 3600
+    }
+    claims.update(kwargs)
+    return claims
+
+
+@pytest.fixture(scope="module")
+def keys():
+    random.seed(0)
+    return {"key1": generate_key(), "key2": generate_key()}
+
+
+@pytest.fixture
+def jwks(keys):
+    class FakeJWKS:
+        def __init__(self):
+            self.keys = {"key1": keys["key1"]}
+            self.calls = 0
+
+        def __call__(self, url):
+            assert url == ISSUER + "/.well-known/jwks.json"
+            self.calls += 1
+            return {"keys": [to_jwk(kid, key) for kid, key in self.keys.items()]}
+
+    return FakeJWKS()
+
+
+@pytest.fixture
+def clock():
+    class FakeClock:
+        def __init__(self):
+            self.now = NOW
+
+        def __call__(self):
+            return self.now
+
+    return FakeClock()
+
+
+@pytest.fixture
+def verifier(jwks, clock):
+    return auth.Verifier(
+        ISSUER,
+        client_id="CLIENT_ID",
+        keys=auth.KeySet(ISSUER + "/.well-known/jwks.json", fetch=jwks, clock=clock),
+        cache=auth.TTLCache(clock=clock),
+        clock=clock
+    )
+
+
+def test_cognito_issuer():
+    """
+    Test cognito_issuer()
+    """
+
+    assert auth.cognito_issuer("eu-west-1_TEST") == ISSUER
+
+
+def test_groups():
+    """
+    Test groups()
+    """
+
+    assert auth.groups(get_claims()) == ["host"]
+    assert auth.groups({"sub": "USER_ID"}) == []
+
+
+def test_verify_rs256_known_answer():
+    """
+    Test verify_rs256() with the example of RFC 7515
+    """
+
+    key = (auth._to_int(RFC7515_A2["n"]), auth._to_int(RFC7515_A2["e"])) # pylint: disable=protected-access
+    message = "{}.{}".format(RFC7515_A2["protected"], RFC7515_A2["payload"]).encode("ascii")
+    signature = auth._b64decode(RFC7515_A2["signature"]) # pylint: disable=protected-access
+
+    assert auth.verify_rs256(key, message, signature)
+    assert not auth.verify_rs256(key, message + b"x", signature)
+    assert not auth.verify_rs256(key, message, signature[:-1] + bytes([signature[-1] ^ 1]))
+
+
+def test_verify(verifier, keys, jwks):
+    """
+    Test Verifier.verify()
+    """
+
+    claims = get_claims()
+    token = sign("key1", keys["key1"], claims)
+
+    assert verifier.verify(token) == claims
+    assert verifier.verify("Bearer " + token) == claims
+    assert jwks.calls == 1
+
+
+def test_verify_cached(verifier, keys, clock):
+    """
+    Verified tokens are cached until they expire
+    """
+
+    token = sign("key1", keys["key1"], get_claims(exp=NOW + 60))
+    verifier.verify(token)
+    assert verifier.cache.misses == 1
+
+    verifier.verify(token)
+    assert verifier.cache.hits == 1
+
+    clock.now = NOW + 60 + auth.LEEWAY
+    with pytest.raises(auth.InvalidToken):
+        verifier.verify(token)
+
+
+def test_verify_invalid(verifier, keys):
+    """
+    Test Verifier.verify() with invalid tokens
+    """
+
+    token = sign("key1", keys["key1"], get_claims())
+    header, payload, signature = token.split(".")
+    other_payload = b64encode(json.dumps(get_claims(sub="OTHER")).encode("utf-8"))
+
+    tokens = [
+        None,
+        "",
+        "abc",
+        "a.b.c",
+        # Non-ASCII characters
+        "{}.{}.{}".format(header, payload, signature + "\u00e9"),
+        "\u00e9" + token,
+        # Tampered claims
+        "{}.{}.{}".format(header, other_payload, signature),
+        # Truncated signature
+        "{}.{}.{}".format(header, payload, signature[:-4]),
+        # Signed with a key that is not in the JWKS
+        sign("key1", keys["key2"], get_claims()),
+        sign("unknown", keys["key1"], get_claims()),
+        sign("key1", keys["key1"], get_claims(), alg="none"),
+        sign("key1", keys["key1"], get_claims(exp=NOW - auth.LEEWAY)),
+        sign("key1", keys["key1"], get_claims(exp="never")),
+        sign("key1", keys["key1"], get_claims(iat=NOW + 3600)),
+        sign("key1", keys["key1"], get_claims(iss="https://example.local")),
+        sign("key1", keys["key1"], get_claims(token_use="id")),
+        sign("key1", keys["key1"], get_claims(client_id="OTHER"))
+    ]
+
+    for token in tokens:
+        with pytest.raises(auth.InvalidToken):
+            verifier.verify(token)
+
+
+def test_key_rotation(verifier, keys, jwks, clock):
+    """
+    Unknown key IDs read the JWKS again, at most once per minimum refresh
+    interval
+    """
+
+    verifier.verify(sign("key1", keys["key1"], get_claims()))
+    assert jwks.calls == 1
+
+    jwks.keys["key2"] = keys["key2"]
+    token = sign("key2", keys["key2"], get_claims())
+    with pytest.raises(auth.InvalidToken):
+        verifier.verify(token)
+    assert jwks.calls == 1
+
+    clock.now = NOW + auth.JWKS_MIN_REFRESH
+    assert verifier.verify(token)["sub"] == "USER_ID"
+    assert jwks.calls == 2
+
+
+def test_key_set_ttl(keys, jwks, clock):
+    """
+    The JWKS is read again after its TTL, and kept if it cannot be read
+    """
+
+    key_set = auth.KeySet(ISSUER + "/.well-known/jwks.json", ttl=100, fetch=jwks, clock=clock)
+    assert key_set.get("key1") == (keys["key1"]["n"], keys["key1"]["e"])
+
+    clock.now = NOW + 100
+    jwks.keys = {"key2": keys["key2"]}
+    assert key_set.get("key1") is None
+    assert key_set.get("key2") is not None
+    assert jwks.calls == 2
+
+    def fail(_):
+        raise ConnectionError()
+
+    key_set.fetch = fail
+    clock.now = NOW + 200
+    assert key_set.get("key2") is not None
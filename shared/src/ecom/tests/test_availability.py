@@ -0,0 +1,335 @@
+import datetime
+import boto3
+import pytest
+from botocore import stub
+from ecom import availability # pylint: disable=import-error
+
+
+TABLE_NAME = "CALENDAR_TABLE_NAME"
+LISTING_ID = "LISTING_ID"
+
+
+def date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+@pytest.fixture
+def table():
+    return boto3.resource("dynamodb").Table(TABLE_NAME)
+
+
+def test_month_masks():
+    """
+    Test month_masks()
+    """
+
+    assert availability.month_masks(date("2021-06-01"), date("2021-06-03")) == [("2021-06", 0b11)]
+    assert availability.month_masks(date("2021-06-10"), date("2021-06-11")) == [("2021-06", 1 << 9)]
+    # Spans multiple months, end date excluded
+    assert availability.month_masks(date("2021-06-29"), date("2021-08-02")) == [
+        ("2021-06", 0b11 << 28),
+        ("2021-07", (1 << 31) - 1),
+        ("2021-08", 0b1)
+    ]
+    # Leap years
+    assert availability.month_masks(date("2020-02-01"), date("2020-03-01")) == [("2020-02", (1 << 29) - 1)]
+    assert availability.month_masks(date("2021-06-01"), date("2021-06-01")) == []
+
+
+def test_to_bitsets():
+    """
+    Test to_bitsets()
+    """
+
+    assert availability.to_bitsets([
+        {"date": "2021-06-01", "available": True},
+        {"date": "2021-06-02", "available": False},
+        {"date": "2021-06-03", "available": True},
+        {"date": "2021-07-31", "available": True},
+        {"date": "2021-08-01", "available": False}
+    ]) == {"2021-06": 0b101, "2021-07": 1 << 30, "2021-08": 0}
+
+
+def test_is_free():
+    """
+    Test is_free()
+    """
+
+    bitsets = {"2021-06": 0b0111 << 28, "2021-07": 0b1}
+
+    assert availability.is_free(bitsets, availability.month_masks(date("2021-06-29"), date("2021-07-02")))
+    assert not availability.is_free(bitsets, availability.month_masks(date("2021-06-28"), date("2021-07-02")))
+    assert not availability.is_free(bitsets, availability.month_masks(date("2021-06-29"), date("2021-07-03")))
+    # Months without a calendar are not available
+    assert not availability.is_free(bitsets, availability.month_masks(date("2021-08-01"), date("2021-08-02")))
+
+
+def test_find_available():
+    """
+    Test find_available()
+    """
+
+    partitions = {
+        "Paris#2021-06": [
+            {"listingId": "a", "free": 0b11 << 28},
+            {"listingId": "b", "free": 0b01 << 28},
+            {"listingId": "c", "free": 0b11 << 28}
+        ],
+        "Paris#2021-07": [
+            {"listingId": "a", "free": 0b1},
+            {"listingId": "b", "free": 0b1},
+            {"listingId": "c", "free": 0b0}
+        ]
+    }
+    calls = []
+
+    def query(**kwargs):
+        calls.append(kwargs)
+        assert kwargs["IndexName"] == availability.CITY_INDEX
+        partition = kwargs["KeyConditionExpression"].get_expression()["values"][1]
+        return {"Items": partitions.get(partition, [])}
+
+    assert availability.find_available(query, "Paris", date("2021-06-29"), date("2021-07-02")) == {"a"}
+    assert len(calls) == 2
+
+    # Stops at the first month without available listings
+    calls.clear()
+    assert availability.find_available(query, "Paris", date("2021-05-31"), date("2021-07-02")) == set()
+    assert len(calls) == 1
+
+
+def test_book(table):
+    """
+    Test book() across two months
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("batch_get_item", {"Responses": {TABLE_NAME: [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": str(0b111 << 27)}},
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-07"}, "free": {"N": "3"}, "booked": {"N": "4"}}
+    ]}}, {"RequestItems": {TABLE_NAME: {
+        "Keys": [
+            {"listingId": LISTING_ID, "month": "2021-06"},
+            {"listingId": LISTING_ID, "month": "2021-07"}
+        ],
+        "ConsistentRead": True
+    }}})
+    client.add_response("transact_write_items", {}, {"TransactItems": [{
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-06"},
+            "UpdateExpression": "SET #free = :new, #booked = :booked",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free", "#booked": "booked"},
+            "ExpressionAttributeValues": {":old": 0b111 << 27, ":new": 0b001 << 27, ":booked": 0b110 << 27}
+        }
+    }, {
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-07"},
+            "UpdateExpression": "SET #free = :new, #booked = :booked",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free", "#booked": "booked"},
+            "ExpressionAttributeValues": {":old": 3, ":new": 2, ":booked": 5}
+        }
+    }, {
+        "ConditionCheck": {
+            "TableName": "OTHER_TABLE",
+            "Key": {"id": "ID"},
+            "ConditionExpression": "attribute_exists(id)"
+        }
+    }]})
+    client.activate()
+
+    availability.book(
+        table, LISTING_ID, date("2021-06-29"), date("2021-07-02"),
+        extra=lambda: [{"ConditionCheck": {
+            "TableName": "OTHER_TABLE",
+            "Key": {"id": "ID"},
+            "ConditionExpression": "attribute_exists(id)"
+        }}]
+    )
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_book_unprocessed(table):
+    """
+    Test book() when BatchGetItem does not return all months at once
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("batch_get_item", {
+        "Responses": {TABLE_NAME: [
+            {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": str(0b111 << 27)}}
+        ]},
+        "UnprocessedKeys": {TABLE_NAME: {"Keys": [
+            {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-07"}}
+        ], "ConsistentRead": True}}
+    })
+    client.add_response("batch_get_item", {"Responses": {TABLE_NAME: [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-07"}, "free": {"N": "3"}}
+    ]}}, {"RequestItems": {TABLE_NAME: {
+        "Keys": [{"listingId": LISTING_ID, "month": "2021-07"}],
+        "ConsistentRead": True
+    }}})
+    client.add_response("transact_write_items", {})
+    client.activate()
+
+    availability.book(table, LISTING_ID, date("2021-06-29"), date("2021-07-02"))
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_book_not_available(table):
+    """
+    Test book() with booked days
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("batch_get_item", {"Responses": {TABLE_NAME: [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": "1"}}
+    ]}})
+    client.activate()
+
+    with pytest.raises(availability.NotAvailable):
+        availability.book(table, LISTING_ID, date("2021-06-01"), date("2021-06-03"))
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_book_conflict(table):
+    """
+    Test book() with a concurrent booking
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("batch_get_item", {"Responses": {TABLE_NAME: [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": "7"}}
+    ]}})
+    client.add_client_error(
+        "transact_write_items",
+        "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [{"Code": "ConditionalCheckFailed"}]}
+    )
+    # The concurrent booking took the first day
+    client.add_response("batch_get_item", {"Responses": {TABLE_NAME: [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": "6"}}
+    ]}})
+    client.activate()
+
+    with pytest.raises(availability.NotAvailable):
+        availability.book(table, LISTING_ID, date("2021-06-01"), date("2021-06-03"))
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_replace_calendar(table):
+    """
+    Test replace_calendar() with booked days
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("query", {"Items": [
+        # Days 2 and 3 are booked
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": "1"}, "booked": {"N": "6"}},
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-07"}, "free": {"N": "1"}},
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-08"}, "free": {"N": "0"}, "booked": {"N": "1"}}
+    ]}, {
+        "TableName": TABLE_NAME,
+        "KeyConditionExpression": stub.ANY,
+        "ConsistentRead": True
+    })
+    client.add_response("transact_write_items", {}, {"TransactItems": [{
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-06"},
+            "UpdateExpression": "SET #free = :free, cityMonth = :cityMonth",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free"},
+            "ExpressionAttributeValues": {":free": 0b1001, ":cityMonth": "Paris#2021-06", ":old": 1}
+        }
+    }, {
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-09"},
+            "UpdateExpression": "SET #free = :free, cityMonth = :cityMonth",
+            "ConditionExpression": "attribute_not_exists(listingId)",
+            "ExpressionAttributeNames": {"#free": "free"},
+            "ExpressionAttributeValues": {":free": 1, ":cityMonth": "Paris#2021-09"}
+        }
+    }, {
+        "Delete": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-07"},
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free"},
+            "ExpressionAttributeValues": {":old": 1}
+        }
+    }, {
+        # Bookings are kept
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-08"},
+            "UpdateExpression": "SET #free = :free",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free"},
+            "ExpressionAttributeValues": {":old": 0, ":free": 0}
+        }
+    }]})
+    client.activate()
+
+    calendar = availability.replace_calendar(table, LISTING_ID, "Paris", [
+        {"date": "2021-06-{:02d}".format(day), "available": True}
+        for day in range(1, 5)
+    ] + [{"date": "2021-09-01", "available": True}])
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+    assert [entry["available"] for entry in calendar] == [True, False, False, True, True]
+
+
+def test_replace_calendar_conflict(table):
+    """
+    Test replace_calendar() with a concurrent booking
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("query", {"Items": [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": "3"}}
+    ]})
+    client.add_client_error(
+        "transact_write_items",
+        "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [{"Code": "ConditionalCheckFailed"}]}
+    )
+    # The concurrent booking took the first day
+    client.add_response("query", {"Items": [
+        {"listingId": {"S": LISTING_ID}, "month": {"S": "2021-06"}, "free": {"N": "2"}, "booked": {"N": "1"}}
+    ]})
+    client.add_response("transact_write_items", {}, {"TransactItems": [{
+        "Update": {
+            "TableName": TABLE_NAME,
+            "Key": {"listingId": LISTING_ID, "month": "2021-06"},
+            "UpdateExpression": "SET #free = :free REMOVE cityMonth",
+            "ConditionExpression": "#free = :old",
+            "ExpressionAttributeNames": {"#free": "free"},
+            "ExpressionAttributeValues": {":free": 2, ":old": 2}
+        }
+    }]})
+    client.activate()
+
+    calendar = availability.replace_calendar(table, LISTING_ID, None, [
+        {"date": "2021-06-01", "available": True},
+        {"date": "2021-06-02", "available": True}
+    ])
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+    assert [entry["available"] for entry in calendar] == [False, True]
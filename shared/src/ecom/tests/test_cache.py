@@ -0,0 +1,369 @@
+import threading
+import boto3
+from botocore import stub
+import pytest
+from ecom.cache import DynamoDBStore, MemoryStore, Store, TTLCache, VersionedCache, create_store # pylint: disable=import-error
+
+
+class Clock:
+    """
+    Manually advanced clock
+    """
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_put():
+    """
+    Test TTLCache.get() and TTLCache.put()
+    """
+
+    cache = TTLCache()
+
+    assert cache.get("key") is None
+    assert cache.get("key", "default") == "default"
+
+    cache.put("key", "value")
+    assert cache.get("key") == "value"
+    assert len(cache) == 1
+
+    assert cache.hits == 1
+    assert cache.misses == 2
+    assert cache.hit_rate() == 1/3
+
+
+def test_ttl():
+    """
+    Test that entries expire after their TTL
+    """
+
+    clock = Clock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.put("key", "value")
+    cache.put("short", "value", ttl=1)
+
+    clock.now = 1
+    assert cache.get("short") is None
+    assert cache.get("key") == "value"
+
+    # Reading an entry does not extend its TTL
+    clock.now = 9.999
+    assert cache.get("key") == "value"
+    clock.now = 10
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+
+def test_lru():
+    """
+    Test that the least recently used entry is evicted
+    """
+
+    cache = TTLCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_get_many():
+    """
+    Test TTLCache.get_many()
+    """
+
+    cache = TTLCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    assert cache.get_many(["a", "c", "b"]) == {"a": 1, "b": 2}
+
+
+def test_invalidate():
+    """
+    Test TTLCache.invalidate() and TTLCache.clear()
+    """
+
+    cache = TTLCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_threads():
+    """
+    Test TTLCache with concurrent writers
+    """
+
+    cache = TTLCache(maxsize=100)
+
+    def write(offset):
+        for i in range(1000):
+            cache.put(offset+i, i)
+            cache.get(offset+i-1)
+
+    threads = [threading.Thread(target=write, args=(i*1000, )) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == 100
+
+
+def test_memory_store():
+    """
+    Test MemoryStore
+    """
+
+    clock = Clock()
+    store = MemoryStore(clock=clock)
+
+    assert store.get("key") is None
+    store.put("key", {"a": 1}, 10)
+    assert store.get("key") == {"a": 1}
+
+    clock.now = 10
+    assert store.get("key") is None
+
+    store.put("key", 1, 10)
+    store.delete("key")
+    store.delete("missing")
+    assert store.get("key") is None
+
+
+def test_store_abstract():
+    """
+    Stores must implement all methods
+    """
+
+    class PartialStore(Store):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_dynamodb_store():
+    """
+    Test DynamoDBStore
+    """
+
+    clock = Clock()
+    clock.now = 1000
+    table = boto3.resource("dynamodb").Table("CACHE_TABLE_NAME")
+    store = DynamoDBStore(table=table, clock=clock)
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("put_item", {}, {
+        "TableName": "CACHE_TABLE_NAME",
+        "Item": {"key": "key", "value": '{"a": 1}', "ttl": 1011}
+    })
+    for _ in range(2):
+        client.add_response("get_item", {"Item": {
+            "key": {"S": "key"}, "value": {"S": '{"a": 1}'}, "ttl": {"N": "1011"}
+        }}, {"TableName": "CACHE_TABLE_NAME", "Key": {"key": "key"}})
+    client.add_response("delete_item", {}, {"TableName": "CACHE_TABLE_NAME", "Key": {"key": "key"}})
+    client.add_response("get_item", {}, {"TableName": "CACHE_TABLE_NAME", "Key": {"key": "key"}})
+    client.activate()
+
+    store.put("key", {"a": 1}, 10)
+    assert store.get("key") == {"a": 1}
+    # Expired, but not deleted by DynamoDB yet
+    clock.now = 1011
+    assert store.get("key") is None
+    store.delete("key")
+    assert store.get("key") is None
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_dynamodb_store_get_many():
+    """
+    Test DynamoDBStore.get_many()
+    """
+
+    clock = Clock()
+    clock.now = 1000
+    table = boto3.resource("dynamodb").Table("CACHE_TABLE_NAME")
+    store = DynamoDBStore(table=table, clock=clock)
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("batch_get_item", {"Responses": {"CACHE_TABLE_NAME": [
+        {"key": {"S": "a"}, "value": {"S": "1"}, "ttl": {"N": "1011"}},
+        {"key": {"S": "b"}, "value": {"S": "2"}, "ttl": {"N": "1000"}}
+    ]}}, {"RequestItems": {"CACHE_TABLE_NAME": {"Keys": [{"key": "a"}, {"key": "b"}, {"key": "c"}]}}})
+    client.activate()
+
+    # 'b' is expired and 'c' is missing
+    assert store.get_many(["a", "b", "c"]) == {"a": 1}
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_create_store(monkeypatch):
+    """
+    Test create_store()
+    """
+
+    assert create_store("") is None
+    assert create_store(None) is None
+    assert isinstance(create_store("memory"), MemoryStore)
+    monkeypatch.setenv("CACHE_TABLE_NAME", "CACHE_TABLE_NAME")
+    assert create_store("dynamodb").table.name == "CACHE_TABLE_NAME"
+    with pytest.raises(ValueError):
+        create_store("unknown")
+
+
+class Loader:
+    """
+    Loader that counts its calls
+    """
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.entry
+
+
+def test_versioned_cache_local():
+    """
+    Test VersionedCache without a shared tier
+    """
+
+    cache = VersionedCache(TTLCache())
+    loader = Loader({"version": 1, "value": "a"})
+
+    assert cache.get("key", loader) == {"version": 1, "value": "a"}
+    assert cache.get("key", loader) == {"version": 1, "value": "a"}
+    assert loader.calls == 1
+
+    # Invalidations reach the local tier
+    loader.entry = {"version": 2, "value": "b"}
+    cache.invalidate("key", 2)
+    assert cache.get("key", loader) == {"version": 2, "value": "b"}
+    assert loader.calls == 2
+
+    # Missing entries are not cached
+    assert cache.get("missing", Loader(None)) is None
+    assert len(cache.local) == 1
+
+
+def test_versioned_cache_shared():
+    """
+    Test VersionedCache with a shared tier between two containers
+    """
+
+    clock = Clock()
+    store = MemoryStore(clock=clock)
+    reader = VersionedCache(TTLCache(clock=clock), store)
+    other = VersionedCache(TTLCache(clock=clock), store)
+    writer = VersionedCache(TTLCache(clock=clock), store)
+    loader = Loader({"version": 1, "value": "a"})
+
+    # The shared tier is filled by the first reader
+    assert reader.get("key", loader)["value"] == "a"
+    assert other.get("key", loader)["value"] == "a"
+    assert loader.calls == 1
+
+    # Invalidations reach the local tier of all containers once they check
+    # the marker again
+    loader.entry = {"version": 2, "value": "b"}
+    writer.invalidate("key", 2)
+    assert writer.get("key", loader)["value"] == "b"
+    assert reader.get("key", loader)["value"] == "a"
+    clock.now = 1
+    assert reader.get("key", loader)["value"] == "b"
+    assert other.get("key", loader)["value"] == "b"
+    assert loader.calls == 2
+
+
+def test_versioned_cache_reads():
+    """
+    Local hits do not read the shared tier within the check interval, and
+    local misses read it once
+    """
+
+    class CountingStore(MemoryStore):
+        def __init__(self, clock):
+            super().__init__(clock=clock)
+            self.reads = 0
+
+        def get_many(self, keys):
+            self.reads += 1
+            return super().get_many(keys)
+
+    clock = Clock()
+    store = CountingStore(clock)
+    cache = VersionedCache(TTLCache(ttl=30, clock=clock), store, check_interval=5)
+    loader = Loader({"version": 1, "value": "a"})
+
+    assert cache.get("key", loader)["value"] == "a"
+    assert store.reads == 1
+    for _ in range(10):
+        assert cache.get("key", loader)["value"] == "a"
+    assert store.reads == 1
+
+    clock.now = 5
+    assert cache.get("key", loader)["value"] == "a"
+    assert store.reads == 2
+    assert loader.calls == 1
+
+
+def test_versioned_cache_marker_ttl():
+    """
+    Markers outlive the entries they invalidate
+    """
+
+    clock = Clock()
+    store = MemoryStore(clock=clock)
+    cache = VersionedCache(TTLCache(ttl=30, clock=clock), store)
+
+    # Stale entry written by a reader that loaded it before the invalidation
+    cache.invalidate("key", 2)
+    clock.now = 10
+    store.put("key", {"version": 1, "value": "a"}, 30)
+
+    clock.now = 35
+    loader = Loader({"version": 2, "value": "b"})
+    assert cache.get("key", loader)["value"] == "b"
+    assert loader.calls == 1
+
+
+def test_versioned_cache_stale_load():
+    """
+    Entries older than the version marker are never served
+    """
+
+    store = MemoryStore()
+    cache = VersionedCache(TTLCache(), store)
+
+    # Replica lag: the source still returns the old version
+    cache.invalidate("key", 2)
+    loader = Loader({"version": 1, "value": "a"})
+    assert cache.get("key", loader)["value"] == "a"
+    assert store.get("key") is None
+
+    loader.entry = {"version": 2, "value": "b"}
+    assert cache.get("key", loader)["value"] == "b"
+    assert loader.calls == 2
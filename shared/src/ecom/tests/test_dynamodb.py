@@ -0,0 +1,293 @@
+import json
+import threading
+from decimal import Decimal
+import pytest
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from ecom import dynamodb, helpers # pylint: disable=import-error
+
+
+def test_ddb_to_plain():
+    """
+    Test ddb_to_plain() with all DynamoDB types
+    """
+
+    assert dynamodb.ddb_to_plain({"S": "value"}) == "value"
+    assert dynamodb.ddb_to_plain({"N": "123"}) == 123
+    assert dynamodb.ddb_to_plain({"N": "-1.5"}) == -1.5
+    assert dynamodb.ddb_to_plain({"N": "2.0"}) == 2
+    assert isinstance(dynamodb.ddb_to_plain({"N": "2.0"}), int)
+    assert dynamodb.ddb_to_plain({"BOOL": False}) is False
+    assert dynamodb.ddb_to_plain({"NULL": True}) is None
+    assert dynamodb.ddb_to_plain({"B": "AQID"}) == "AQID"
+    assert dynamodb.ddb_to_plain({"SS": ["a", "b"]}) == ["a", "b"]
+    assert dynamodb.ddb_to_plain({"NS": ["1", "2.5"]}) == [1, 2.5]
+    assert dynamodb.ddb_to_plain({"L": [{"S": "a"}, {"N": "1"}]}) == ["a", 1]
+    assert dynamodb.ddb_to_plain({"M": {"key": {"M": {"nested": {"N": "1"}}}}}) == {"key": {"nested": 1}}
+
+
+def test_image_to_json():
+    """
+    Test that image_to_json() matches TypeDeserializer and Encoder
+    """
+
+    product = {
+        "productId": "PRODUCT_ID",
+        "name": "Red Shoes",
+        "tags": ["Red", "Shoes"],
+        "package": {"width": 100, "length": 200, "height": 300, "weight": 400},
+        "price": Decimal("10.25"),
+        "available": True,
+        "discount": None
+    }
+    image = {k: TypeSerializer().serialize(v) for k, v in product.items()}
+
+    expected = json.dumps(
+        {k: TypeDeserializer().deserialize(v) for k, v in image.items()},
+        cls=helpers.Encoder
+    )
+
+    assert json.loads(dynamodb.image_to_json(image)) == json.loads(expected)
+
+
+def test_diff_images():
+    """
+    Test diff_images() with nested changes
+    """
+
+    old = {
+        "productId": {"S": "PRODUCT_ID"},
+        "price": {"N": "100"},
+        "package": {"M": {"weight": {"N": "10"}, "width": {"N": "20"}}},
+        "pictures": {"L": [{"S": "a.jpg"}, {"S": "b.jpg"}]},
+        "tags": {"SS": ["Red", "Shoes"]},
+        "removed": {"S": "value"},
+        "a/b": {"S": "value"}
+    }
+    new = {
+        "productId": {"S": "PRODUCT_ID"},
+        "price": {"N": "100.0"},
+        "package": {"M": {"weight": {"N": "15"}, "width": {"N": "20"}}},
+        "pictures": {"L": [{"S": "a.jpg"}, {"S": "c.jpg"}, {"S": "d.jpg"}]},
+        "tags": {"SS": ["Shoes", "Red"]},
+        "added": {"N": "1"},
+        "a/b": {"N": "1"}
+    }
+
+    changes = dynamodb.diff_images(old, new)
+
+    assert changes == {
+        "removed": ["/removed"],
+        "package": ["/package/weight"],
+        "pictures": ["/pictures/1", "/pictures/2"],
+        "added": ["/added"],
+        "a/b": ["/a~1b"]
+    }
+
+
+def test_diff_images_unchanged():
+    """
+    Test diff_images() with identical images
+    """
+
+    image = {
+        "productId": {"S": "PRODUCT_ID"},
+        "package": {"M": {"weight": {"N": "10"}}}
+    }
+
+    assert dynamodb.diff_images(image, dict(image)) == {}
+
+
+class BatchGetClient:
+    """
+    BatchGetItem stand-in that leaves some keys unprocessed
+    """
+
+    def __init__(self, table_name: str, unprocessed: int = 0):
+        self.table_name = table_name
+        # Number of requests that leave half of their keys unprocessed
+        self.unprocessed = unprocessed
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems): # pylint: disable=invalid-name
+        request = RequestItems[self.table_name]
+        keys = request["Keys"]
+        assert len(keys) <= 100
+
+        with self._lock:
+            self.requests.append(request)
+            unprocessed = []
+            if self.unprocessed > 0:
+                self.unprocessed -= 1
+                unprocessed = keys[len(keys)//2:]
+                keys = keys[:len(keys)//2]
+
+        res = {"Responses": {self.table_name: [
+            {"productId": key["productId"], "name": {"S": "Product"}}
+            for key in keys
+        ]}}
+        if unprocessed:
+            res["UnprocessedKeys"] = {self.table_name: dict(request, Keys=unprocessed)}
+        return res
+
+
+def test_batch_get():
+    """
+    Test batch_get()
+    """
+
+    client = BatchGetClient("TABLE")
+    keys = [{"productId": {"S": str(i)}} for i in range(250)]
+
+    items = list(dynamodb.batch_get(client, "TABLE", keys, ProjectionExpression="productId"))
+
+    assert sorted(item["productId"]["S"] for item in items) == sorted(str(i) for i in range(250))
+    assert sorted(len(r["Keys"]) for r in client.requests) == [50, 100, 100]
+    assert all(r["ProjectionExpression"] == "productId" for r in client.requests)
+
+
+def test_batch_get_duplicates():
+    """
+    Test batch_get() with duplicate keys
+    """
+
+    client = BatchGetClient("TABLE")
+    keys = [{"productId": {"S": str(i%10)}} for i in range(150)]
+
+    items = list(dynamodb.batch_get(client, "TABLE", keys))
+
+    assert len(items) == 10
+    assert len(client.requests) == 1
+
+
+def test_batch_get_unprocessed():
+    """
+    Test batch_get() with unprocessed keys
+    """
+
+    client = BatchGetClient("TABLE", unprocessed=3)
+    keys = [{"productId": {"S": str(i)}} for i in range(100)]
+
+    items = list(dynamodb.batch_get(client, "TABLE", keys, base_delay=0))
+
+    assert len(items) == 100
+    # Only the unprocessed keys are retried
+    assert [len(r["Keys"]) for r in client.requests] == [100, 50, 25, 13]
+
+
+def test_batch_get_unprocessed_error():
+    """
+    Test batch_get() with keys that remain unprocessed
+    """
+
+    client = BatchGetClient("TABLE", unprocessed=10)
+    keys = [{"productId": {"S": str(i)}} for i in range(8)]
+
+    with pytest.raises(dynamodb.BatchGetError) as excinfo:
+        list(dynamodb.batch_get(client, "TABLE", keys, max_attempts=3, base_delay=0))
+
+    assert len(excinfo.value.keys) == 1
+    assert len(client.requests) == 3
+
+
+def test_batch_get_empty():
+    """
+    Test batch_get() without keys
+    """
+
+    client = BatchGetClient("TABLE")
+
+    assert list(dynamodb.batch_get(client, "TABLE", [])) == []
+    assert len(client.requests) == 0
+
+
+def test_query_all():
+    """
+    Test query_all()
+    """
+
+    pages = [
+        {"Items": [1, 2], "LastEvaluatedKey": {"pk": "2"}},
+        {"Items": [3], "LastEvaluatedKey": {"pk": "3"}},
+        {"Items": []}
+    ]
+    calls = []
+
+    def query(**kwargs):
+        calls.append(dict(kwargs))
+        return pages[len(calls)-1]
+
+    assert list(dynamodb.query_all(query, KeyConditionExpression="expr")) == [1, 2, 3]
+    assert calls == [
+        {"KeyConditionExpression": "expr"},
+        {"KeyConditionExpression": "expr", "ExclusiveStartKey": {"pk": "2"}},
+        {"KeyConditionExpression": "expr", "ExclusiveStartKey": {"pk": "3"}}
+    ]
+
+
+def test_update_planner():
+    """
+    Test UpdatePlanner.plan()
+    """
+
+    planner = dynamodb.UpdatePlanner({
+        "name": str,
+        "price": dynamodb.NUMBER,
+        "profile.about": str,
+        "profile.languages": list
+    })
+
+    assert planner.plan({"name": "a", "price": 1.5, "profile": {"about": "b"}}) == {
+        "UpdateExpression": "SET #n0 = :v0, #n1 = :v1, #n2.#n3 = :v2",
+        "ExpressionAttributeNames": {"#n0": "name", "#n1": "price", "#n2": "profile", "#n3": "about"},
+        "ExpressionAttributeValues": {":v0": "a", ":v1": Decimal("1.5"), ":v2": "b"}
+    }
+
+    assert planner.plan({"name": "a"}, remove=["searchCity"], add={"version": 1}) == {
+        "UpdateExpression": "SET #n0 = :v0 REMOVE #n1 ADD #n2 :v1",
+        "ExpressionAttributeNames": {"#n0": "name", "#n1": "searchCity", "#n2": "version"},
+        "ExpressionAttributeValues": {":v0": "a", ":v1": 1}
+    }
+
+    assert planner.plan({}, remove=["name"]) == {
+        "UpdateExpression": "REMOVE #n0",
+        "ExpressionAttributeNames": {"#n0": "name"}
+    }
+
+    # Floats are converted inside lists and maps
+    assert planner.plan({"profile": {"languages": [{"level": 0.5}, 1.5, "fr"]}}) == {
+        "UpdateExpression": "SET #n0.#n1 = :v0",
+        "ExpressionAttributeNames": {"#n0": "profile", "#n1": "languages"},
+        "ExpressionAttributeValues": {":v0": [{"level": Decimal("0.5")}, Decimal("1.5"), "fr"]}
+    }
+
+
+def test_update_planner_invalid():
+    """
+    Test UpdatePlanner.plan() with invalid updates
+    """
+
+    planner = dynamodb.UpdatePlanner({
+        "name": str,
+        "price": dynamodb.NUMBER,
+        "profile.about": str,
+        "profile.languages": list
+    })
+
+    for update in [
+            None,
+            "name",
+            ["name"],
+            {},
+            {"userId": "a"},
+            {"name": 1},
+            {"price": "1"},
+            {"price": True},
+            {"profile": "a"},
+            {"profile": {"other": "a"}},
+            {"profile.about": "a"},
+            {"price": float("nan")},
+            {"profile": {"languages": [float("inf")]}}
+        ]:
+        with pytest.raises(dynamodb.InvalidUpdate):
+            planner.plan(update)
@@ -0,0 +1,166 @@
+import threading
+from ecom import eventbridge # pylint: disable=import-error
+
+
+class StubClient:
+    """
+    EventBridge client that rejects entries based on their DetailType
+    """
+
+    def __init__(self, failures: dict = None):
+        # Number of times each DetailType fails before being accepted
+        self.failures = failures or {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def put_events(self, Entries): # pylint: disable=invalid-name
+        with self._lock:
+            self.calls.append(Entries)
+            results = []
+            for entry in Entries:
+                if self.failures.get(entry["DetailType"], 0) != 0:
+                    self.failures[entry["DetailType"]] -= 1
+                    results.append({"ErrorCode": "InternalFailure", "ErrorMessage": "Failure"})
+                else:
+                    results.append({"EventId": "1"})
+        return {
+            "FailedEntryCount": len([r for r in results if "ErrorCode" in r]),
+            "Entries": results
+        }
+
+
+def get_entry(detail_type: str = "ProductCreated", detail_size: int = 10) -> dict:
+    """
+    Generate an EventBridge entry
+    """
+
+    return {
+        "Source": "ecommerce.products",
+        "DetailType": detail_type,
+        "Detail": "x" * detail_size,
+        "Resources": ["abc"],
+        "EventBusName": "EVENT_BUS_NAME"
+    }
+
+
+def test_entry_size():
+    """
+    Test entry_size()
+    """
+
+    entry = get_entry()
+    assert eventbridge.entry_size(entry) == len("ecommerce.products") + len("ProductCreated") + 10 + 3
+
+    entry["Time"] = "2020-01-01T00:00:00"
+    assert eventbridge.entry_size(entry) == len("ecommerce.products") + len("ProductCreated") + 10 + 3 + 14
+
+    # Size is in bytes
+    entry = {"Detail": "é"}
+    assert eventbridge.entry_size(entry) == 2
+
+
+def test_pack_entries_count():
+    """
+    Test pack_entries() with more than 10 entries
+    """
+
+    batches = eventbridge.pack_entries([get_entry() for _ in range(25)])
+
+    assert batches == [list(range(0, 10)), list(range(10, 20)), list(range(20, 25))]
+
+
+def test_pack_entries_size():
+    """
+    Test pack_entries() with large entries
+    """
+
+    entries = [get_entry(detail_size=100*1024) for _ in range(5)]
+    entries.insert(2, get_entry(detail_size=300*1024))
+
+    batches = eventbridge.pack_entries(entries)
+
+    # The entry at index 2 is too large on its own
+    assert batches == [[0, 1], [3, 4], [5]]
+
+
+def test_put_events():
+    """
+    Test put_events()
+    """
+
+    client = StubClient()
+    entries = [get_entry() for _ in range(25)]
+
+    failures = eventbridge.put_events(client, entries)
+
+    assert failures == []
+    assert len(client.calls) == 3
+    assert sum(len(call) for call in client.calls) == 25
+
+
+def test_put_events_retry():
+    """
+    Test put_events() with entries failing once
+    """
+
+    client = StubClient({"ProductModified": 1})
+    entries = [get_entry() for _ in range(5)]
+    entries[3] = get_entry("ProductModified")
+
+    failures = eventbridge.put_events(client, entries, base_delay=0)
+
+    assert failures == []
+    assert len(client.calls) == 2
+    # Only the failed entry is retried
+    assert client.calls[1] == [entries[3]]
+
+
+def test_put_events_failure():
+    """
+    Test put_events() with entries that keep failing
+    """
+
+    client = StubClient({"ProductModified": -1})
+    entries = [get_entry() for _ in range(15)]
+    entries[3] = get_entry("ProductModified")
+    entries[12] = get_entry("ProductModified")
+    entries[7] = get_entry(detail_size=300*1024)
+
+    failures = eventbridge.put_events(client, entries, max_attempts=3, base_delay=0)
+
+    assert [f["index"] for f in failures] == [3, 7, 12]
+    assert failures[0]["ErrorCode"] == "InternalFailure"
+    assert failures[1]["ErrorCode"] == "EntryTooLarge"
+    # 2 batches, 2 retries each
+    assert len(client.calls) == 6
+
+
+def test_put_events_exception():
+    """
+    Test put_events() when the client raises an exception
+    """
+
+    class FailingClient:
+        def put_events(self, Entries): # pylint: disable=invalid-name
+            raise ConnectionError("Connection reset")
+
+    failures = eventbridge.put_events(FailingClient(), [get_entry() for _ in range(3)], base_delay=0)
+
+    assert [f["index"] for f in failures] == [0, 1, 2]
+    assert failures[0]["ErrorCode"] == "ConnectionError"
+    assert failures[0]["ErrorMessage"] == "Connection reset"
+
+
+def test_put_record_events():
+    """
+    Test put_record_events()
+    """
+
+    client = StubClient({"ProductModified": -1})
+    entries = [get_entry() for _ in range(3)]
+    entries[1] = get_entry("ProductModified")
+    records = [{"dynamodb": {"SequenceNumber": str(i)}} for i in range(3)]
+
+    response = eventbridge.put_record_events(client, records, entries)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "1"}]}
@@ -1,6 +1,9 @@
 import datetime
 import decimal
 import json
+import os
+import subprocess
+import sys
 import uuid
 import pytest
 from ecom import apigateway, eventbridge, helpers # pylint: disable=import-error
@@ -204,4 +207,66 @@ def test_response_status():
 
     status_code = 400
     retval = apigateway.response("Message", status_code)
-    assert retval["statusCode"] == status_code
\ No newline at end of file
+    assert retval["statusCode"] == status_code
+
+def test_ddb_to_event_modify_compact():
+    """
+    Test ddb_to_event() with a MODIFY record and a compact detail
+    """
+
+    record = {
+        "awsRegion": "eu-west-1",
+        "dynamodb": {
+            "Keys": {
+                "pk": {"S": "123"}
+            },
+            "NewImage": {
+                "pk": {"S": "123"},
+                "package": {"M": {"weight": {"N": "15"}, "width": {"N": "20"}}},
+                "pictures": {"L": [{"S": "a.jpg"}, {"S": "b.jpg"}]}
+            },
+            "OldImage": {
+                "pk": {"S": "123"},
+                "package": {"M": {"weight": {"N": "10"}, "width": {"N": "20"}}},
+                "pictures": {"L": [{"S": "a.jpg"}, {"S": "b.jpg"}]}
+            },
+            "SequenceNumber": "1234567890123456789012345",
+            "SizeBytes": 123,
+            "StreamViewType": "NEW_AND_OLD_IMAGES"
+        },
+        "eventID": str(uuid.uuid4()),
+        "eventName": "MODIFY",
+        "eventSource": "aws:dynamodb",
+        "eventVersion": "1.0"
+    }
+
+    retval = eventbridge.ddb_to_event(record, "EVENT_BUS_NAME", "SOURCE", "Object", "pk")
+    detail = json.loads(retval["Detail"])
+
+    assert retval["DetailType"] == "ObjectModified"
+    assert detail["changed"] == ["package"]
+    assert detail["changedPaths"] == ["/package/weight"]
+    assert detail["old"]["pictures"] == ["a.jpg", "b.jpg"]
+
+    retval = eventbridge.ddb_to_event(record, "EVENT_BUS_NAME", "SOURCE", "Object", "pk", compact=True)
+    detail = json.loads(retval["Detail"])
+
+    assert detail["new"] == {"pk": "123", "package": {"weight": 15, "width": 20}, "pictures": ["a.jpg", "b.jpg"]}
+    assert detail["old"] == {"package": {"weight": 10, "width": 20}}
+    assert detail["changed"] == ["package"]
+
+
+def test_import_dependencies():
+    """
+    Importing the package does not load the dependencies of other modules,
+    which would add to the cold start of every function
+    """
+
+    code = "import sys, ecom; print([m for m in ['requests', 'jsonschema', 'fastjsonschema'] if m in sys.modules])"
+    res = subprocess.run(
+        [sys.executable, "-c", code],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        stdout=subprocess.PIPE, check=True
+    )
+
+    assert res.stdout.decode("utf-8").strip() == "[]"
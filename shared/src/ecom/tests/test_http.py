@@ -0,0 +1,66 @@
+import json
+import requests_mock
+from ecom import http # pylint: disable=import-error
+
+
+def test_client_post():
+    """
+    Test Client.post()
+    """
+
+    url = "mock://API_URL/backend/validate"
+    client = http.Client(region="eu-west-1")
+
+    with requests_mock.Mocker() as m:
+        m.post(url, text=json.dumps({"ok": True}))
+        res = client.post(url, json={"key": "value"})
+
+    assert res.json() == {"ok": True}
+    assert m.call_count == 1
+    assert m.request_history[0].json() == {"key": "value"}
+    assert "Authorization" in m.request_history[0].headers
+
+
+def test_client_get_unsigned():
+    """
+    Test Client.get() without IAM signature
+    """
+
+    url = "mock://API_URL/item"
+    client = http.Client(sign=False)
+
+    with requests_mock.Mocker() as m:
+        m.get(url, text=json.dumps({"ok": True}))
+        client.get(url)
+
+    assert m.call_count == 1
+    assert "Authorization" not in m.request_history[0].headers
+
+
+def test_client_auth_cache():
+    """
+    Test that signature helpers are cached per host
+    """
+
+    client = http.Client(region="eu-west-1")
+
+    auth = client.auth("https://host-a.local/path")
+    assert client.auth("https://host-a.local/other/path") is auth
+    assert client.auth("https://host-b.local/path") is not auth
+
+
+def test_client_timeout():
+    """
+    Test that the default timeout is applied to requests
+    """
+
+    url = "mock://API_URL/item"
+    client = http.Client(sign=False, timeout=1.5)
+
+    with requests_mock.Mocker() as m:
+        m.get(url, text="{}")
+        client.get(url)
+        client.get(url, timeout=5)
+
+    assert m.request_history[0].timeout == 1.5
+    assert m.request_history[1].timeout == 5
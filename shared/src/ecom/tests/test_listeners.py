@@ -0,0 +1,58 @@
+import boto3
+from botocore import stub
+import pytest
+from ecom import listeners # pylint: disable=import-error
+
+
+TABLE_NAME = "LISTENER_TABLE_NAME"
+
+
+@pytest.fixture
+def table():
+    return boto3.resource("dynamodb").Table(TABLE_NAME)
+
+
+def test_bump_version(table):
+    """
+    Test bump_version()
+    """
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("update_item", {}, {
+        "TableName": TABLE_NAME,
+        "Key": {"id": "version#ecommerce.orders"},
+        "UpdateExpression": "ADD #version :one",
+        "ExpressionAttributeNames": {"#version": "version"},
+        "ExpressionAttributeValues": {":one": 1}
+    })
+    client.activate()
+
+    listeners.bump_version(table, "ecommerce.orders")
+
+    client.assert_no_pending_responses()
+    client.deactivate()
+
+
+def test_read_version(table):
+    """
+    Test read_version()
+    """
+
+    expected_params = {
+        "TableName": TABLE_NAME,
+        "Key": {"id": "version#ecommerce.orders"},
+        "ProjectionExpression": "#version",
+        "ExpressionAttributeNames": {"#version": "version"}
+    }
+
+    client = stub.Stubber(table.meta.client)
+    client.add_response("get_item", {"Item": {"version": {"N": "3"}}}, expected_params)
+    # Services whose listeners never changed
+    client.add_response("get_item", {}, expected_params)
+    client.activate()
+
+    assert listeners.read_version(table, "ecommerce.orders") == 3
+    assert listeners.read_version(table, "ecommerce.orders") == 0
+
+    client.assert_no_pending_responses()
+    client.deactivate()
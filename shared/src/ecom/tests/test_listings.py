@@ -0,0 +1,51 @@
+from ecom import listings # pylint: disable=import-error
+
+
+def test_search_keys():
+    """
+    Test search_keys()
+    """
+
+    assert listings.search_keys("Paris", "apartment") == {
+        "searchCity": "Paris",
+        "searchCityCategory": "Paris#apartment"
+    }
+    assert listings.search_keys("Paris", None) == {"searchCity": "Paris"}
+    assert listings.search_keys(None, "apartment") == {}
+    # Every search index is keyed by a stored attribute
+    assert set(listings.SEARCH_KEYS) == {"searchCity", "searchCityCategory"}
+
+
+def test_legacy_update():
+    """
+    Test legacy_update()
+    """
+
+    item = {"listingId": "ID", "City": "Paris", "category": "apartment"}
+
+    retval = listings.legacy_update(item)
+
+    assert retval["Key"] == {"listingId": "ID"}
+    assert retval["ConditionExpression"] == "attribute_exists(listingId)"
+    assert retval["UpdateExpression"] == "SET #a0 = :a0, #a1 = :a1, #a2 = :a2 REMOVE #legacy"
+    assigned = {
+        retval["ExpressionAttributeNames"][name]: retval["ExpressionAttributeValues"][name.replace("#", ":")]
+        for name in ["#a0", "#a1", "#a2"]
+    }
+    assert assigned == {"city": "Paris", "searchCity": "Paris", "searchCityCategory": "Paris#apartment"}
+    assert retval["ExpressionAttributeNames"]["#legacy"] == "City"
+
+
+def test_legacy_update_current():
+    """
+    Listings with a city and their search keys are up to date
+    """
+
+    item = {"listingId": "ID", "city": "Paris", "category": "apartment"}
+    item.update(listings.search_keys("Paris", "apartment"))
+
+    assert listings.legacy_update(item) is None
+
+    # Missing search keys
+    retval = listings.legacy_update({"listingId": "ID", "city": "Paris", "category": "apartment"})
+    assert "REMOVE" not in retval["UpdateExpression"]
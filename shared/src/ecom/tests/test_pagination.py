@@ -0,0 +1,143 @@
+import base64
+from decimal import Decimal
+import pytest
+from ecom import pagination # pylint: disable=import-error
+
+
+KEY = {"listingId": "ID", "hostId": "HOST", "price": Decimal("12.5")}
+
+
+class FakeOperation:
+    """
+    Query or Scan operation that returns predefined pages
+    """
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.calls = []
+
+    def __call__(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.pages.pop(0)
+
+
+def test_cursor():
+    """
+    Test encode_cursor() and decode_cursor()
+    """
+
+    cursor = pagination.encode_cursor(KEY, "scope")
+
+    assert isinstance(cursor, str)
+    assert pagination.decode_cursor(cursor, "scope", list(KEY.keys())) == KEY
+    assert pagination.encode_cursor(None, "scope") is None
+    assert pagination.decode_cursor(None, "scope", list(KEY.keys())) is None
+    assert pagination.decode_cursor("", "scope", list(KEY.keys())) is None
+
+
+def test_cursor_mismatch():
+    """
+    Cursors from another scope or key schema are rejected
+    """
+
+    cursor = pagination.encode_cursor(KEY, "scope")
+
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, "other", list(KEY.keys()))
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, "scope", ["listingId"])
+
+
+def test_cursor_malformed():
+    """
+    Malformed cursors are rejected
+    """
+
+    for cursor in ["not a cursor", "e30=", "bnVsbA==", "W10="]:
+        with pytest.raises(pagination.InvalidCursor):
+            pagination.decode_cursor(cursor, "scope", list(KEY.keys()))
+
+
+def test_cursor_signed():
+    """
+    Signed cursors cannot be forged
+    """
+
+    cursor = pagination.encode_cursor(KEY, "scope", "secret")
+    assert pagination.decode_cursor(cursor, "scope", list(KEY.keys()), "secret") == KEY
+
+    # Wrong secret, or unsigned cursor
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, "scope", list(KEY.keys()), "other")
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(pagination.encode_cursor(KEY, "scope"), "scope", list(KEY.keys()), "secret")
+
+    # Tampered key
+    raw = base64.urlsafe_b64decode(cursor)
+    tampered = base64.urlsafe_b64encode(raw.replace(b"HOST", b"EVIL")).decode("ascii")
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(tampered, "scope", list(KEY.keys()), "secret")
+
+
+def test_fill_page():
+    """
+    Sparse pages are filled by reading again
+    """
+
+    items = [{"listingId": str(i), "hostId": "HOST"} for i in range(5)]
+    operation = FakeOperation([
+        {"Items": items[:1], "LastEvaluatedKey": {"listingId": "0"}},
+        {"Items": [], "LastEvaluatedKey": {"listingId": "X"}},
+        {"Items": items[1:], "LastEvaluatedKey": {"listingId": "4"}}
+    ])
+
+    retval, last_key = pagination.fill_page(
+        operation, {"IndexName": "INDEX"}, 3, ["listingId", "hostId"], start_key={"listingId": "S"}
+    )
+
+    assert retval == items[:3]
+    assert [call["Limit"] for call in operation.calls] == [3, 2, 2]
+    assert operation.calls[0]["ExclusiveStartKey"] == {"listingId": "S"}
+    assert operation.calls[2]["ExclusiveStartKey"] == {"listingId": "X"}
+    assert all(call["IndexName"] == "INDEX" for call in operation.calls)
+    # Resumes after the last returned item, not the last read item
+    assert last_key == {"listingId": "2", "hostId": "HOST"}
+
+
+def test_fill_page_read_size():
+    """
+    Test fill_page() with a minimum read size
+    """
+
+    operation = FakeOperation([{"Items": []}])
+
+    retval, last_key = pagination.fill_page(operation, {}, 10, ["listingId"], read_size=100)
+
+    assert retval == []
+    assert last_key is None
+    assert operation.calls[0]["Limit"] == 100
+
+
+def test_fill_page_last_page():
+    """
+    No key is returned on the last page
+    """
+
+    items = [{"listingId": str(i)} for i in range(2)]
+
+    assert pagination.fill_page(FakeOperation([{"Items": items}]), {}, 2, ["listingId"]) == (items, None)
+    assert pagination.fill_page(FakeOperation([{"Items": items}]), {}, 5, ["listingId"]) == (items, None)
+
+
+def test_fill_page_max_reads():
+    """
+    Partial pages are returned after 'max_reads' requests
+    """
+
+    operation = FakeOperation([{"Items": [], "LastEvaluatedKey": {"listingId": str(i)}} for i in range(5)])
+
+    retval, last_key = pagination.fill_page(operation, {}, 10, ["listingId"], max_reads=3)
+
+    assert retval == []
+    assert len(operation.calls) == 3
+    assert last_key == {"listingId": "2"}
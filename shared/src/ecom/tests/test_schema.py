@@ -0,0 +1,85 @@
+import json
+import pytest
+from ecom import schema # pylint: disable=import-error
+
+
+SCHEMA = {
+    "type": "object",
+    "required": ["name", "items"],
+    "properties": {
+        "name": {"type": "string"},
+        "date": {"type": "string", "format": "date-time"},
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["price"],
+                "properties": {
+                    "price": {"type": "integer", "default": 0}
+                }
+            }
+        }
+    }
+}
+
+
+def test_validator_valid():
+    """
+    Test Validator.errors() with a valid instance
+    """
+
+    validator = schema.Validator(SCHEMA)
+    instance = {"name": "Name", "items": [{"price": 10}]}
+
+    assert validator.errors(instance) == []
+    assert validator.is_valid(instance)
+
+
+def test_validator_all_errors():
+    """
+    Test that Validator.errors() reports all errors at once
+    """
+
+    validator = schema.Validator(SCHEMA)
+    errors = validator.errors({"name": 1, "items": [{"price": "10"}, {}]})
+
+    assert len(errors) == 3
+    assert "/name: 1 is not of type 'string'" in errors
+    assert "/items/0/price: '10' is not of type 'integer'" in errors
+    assert "/items/1: 'price' is a required property" in errors
+    assert not validator.is_valid({"name": 1, "items": []})
+
+
+def test_validator_no_side_effects():
+    """
+    Test that Validator does not check formats or inject defaults, like
+    jsonschema.validate()
+    """
+
+    validator = schema.Validator(SCHEMA)
+    instance = {"name": "Name", "date": "not-a-date", "items": [{"price": 1}]}
+
+    assert validator.errors(instance) == []
+    assert instance["items"] == [{"price": 1}]
+
+
+def test_validator_invalid_schema():
+    """
+    Test Validator with an invalid schema
+    """
+
+    with pytest.raises(Exception):
+        schema.Validator({"type": "not-a-type"})
+
+
+def test_load_validator(tmp_path):
+    """
+    Test that load_validator() only compiles a schema file once
+    """
+
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps(SCHEMA))
+
+    validator = schema.load_validator(str(path))
+    assert schema.load_validator(str(path)) is validator
+    assert validator.schema == SCHEMA
@@ -98,15 +98,19 @@ def listener():
                 timeout = datetime.datetime.utcnow() + datetime.timedelta(seconds=wait_time)
                 while datetime.datetime.utcnow() < timeout:
                     try:
-                        message = json.loads(await asyncio.wait_for(
+                        frame = json.loads(await asyncio.wait_for(
                             websocket.recv(),
                             timeout=(timeout - datetime.datetime.utcnow()).total_seconds()
                         ))
-                        print(message)
-                        messages.append(message)
-                        # Run the user-provided test
-                        if test_function is not None and test_function(message):
-                            found = True
+                        # In coalescing mode, frames hold arrays of messages
+                        for message in frame if isinstance(frame, list) else [frame]:
+                            print(message)
+                            messages.append(message)
+                            # Run the user-provided test
+                            if test_function is not None and test_function(message):
+                                found = True
+                                break
+                        if found:
                             break
                     except asyncio.exceptions.TimeoutError:
                         # Timeout exceeded
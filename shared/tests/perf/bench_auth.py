@@ -0,0 +1,124 @@
+"""
+Benchmark for token verification
+
+This compares the previous authentication of API requests, which calls
+Cognito's GetUser (and ListGroupsForUser to create listings) on every
+request, with ecom.auth.Verifier. The JWKS is served by a local stub server
+and the tokens are signed with a locally generated 2048-bit key.
+
+Cognito cannot be called from here, so the previous pattern is estimated from
+the number of calls per request and COGNITO_LATENCY_MS, a typical latency for
+a call to Cognito from Lambda in the same region.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python shared/tests/perf/bench_auth.py
+"""
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from ecom.auth import Verifier # pylint: disable=import-error
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "ecom", "tests"))
+from test_auth import generate_key, sign, to_jwk # pylint: disable=import-error,wrong-import-position
+
+
+REQUESTS = 1000
+# Number of distinct tokens, as users send several requests with a token
+USERS = 100
+COGNITO_LATENCY_MS = 20
+ISSUER = "https://cognito-idp.eu-west-1.amazonaws.com/eu-west-1_BENCH"
+
+
+def serve_jwks(jwks: dict) -> ThreadingHTTPServer:
+    """
+    Start a stub server returning the JWKS
+    """
+
+    body = json.dumps(jwks).encode("utf-8")
+
+    class JWKSHandler(BaseHTTPRequestHandler):
+        """
+        Answers every GET with the JWKS
+        """
+
+        def do_GET(self): # pylint: disable=invalid-name
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): # pylint: disable=arguments-differ
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), JWKSHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """
+    Run the benchmark
+    """
+
+    random.seed(42)
+    print("Generating a 2048-bit RSA key...")
+    key = generate_key(2048)
+    server = serve_jwks({"keys": [to_jwk("bench", key)]})
+    url = "http://127.0.0.1:{}".format(server.server_address[1])
+
+    now = int(time.time())
+    tokens = [sign("bench", key, {
+        "sub": "user-{}".format(i),
+        "username": "user-{}".format(i),
+        "cognito:groups": ["host"],
+        "iss": ISSUER,
+        "token_use": "access",
+        "iat": now,
+        "exp": now + 3600
+    }) for i in range(USERS)]
+
+    # The issuer must match the tokens, but the JWKS is read from the stub
+    # server.
+    verifier = Verifier(ISSUER)
+    verifier.keys.url = url
+
+    start = time.perf_counter()
+    verifier.verify(tokens[0])
+    cold = (time.perf_counter() - start) * 1000
+
+    uncached = []
+    for token in tokens[1:]:
+        start = time.perf_counter()
+        verifier.verify(token)
+        uncached.append((time.perf_counter() - start) * 1000)
+
+    requests = [random.choice(tokens) for _ in range(REQUESTS)]
+    cached = []
+    for token in requests:
+        start = time.perf_counter()
+        verifier.verify(token)
+        cached.append((time.perf_counter() - start) * 1000)
+
+    server.shutdown()
+
+    print("{:<36} {:>10}".format("method", "latency"))
+    print("{:<36} {:>8.2f}ms".format("cognito.get_user (estimated)", COGNITO_LATENCY_MS))
+    print("{:<36} {:>8.2f}ms".format("get_user + list_groups (estimated)", 2 * COGNITO_LATENCY_MS))
+    print("{:<36} {:>8.2f}ms".format("verifier, cold container", cold))
+    print("{:<36} {:>8.3f}ms".format("verifier, new token", statistics.mean(uncached)))
+    print("{:<36} {:>8.3f}ms".format("verifier, cached token", statistics.mean(cached)))
+    print("{:<36} {:>8.3f}ms".format("verifier, cached token (p99)", sorted(cached)[int(len(cached) * 0.99)]))
+
+
+if __name__ == "__main__":
+    main()
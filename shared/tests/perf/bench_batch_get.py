@@ -0,0 +1,143 @@
+"""
+Benchmark for BatchGetItem calls
+
+This compares the previous pattern (sequential 100-key requests, unprocessed
+keys retried immediately) with `ecom.dynamodb.batch_get()` against a local
+DynamoDB stand-in that adds latency per request and throttles keys once its
+read capacity is exhausted, on carts of 1,000 items.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python shared/tests/perf/bench_batch_get.py
+"""
+
+
+import random
+import statistics
+import threading
+import time
+from ecom.dynamodb import batch_get # pylint: disable=import-error
+
+
+TABLE_NAME = "TABLE_NAME"
+CART_SIZE = 1000
+RUNS = 20
+# Latency per request, plus per key
+LATENCY = 0.008
+KEY_LATENCY = 0.00005
+# Read capacities of the table to test, in keys per second, and burst size
+CAPACITIES = [40000, 5000]
+BURST = 400
+
+
+class StubClient:
+    """
+    BatchGetItem stand-in with latency and throttling
+
+    Throttling uses a token bucket: each key consumes a token, and keys are
+    left unprocessed when the bucket is empty.
+    """
+
+    def __init__(self, capacity: int):
+        self.requests = 0
+        self.capacity = capacity
+        self._tokens = BURST
+        self._updated = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _take(self, count: int) -> int:
+        """
+        Take up to 'count' tokens from the bucket
+        """
+
+        with self._lock:
+            now = time.perf_counter()
+            self._tokens = min(BURST, self._tokens + (now-self._updated)*self.capacity)
+            self._updated = now
+            taken = min(count, int(self._tokens))
+            self._tokens -= taken
+            return taken
+
+    def batch_get_item(self, RequestItems): # pylint: disable=invalid-name
+        with self._lock:
+            self.requests += 1
+
+        request = RequestItems[TABLE_NAME]
+        time.sleep(LATENCY + KEY_LATENCY*len(request["Keys"]))
+
+        taken = self._take(len(request["Keys"]))
+        processed = [
+            {"productId": key["productId"], "price": {"N": "100"}}
+            for key in request["Keys"][:taken]
+        ]
+        unprocessed = request["Keys"][taken:]
+
+        res = {"Responses": {TABLE_NAME: processed}}
+        if unprocessed:
+            res["UnprocessedKeys"] = {TABLE_NAME: dict(request, Keys=unprocessed)}
+        return res
+
+
+def before(client, keys):
+    """
+    Previous pattern from the products validate function
+    """
+
+    items = []
+    for i in range(0, len(keys), 100):
+        res = client.batch_get_item(RequestItems={TABLE_NAME: {"Keys": keys[i:i+100]}})
+        items.extend(res.get("Responses", {}).get(TABLE_NAME, []))
+        while res.get("UnprocessedKeys", {}).get(TABLE_NAME, None) is not None:
+            res = client.batch_get_item(RequestItems=res["UnprocessedKeys"])
+            items.extend(res.get("Responses", {}).get(TABLE_NAME, []))
+    return items
+
+
+def after(client, keys):
+    """
+    ecom.dynamodb.batch_get()
+    """
+
+    return list(batch_get(client, TABLE_NAME, keys))
+
+
+def run(name, func, capacity):
+    """
+    Run a function RUNS times and print latency statistics
+    """
+
+    latencies = []
+    requests = 0
+    for _ in range(RUNS):
+        # Carts contain duplicates
+        keys = [{"productId": {"S": str(random.randrange(0, CART_SIZE))}} for _ in range(CART_SIZE)]
+        client = StubClient(capacity)
+
+        start = time.perf_counter()
+        func(client, keys)
+        latencies.append((time.perf_counter() - start) * 1000)
+        requests += client.requests
+
+    latencies.sort()
+    print("{:<8} {:>6} keys/s  mean {:8.1f}ms  p50 {:8.1f}ms  max {:8.1f}ms  {:5.1f} requests/cart".format(
+        name,
+        capacity,
+        statistics.mean(latencies),
+        latencies[len(latencies)//2],
+        latencies[-1],
+        requests/RUNS
+    ))
+
+
+def main():
+    """
+    Run both benchmarks
+    """
+
+    for capacity in CAPACITIES:
+        run("before", before, capacity)
+        run("after", after, capacity)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark for DynamoDB Streams to EventBridge conversion
+
+This compares the previous TypeDeserializer and Encoder based conversion with
+`ecom.eventbridge.ddb_to_event()` on batches of 100 product records, and
+reports the size of full and compact MODIFY details.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python shared/tests/perf/bench_ddb_to_event.py
+"""
+
+
+import json
+import random
+import timeit
+import uuid
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from ecom.eventbridge import ddb_to_event # pylint: disable=import-error
+from ecom.helpers import Encoder # pylint: disable=import-error
+
+
+BATCH_SIZE = 100
+ITERATIONS = 50
+
+
+deserialize = TypeDeserializer().deserialize
+serialize = TypeSerializer().serialize
+
+
+def get_product() -> dict:
+    """
+    Generate a large product item
+    """
+
+    return {
+        "productId": str(uuid.uuid4()),
+        "name": "Red Shoes",
+        "createdDate": "2020-01-01T00:00:00",
+        "modifiedDate": "2020-01-01T00:00:00",
+        "category": "Shoes",
+        "tags": ["Red", "Shoes"],
+        "pictures": [
+            "https://example.local/{}.jpg".format(random.randrange(0, 1000))
+            for _ in range(100)
+        ],
+        "package": {
+            "weight": random.randrange(0, 1000),
+            "height": random.randrange(0, 1000),
+            "length": random.randrange(0, 1000),
+            "width": random.randrange(0, 1000)
+        },
+        "price": random.randrange(0, 1000)
+    }
+
+
+def get_record(event_name: str) -> dict:
+    """
+    Generate a DynamoDB Streams record
+    """
+
+    new = get_product()
+    old = dict(new, price=new["price"]+1)
+    record = {
+        "eventName": event_name,
+        "dynamodb": {
+            "Keys": {"productId": {"S": new["productId"]}}
+        }
+    }
+    if event_name in ["INSERT", "MODIFY"]:
+        record["dynamodb"]["NewImage"] = {k: serialize(v) for k, v in new.items()}
+    if event_name in ["REMOVE", "MODIFY"]:
+        record["dynamodb"]["OldImage"] = {k: serialize(v) for k, v in old.items()}
+    return record
+
+
+def legacy_ddb_to_event(record: dict) -> dict:
+    """
+    Previous conversion of the record images
+    """
+
+    if record["eventName"] == "MODIFY":
+        new = {k: deserialize(v) for k, v in record["dynamodb"]["NewImage"].items()}
+        old = {k: deserialize(v) for k, v in record["dynamodb"]["OldImage"].items()}
+        changed = [k for k in old.keys() if k not in new.keys()]
+        changed.extend(k for k in new.keys() if k not in old or new[k] != old[k])
+        return {"Detail": json.dumps({"new": new, "old": old, "changed": changed}, cls=Encoder)}
+
+    image = record["dynamodb"].get("NewImage", record["dynamodb"].get("OldImage"))
+    return {"Detail": json.dumps({k: deserialize(v) for k, v in image.items()}, cls=Encoder)}
+
+
+def main():
+    """
+    Run the benchmark for each record type
+    """
+
+    print("{:>8} {:>14} {:>14} {:>8}".format("event", "legacy", "ddb_to_event", "speedup"))
+    for event_name in ["INSERT", "MODIFY", "REMOVE"]:
+        batch = [get_record(event_name) for _ in range(BATCH_SIZE)]
+        before = timeit.timeit(
+            lambda: [legacy_ddb_to_event(r) for r in batch], # pylint: disable=cell-var-from-loop
+            number=ITERATIONS
+        ) / ITERATIONS
+        after = timeit.timeit(
+            lambda: [ddb_to_event(r, "BUS", "SOURCE", "Product", "productId") for r in batch], # pylint: disable=cell-var-from-loop
+            number=ITERATIONS
+        ) / ITERATIONS
+        print("{:>8} {:>12.2f}ms {:>12.2f}ms {:>7.1f}x".format(
+            event_name, before*1e3, after*1e3, before/after
+        ))
+
+    # Payload size of MODIFY events, with the full and compact details
+    record = get_record("MODIFY")
+    for compact in [False, True]:
+        event = ddb_to_event(record, "BUS", "SOURCE", "Product", "productId", compact=compact)
+        print("MODIFY detail size (compact={}): {} bytes".format(compact, len(event["Detail"])))
+
+
+if __name__ == "__main__":
+    main()
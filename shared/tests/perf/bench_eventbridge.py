@@ -0,0 +1,103 @@
+"""
+Benchmark for publishing events to EventBridge
+
+This compares the previous pattern (sequential PutEvents requests of 10
+entries) with `ecom.eventbridge.put_events()` against a local stub that adds a
+fixed latency per request and rejects a fraction of entries.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python shared/tests/perf/bench_eventbridge.py
+"""
+
+
+import random
+import threading
+import time
+from ecom.eventbridge import put_events # pylint: disable=import-error
+
+
+BATCH_SIZES = [10, 50, 100, 500]
+LATENCY = 0.02
+FAILURE_RATE = 0.02
+
+
+class StubClient:
+    """
+    EventBridge client stub with a fixed latency per request
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def put_events(self, Entries): # pylint: disable=invalid-name
+        with self._lock:
+            self.requests += 1
+        time.sleep(LATENCY)
+        results = [
+            {"ErrorCode": "InternalFailure", "ErrorMessage": "Failure"}
+            if random.random() < FAILURE_RATE else {"EventId": "1"}
+            for _ in Entries
+        ]
+        return {
+            "FailedEntryCount": len([r for r in results if "ErrorCode" in r]),
+            "Entries": results
+        }
+
+
+def get_entries(count: int) -> list:
+    """
+    Generate EventBridge entries
+    """
+
+    return [{
+        "Source": "ecommerce.products",
+        "DetailType": "ProductModified",
+        "Detail": "x" * random.randrange(1000, 20000),
+        "Resources": [str(i)],
+        "EventBusName": "EVENT_BUS_NAME"
+    } for i in range(count)]
+
+
+def before(client, entries: list) -> int:
+    """
+    Previous pattern: sequential requests, failed entries are ignored
+    """
+
+    failed = 0
+    for i in range(0, len(entries), 10):
+        res = client.put_events(Entries=entries[i:i+10])
+        failed += res["FailedEntryCount"]
+    return failed
+
+
+def main():
+    """
+    Run the benchmark for each batch size
+    """
+
+    print("{:>8} {:>12} {:>8} {:>12} {:>8} {:>8}".format(
+        "events", "before", "lost", "put_events", "lost", "speedup"
+    ))
+    for size in BATCH_SIZES:
+        entries = get_entries(size)
+
+        client = StubClient()
+        start = time.perf_counter()
+        lost_before = before(client, entries)
+        duration_before = time.perf_counter() - start
+
+        client = StubClient()
+        start = time.perf_counter()
+        lost_after = len(put_events(client, entries, base_delay=0.01))
+        duration_after = time.perf_counter() - start
+
+        print("{:>8} {:>10.1f}ms {:>8} {:>10.1f}ms {:>8} {:>7.1f}x".format(
+            size, duration_before*1e3, lost_before,
+            duration_after*1e3, lost_after, duration_before/duration_after
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark for service-to-service HTTP calls
+
+This compares the per-call latency of the previous pattern (a new signature
+helper and a bare `requests.post` per call) with the pooled `ecom.http.Client`
+against a local keep-alive stub server.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python shared/tests/perf/bench_http.py
+"""
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+import boto3
+import requests
+from aws_requests_auth.boto_utils import BotoAWSRequestsAuth
+from ecom.http import Client # pylint: disable=import-error
+
+
+CALLS = 500
+PAYLOAD = {"products": [{"productId": str(i), "price": i} for i in range(20)]}
+
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AWS_ACCESS_KEY_ID")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "AWS_SECRET_ACCESS_KEY")
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Keep-alive stub that answers every POST with a small JSON body
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self): # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"ok": True}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+
+
+def before(url: str) -> None:
+    """
+    Previous pattern: resolve the region and credentials on every call
+    """
+
+    region = boto3.session.Session().region_name
+    auth = BotoAWSRequestsAuth(aws_host=urlparse(url).netloc,
+                               aws_region=region,
+                               aws_service="execute-api")
+    requests.post(url, json=PAYLOAD, auth=auth)
+
+
+def run(name: str, func, url: str) -> None:
+    """
+    Run a function CALLS times and print latency statistics
+    """
+
+    latencies = []
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        func(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    print("{:<8} mean {:7.3f}ms  p50 {:7.3f}ms  p99 {:7.3f}ms".format(
+        name,
+        statistics.mean(latencies),
+        latencies[len(latencies)//2],
+        latencies[int(len(latencies)*0.99)]
+    ))
+
+
+def main():
+    """
+    Start the stub server and run both benchmarks
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:{}/backend/validate".format(server.server_address[1])
+
+    client = Client()
+
+    run("before", before, url)
+    run("after", lambda u: client.post(u, json=PAYLOAD), url)
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
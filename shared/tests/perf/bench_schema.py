@@ -0,0 +1,84 @@
+"""
+Benchmark for order JSON Schema validation
+
+This compares `jsonschema.validate()` with the precompiled
+`ecom.schema.Validator` on orders with 2 to 100 products.
+
+Usage:
+
+    PYTHONPATH=shared/src/ecom python shared/tests/perf/bench_schema.py
+"""
+
+
+import json
+import os
+import random
+import timeit
+import uuid
+import jsonschema
+from ecom.schema import Validator # pylint: disable=import-error
+
+
+SCHEMA_FILE = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..",
+    "orders", "src", "create_order", "schema.json"
+)
+CART_SIZES = [2, 10, 50, 100]
+ITERATIONS = 200
+
+
+def get_order(n_products: int) -> dict:
+    """
+    Generate an order with n_products products
+    """
+
+    return {
+        "userId": str(uuid.uuid4()),
+        "products": [{
+            "productId": str(uuid.uuid4()),
+            "name": "Product {}".format(i),
+            "price": random.randrange(100, 10000),
+            "package": {
+                "width": random.randrange(10, 1000),
+                "length": random.randrange(10, 1000),
+                "height": random.randrange(10, 1000),
+                "weight": random.randrange(10, 1000)
+            },
+            "quantity": random.randrange(1, 5)
+        } for i in range(n_products)],
+        "address": {
+            "name": "John Doe",
+            "companyName": "Test Co",
+            "streetAddress": "123 Test St",
+            "postCode": "12345",
+            "city": "Test City",
+            "state": "Test State",
+            "country": "SE",
+            "phoneNumber": "+123456789"
+        },
+        "deliveryPrice": 1000,
+        "paymentToken": str(uuid.uuid4())
+    }
+
+
+def main():
+    """
+    Run the benchmark for each cart size
+    """
+
+    with open(SCHEMA_FILE) as fp:
+        schema = json.load(fp)
+    validator = Validator(schema)
+
+    print("{:>8} {:>14} {:>14} {:>8}".format("products", "jsonschema", "compiled", "speedup"))
+    for size in CART_SIZES:
+        order = get_order(size)
+        before = timeit.timeit(lambda: jsonschema.validate(order, schema), number=ITERATIONS) / ITERATIONS
+        after = timeit.timeit(lambda: validator.errors(order), number=ITERATIONS) / ITERATIONS
+        print("{:>8} {:>12.1f}us {:>12.1f}us {:>7.1f}x".format(
+            size, before*1e6, after*1e6, before/after
+        ))
+
+
+if __name__ == "__main__":
+    main()
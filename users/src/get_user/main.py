@@ -4,13 +4,14 @@ import boto3
 from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.logging.logger import Logger
 from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+from ecom.auth import InvalidToken, Verifier, cognito_issuer # pylint: disable=import-error
 
 logger = Logger()
 tracer = Tracer()
 
 dynamodb = boto3.resource('dynamodb')
-cognito = boto3.client("cognito-idp")
 users_table = dynamodb.Table(os.environ['TABLE_NAME'])
+verifier = Verifier(cognito_issuer(os.environ['USER_POOL_ID']))
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
@@ -21,11 +22,8 @@ def handler(event, _):
 
     try:
         # Verify token and get the user info
-        response = cognito.get_user(
-            AccessToken=token
-        )
-        
-        user_id_from_token = response['Username']
+        claims = verifier.verify(token)
+        user_id_from_token = claims['username']
 
         # Get user information from DynamoDB
         response = users_table.get_item(Key={'userId': user_id_to_get})
@@ -60,7 +58,7 @@ def handler(event, _):
             'body': json.dumps(limited_user_info)
         }
     
-    except cognito.exceptions.NotAuthorizedException as error:
+    except InvalidToken as error:
         logger.error(error)
         return {
             'statusCode': 400,
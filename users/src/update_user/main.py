@@ -4,13 +4,71 @@ import boto3
 from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.logging.logger import Logger
 from aws_lambda_powertools.utilities.data_classes import APIGatewayProxyEvent
+from ecom.auth import InvalidToken, Verifier, cognito_issuer # pylint: disable=import-error
+from ecom.dynamodb import InvalidUpdate, UpdatePlanner # pylint: disable=import-error
+from ecom.helpers import Encoder # pylint: disable=import-error
 
 logger = Logger()
 tracer = Tracer()
 
 dynamodb = boto3.resource('dynamodb')
-cognito = boto3.client("cognito-idp")
 users_table = dynamodb.Table(os.environ['TABLE_NAME'])
+verifier = Verifier(cognito_issuer(os.environ['USER_POOL_ID']))
+
+# Fields that users can update
+update_planner = UpdatePlanner({
+    'financeInformation.paymentMethod.cardType': str,
+    'financeInformation.paymentMethod.lastFourDigits': str,
+    'financeInformation.paymentMethod.expiryDate': str,
+    'financeInformation.payoutInformation.bankName': str,
+    'financeInformation.payoutInformation.accountNumber': str,
+    'financeInformation.payoutInformation.routingNumber': str,
+    'financeInformation.taxInformation.taxID': str,
+    'financeInformation.taxInformation.taxStatus': str
+})
+
+# Fields that are never returned after an update
+SENSITIVE_FIELDS = [
+    'financeInformation.payoutInformation.accountNumber',
+    'financeInformation.payoutInformation.routingNumber',
+    'financeInformation.taxInformation.taxID',
+    'personalInformation.governmentID'
+]
+
+
+def path_tree(paths):
+    """
+    Transform dotted paths into a tree of nested dicts, with None as leaves
+    """
+
+    tree = {}
+    for path in paths:
+        node = tree
+        keys = path.split('.')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = None
+    return tree
+
+
+SENSITIVE_TREE = path_tree(SENSITIVE_FIELDS)
+
+
+def project(item, exclude):
+    """
+    Returns a copy of an item without the paths in the 'exclude' tree
+
+    Only the maps that contain excluded paths are copied.
+    """
+
+    result = {}
+    for key, value in item.items():
+        if key not in exclude:
+            result[key] = value
+        elif exclude[key] is not None and isinstance(value, dict):
+            result[key] = project(value, exclude[key])
+    return result
+
 
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
@@ -21,11 +79,8 @@ def handler(event, _):
 
     try:
         # Verify token and get the user info
-        response = cognito.get_user(
-            AccessToken=token
-        )
-        
-        user_id_from_token = response['Username']
+        claims = verifier.verify(token)
+        user_id_from_token = claims['username']
 
         if user_id_from_token != user_id_to_update:
             return {
@@ -38,47 +93,30 @@ def handler(event, _):
             }
 
         body = json.loads(event['body'])
-        update_expression = "SET "
-        expression_attribute_values = {}
-
-        allowed_fields = {
-            'financeInformation.paymentMethod': 'paymentMethod',
-            'financeInformation.payoutInformation': 'payoutInformation',
-            'financeInformation.taxInformation': 'taxInformation'
-        }
-
-        for field, subfield in allowed_fields.items():
-            if subfield in body.get('financeInformation', {}):
-                for key, value in body['financeInformation'][subfield].items():
-                    update_expression += f"{field}.{key} = :{subfield}_{key}, "
-                    expression_attribute_values[f":{subfield}_{key}"] = value
-
-        if not expression_attribute_values:
+        try:
+            params = update_planner.plan(body)
+        except InvalidUpdate as error:
             return {
                 'statusCode': 400,
                 'body': json.dumps({
                     'message': 'No valid fields to update',
                     'code': 400,
-                    'details': 'Only financeInformation.paymentMethod, financeInformation.payoutInformation, and financeInformation.taxInformation are allowed'
+                    'details': '{}. Only financeInformation.paymentMethod, financeInformation.payoutInformation, and financeInformation.taxInformation are allowed'.format(error)
                 })
             }
 
-        update_expression = update_expression.rstrip(', ')
-
-        users_table.update_item(
+        # Return the updated user in the same round trip
+        response = users_table.update_item(
             Key={'userId': user_id_to_update},
-            UpdateExpression=update_expression,
-            ExpressionAttributeValues=expression_attribute_values
+            ReturnValues='ALL_NEW',
+            **params
         )
 
-        response = users_table.get_item(Key={'userId': user_id_to_update})
-        updated_user_info = response.get('Item', {})
-
         return {
             'statusCode': 200,
-            'body': json.dumps(updated_user_info)
+            'body': json.dumps(project(response['Attributes'], SENSITIVE_TREE), cls=Encoder)
         }
-    except cognito.exceptions.NotAuthorizedException as error:
+    except InvalidToken as error:
         logger.error(error)
         return {
             'statusCode': 400,
@@ -0,0 +1,149 @@
+import json
+import uuid
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+from ecom.auth import InvalidToken # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "get_user",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "USER_POOL_ID": "eu-west-1_TEST",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+@pytest.fixture
+def user():
+    return {
+        "userId": str(uuid.uuid4()),
+        "email": "john.doe@example.local",
+        "userType": "guest",
+        "profile": {"firstName": "John"},
+        "personalInformation": {"phoneNumber": "+33100000000"}
+    }
+
+
+@pytest.fixture
+def claims(lambda_module, monkeypatch):
+    """
+    Claims returned by the verifier, without signed tokens
+    """
+
+    claims = {}
+
+    def verify(token):
+        if token != "TOKEN":
+            raise InvalidToken("Invalid signature")
+        return claims
+
+    monkeypatch.setattr(lambda_module.verifier, "verify", verify)
+    return claims
+
+
+def add_get_item(table, user_id: str, item) -> None:
+    response = {}
+    if item is not None:
+        response["Item"] = {k: TypeSerializer().serialize(v) for k, v in item.items()}
+    table.add_response("get_item", response, {
+        "TableName": "TABLE_NAME",
+        "Key": {"userId": user_id}
+    })
+
+
+def get_event(apigateway_event, user_id: str, token: str = "TOKEN") -> dict:
+    event = apigateway_event(
+        resource="/users/{userId}",
+        path="/users/{}".format(user_id),
+        path_params={"userId": user_id}
+    )
+    event["headers"] = {"Authorization": token}
+    return event
+
+
+def test_handler(lambda_module, apigateway_event, context, claims, user):
+    """
+    Users get their full information
+    """
+
+    claims["username"] = user["userId"]
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    add_get_item(table, user["userId"], user)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, user["userId"]), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == user
+
+
+def test_handler_other_user(lambda_module, apigateway_event, context, claims, user):
+    """
+    Other users only get the public information
+    """
+
+    claims["username"] = str(uuid.uuid4())
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    add_get_item(table, user["userId"], user)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, user["userId"]), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {
+        "userId": user["userId"],
+        "email": user["email"],
+        "profile": user["profile"],
+        "userType": user["userType"]
+    }
+
+
+def test_handler_not_found(lambda_module, apigateway_event, context, claims, user):
+    """
+    Test handler() with an unknown user
+    """
+
+    claims["username"] = user["userId"]
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    add_get_item(table, user["userId"], None)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, user["userId"]), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 400
+
+
+def test_handler_invalid_token(lambda_module, apigateway_event, context, claims, user):
+    """
+    Invalid tokens are rejected before reading the user
+    """
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, user["userId"], "INVALID"), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["message"] == "Invalid token"
@@ -0,0 +1,195 @@
+import json
+import uuid
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore import stub
+from fixtures import apigateway_event, context, lambda_module # pylint: disable=import-error
+from ecom.auth import InvalidToken # pylint: disable=import-error
+
+
+lambda_module = pytest.fixture(scope="module", params=[{
+    "function_dir": "update_user",
+    "module_name": "main",
+    "environ": {
+        "ENVIRONMENT": "test",
+        "TABLE_NAME": "TABLE_NAME",
+        "USER_POOL_ID": "eu-west-1_TEST",
+        "POWERTOOLS_TRACE_DISABLED": "true"
+    }
+}])(lambda_module)
+context = pytest.fixture(context)
+
+
+@pytest.fixture
+def user_id():
+    return str(uuid.uuid4())
+
+
+@pytest.fixture
+def claims(lambda_module, monkeypatch, user_id):
+    """
+    Claims returned by the verifier, without signed tokens
+    """
+
+    claims = {"username": user_id}
+
+    def verify(token):
+        if token != "TOKEN":
+            raise InvalidToken("Invalid signature")
+        return claims
+
+    monkeypatch.setattr(lambda_module.verifier, "verify", verify)
+    return claims
+
+
+def get_event(apigateway_event, user_id: str, body: dict, token: str = "TOKEN") -> dict:
+    event = apigateway_event(
+        resource="/users/{userId}",
+        path="/users/{}".format(user_id),
+        method="PUT",
+        body=json.dumps(body),
+        path_params={"userId": user_id}
+    )
+    event["headers"] = {"Authorization": token}
+    return event
+
+
+def test_path_tree(lambda_module):
+    """
+    Test path_tree()
+    """
+
+    assert lambda_module.path_tree(["a.b.c", "a.d", "e"]) == {"a": {"b": {"c": None}, "d": None}, "e": None}
+    assert lambda_module.SENSITIVE_TREE == {
+        "financeInformation": {
+            "payoutInformation": {"accountNumber": None, "routingNumber": None},
+            "taxInformation": {"taxID": None}
+        },
+        "personalInformation": {"governmentID": None}
+    }
+
+
+def test_project(lambda_module):
+    """
+    Test project()
+    """
+
+    item = {
+        "a": {"b": {"c": 1, "x": 2}, "d": 3, "y": 4},
+        "e": {"f": 5},
+        # Not a map, so it cannot contain excluded paths
+        "g": 6,
+        "z": 7
+    }
+    exclude = lambda_module.path_tree(["a.b.c", "a.d", "e", "g.h"])
+
+    # Maps with excluded paths are copies, so the item is left unchanged
+    assert lambda_module.project(item, exclude) == {"a": {"b": {"x": 2}, "y": 4}, "z": 7}
+    assert item["a"] == {"b": {"c": 1, "x": 2}, "d": 3, "y": 4}
+    assert item["e"] == {"f": 5}
+
+
+def test_handler(lambda_module, apigateway_event, context, claims, user_id):
+    """
+    The user is updated in a single request, and sensitive fields are not
+    returned
+    """
+
+    body = {"financeInformation": {
+        "paymentMethod": {"cardType": "visa", "lastFourDigits": "4242"},
+        "taxInformation": {"taxID": "TAX_ID"}
+    }}
+    user = {
+        "userId": user_id,
+        "email": "john.doe@example.local",
+        "financeInformation": {
+            "paymentMethod": {"cardType": "visa", "lastFourDigits": "4242"},
+            "payoutInformation": {"bankName": "Bank", "accountNumber": "123", "routingNumber": "456"},
+            "taxInformation": {"taxID": "TAX_ID", "taxStatus": "individual"}
+        },
+        "personalInformation": {"governmentID": "ID", "phoneNumber": "+33100000000"}
+    }
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    table.add_response("update_item", {
+        "Attributes": {k: TypeSerializer().serialize(v) for k, v in user.items()}
+    }, dict(
+        TableName="TABLE_NAME",
+        Key={"userId": user_id},
+        ReturnValues="ALL_NEW",
+        **lambda_module.update_planner.plan(body)
+    ))
+    table.activate()
+
+    response = lambda_module.handler(get_event(apigateway_event, user_id, body), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {
+        "userId": user_id,
+        "email": "john.doe@example.local",
+        "financeInformation": {
+            "paymentMethod": {"cardType": "visa", "lastFourDigits": "4242"},
+            "payoutInformation": {"bankName": "Bank"},
+            "taxInformation": {"taxStatus": "individual"}
+        },
+        "personalInformation": {"phoneNumber": "+33100000000"}
+    }
+
+
+def test_handler_invalid_fields(lambda_module, apigateway_event, context, claims, user_id):
+    """
+    Updates to other fields are rejected without writing
+    """
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    table.activate()
+
+    for body in [
+            {"userType": "host"},
+            {"financeInformation": {"paymentMethod": {"cardType": 42}}},
+            {},
+            ["financeInformation"]
+        ]:
+        response = lambda_module.handler(get_event(apigateway_event, user_id, body), context)
+        assert response["statusCode"] == 400
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+def test_handler_other_user(lambda_module, apigateway_event, context, claims):
+    """
+    Users can only update their own account
+    """
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    table.activate()
+
+    body = {"financeInformation": {"paymentMethod": {"cardType": "visa"}}}
+    response = lambda_module.handler(get_event(apigateway_event, str(uuid.uuid4()), body), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 400
+
+
+def test_handler_invalid_token(lambda_module, apigateway_event, context, claims, user_id):
+    """
+    Invalid tokens are rejected before writing
+    """
+
+    table = stub.Stubber(lambda_module.users_table.meta.client)
+    table.activate()
+
+    body = {"financeInformation": {"paymentMethod": {"cardType": "visa"}}}
+    response = lambda_module.handler(get_event(apigateway_event, user_id, body, "INVALID"), context)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["message"] == "Invalid token"
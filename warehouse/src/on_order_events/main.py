@@ -6,14 +6,17 @@ OrderEventsFunction
 import os
 from typing import Dict, List, Optional
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, ConditionBase, ConditionExpressionBuilder, Key
 from aws_lambda_powertools.tracing import Tracer # pylint: disable=import-error
 from aws_lambda_powertools.logging.logger import Logger # pylint: disable=import-error
+from ecom.dynamodb import query_all # pylint: disable=import-error
 
 
 ENVIRONMENT = os.environ["ENVIRONMENT"]
 METADATA_KEY = os.environ["METADATA_KEY"]
 TABLE_NAME = os.environ["TABLE_NAME"]
+# Maximum number of operations in a TransactWriteItems request
+MAX_TRANSACT_ITEMS = 100
 
 
 dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
@@ -22,6 +25,27 @@ logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 
 
+def merge_products(products: List[dict]) -> List[dict]:
+    """
+    Merge products that appear more than once in an order, adding up their
+    quantities
+
+    DynamoDB rejects transactions and batches that write the same item twice.
+    """
+
+    merged: Dict[str, dict] = {}
+    for product in products:
+        product_id = product["productId"]
+        if product_id in merged:
+            merged[product_id] = dict(
+                merged[product_id],
+                quantity=merged[product_id].get("quantity", 1) + product.get("quantity", 1)
+            )
+        else:
+            merged[product_id] = product
+    return list(merged.values())
+
+
 @tracer.capture_method
 def get_diff(old_products: List[dict], new_products: List[dict]) -> Dict[str, dict]:
     """
@@ -31,8 +55,8 @@ def get_diff(old_products: List[dict], new_products: List[dict]) -> Dict[str, di
     """
 
     # Transform lists into dict
-    old = {p["productId"]: p for p in old_products}
-    new = {p["productId"]: p for p in new_products}
+    old = {p["productId"]: p for p in merge_products(old_products)}
+    new = {p["productId"]: p for p in merge_products(new_products)}
 
     diff = {
         "created": [],
@@ -81,33 +105,18 @@ def get_products(order_id: str) -> List[dict]:
     Retrieve products from the DynamoDB table
     """
 
-    res = table.query(
+    products = list(query_all(
+        table.query,
         KeyConditionExpression=Key("orderId").eq(order_id),
         Limit=100
-    )
+    ))
     logger.info({
         "message": "Retrieving {} products from order {}".format(
-            len(res.get("Items", [])), order_id
+            len(products), order_id
         ),
         "operation": "query",
         "orderId": order_id
     })
-    products = res.get("Items", [])
-
-    while res.get("LastEvaluatedKey", None) is not None:
-        res = table.query(
-            KeyConditionExpression=Key("orderId").eq(order_id),
-            ExclusiveStartKey=res["LastEvaluatedKey"],
-            Limit=100
-        )
-        logger.info({
-            "message": "Retrieving {} products from order {}".format(
-                len(res.get("Items", [])), order_id
-            ),
-            "operation": "query",
-            "orderId": order_id
-        })
-        products.extend(res.get("Items", []))
 
     return products
 
@@ -134,7 +143,7 @@ def delete_products(order_id: str, products: Optional[list] = None) -> None:
     with table.batch_writer() as batch:
         # If no list of 'products' is specified, deleted all products for
         # that item.
-        for product in products or get_products(order_id):
+        for product in merge_products(products or get_products(order_id)):
             # Skip metadata key
             if product["productId"] == METADATA_KEY:
                 continue
@@ -164,72 +173,97 @@ def delete_products(order_id: str, products: Optional[list] = None) -> None:
 
 
 @tracer.capture_method
-def save_metadata(order_id: str, modified_date: str, status: str = "NEW") -> None:
+def transact_products(
+        order_id: str,
+        modified_date: str,
+        condition: ConditionBase,
+        products: List[dict],
+        deleted: Optional[List[dict]] = None
+    ) -> bool:
     """
-    Save metadata in the DynamoDB table
+    Save products and metadata in the DynamoDB table with TransactWriteItems
+
+    All writes are conditioned on the metadata item matching 'condition'. If
+    there are too many products for a single transaction, they are split into
+    multiple transactions that each check the condition, and the metadata is
+    written in the last one. A failed request can therefore be retried
+    safely, while events that were already processed are rejected by the
+    condition without reading the table first.
+
+    Returns False if the condition failed.
     """
 
-    item = {
-        "orderId": order_id,
-        "productId": METADATA_KEY,
-        "modifiedDate": modified_date,
-        "status": status
+    # boto3 only injects expressions for top-level parameters, so the
+    # condition needs to be built for each transaction item.
+    expression, names, values = ConditionExpressionBuilder().build_expression(condition)
+    condition_params = {
+        "TableName": TABLE_NAME,
+        "ConditionExpression": expression,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values
     }
 
-    # Inject newDate for new requests
-    # This allow to make a sparse projects in DynamoDB using a Local Secondary Index.
-    if status == "NEW":
-        item["newDate"] = modified_date
-
-    table.put_item(Item=item)
+    operations = [
+        {"Put": {"TableName": TABLE_NAME, "Item": {
+            "orderId": order_id,
+            "productId": product["productId"],
+            "quantity": product.get("quantity", 1)
+        }}}
+        for product in merge_products(products)
+        if product["productId"] != METADATA_KEY
+    ]
+    operations.extend(
+        {"Delete": {"TableName": TABLE_NAME, "Key": {
+            "orderId": order_id,
+            "productId": product["productId"]
+        }}}
+        for product in merge_products(deleted or [])
+        if product["productId"] != METADATA_KEY
+    )
 
-
-@tracer.capture_method
-def save_products(order_id: str, products: List[dict]) -> None:
-    """
-    Save products in the DynamoDB table
-    """
+    # Keep one operation per transaction for the metadata item
+    chunk_size = MAX_TRANSACT_ITEMS - 1
+    chunks = [
+        operations[i:i+chunk_size]
+        for i in range(0, len(operations), chunk_size)
+    ] or [[]]
 
     logger.info({
-        "message": "Writing {} products for order {}".format(
-            len(products), order_id
+        "message": "Writing {} products for order {} in {} transaction(s)".format(
+            len(operations), order_id, len(chunks)
         ),
-        "operation": "put",
+        "operation": "transact_write",
         "orderId": order_id,
-        "productCount": len(products)
+        "productCount": len(operations)
     })
 
-    with table.batch_writer() as batch:
-        for product in products:
-            item = {
+    for i, chunk in enumerate(chunks):
+        if i < len(chunks) - 1:
+            chunk.append({"ConditionCheck": dict(condition_params, Key={
                 "orderId": order_id,
-                "productId": product["productId"],
-                "quantity": product.get("quantity", 1)
-            }
-            logger.debug({
-                "message": "Writing product {}".format(product["productId"]),
-                "operation": "put",
-                "product": item,
-                "orderId": order_id
-            })
-            batch.put_item(Item=item)
-
-
-@tracer.capture_method
-def update_products(order_id: str, old_products: List[dict], new_products: List[dict]):
-    """
-    Update products in DynamoDB
-    """
-
-    diff = get_diff(old_products, new_products)
-
-    # As DynamoDB put_item overwrite existing items, we can perform both steps
-    # in one go.
-    if len(diff["created"]) + len(diff["modified"]) > 0:
-        save_products(order_id, diff["created"] + diff["modified"])
-
-    if len(diff["deleted"]) > 0:
-        delete_products(order_id, diff["deleted"])
+                "productId": METADATA_KEY
+            })})
+        else:
+            chunk.append({"Put": dict(condition_params, Item={
+                "orderId": order_id,
+                "productId": METADATA_KEY,
+                "modifiedDate": modified_date,
+                "status": "NEW",
+                # Inject newDate for new requests
+                # This allow to make a sparse projects in DynamoDB using a Local Secondary Index.
+                "newDate": modified_date
+            })})
+
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=chunk)
+        except dynamodb.meta.client.exceptions.TransactionCanceledException as exc:
+            # The metadata item is always the last operation of a transaction
+            reasons = exc.response.get("CancellationReasons", [])
+            if len(reasons) > 0 and reasons[-1].get("Code") == "ConditionalCheckFailed":
+                return False
+            raise
+
+    return True
 
 
 @tracer.capture_method
@@ -240,23 +274,22 @@ def on_order_created(order: dict):
 
     order_id = order["orderId"]
 
-    # Idempotency check
-    metadata = get_metadata(order_id)
-    # Check if the metadata exist and is newer/same version as the event
-    if metadata is not None and metadata["modifiedDate"] >= order["modifiedDate"]:
-        logger.info({
-            "message": "Order {} is already in the database".format(order_id),
-            "orderId": order_id
-        })
-        # Skipping
-        return
-
     logger.info({
         "message": "Saving new packaging request for order {}".format(order_id),
         "orderId": order_id
     })
-    save_products(order_id, order["products"])
-    save_metadata(order_id, order["modifiedDate"])
+
+    # Idempotency check: only save if the metadata does not exist or is older
+    # than the event
+    condition = (
+        Attr("orderId").not_exists()
+        | Attr("modifiedDate").lt(order["modifiedDate"])
+    )
+    if not transact_products(order_id, order["modifiedDate"], condition, order["products"]):
+        logger.info({
+            "message": "Order {} is already in the database".format(order_id),
+            "orderId": order_id
+        })
 
 
 @tracer.capture_method
@@ -267,41 +300,30 @@ def on_order_modified(old_order: dict, new_order: dict):
 
     order_id = old_order["orderId"]
 
-    # Idempotency check
-    metadata = get_metadata(order_id)
-    # If no metadata, the order is not in the database
-    if metadata is None:
-        logger.info({
-            "message": "Saving changes for unknown order {}".format(order_id),
-            "orderId": order_id
-        })
-        save_products(order_id, new_order["products"])
-        save_metadata(order_id, new_order["modifiedDate"])
-    # Accepting modifications only if the order is in the 'NEW' state and
-    # the event is newer than the last known state
-    elif metadata["status"] == "NEW" and metadata["modifiedDate"] < new_order["modifiedDate"]:
-        logger.info({
-            "message": "Saving changes for order {}".format(order_id),
-            "orderId": order_id
-        })
-        update_products(old_order["orderId"], old_order["products"], new_order["products"])
-        save_metadata(old_order["orderId"], new_order["modifiedDate"], metadata["status"])
-    elif metadata["modifiedDate"] >= new_order["modifiedDate"]:
-        logger.info({
-            "message": "Will not save changes: latest state for order {} is already in the database".format(order_id),
-            "metadata": metadata,
-            "orderId": order_id
-        })
-    elif metadata["status"] != "NEW":
+    logger.info({
+        "message": "Saving changes for order {}".format(order_id),
+        "orderId": order_id
+    })
+
+    # Accepting modifications only if the order is in the 'NEW' state and the
+    # event is newer than the last known state. Only the products that changed
+    # are written.
+    diff = get_diff(old_order["products"], new_order["products"])
+    if transact_products(
+            order_id, new_order["modifiedDate"],
+            Attr("status").eq("NEW") & Attr("modifiedDate").lt(new_order["modifiedDate"]),
+            diff["created"] + diff["modified"], diff["deleted"]
+        ):
+        return
+
+    # If the order is not in the database yet, all its products are saved
+    if not transact_products(
+            order_id, new_order["modifiedDate"],
+            Attr("orderId").not_exists(),
+            new_order["products"]
+        ):
         logger.info({
-            "message": "Will not save changes: packaging request for order {} is not NEW".format(order_id),
-            "metadata": metadata,
-            "orderId": order_id
-        })
-    else:
-        logger.warning({
-            "message": "Will not save changes: packaging request for order {} cannot be updated".format(order_id),
-            "metadata": metadata,
+            "message": "Will not save changes: packaging request for order {} is not NEW or already up to date".format(order_id),
             "orderId": order_id
         })
 
@@ -3,11 +3,12 @@ TableUpdateFunction
 """
 
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import json
 import os
 import warnings
-from typing import List, Optional
+from typing import Dict, List, Optional
 from aws_lambda_powertools.tracing import Tracer
 from aws_lambda_powertools.logging.logger import Logger
 from aws_lambda_powertools import Metrics
@@ -15,6 +16,8 @@ from aws_lambda_powertools.metrics import MetricUnit
 import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.types import TypeDeserializer
+from ecom.dynamodb import query_all # pylint: disable=import-error
+from ecom.eventbridge import put_record_events # pylint: disable=import-error
 from ecom.helpers import Encoder #pylint: disable=import-error
 
 
@@ -22,6 +25,10 @@ ENVIRONMENT = os.environ["ENVIRONMENT"]
 EVENT_BUS_NAME = os.environ["EVENT_BUS_NAME"]
 METADATA_KEY = os.environ["METADATA_KEY"]
 TABLE_NAME = os.environ["TABLE_NAME"]
+# Maximum number of orders to query concurrently
+MAX_WORKERS = 10
+# Maximum number of items per query page
+PAGE_SIZE = 1000
 
 
 dynamodb = boto3.resource("dynamodb") # pylint: disable=invalid-name
@@ -31,6 +38,7 @@ type_deserializer = TypeDeserializer() # pylint: disable=invalid-name
 logger = Logger() # pylint: disable=invalid-name
 tracer = Tracer() # pylint: disable=invalid-name
 metrics = Metrics(namespace="ecommerce.warehouse", service="warehouse")
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS) # pylint: disable=invalid-name
 
 
 event_type_to_metric = {
@@ -39,34 +47,37 @@ event_type_to_metric = {
 }
 
 
-@tracer.capture_method
-def send_events(events: List[dict]):
+def get_order_id(ddb_record: dict) -> Optional[str]:
     """
-    Send events to EventBridge
+    Returns the order ID for metadata records in the COMPLETED status, None
+    otherwise
     """
 
-    logger.info("Sending %d events to EventBridge", len(events))
-    # EventBridge only supports batches of up to 10 events
-    for i in range(0, len(events), 10):
-        eventbridge.put_events(Entries=events[i:i+10])
+    # Discard records that concern removed events, non-metadata items or items that are
+    # not in the COMPLETED status.
+    if (ddb_record["eventName"].upper() == "REMOVE"
+            or ddb_record["dynamodb"]["NewImage"]["productId"]["S"] != METADATA_KEY
+            or ddb_record["dynamodb"]["NewImage"]["status"]["S"] != "COMPLETED"):
+        return None
+
+    return ddb_record["dynamodb"]["NewImage"]["orderId"]["S"]
 
 
 @tracer.capture_method
-def parse_record(ddb_record: dict) -> Optional[dict]:
+def parse_record(ddb_record: dict, orders_products: Dict[str, List[dict]]) -> Optional[dict]:
     """
     Parse a DynamoDB record into an EventBridge event
+
+    'orders_products' contains the products for each completed order in the
+    batch, as returned by get_orders_products().
     """
 
-    # Discard records that concern removed events, non-metadata items or items that are
-    # not in the COMPLETED status.
-    if (ddb_record["eventName"].upper() == "REMOVE"
-            or ddb_record["dynamodb"]["NewImage"]["productId"]["S"] != METADATA_KEY
-            or ddb_record["dynamodb"]["NewImage"]["status"]["S"] != "COMPLETED"):
+    order_id = get_order_id(ddb_record)
+    if order_id is None:
         return None
 
     # Gather information
-    order_id = ddb_record["dynamodb"]["NewImage"]["orderId"]["S"]
-    products = get_products(order_id)
+    products = orders_products.get(order_id, [])
 
     # Create the detail
     detail_type = "PackagingFailed"
@@ -90,43 +101,54 @@ def parse_record(ddb_record: dict) -> Optional[dict]:
         "Detail": json.dumps(detail, cls=Encoder)
     }
 
-@tracer.capture_method
+
 def get_products(order_id: str) -> List[dict]:
     """
     Retrieve products from the DynamoDB table
+
+    This runs in worker threads, so it uses the client of the table, as boto3
+    clients are thread-safe but resources are not. It is not traced either,
+    as worker threads do not have the X-Ray context of the invocation:
+    get_orders_products() covers it.
     """
 
-    res = table.query(
+    products = list(query_all(
+        table.meta.client.query,
+        TableName=TABLE_NAME,
         KeyConditionExpression=Key("orderId").eq(order_id),
-        Limit=100
-    )
+        Limit=PAGE_SIZE
+    ))
     logger.info({
         "message": "Retrieving {} products from order {}".format(
-            len(res.get("Items", [])), order_id
+            len(products), order_id
         ),
         "operation": "query",
         "orderId": order_id
     })
-    products = res.get("Items", [])
-
-    while res.get("LastEvaluatedKey", None) is not None:
-        res = table.query(
-            KeyConditionExpression=Key("orderId").eq(order_id),
-            ExclusiveStartKey=res["LastEvaluatedKey"],
-            Limit=100
-        )
-        logger.info({
-            "message": "Retrieving {} products from order {}".format(
-                len(res.get("Items", [])), order_id
-            ),
-            "operation": "query",
-            "orderId": order_id
-        })
-        products.extend(res.get("Items", []))
 
     return products
 
 
+@tracer.capture_method
+def get_orders_products(order_ids: List[str]) -> Dict[str, List[dict]]:
+    """
+    Retrieve products for multiple orders from the DynamoDB table
+
+    Orders are queried concurrently, so this takes as long as the slowest
+    order rather than the sum of all of them.
+    """
+
+    # Remove duplicates while preserving order
+    order_ids = list(dict.fromkeys(order_ids))
+
+    if len(order_ids) == 0:
+        return {}
+    if len(order_ids) == 1:
+        return {order_ids[0]: get_products(order_ids[0])}
+
+    return dict(zip(order_ids, executor.map(get_products, order_ids)))
+
+
 @metrics.log_metrics
 @logger.inject_lambda_context
 @tracer.capture_lambda_handler
@@ -150,14 +172,23 @@ def handler(event, _):
         "records": event.get("Records", [])
     })
 
-    # Parse events
-    events = [
-        parse_record(record)
-        for record in event.get("Records", [])
-    ]
-
-    # Filter None events
-    events = [event for event in events if event is not None]
+    # Retrieve the products of all completed orders at once
+    order_ids = [get_order_id(record) for record in event.get("Records", [])]
+    orders_products = get_orders_products([
+        order_id for order_id in order_ids
+        if order_id is not None
+    ])
+
+    # Parse events and keep track of the record for each event, to report
+    # failures
+    records = []
+    events = []
+    for record in event.get("Records", []):
+        record_event = parse_record(record, orders_products)
+        # Filter None events
+        if record_event is not None:
+            records.append(record)
+            events.append(record_event)
 
     logger.info("Received %d event(s)", len(events))
     logger.debug({
@@ -165,4 +196,5 @@ def handler(event, _):
         "events": events
     })
 
-    send_events(events)
+    # Report failed records, so Lambda retries from the first failed one
+    return put_record_events(eventbridge, records, events, logger)
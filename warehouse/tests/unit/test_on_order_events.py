@@ -81,6 +81,24 @@ def test_get_diff(lambda_module, get_product):
     assert response["modified"][0] == new_products[0]
 
 
+def test_merge_products(lambda_module, get_product):
+    """
+    Test merge_products()
+    """
+
+    product_a, product_b = get_product(), get_product()
+    product_a["quantity"] = 2
+    product_b.pop("quantity", None)
+
+    merged = lambda_module.merge_products([product_a, product_b, dict(product_a, quantity=3), product_b])
+
+    assert [p["productId"] for p in merged] == [product_a["productId"], product_b["productId"]]
+    assert merged[0]["quantity"] == 5
+    assert merged[1]["quantity"] == 2
+    # The input is left unchanged
+    assert product_a["quantity"] == 2
+
+
 def test_get_metadata(lambda_module, order_metadata):
     """
     Test get_metadata()
@@ -201,88 +219,158 @@ def test_delete_products(lambda_module, order, order_products):
     table.deactivate()
 
 
-def test_save_metadata(lambda_module, order_metadata):
+def test_transact_products(lambda_module, order, order_products):
     """
-    Test save_metadata()
+    Test transact_products()
     """
 
-    item = copy.deepcopy(order_metadata)
-    item["newDate"] = order_metadata["modifiedDate"]
-
-    table = mock_table(
-        lambda_module.table, "put_item",
-        ["orderId", "productId"],
-        items=item
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_response("transact_write_items", {}, {"TransactItems": [
+        {"Put": {"TableName": lambda_module.table.name, "Item": product}}
+        for product in order_products
+    ] + [
+        {"Put": {
+            "TableName": lambda_module.table.name,
+            "Item": {
+                "orderId": order["orderId"],
+                "productId": METADATA_KEY,
+                "modifiedDate": order["modifiedDate"],
+                "status": "NEW",
+                "newDate": order["modifiedDate"]
+            },
+            "ConditionExpression": "attribute_not_exists(#n0)",
+            "ExpressionAttributeNames": {"#n0": "orderId"},
+            "ExpressionAttributeValues": {}
+        }}
+    ]})
+    table.activate()
+
+    retval = lambda_module.transact_products(
+        order["orderId"], order["modifiedDate"],
+        lambda_module.Attr("orderId").not_exists(),
+        order["products"]
     )
 
-    lambda_module.save_metadata(
-        order_metadata["orderId"],
-        order_metadata["modifiedDate"],
-        order_metadata["status"]
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+    assert retval == True
+
+
+def test_transact_products_duplicates(lambda_module, order, get_product):
+    """
+    Test transact_products() with a product that appears twice
+    """
+
+    product = get_product()
+    product["quantity"] = 1
+
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_response("transact_write_items", {}, {"TransactItems": [
+        {"Put": {"TableName": lambda_module.table.name, "Item": {
+            "orderId": order["orderId"],
+            "productId": product["productId"],
+            "quantity": 2
+        }}},
+        {"Put": stub.ANY}
+    ]})
+    table.activate()
+
+    retval = lambda_module.transact_products(
+        order["orderId"], order["modifiedDate"],
+        lambda_module.Attr("orderId").not_exists(),
+        [product, product]
     )
 
     table.assert_no_pending_responses()
     table.deactivate()
 
+    assert retval == True
+
 
-def test_save_products(lambda_module, order, order_products):
+def test_transact_products_chunks(lambda_module, order, get_product):
     """
-    Test save_products()
+    Test transact_products() with more products than fit in a transaction
     """
 
-    table = mock_table(
-        lambda_module.table, "batch_write_item",
-        ["orderId", "productId"],
-        items=[
-            {"PutRequest": {"Item": product}}
-            for product in order_products
-        ]
-    )
+    products = [get_product() for _ in range(150)]
+    deleted = [get_product() for _ in range(10)]
+    condition = lambda_module.Attr("orderId").not_exists()
 
-    lambda_module.save_products(order["orderId"], order["products"])
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    # First transaction: 99 products and a condition check on the metadata
+    table.add_response("transact_write_items", {}, {"TransactItems": [stub.ANY] * 99 + [
+        {"ConditionCheck": {
+            "TableName": lambda_module.table.name,
+            "Key": {"orderId": order["orderId"], "productId": METADATA_KEY},
+            "ConditionExpression": "attribute_not_exists(#n0)",
+            "ExpressionAttributeNames": {"#n0": "orderId"},
+            "ExpressionAttributeValues": {}
+        }}
+    ]})
+    # Second transaction: 51 products, 10 deletes and the metadata
+    table.add_response("transact_write_items", {}, {"TransactItems": [stub.ANY] * 61 + [
+        {"Put": stub.ANY}
+    ]})
+    table.activate()
+
+    retval = lambda_module.transact_products(
+        order["orderId"], order["modifiedDate"], condition,
+        products, deleted
+    )
 
     table.assert_no_pending_responses()
     table.deactivate()
 
+    assert retval == True
+
 
-def test_update_products_new(lambda_module, order, order_products):
+def test_transact_products_condition_failed(lambda_module, order):
     """
-    Test update_products() with new products only
+    Test transact_products() with a failed condition
     """
 
-    table = mock_table(
-        lambda_module.table, "batch_write_item",
-        ["orderId", "productId"],
-        items=[
-            {"PutRequest": {"Item": product}}
-            for product in order_products
-        ]
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_client_error(
+        "transact_write_items", "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [
+            {"Code": "None"} for _ in order["products"]
+        ] + [{"Code": "ConditionalCheckFailed"}]}
     )
+    table.activate()
 
-    lambda_module.update_products(order["orderId"], [], order["products"])
+    retval = lambda_module.transact_products(
+        order["orderId"], order["modifiedDate"],
+        lambda_module.Attr("orderId").not_exists(),
+        order["products"]
+    )
 
     table.assert_no_pending_responses()
     table.deactivate()
 
+    assert retval == False
 
-def test_update_products_old(lambda_module, order, order_products):
+
+def test_transact_products_conflict(lambda_module, order):
     """
-    Test update_products() with old products only
+    Test transact_products() with a transaction conflict
     """
 
-    table = mock_table(
-        lambda_module.table, "batch_write_item",
-        ["orderId", "productId"],
-        items=[
-            {"DeleteRequest": {"Key": {
-                "orderId": product["orderId"],
-                "productId": product["productId"]
-            }}}
-            for product in order_products
-        ]
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_client_error(
+        "transact_write_items", "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [
+            {"Code": "None"} for _ in order["products"]
+        ] + [{"Code": "TransactionConflict"}]}
     )
+    table.activate()
 
-    lambda_module.update_products(order["orderId"], order["products"], [])
+    with pytest.raises(lambda_module.dynamodb.meta.client.exceptions.TransactionCanceledException):
+        lambda_module.transact_products(
+            order["orderId"], order["modifiedDate"],
+            lambda_module.Attr("orderId").not_exists(),
+            order["products"]
+        )
 
     table.assert_no_pending_responses()
     table.deactivate()
@@ -293,88 +381,154 @@ def test_on_order_created(lambda_module, order, order_products, order_metadata):
     Test on_order_created()
     """
 
-    table = mock_table(
-        lambda_module.table, "get_item", ["orderId", "productId"]
-    )
-    mock_table(
-        table, "batch_write_item",
-        ["orderId", "productId"],
-        table_name=lambda_module.table.name,
-        items=[
-            {"PutRequest": {"Item": product}}
-            for product in order_products
-        ]
-    )
     order_metadata = copy.deepcopy(order_metadata)
     order_metadata["newDate"] = order_metadata["modifiedDate"]
-    mock_table(
-        table, "put_item", ["orderId", "productId"],
-        table_name=lambda_module.table.name,
-        items=order_metadata
-    )
-    
+
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_response("transact_write_items", {}, {"TransactItems": [
+        {"Put": {"TableName": lambda_module.table.name, "Item": product}}
+        for product in order_products
+    ] + [
+        {"Put": {
+            "TableName": lambda_module.table.name,
+            "Item": order_metadata,
+            "ConditionExpression": "(attribute_not_exists(#n0) OR #n1 < :v0)",
+            "ExpressionAttributeNames": {"#n0": "orderId", "#n1": "modifiedDate"},
+            "ExpressionAttributeValues": {":v0": order["modifiedDate"]}
+        }}
+    ]})
+    table.activate()
+
     lambda_module.on_order_created(order)
 
     table.assert_no_pending_responses()
     table.deactivate()
 
 
-def test_on_order_created_idempotent(lambda_module, order, order_metadata):
+def test_on_order_created_idempotent(lambda_module, order):
     """
     Test on_order_created() with an existing item
     """
 
-    table = mock_table(
-        lambda_module.table, "get_item", ["orderId", "productId"],
-        items=order_metadata
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_client_error(
+        "transact_write_items", "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [
+            {"Code": "None"} for _ in order["products"]
+        ] + [{"Code": "ConditionalCheckFailed"}]}
     )
-    
+    table.activate()
+
     lambda_module.on_order_created(order)
 
     table.assert_no_pending_responses()
     table.deactivate()
 
 
-def test_on_order_modified_new(lambda_module, order, order_products, order_metadata):
+def test_on_order_modified_new(lambda_module, order, order_products, order_metadata, get_product):
     """
     Test on_order_modified() with a new event
     """
 
-    table = mock_table(
-        lambda_module.table, "get_item", ["orderId", "productId"]
-    )
-    mock_table(
-        table, "batch_write_item",
-        ["orderId", "productId"],
-        table_name=lambda_module.table.name,
-        items=[
-            {"PutRequest": {"Item": product}}
-            for product in order_products
-        ]
-    )
+    new_order = copy.deepcopy(order)
+    new_order["modifiedDate"] = datetime.datetime.now().isoformat()
+    deleted = new_order["products"].pop()
+    new_order["products"].append(get_product())
+
     order_metadata = copy.deepcopy(order_metadata)
-    order_metadata["newDate"] = order_metadata["modifiedDate"]
-    mock_table(
-        table, "put_item", ["orderId", "productId"],
-        table_name=lambda_module.table.name,
-        items=order_metadata
+    order_metadata["modifiedDate"] = new_order["modifiedDate"]
+    order_metadata["newDate"] = new_order["modifiedDate"]
+
+    # Only the new product is written
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_response("transact_write_items", {}, {"TransactItems": [
+        {"Put": {"TableName": lambda_module.table.name, "Item": {
+            "orderId": order["orderId"],
+            "productId": new_order["products"][-1]["productId"],
+            "quantity": new_order["products"][-1].get("quantity", 1)
+        }}},
+        {"Delete": {"TableName": lambda_module.table.name, "Key": {
+            "orderId": order["orderId"],
+            "productId": deleted["productId"]
+        }}},
+        {"Put": {
+            "TableName": lambda_module.table.name,
+            "Item": order_metadata,
+            "ConditionExpression": "(#n0 = :v0 AND #n1 < :v1)",
+            "ExpressionAttributeNames": {"#n0": "status", "#n1": "modifiedDate"},
+            "ExpressionAttributeValues": {":v0": "NEW", ":v1": new_order["modifiedDate"]}
+        }}
+    ]})
+    table.activate()
+
+    lambda_module.on_order_modified(order, new_order)
+
+    table.assert_no_pending_responses()
+    table.deactivate()
+
+
+def test_on_order_modified_missing(lambda_module, order, order_metadata, get_product):
+    """
+    Test on_order_modified() with an order that is not in the database
+    """
+
+    new_order = copy.deepcopy(order)
+    new_order["modifiedDate"] = datetime.datetime.now().isoformat()
+    new_order["products"].append(get_product())
+
+    order_metadata = copy.deepcopy(order_metadata)
+    order_metadata["modifiedDate"] = new_order["modifiedDate"]
+    order_metadata["newDate"] = new_order["modifiedDate"]
+
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_client_error(
+        "transact_write_items", "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [{"Code": "None"}, {"Code": "ConditionalCheckFailed"}]}
     )
+    # All products are saved
+    table.add_response("transact_write_items", {}, {"TransactItems": [
+        {"Put": {"TableName": lambda_module.table.name, "Item": {
+            "orderId": order["orderId"],
+            "productId": product["productId"],
+            "quantity": product.get("quantity", 1)
+        }}}
+        for product in new_order["products"]
+    ] + [
+        {"Put": {
+            "TableName": lambda_module.table.name,
+            "Item": order_metadata,
+            "ConditionExpression": "attribute_not_exists(#n0)",
+            "ExpressionAttributeNames": {"#n0": "orderId"},
+            "ExpressionAttributeValues": {}
+        }}
+    ]})
+    table.activate()
 
-    lambda_module.on_order_modified(order, order)
+    lambda_module.on_order_modified(order, new_order)
 
     table.assert_no_pending_responses()
     table.deactivate()
 
 
-def test_on_order_modified_idempotent(lambda_module, order, order_metadata):
+def test_on_order_modified_idempotent(lambda_module, order):
     """
     Test on_order_modified() with an already processed event
     """
 
-    table = mock_table(
-        lambda_module.table, "get_item", ["orderId", "productId"],
-        items=order_metadata
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    # The order is up to date
+    table.add_client_error(
+        "transact_write_items", "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [{"Code": "ConditionalCheckFailed"}]}
     )
+    # The order exists
+    table.add_client_error(
+        "transact_write_items", "TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [
+            {"Code": "None"} for _ in order["products"]
+        ] + [{"Code": "ConditionalCheckFailed"}]}
+    )
+    table.activate()
 
     lambda_module.on_order_modified(order, order)
 
@@ -436,25 +590,23 @@ def test_handler_created(lambda_module, context, order, order_products, order_me
     Test handler() with OrderCreated
     """
 
-    table = mock_table(
-        lambda_module.table, "get_item", ["orderId", "productId"]
-    )
-    mock_table(
-        table, "batch_write_item",
-        ["orderId", "productId"],
-        table_name=lambda_module.table.name,
-        items=[
-            {"PutRequest": {"Item": product}}
-            for product in order_products
-        ]
-    )
     order_metadata = copy.deepcopy(order_metadata)
     order_metadata["newDate"] = order_metadata["modifiedDate"]
-    mock_table(
-        table, "put_item", ["orderId", "productId"],
-        table_name=lambda_module.table.name,
-        items=order_metadata
-    )
+
+    table = stub.Stubber(lambda_module.dynamodb.meta.client)
+    table.add_response("transact_write_items", {}, {"TransactItems": [
+        {"Put": {"TableName": lambda_module.table.name, "Item": product}}
+        for product in order_products
+    ] + [
+        {"Put": {
+            "TableName": lambda_module.table.name,
+            "Item": order_metadata,
+            "ConditionExpression": stub.ANY,
+            "ExpressionAttributeNames": stub.ANY,
+            "ExpressionAttributeValues": stub.ANY
+        }}
+    ]})
+    table.activate()
 
     lambda_module.handler({
         "source": "ecommerce.orders",
@@ -2,6 +2,7 @@ import copy
 import datetime
 import json
 import random
+import time
 import uuid
 from botocore import stub
 import pytest
@@ -168,21 +169,50 @@ def test_get_products(lambda_module, order, order_products):
     assert response == order_products
 
 
-def test_parse_record_metadata_completed(lambda_module, ddb_record_metadata_completed, event_metadata_completed, order, order_products):
+def test_get_orders_products(lambda_module, monkeypatch):
     """
-    Test parse_record() with a metadata completed item
+    Test get_orders_products() with multiple orders
     """
 
-    table = mock_table(
-        lambda_module.table, "query",
-        ["orderId", "productId"],
-        items=order_products
-    )
+    order_ids = [str(uuid.uuid4()) for _ in range(5)]
+    calls = []
 
-    response = lambda_module.parse_record(ddb_record_metadata_completed)
+    def get_products(order_id):
+        calls.append(order_id)
+        time.sleep(0.1)
+        return [{"orderId": order_id, "productId": str(uuid.uuid4()), "quantity": 1}]
 
-    table.assert_no_pending_responses()
-    table.deactivate()
+    monkeypatch.setattr(lambda_module, "get_products", get_products)
+
+    start = time.time()
+    # Duplicate order IDs are only queried once
+    response = lambda_module.get_orders_products(order_ids + order_ids[:2])
+    duration = time.time() - start
+
+    assert sorted(calls) == sorted(order_ids)
+    assert list(response.keys()) == order_ids
+    for order_id in order_ids:
+        assert response[order_id][0]["orderId"] == order_id
+    # Orders are queried concurrently
+    assert duration < 0.1 * len(order_ids)
+
+
+def test_get_orders_products_empty(lambda_module):
+    """
+    Test get_orders_products() without orders
+    """
+
+    assert lambda_module.get_orders_products([]) == {}
+
+
+def test_parse_record_metadata_completed(lambda_module, ddb_record_metadata_completed, event_metadata_completed, order, order_products):
+    """
+    Test parse_record() with a metadata completed item
+    """
+
+    response = lambda_module.parse_record(ddb_record_metadata_completed, {
+        order["orderId"]: order_products
+    })
 
     assert response is not None
     compare_event(event_metadata_completed, response)
@@ -193,15 +223,9 @@ def test_parse_record_metadata_completed_empty(lambda_module, ddb_record_metadat
     Test parse_record() with a metadata completed item without products
     """
 
-    table = mock_table(
-        lambda_module.table, "query",
-        ["orderId", "productId"]
-    )
-
-    response = lambda_module.parse_record(ddb_record_metadata_completed)
-
-    table.assert_no_pending_responses()
-    table.deactivate()
+    response = lambda_module.parse_record(ddb_record_metadata_completed, {
+        order["orderId"]: []
+    })
 
     assert response is not None
     compare_event(event_metadata_failed, response)
@@ -212,7 +236,7 @@ def test_parse_record_metadata_product(lambda_module, ddb_record_metadata_produc
     Test parse_record() with a product item
     """
 
-    response = lambda_module.parse_record(ddb_record_metadata_product)
+    response = lambda_module.parse_record(ddb_record_metadata_product, {})
 
     assert response is None
 
@@ -222,7 +246,7 @@ def test_parse_record_metadata_removed(lambda_module, ddb_record_metadata_remove
     Test parse_record() with a metadata removed item
     """
 
-    response = lambda_module.parse_record(ddb_record_metadata_removed)
+    response = lambda_module.parse_record(ddb_record_metadata_removed, {})
 
     assert response is None
 